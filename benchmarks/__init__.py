@@ -0,0 +1,5 @@
+"""Micro-benchmarks for tchaka's in-memory hot paths.
+
+Each module is a standalone script (``python -m benchmarks.<name>``) printing
+a small table. They are not part of the test-suite and need no Telegram token.
+"""
@@ -0,0 +1,52 @@
+"""Shared helpers for the benchmark scripts."""
+
+from __future__ import annotations
+
+import random
+import time
+from collections.abc import Callable
+
+from tchaka.state import AppState, Coord, UserRecord
+
+# Inhabited latitude band; spreading users over it keeps density (and thus the
+# size of one neighborhood) roughly constant as the population grows.
+LAT_BAND = (-55.0, 70.0)
+DISTANCE_DEGREE_KM = 111.32  # mean km length of 1 degree of latitude
+
+
+def random_coords(n: int, *, seed: int = 0) -> list[tuple[float, float]]:
+    """``n`` reproducible random points spread over the inhabited band."""
+    rng = random.Random(seed)
+    return [(rng.uniform(*LAT_BAND), rng.uniform(-180.0, 180.0)) for _ in range(n)]
+
+
+def city_coords(
+    n: int, *, cities: int = 200, seed: int = 0
+) -> list[tuple[float, float]]:
+    """``n`` points around ``cities`` centers (Gaussian, ~10 km spread), so
+    dense areas dominate as in production."""
+    rng = random.Random(seed)
+    centers = [
+        (rng.uniform(*LAT_BAND), rng.uniform(-180.0, 180.0)) for _ in range(cities)
+    ]
+    spread = 10.0 / DISTANCE_DEGREE_KM
+    out = []
+    for _ in range(n):
+        lat, lon = rng.choice(centers)
+        out.append((lat + rng.gauss(0, spread), lon + rng.gauss(0, spread)))
+    return out
+
+
+def populate(state: AppState, coords: list[tuple[float, float]]) -> AppState:
+    """Register one user per coordinate (user ids ``u0``, ``u1``, ...)."""
+    for i, (lat, lon) in enumerate(coords):
+        state.register(UserRecord(f"u{i}", i, Coord(lat, lon), 0.0))
+    return state
+
+
+def per_call_us(fn: Callable[[], object], repeat: int) -> float:
+    """Mean wall time of ``fn()`` in microseconds over ``repeat`` calls."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
@@ -0,0 +1,313 @@
+"""An in-process stand-in for the subset of ``redis.asyncio`` tchaka uses.
+
+:class:`LocalRedis` answers the commands :class:`~tchaka.backend.RedisBackend`
+sends, with redis-py's call signatures and ``decode_responses=True`` replies,
+so the backend is tested and benchmarked without a server. It also counts
+round trips: a direct command is one, and so is a whole pipeline's
+``execute()``. With ``latency`` set, each round trip sleeps that long, which
+models the network; concurrent callers overlap as over a connection pool.
+
+Only what the backend needs is implemented: hashes, sorted sets, GEO sets
+(``GEOSEARCH`` from a member, by radius) and lists. Distances use Redis's
+Earth radius on the exact coordinates, without geohash rounding.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from bisect import bisect_left, insort
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from tchaka.geo import haversine_distance
+from tchaka.spatial import GridIndex
+
+__all__ = ["LocalPipeline", "LocalRedis", "ResponseError"]
+
+REDIS_EARTH_RADIUS_KM = 6_372.797560856
+_UNIT_KM = {"m": 0.001, "km": 1.0, "mi": 1.609344, "ft": 0.0003048}
+
+
+class ResponseError(Exception):
+    """An error reply, as ``redis.exceptions.ResponseError``."""
+
+
+class _Geo:
+    """A GEO set: a sorted set scored by position, with a grid for searches."""
+
+    def __init__(self) -> None:
+        self.points: dict[str, tuple[float, float]] = {}  # member -> (lon, lat)
+        self.index: GridIndex[str] = GridIndex()
+
+
+class LocalRedis:
+    """Keys and commands of one Redis database, in memory."""
+
+    COMMANDS = frozenset(
+        {
+            "delete",
+            "geoadd",
+            "geosearch",
+            "hdel",
+            "hget",
+            "hgetall",
+            "hmget",
+            "hset",
+            "hsetnx",
+            "lrange",
+            "rpush",
+            "zadd",
+            "zmscore",
+            "zrangebyscore",
+            "zrem",
+            "zscore",
+        }
+    )
+
+    def __init__(self, *, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.round_trips = 0
+        self._data: dict[str, Any] = {}
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        if name not in self.COMMANDS:
+            raise AttributeError(name)
+        command = getattr(self, f"_{name}")
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            await self._round_trip()
+            return command(*args, **kwargs)
+
+        return call
+
+    def pipeline(self, transaction: bool = True) -> LocalPipeline:
+        return LocalPipeline(self)
+
+    async def _round_trip(self) -> None:
+        self.round_trips += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _get(self, key: str, kind: type) -> Any:
+        value = self._data.get(key)
+        if value is not None and not isinstance(value, kind):
+            raise ResponseError(
+                "WRONGTYPE Operation against a key holding the wrong kind of value"
+            )
+        return value
+
+    def _create(self, key: str, kind: type) -> Any:
+        value = self._get(key, kind)
+        if value is None:
+            value = self._data[key] = kind()
+        return value
+
+    # -- keys ---------------------------------------------------------- #
+    def _delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    # -- hashes -------------------------------------------------------- #
+    def _hset(
+        self,
+        name: str,
+        key: str | None = None,
+        value: object = None,
+        mapping: dict[str, object] | None = None,
+    ) -> int:
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        h = self._create(name, dict)
+        added = sum(k not in h for k in items)
+        h.update((k, str(v)) for k, v in items.items())
+        return added
+
+    def _hsetnx(self, name: str, key: str, value: object) -> int:
+        h = self._create(name, dict)
+        if key in h:
+            return 0
+        h[key] = str(value)
+        return 1
+
+    def _hget(self, name: str, key: str) -> str | None:
+        return (self._get(name, dict) or {}).get(key)
+
+    def _hgetall(self, name: str) -> dict[str, str]:
+        return dict(self._get(name, dict) or {})
+
+    def _hmget(self, name: str, keys: Iterable[str]) -> list[str | None]:
+        h = self._get(name, dict) or {}
+        return [h.get(key) for key in keys]
+
+    def _hdel(self, name: str, *keys: str) -> int:
+        h = self._get(name, dict)
+        if h is None:
+            return 0
+        removed = sum(h.pop(key, None) is not None for key in keys)
+        if not h:
+            del self._data[name]
+        return removed
+
+    # -- sorted sets --------------------------------------------------- #
+    def _zadd(self, name: str, mapping: dict[str, float], xx: bool = False) -> int:
+        z = self._get(name, _ZSet)
+        if z is None:
+            if xx:
+                return 0
+            z = self._data[name] = _ZSet()
+        return sum(
+            z.add(member, float(score), xx=xx) for member, score in mapping.items()
+        )
+
+    def _zscore(self, name: str, member: str) -> float | None:
+        z = self._get(name, _ZSet)
+        return None if z is None else z.scores.get(member)
+
+    def _zmscore(self, key: str, members: Iterable[str]) -> list[float | None]:
+        z = self._get(key, _ZSet)
+        scores = {} if z is None else z.scores
+        return [scores.get(member) for member in members]
+
+    def _zrangebyscore(
+        self, name: str, min: float | str, max: float | str
+    ) -> list[str]:
+        z = self._get(name, _ZSet)
+        if z is None:
+            return []
+        low, high = float(min), float(max)
+        return [member for score, member in z.order if low <= score <= high]
+
+    def _zrem(self, name: str, *members: str) -> int:
+        value = self._data.get(name)
+        if isinstance(value, _Geo):
+            removed = 0
+            for member in members:
+                if value.points.pop(member, None) is not None:
+                    value.index.remove(member)
+                    removed += 1
+            empty = not value.points
+        else:
+            z = self._get(name, _ZSet)
+            if z is None:
+                return 0
+            removed = sum(z.remove(member) for member in members)
+            empty = not z.scores
+        if empty:
+            del self._data[name]
+        return removed
+
+    # -- GEO ----------------------------------------------------------- #
+    def _geoadd(self, name: str, values: list[Any]) -> int:
+        g = self._create(name, _Geo)
+        added = 0
+        for i in range(0, len(values), 3):
+            lon, lat, member = (
+                float(values[i]),
+                float(values[i + 1]),
+                str(values[i + 2]),
+            )
+            added += member not in g.points
+            g.points[member] = (lon, lat)
+            g.index.insert(member, lat, lon)
+        return added
+
+    def _geosearch(
+        self,
+        name: str,
+        *,
+        member: str,
+        radius: float,
+        unit: str = "m",
+        sort: str | None = None,
+        withdist: bool = False,
+    ) -> list[Any]:
+        g = self._get(name, _Geo)
+        if g is None or member not in g.points:
+            raise ResponseError("could not decode requested zset member")
+        scale = _UNIT_KM[unit]
+        lon, lat = g.points[member]
+        found = []
+        for other in g.index.candidates(lat, lon, radius * scale):
+            olon, olat = g.points[other]
+            km = haversine_distance(lat, lon, olat, olon, radius=REDIS_EARTH_RADIUS_KM)
+            if km <= radius * scale:
+                found.append((km / scale, other))
+        if sort is not None:
+            found.sort(reverse=sort == "DESC")
+        if withdist:
+            return [[other, round(dist, 4)] for dist, other in found]
+        return [other for _, other in found]
+
+    # -- lists --------------------------------------------------------- #
+    def _rpush(self, name: str, *values: object) -> int:
+        items = self._create(name, list)
+        items.extend(str(v) for v in values)
+        return len(items)
+
+    def _lrange(self, name: str, start: int, end: int) -> list[str]:
+        items = self._get(name, list) or []
+        stop = len(items) if end == -1 else end + 1
+        return items[start:stop]
+
+
+class _ZSet:
+    """Members with scores, also kept in (score, member) order."""
+
+    def __init__(self) -> None:
+        self.scores: dict[str, float] = {}
+        self.order: list[tuple[float, str]] = []
+
+    def add(self, member: str, score: float, *, xx: bool) -> bool:
+        """Set ``member``'s score; whether it was added."""
+        old = self.scores.get(member)
+        if old is None and xx:
+            return False
+        if old is not None:
+            del self.order[bisect_left(self.order, (old, member))]
+        self.scores[member] = score
+        insort(self.order, (score, member))
+        return old is None
+
+    def remove(self, member: str) -> bool:
+        score = self.scores.pop(member, None)
+        if score is None:
+            return False
+        del self.order[bisect_left(self.order, (score, member))]
+        return True
+
+
+class LocalPipeline:
+    """Commands queued for one round trip, as ``redis.asyncio`` pipelines.
+
+    Commands run back to back at :meth:`execute`, so a transaction and a plain
+    pipeline behave alike here (nothing else runs in between).
+    """
+
+    def __init__(self, redis: LocalRedis) -> None:
+        self._redis = redis
+        self._queue: list[tuple[str, tuple[Any, ...], dict[str, Any]]] = []
+
+    def __getattr__(self, name: str) -> Callable[..., LocalPipeline]:
+        if name not in LocalRedis.COMMANDS:
+            raise AttributeError(name)
+
+        def queue(*args: Any, **kwargs: Any) -> LocalPipeline:
+            self._queue.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self, raise_on_error: bool = True) -> list[Any]:
+        queued, self._queue = self._queue, []
+        await self._redis._round_trip()
+        replies: list[Any] = []
+        for name, args, kwargs in queued:
+            try:
+                replies.append(getattr(self._redis, f"_{name}")(*args, **kwargs))
+            except ResponseError as exc:
+                replies.append(exc)
+        if raise_on_error:
+            for reply in replies:
+                if isinstance(reply, ResponseError):
+                    raise reply
+        return replies
@@ -0,0 +1,142 @@
+"""The real callbacks under the state lock versus on a single-writer actor.
+
+``UPDATES`` updates are dispatched at once, as concurrent callbacks on one
+event loop, against ``POPULATION`` registered users in a city: a mix of
+``/help`` (touch and track), ``/range`` (a read-modify-write), live-location
+edits and new locations (moves). Telegram I/O is a stub
+that yields to the loop once per request.
+
+- ``lock``: every read-modify-write takes ``STATE.lock``;
+- ``actor``: a :class:`~tchaka.actor.StateActor` applies them, with touches
+  and tracked ids queued without waiting.
+
+Reported: the time to drain all updates, callback latency percentiles, and
+for the actor the operations applied per pass::
+
+    python -m benchmarks.bench_actor
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import statistics
+import time
+from types import SimpleNamespace
+from typing import Any
+
+from benchmarks._common import populate
+from benchmarks.bench_move import crowd
+from tchaka import commands
+from tchaka.actor import StateActor
+from tchaka.config import Settings
+from tchaka.state import AppState
+from tchaka.utils import FakeClock
+
+RANGE_KM = 0.1
+POPULATION = 5_000
+UPDATES = 10_000
+MIX = (("help", 3), ("range", 2), ("live", 3), ("location", 2))
+
+
+class Bot:
+    """Telegram stub: one loop yield per request, increasing message ids."""
+
+    def __init__(self) -> None:
+        self.next_id = 1_000_000
+
+    async def send(self, **_: Any) -> SimpleNamespace:
+        await asyncio.sleep(0)
+        self.next_id += 1
+        return SimpleNamespace(message_id=self.next_id)
+
+
+def make_update(bot: Bot, kind: str, chat_id: int, rng: random.Random) -> Any:
+    (lat, lon) = crowd(1, rng)[0]
+    message = SimpleNamespace(
+        chat_id=chat_id,
+        message_id=rng.randrange(1, 1_000_000),
+        location=SimpleNamespace(latitude=lat, longitude=lon),
+        reply_text=bot.send,
+        reply_markdown=bot.send,
+        reply_to_message=None,
+    )
+    user = SimpleNamespace(is_bot=False, language_code="en", full_name="x")
+    if kind == "live":
+        return SimpleNamespace(
+            effective_user=user, message=None, edited_message=message
+        )
+    return SimpleNamespace(effective_user=user, message=message, edited_message=None)
+
+
+CALLBACKS = {
+    "help": commands.help_callback,
+    "range": commands.range_callback,
+    "live": commands.live_location_callback,
+    "location": commands.location_callback,
+}
+
+
+async def run(mode: str) -> tuple[float, list[float], StateActor | None]:
+    """(seconds to drain, callback latencies s, the actor if any)."""
+    rng = random.Random(0)
+    state = populate(AppState(cell_km=RANGE_KM), crowd(POPULATION, rng))
+    actor = StateActor(state) if mode == "actor" else None
+    settings = Settings(
+        tg_token="tok",
+        developer_chat_id=None,
+        distance_threshold_km=RANGE_KM,
+        idle_ttl_seconds=3600,
+        sweep_interval_seconds=300,
+        max_relay_chars=500,
+        max_error_chars=3500,
+        live_debounce_seconds=0.0,
+    )
+    commands.configure(state=state, settings=settings, clock=FakeClock(1.0))
+    commands.ACTOR = actor
+    bot = Bot()
+    ctx = SimpleNamespace(bot=SimpleNamespace(send_message=bot.send), args=[])
+    kinds = [kind for kind, weight in MIX for _ in range(weight)]
+    jobs = [
+        (CALLBACKS[kind], make_update(bot, kind, rng.randrange(POPULATION), rng))
+        for kind in (rng.choice(kinds) for _ in range(UPDATES))
+    ]
+    latencies: list[float] = []
+
+    async def one(callback: Any, update: Any) -> None:
+        start = time.perf_counter()
+        await callback(update, ctx)
+        latencies.append(time.perf_counter() - start)
+
+    if actor is not None:
+        actor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(callback, update) for callback, update in jobs))
+    if actor is not None:
+        await actor.close()
+    elapsed = time.perf_counter() - start
+    commands.ACTOR = None
+    return elapsed, latencies, actor
+
+
+def main() -> None:
+    logging.disable(logging.INFO)  # the callbacks log every update
+    print(f"{UPDATES} concurrent updates, {POPULATION} users")
+    print(
+        f"{'mode':>6} {'total ms':>9} {'updates/s':>10} {'p50 ms':>7}"
+        f" {'p99 ms':>7} {'ops/pass':>9}"
+    )
+    for mode in ("lock", "actor"):
+        elapsed, latencies, actor = asyncio.run(run(mode))
+        p50 = statistics.median(latencies) * 1e3
+        p99 = statistics.quantiles(latencies, n=100)[98] * 1e3
+        per_pass = actor.applied / actor.passes if actor and actor.passes else 0.0
+        print(
+            f"{mode:>6} {elapsed * 1e3:>9.0f} {UPDATES / elapsed:>10.0f}"
+            f" {p50:>7.1f} {p99:>7.1f} {per_pass:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Density-adaptive ranges: ring search cost in a city and in the countryside.
+
+A population of city clusters plus a thin rural scatter. For each user the
+adaptive range is the distance to its ``K``-th nearest neighbor, clamped to
+``[RANGE_KM, MAX_KM]``. The ring search starts at ``RANGE_KM`` and doubles, so
+city users stop after the first ring; rural users widen until they find ``K``
+users or hit the cap. The baseline sorts the distance to every user::
+
+    python -m benchmarks.bench_adaptive
+"""
+
+from __future__ import annotations
+
+import itertools
+
+from benchmarks._common import city_coords, per_call_us, populate, random_coords
+from tchaka.geo import haversine_distance
+from tchaka.state import AppState
+
+RANGE_KM = 5.0
+MAX_KM = 80.0
+K = 5
+SIZES = (10_000, 50_000)
+RURAL_SHARE = 0.05
+QUERIES = 200
+
+
+def sort_all(state: AppState, user_id: str) -> float:
+    """Adaptive range by computing and sorting every distance, the baseline."""
+    origin = state.users[user_id].coord
+    distances = sorted(
+        haversine_distance(*origin, *rec.coord)
+        for uid, rec in state.users.items()
+        if uid != user_id
+    )
+    kth = distances[K - 1] if len(distances) >= K else MAX_KM
+    return min(max(kth, RANGE_KM), MAX_KM)
+
+
+def bench_area(
+    state: AppState, sample: list[str], n: int
+) -> tuple[float, float, float]:
+    """(scan us, ring us, mean range km) per query over ``sample``."""
+    recs = [state.users[uid] for uid in sample]
+    cycle = itertools.cycle(recs)
+    scan_reps = max(QUERIES * 2_000 // n, 5)
+    scan = per_call_us(lambda: sort_all(state, next(cycle).user_id), scan_reps)
+    ring = per_call_us(lambda: state.adaptive_range(next(cycle), RANGE_KM), QUERIES)
+    km = sum(state.adaptive_range(rec, RANGE_KM) for rec in recs) / len(recs)
+    return scan, ring, km
+
+
+def bench(n: int) -> dict[str, tuple[float, float, float]]:
+    """Per-area results for city users and rural users at population ``n``."""
+    rural = int(n * RURAL_SHARE)
+    coords = city_coords(n - rural) + random_coords(rural, seed=1)
+    state = populate(
+        AppState(cell_km=RANGE_KM, adaptive_k=K, adaptive_max_km=MAX_KM), coords
+    )
+    ids = list(state.users)
+    return {
+        "city": bench_area(state, ids[:QUERIES], n),
+        "rural": bench_area(state, ids[n - rural :][:QUERIES], n),
+    }
+
+
+def main() -> None:
+    print(f"{'users':>8} {'area':>6} {'range km':>9} {'scan us':>11} {'ring us':>9}")
+    for n in SIZES:
+        for area, (scan, ring, km) in bench(n).items():
+            print(f"{n:>8} {area:>6} {km:>9.1f} {scan:>11.1f} {ring:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Relay-recipient snapshot cost with and without the materialized adjacency.
+
+Joins pay for the neighborhood once; every later message reads it. In a dense
+area the read is a dict-values copy instead of a spatial query::
+
+    python -m benchmarks.bench_adjacency
+
+The second table is the packed stadium: every user within 1 km of the others
+at a 5 km range, so each join links to everyone already there. ``MB`` is the
+heap growth of registering the crowd (``tracemalloc``), ``join s`` the total
+registration time and ``last ms`` the mean of the last ``TAIL`` joins, i.e.
+the event-loop stall of one join late in the run. The adjacency grows with the
+square of the crowd, which is why it is opt-in (``TCHAKA_ADJACENCY``).
+"""
+
+from __future__ import annotations
+
+import gc
+import itertools
+import random
+import time
+import tracemalloc
+
+from benchmarks._common import DISTANCE_DEGREE_KM, per_call_us, populate
+from benchmarks.bench_chord import CENTER, dense_coords
+from tchaka.state import AppState, Coord, UserRecord
+
+RANGE_KM = 5.0
+SIZES = (1_000, 2_000, 5_000)
+QUERIES = 50
+CROWD_KM = 1.0
+CROWDS = (1_000, 2_000, 5_000)
+TAIL = 100
+
+
+def bench(n: int) -> tuple[float, float, float]:
+    """Mean (join, query per message, adjacency read) microseconds at ``n``."""
+    coords = dense_coords(n)
+    plain = populate(AppState(cell_km=RANGE_KM), coords)
+    start = time.perf_counter()
+    adj = populate(AppState(cell_km=RANGE_KM, adjacency_km=RANGE_KM), coords)
+    join = (time.perf_counter() - start) / n * 1e6
+
+    ids = itertools.cycle(list(plain.users)[:QUERIES])
+    query = per_call_us(lambda: plain.recipients(next(ids), RANGE_KM), QUERIES)
+    read = per_call_us(lambda: adj.recipients(next(ids), RANGE_KM), QUERIES)
+    return join, query, read
+
+
+def crowd(n: int, *, seed: int = 0) -> list[tuple[float, float]]:
+    """``n`` points in a square of :data:`CROWD_KM` side around ``CENTER``."""
+    rng = random.Random(seed)
+    half = CROWD_KM / DISTANCE_DEGREE_KM / 2
+    return [
+        (CENTER[0] + rng.uniform(-half, half), CENTER[1] + rng.uniform(-half, half))
+        for _ in range(n)
+    ]
+
+
+def bench_crowd(n: int, *, adjacency: bool) -> tuple[float, float, float]:
+    """(MB, join s, mean ms of the last ``TAIL`` joins) for a crowd of ``n``."""
+    records = [
+        UserRecord(f"u{i}", i, Coord(lat, lon), 0.0)
+        for i, (lat, lon) in enumerate(crowd(n))
+    ]
+
+    def build() -> tuple[AppState, float, float]:
+        state = AppState(cell_km=RANGE_KM, adjacency_km=RANGE_KM if adjacency else None)
+        start = time.perf_counter()
+        for rec in records[:-TAIL]:
+            state.register(rec)
+        tail = time.perf_counter()
+        for rec in records[-TAIL:]:
+            state.register(rec)
+        end = time.perf_counter()
+        return state, end - start, (end - tail) / TAIL * 1e3
+
+    _, elapsed, last = build()  # timed without tracemalloc's overhead
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = build()
+        size, _ = tracemalloc.get_traced_memory()
+        del kept
+    finally:
+        tracemalloc.stop()
+    return size / 2**20, elapsed, last
+
+
+def main() -> None:
+    print(f"{'users':>8} {'join us':>12} {'query us/msg':>14} {'read us/msg':>14}")
+    for n in SIZES:
+        join, query, read = bench(n)
+        print(f"{n:>8} {join:>12.1f} {query:>14.1f} {read:>14.1f}")
+    print()
+    print(f"crowd within {CROWD_KM:g} km, range {RANGE_KM:g} km")
+    print(f"{'users':>8} {'adjacency':>10} {'MB':>9} {'join s':>9} {'last ms':>9}")
+    for n in CROWDS:
+        for adjacency in (False, True):
+            mb, elapsed, last = bench_crowd(n, adjacency=adjacency)
+            flag = "on" if adjacency else "off"
+            print(f"{n:>8} {flag:>10} {mb:>9.1f} {elapsed:>9.2f} {last:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Cost of one relayed message, in memory and in the shared Redis store.
+
+A relay resolves the sender (``user_for_chat``), refreshes its activity
+(``touch``), computes its recipients and tracks one message id per recipient.
+``USERS`` users live around city centers; the default
+:class:`~tchaka.backend.MemoryBackend` and :class:`~tchaka.backend.RedisBackend`
+each relay ``RELAYS`` messages from random senders:
+
+- ``trips``: round trips to the store per relay (0 in memory);
+- ``us/relay``: CPU time per relay, without network latency (Redis over the
+  in-process :class:`~benchmarks._redis.LocalRedis`, so this is the client
+  and command cost only, not a server's);
+- ``relays/s``: throughput with ``RTT_MS`` per round trip and ``CONCURRENCY``
+  relays in flight, as concurrent callbacks over a connection pool.
+
+::
+
+    python -m benchmarks.bench_backend
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+
+from benchmarks._common import city_coords
+from benchmarks._redis import LocalRedis
+from tchaka.backend import MemoryBackend, RedisBackend, StateBackend
+from tchaka.state import AppState, Coord, UserRecord
+
+RANGE_KM = 5.0
+USERS = 20_000
+RELAYS = 2_000
+RTT_MS = 0.5
+CONCURRENCY = 64
+
+
+def records() -> list[UserRecord]:
+    return [
+        UserRecord(f"u{i}", i, Coord(lat, lon), 0.0)
+        for i, (lat, lon) in enumerate(city_coords(USERS, cities=400))
+    ]
+
+
+async def relay(backend: StateBackend, chat_id: int, message_id: int) -> int:
+    """One relay step; the number of recipients."""
+    rec = await backend.user_for_chat(chat_id)
+    if rec is None:
+        return 0
+    await backend.touch(rec.user_id, 1.0)
+    chats = await backend.recipients(rec.user_id, RANGE_KM)
+    for chat in chats:
+        await backend.track_message(chat, message_id)
+    return len(chats)
+
+
+def senders() -> list[int]:
+    rng = random.Random(0)
+    return [rng.randrange(USERS) for _ in range(RELAYS)]
+
+
+async def run_memory() -> tuple[float, float]:
+    """(recipients, us per relay)."""
+    backend = MemoryBackend(AppState(cell_km=RANGE_KM))
+    for rec in records():
+        await backend.register(rec)
+    start = time.perf_counter()
+    fanout = [await relay(backend, chat, mid) for mid, chat in enumerate(senders())]
+    elapsed = time.perf_counter() - start
+    return sum(fanout) / RELAYS, elapsed / RELAYS * 1e6
+
+
+async def run_redis() -> tuple[float, float, float, float]:
+    """(recipients, round trips, us per relay, relays/s with latency)."""
+    client = LocalRedis()
+    backend = RedisBackend(client)
+    for rec in records():
+        await backend.register(rec)
+    chats = senders()
+
+    before = client.round_trips
+    start = time.perf_counter()
+    fanout = [await relay(backend, chat, mid) for mid, chat in enumerate(chats)]
+    elapsed = time.perf_counter() - start
+    trips = (client.round_trips - before) / RELAYS
+
+    client.latency = RTT_MS / 1e3
+    queue = iter(enumerate(chats))
+
+    async def caller() -> None:
+        for mid, chat in queue:
+            await relay(backend, chat, mid)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(CONCURRENCY)))
+    loaded = time.perf_counter() - start
+    return sum(fanout) / RELAYS, trips, elapsed / RELAYS * 1e6, RELAYS / loaded
+
+
+def main() -> None:
+    print(
+        f"{'backend':>8} {'fan-out':>8} {'trips':>7} {'us/relay':>9}"
+        f" {'relays/s':>9}  ({RTT_MS} ms RTT, {CONCURRENCY} in flight)"
+    )
+    fanout, us = asyncio.run(run_memory())
+    print(f"{'memory':>8} {fanout:>8.1f} {0.0:>7.1f} {us:>9.1f} {'-':>9}")
+    fanout, trips, us, rate = asyncio.run(run_redis())
+    print(f"{'redis':>8} {fanout:>8.1f} {trips:>7.1f} {us:>9.1f} {rate:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Haversine versus cached-unit-vector chord test in a dense city.
+
+Every user sits within a few kilometres of each other, so the grid hands back
+thousands of candidates per query and the per-candidate distance test
+dominates::
+
+    python -m benchmarks.bench_chord
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+
+from benchmarks._common import per_call_us, populate
+from tchaka.geo import haversine_distance
+from tchaka.state import AppState, UserRecord
+
+RANGE_KM = 5.0
+SIZES = (1_000, 5_000, 20_000)
+QUERIES = 50
+CENTER = (52.52, 13.405)  # Berlin
+
+
+def dense_coords(n: int, *, seed: int = 0) -> list[tuple[float, float]]:
+    """``n`` points within about 4 km of :data:`CENTER`."""
+    rng = random.Random(seed)
+    return [
+        (CENTER[0] + rng.uniform(-0.03, 0.03), CENTER[1] + rng.uniform(-0.05, 0.05))
+        for _ in range(n)
+    ]
+
+
+def haversine_neighbors(state: AppState, user_id: str) -> list[UserRecord]:
+    """Same grid candidates, but a full haversine per pair (the old loop)."""
+    origin = state.users[user_id]
+    return [
+        state.users[uid]
+        for uid in state.index.candidates(*origin.coord, RANGE_KM)
+        if uid != user_id
+        and haversine_distance(*origin.coord, *state.users[uid].coord) <= RANGE_KM
+    ]
+
+
+def bench(n: int) -> tuple[float, float]:
+    """Mean (haversine, chord) microseconds per query at population ``n``."""
+    state = populate(AppState(cell_km=RANGE_KM), dense_coords(n))
+    ids = itertools.cycle(list(state.users)[:QUERIES])
+    trig = per_call_us(lambda: haversine_neighbors(state, next(ids)), QUERIES)
+    chord = per_call_us(lambda: state.neighbors(next(ids), RANGE_KM), QUERIES)
+    return trig, chord
+
+
+def main() -> None:
+    print(f"{'users':>8} {'haversine us':>14} {'chord us':>14}")
+    for n in SIZES:
+        trig, chord = bench(n)
+        print(f"{n:>8} {trig:>14.1f} {chord:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Batch clustering: :func:`~tchaka.cluster.cluster_points` versus the old
+50 km cells.
+
+Points are drawn around 200 city centers (Gaussian, ~10 km spread) so dense
+areas dominate, as in production. Up to about 60k points the cities stay
+sparse enough for the pairwise pass; above, the clique cells take over. The
+old implementation is quadratic inside each city and is skipped above
+``BASELINE_MAX`` points. Its partitions differ: its longitude cheap-reject
+ignores cos(lat), so it splits clusters that are in range away from the
+equator::
+
+    python -m benchmarks.bench_cluster
+"""
+
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from collections.abc import Callable
+
+from benchmarks._common import DISTANCE_DEGREE_KM, city_coords
+from tchaka.cluster import IncrementalClusters, cluster_points
+from tchaka.geo import haversine_distance
+
+THRESHOLD_KM = 5.0
+SIZES = (10_000, 30_000, 100_000, 1_000_000)
+BASELINE_MAX = 100_000
+INCREMENTAL_OPS = 2_000
+
+
+def old_group(coords: list[tuple[float, float]], threshold: float) -> list[int]:
+    """The previous ``group_coordinates`` core (cells of at least 50 km)."""
+    step = max(threshold, 50) / DISTANCE_DEGREE_KM
+    cells: dict[tuple[int, int], list[int]] = defaultdict(list)
+    for idx, (lat, lon) in enumerate(coords):
+        cells[int(lat / step), int(lon / step)].append(idx)
+    parent = list(range(len(coords)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for (cx, cy), idxs in cells.items():
+        cand: list[int] = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                cand.extend(cells.get((cx + dx, cy + dy), []))
+        for i in idxs:
+            lat_i, lon_i = coords[i]
+            for j in cand:
+                if j <= i:
+                    continue
+                lat_j, lon_j = coords[j]
+                if (
+                    abs(lat_i - lat_j) * DISTANCE_DEGREE_KM > threshold
+                    or abs(lon_i - lon_j) * DISTANCE_DEGREE_KM > threshold
+                ):
+                    continue
+                if haversine_distance(lat_i, lon_i, lat_j, lon_j) <= threshold:
+                    pi, pj = find(i), find(j)
+                    if pi != pj:
+                        parent[pj] = pi
+    return [find(i) for i in range(len(coords))]
+
+
+def timed(fn: Callable[..., object], *args: object) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def incremental_us(coords: list[tuple[float, float]]) -> tuple[float, float]:
+    """Mean (add, remove) microseconds on a populated incremental structure."""
+    clusters: IncrementalClusters[int] = IncrementalClusters(THRESHOLD_KM)
+    for i, (lat, lon) in enumerate(coords):
+        clusters.add(i, lat, lon)
+    extra = city_coords(INCREMENTAL_OPS, seed=1)
+    base = len(coords)
+    start = time.perf_counter()
+    for i, (lat, lon) in enumerate(extra):
+        clusters.add(base + i, lat, lon)
+    add = (time.perf_counter() - start) / INCREMENTAL_OPS * 1e6
+    start = time.perf_counter()
+    for i in range(INCREMENTAL_OPS):
+        clusters.remove(base + i)
+    remove = (time.perf_counter() - start) / INCREMENTAL_OPS * 1e6
+    return add, remove
+
+
+def main() -> None:
+    print(
+        f"{'points':>10} {'old s':>10} {'new s':>10} {'add us':>10} {'remove us':>10}"
+    )
+    for n in SIZES:
+        coords = city_coords(n)
+        old = "skipped"
+        if n <= BASELINE_MAX:
+            old = f"{timed(old_group, coords, THRESHOLD_KM):.2f}"
+        new = timed(cluster_points, coords, THRESHOLD_KM)
+        add, remove = incremental_us(coords) if n <= 100_000 else (float("nan"),) * 2
+        print(f"{n:>10} {old:>10} {new:>10.2f} {add:>10.1f} {remove:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Neighbor queries in the three distance modes, in a dense city.
+
+Same crowd as :mod:`benchmarks.bench_chord`: the grid hands back thousands of
+candidates per query, so the per-candidate test dominates. Compares a full
+haversine per pair, the chord test on cached unit vectors (the default) and
+the equirectangular test on cached ``(phi, lambda, cos phi)`` triples
+(``TCHAKA_DISTANCE_MODE=equirect``). The last column is the share of
+candidates that fell in the equirectangular error band and needed haversine::
+
+    python -m benchmarks.bench_equirect
+"""
+
+from __future__ import annotations
+
+import itertools
+
+from benchmarks._common import per_call_us, populate
+from benchmarks.bench_chord import dense_coords, haversine_neighbors
+from tchaka.geo import equirect_sq, equirect_sq_bounds
+from tchaka.state import AppState
+
+RANGE_KM = 5.0
+LIMIT_KM = 50.0
+SIZES = (1_000, 5_000, 20_000)
+QUERIES = 50
+
+
+def band_share(state: AppState, sample: list[str]) -> float:
+    """Fraction of grid candidates settled by haversine in equirect mode."""
+    sure, maybe = equirect_sq_bounds(RANGE_KM, LIMIT_KM)
+    banded = total = 0
+    for uid in sample:
+        origin = state.eq_points[uid]
+        for other in state.index.candidates(*state.users[uid].coord, RANGE_KM):
+            total += 1
+            banded += sure <= equirect_sq(origin, state.eq_points[other]) <= maybe
+    return banded / total
+
+
+def bench(n: int) -> tuple[float, float, float, float]:
+    """Mean (haversine, chord, equirect) us per query and the band share."""
+    coords = dense_coords(n)
+    chord_state = populate(AppState(cell_km=RANGE_KM), coords)
+    eq_state = populate(AppState(cell_km=RANGE_KM, equirect_km=LIMIT_KM), coords)
+    sample = list(chord_state.users)[:QUERIES]
+    ids = itertools.cycle(sample)
+    trig = per_call_us(lambda: haversine_neighbors(chord_state, next(ids)), QUERIES)
+    chord = per_call_us(lambda: chord_state.neighbors(next(ids), RANGE_KM), QUERIES)
+    eq = per_call_us(lambda: eq_state.neighbors(next(ids), RANGE_KM), QUERIES)
+    return trig, chord, eq, band_share(eq_state, sample)
+
+
+def main() -> None:
+    print(
+        f"{'users':>8} {'haversine us':>13} {'chord us':>10}"
+        f" {'equirect us':>12} {'band':>8}"
+    )
+    for n in SIZES:
+        trig, chord, eq, band = bench(n)
+        print(f"{n:>8} {trig:>13.1f} {chord:>10.1f} {eq:>12.1f} {band:>8.2%}")
+
+
+if __name__ == "__main__":
+    main()
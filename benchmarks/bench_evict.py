@@ -0,0 +1,100 @@
+"""Finding the idle users: full scan versus the expiry timing wheel.
+
+Each idle sweep used to test every user under the lock. The timing wheel
+(:attr:`AppState.expiry`) buckets users by the minute they were last active,
+so a sweep only opens the buckets that are due. Activity times here are
+spread evenly over one TTL and sweeps run every ``SWEEP`` seconds, so each
+sweep finds about ``SWEEP / TTL`` of the users idle. ``touch ns`` is the
+price paid on every message, against a plain timestamp write::
+
+    python -m benchmarks.bench_evict
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+import time
+
+from benchmarks._common import random_coords
+from tchaka.state import AppState, Coord, UserRecord
+
+TTL = 3600.0
+SWEEP = 300.0
+SWEEPS = 5
+TOUCHES = 200_000
+SIZES = (10_000, 100_000, 500_000)
+
+
+def full_scan(state: AppState, now: float) -> list[str]:
+    """The previous sweep: test every record."""
+    return [uid for uid, rec in state.users.items() if now - rec.last_active_ts >= TTL]
+
+
+def build(n: int) -> AppState:
+    """``n`` users last active at random times within one TTL."""
+    rng = random.Random(0)
+    state = AppState()
+    for i, (lat, lon) in enumerate(random_coords(n)):
+        state.register(UserRecord(f"u{i}", i, Coord(lat, lon), rng.uniform(0, TTL)))
+    return state
+
+
+def sweeps_ms(n: int) -> tuple[float, float, int]:
+    """Mean (scan ms, wheel ms, idle users) per sweep; idle users are evicted
+    and replaced by fresh ones, keeping the population at ``n``."""
+    state = build(n)
+    scan = wheel = 0.0
+    found = 0
+    fresh = itertools.count(n)
+    for k in range(1, SWEEPS + 1):
+        now = TTL + k * SWEEP
+        start = time.perf_counter()
+        expected = full_scan(state, now)
+        scan += time.perf_counter() - start
+        start = time.perf_counter()
+        idle = state.idle_user_ids(now, TTL)
+        wheel += time.perf_counter() - start
+        assert sorted(idle) == sorted(expected)
+        found += len(idle)
+        for uid in idle:
+            state.remove_by_chat(state.users[uid].chat_id)
+            i = next(fresh)
+            state.register(UserRecord(f"u{i}", i, Coord(0.0, 0.0), now))
+    return scan / SWEEPS * 1e3, wheel / SWEEPS * 1e3, found // SWEEPS
+
+
+def touch_ns(n: int) -> tuple[float, float]:
+    """Mean ns of a plain timestamp write and of :meth:`AppState.touch`."""
+    state = build(n)
+    rng = random.Random(1)
+    ids = rng.choices(list(state.users), k=TOUCHES)
+    times = sorted(rng.uniform(TTL, 2 * TTL) for _ in range(TOUCHES))
+    users = state.users
+    start = time.perf_counter()
+    for uid, now in zip(ids, times, strict=True):
+        users[uid].last_active_ts = now
+    plain = time.perf_counter() - start
+    state = build(n)
+    start = time.perf_counter()
+    for uid, now in zip(ids, times, strict=True):
+        state.touch(uid, now)
+    wheel = time.perf_counter() - start
+    return plain / TOUCHES * 1e9, wheel / TOUCHES * 1e9
+
+
+def main() -> None:
+    print(
+        f"{'users':>8} {'idle':>7} {'scan ms':>9} {'wheel ms':>9}"
+        f" {'write ns':>9} {'touch ns':>9}"
+    )
+    for n in SIZES:
+        scan, wheel, idle = sweeps_ms(n)
+        plain, touch = touch_ns(n)
+        print(
+            f"{n:>8} {idle:>7} {scan:>9.2f} {wheel:>9.2f} {plain:>9.0f} {touch:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
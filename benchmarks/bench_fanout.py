@@ -0,0 +1,67 @@
+"""Recipient snapshot in a packed stadium, with and without a fan-out cap.
+
+A 5 km crowd at a 500 m range: a relay reaches about 3% of the population,
+so the uncapped fan-out grows with the crowd. The capped snapshot keeps the
+``CAP`` nearest by chord length, cutting large neighborhoods with a
+size-``CAP`` heap first; the baseline ranks every neighbor with a full sort.
+Both read the materialized adjacency, as the bot does::
+
+    python -m benchmarks.bench_fanout
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+from math import dist
+
+from benchmarks._common import per_call_us, populate
+from benchmarks.bench_move import crowd
+from tchaka.state import AppState
+
+RANGE_KM = 0.5
+CAP = 50
+SIZES = (5_000, 20_000)
+QUERIES = 50
+
+
+def sorted_snapshot(state: AppState, user_id: str) -> list[int]:
+    """The ``CAP`` nearest chat ids by sorting every neighbor, the baseline."""
+    origin = state.units[user_id]
+    ids = list(state.adjacency[user_id])
+    keys = [dist(state.units[uid], origin) for uid in ids]
+    order = sorted(range(len(ids)), key=keys.__getitem__)[:CAP]
+    return [state.users[ids[i]].chat_id for i in order]
+
+
+def bench(n: int) -> tuple[float, float, float, float]:
+    """Mean (uncapped, sorted, capped) us per snapshot and uncapped size."""
+    state = populate(
+        AppState(cell_km=RANGE_KM, adjacency_km=RANGE_KM), crowd(n, random.Random(0))
+    )
+    sample = list(state.users)[:QUERIES]
+    ids = itertools.cycle(sample)
+    full = per_call_us(lambda: state.recipients(next(ids), RANGE_KM), QUERIES)
+    ranked = per_call_us(lambda: sorted_snapshot(state, next(ids)), QUERIES)
+    capped = per_call_us(
+        lambda: state.recipients(next(ids), RANGE_KM, limit=CAP), QUERIES
+    )
+    size = sum(len(state.recipients(uid, RANGE_KM)) for uid in sample) / len(sample)
+    return full, ranked, capped, size
+
+
+def main() -> None:
+    print(
+        f"{'users':>8} {'sends':>8} {'uncapped us':>12} {'sort us':>10}"
+        f" {'cap us':>10} {'cap sends':>10}"
+    )
+    for n in SIZES:
+        full, ranked, capped, size = bench(n)
+        print(
+            f"{n:>8} {size:>8.0f} {full:>12.1f} {ranked:>10.1f}"
+            f" {capped:>10.1f} {min(CAP, size):>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
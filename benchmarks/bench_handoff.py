@@ -0,0 +1,114 @@
+"""Downtime of a restart handoff at ``USERS`` users.
+
+The serving process (this one) holds ``USERS`` registered users around
+``CITIES`` city centers, each with ``TRACKED`` tracked message ids. A new
+process, spawned as a deploy would start it, takes the state over through
+:func:`~tchaka.handoff.receive_state` on a real Unix socket. Reported, per
+state configuration:
+
+- ``MB``: the size of the serialized state;
+- ``dump ms``: serialization in the old process (under the lock);
+- ``load ms``: rebuilding the state in the new process (registration,
+  spatial index, expiry wheel, adjacency, tracked runs);
+- ``downtime ms``: from the old process pausing its polling to its
+  receiving the acknowledgement, after which the new process polls.
+
+Configurations: ``grid`` is the spatial grid alone, ``adjacency`` also keeps
+the materialized neighbor sets (opt-in, ``TCHAKA_ADJACENCY``)::
+
+    python -m benchmarks.bench_handoff
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+from multiprocessing.connection import Connection
+
+from benchmarks._common import city_coords
+from tchaka.handoff import HandoffServer, dump_state, receive_state
+from tchaka.state import AppState, Coord, UserRecord
+
+RANGE_KM = 5.0
+USERS = 100_000
+CITIES = 1_000
+TRACKED = 20
+CONFIGS = ("grid", "adjacency")
+
+
+def make_state(config: str) -> AppState:
+    return AppState(
+        cell_km=RANGE_KM, adjacency_km=RANGE_KM if config == "adjacency" else None
+    )
+
+
+def new_process(path: str, config: str, results: Connection) -> None:
+    """The restarted process: take the state over, report the load time."""
+
+    async def go() -> None:
+        state = make_state(config)
+        start = time.perf_counter()
+        loaded = await receive_state(path, state)
+        results.send((loaded, time.perf_counter() - start))
+
+    asyncio.run(go())
+
+
+async def run(config: str) -> tuple[int, float, float, float, float]:
+    """(bytes, dump s, new process s, downtime s, users received)."""
+    state = make_state(config)
+    for i, (lat, lon) in enumerate(city_coords(USERS, cities=CITIES)):
+        state.register(UserRecord(f"u{i:05x}", i, Coord(lat, lon), float(i)))
+        for mid in range(TRACKED):
+            state.track_message(i, mid + 50 * (2 * mid >= TRACKED))  # two runs
+    size = len(dump_state(state))
+    start = time.perf_counter()
+    dump_state(state)
+    dump = time.perf_counter() - start
+
+    marks: dict[str, float] = {}
+    finished = asyncio.Event()
+
+    async def pause() -> None:
+        marks["pause"] = time.perf_counter()
+
+    async def resume() -> None:
+        finished.set()
+
+    def done() -> None:
+        marks["done"] = time.perf_counter()
+        finished.set()
+
+    path = os.path.join(tempfile.mkdtemp(), "handoff.sock")
+    server = HandoffServer(path, state, pause=pause, resume=resume, done=done)
+    await server.start()
+    mp = multiprocessing.get_context("spawn")
+    ours, theirs = mp.Pipe()
+    proc = mp.Process(target=new_process, args=(path, config, theirs))
+    proc.start()
+    await finished.wait()
+    loaded, received = ours.recv()
+    proc.join()
+    await server.close()
+    return size, dump, received, marks["done"] - marks["pause"], loaded
+
+
+def main() -> None:
+    print(f"{USERS} users, {TRACKED} tracked ids each")
+    print(
+        f"{'state':>10} {'MB':>6} {'dump ms':>8} {'load ms':>8}"
+        f" {'downtime ms':>12} {'users':>7}"
+    )
+    for config in CONFIGS:
+        size, dump, received, downtime, loaded = asyncio.run(run(config))
+        print(
+            f"{config:>10} {size / 1e6:>6.1f} {dump * 1e3:>8.0f}"
+            f" {received * 1e3:>8.0f} {downtime * 1e3:>12.0f} {loaded:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Scalar versus vectorized haversine over one origin and N points.
+
+Also times a full-population neighbor query through the NumPy column store
+(``AppState(columnar=True)``). Requires NumPy::
+
+    python -m benchmarks.bench_haversine
+"""
+
+from __future__ import annotations
+
+from benchmarks._common import per_call_us, populate, random_coords
+from tchaka.geo import HAS_NUMPY, haversine_distance, haversine_many
+from tchaka.state import AppState
+
+SIZES = (1_000, 10_000, 100_000)
+RANGE_KM = 5.0
+
+
+def bench(n: int) -> tuple[float, float, float]:
+    """Mean (scalar, vectorized, columnar query) microseconds at size ``n``."""
+    coords = random_coords(n)
+    lats = [c[0] for c in coords]
+    lons = [c[1] for c in coords]
+    o_lat, o_lon = coords[0]
+    reps = max(100_000 // n, 3)
+
+    scalar = per_call_us(
+        lambda: [haversine_distance(o_lat, o_lon, a, b) for a, b in coords], reps
+    )
+    vector = per_call_us(lambda: haversine_many(o_lat, o_lon, lats, lons), reps)
+    state = populate(AppState(columnar=True), coords)
+    columnar = per_call_us(lambda: state.neighbors("u0", RANGE_KM), reps)
+    return scalar, vector, columnar
+
+
+def main() -> None:
+    if not HAS_NUMPY:
+        raise SystemExit("numpy is required for this benchmark")
+    print(f"{'points':>10} {'scalar us':>12} {'vector us':>12} {'columnar us':>12}")
+    for n in SIZES:
+        scalar, vector, columnar = bench(n)
+        print(f"{n:>10} {scalar:>12.1f} {vector:>12.1f} {columnar:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
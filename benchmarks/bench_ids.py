@@ -0,0 +1,82 @@
+"""Hashed user ids versus the allocator: collisions and registration cost.
+
+``USERS`` registrations, each getting an id:
+
+- ``hash``: :func:`tchaka.utils.build_user_hash` (a salted sha256, 5 hex
+  digits), as registration did before; ``collisions`` counts the ids that
+  were already live and would have overwritten another user;
+- ``draw``: :class:`~tchaka.ids.UserIdAllocator` with no pool, drawing each id
+  and checking it against the live ones;
+- ``pool``: the allocator popping ids that one refill drew ahead of time,
+  sized for all of them (the refill, run off the registration path, is
+  reported separately).
+
+``retries`` counts the draws that hit a live id, ``digits`` is the final id
+length::
+
+    python -m benchmarks.bench_ids
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+from tchaka.ids import UserIdAllocator
+from tchaka.utils import build_user_hash
+
+USERS = 50_000
+
+
+def run_hash() -> tuple[float, int]:
+    """(us per id, collisions)."""
+    live: set[str] = set()
+    collisions = 0
+
+    async def go() -> float:
+        nonlocal collisions
+        start = time.perf_counter()
+        for i in range(USERS):
+            user_id = await build_user_hash(f"user {i}")
+            collisions += user_id in live
+            live.add(user_id)
+        return time.perf_counter() - start
+
+    return asyncio.run(go()) / USERS * 1e6, collisions
+
+
+def run_allocator(pool: bool) -> tuple[float, float, UserIdAllocator]:
+    """(us per id, refill us per id, the allocator)."""
+    ids = UserIdAllocator(pool_size=USERS if pool else 0)
+    live: set[str] = set()
+    refill = 0.0
+    if pool:
+        start = time.perf_counter()
+        ids.refill()
+        refill = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(USERS):
+        live.add(ids.allocate(live))
+    elapsed = time.perf_counter() - start
+    assert len(live) == USERS
+    return elapsed / USERS * 1e6, refill / USERS * 1e6, ids
+
+
+def main() -> None:
+    print(f"{USERS} registrations")
+    print(
+        f"{'ids':>5} {'us/id':>7} {'refill us/id':>13} {'collisions':>11}"
+        f" {'retries':>8} {'digits':>7}"
+    )
+    us, collisions = run_hash()
+    print(f"{'hash':>5} {us:>7.2f} {'-':>13} {collisions:>11} {'-':>8} {5:>7}")
+    for name in ("draw", "pool"):
+        us, refill, ids = run_allocator(name == "pool")
+        print(
+            f"{name:>5} {us:>7.2f} {refill:>13.2f} {0:>11}"
+            f" {ids.retries:>8} {ids.length:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""A join storm: one registration at a time versus batched windows.
+
+``STORM`` new users send their first location at once (concurrent
+callbacks on one event loop) into a crowd of ``RESIDENTS`` registered users
+a few kilometres across. Telegram I/O is the stub of
+:mod:`benchmarks.bench_actor` (one loop yield per request).
+
+- ``single``: each location registers under the lock, queries its
+  neighbors and sends its own join notices;
+- ``batched``: a :class:`~tchaka.ingest.Batcher` with a ``WINDOW_S`` window
+  registers the storm together and sends each neighbor one notice.
+
+Reported: the time until every newcomer was welcomed, the join notices
+sent, and the most notices any one user received::
+
+    python -m benchmarks.bench_ingest
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any
+
+from benchmarks._common import populate
+from benchmarks.bench_actor import Bot, make_update
+from benchmarks.bench_move import crowd
+from tchaka import commands
+from tchaka.config import Settings
+from tchaka.ingest import Batcher
+from tchaka.state import AppState
+from tchaka.utils import FakeClock
+
+RANGE_KM = 0.5
+RESIDENTS = 2_000
+STORM = 500
+WINDOW_S = 0.05
+
+
+async def run(mode: str) -> tuple[float, int, int]:
+    """(seconds until all welcomed, join notices, most notices per user)."""
+    rng = random.Random(0)
+    state = populate(AppState(cell_km=RANGE_KM), crowd(RESIDENTS, rng))
+    settings = Settings(
+        tg_token="tok",
+        developer_chat_id=None,
+        distance_threshold_km=RANGE_KM,
+        idle_ttl_seconds=3600,
+        sweep_interval_seconds=300,
+        max_relay_chars=500,
+        max_error_chars=3500,
+    )
+    commands.configure(state=state, settings=settings, clock=FakeClock(1.0))
+    commands.JOINS = (
+        Batcher(WINDOW_S, commands.register_arrivals) if mode == "batched" else None
+    )
+    bot = Bot()
+    notices: Counter[int] = Counter()
+
+    async def send_message(chat_id: int, **kwargs: Any) -> SimpleNamespace:
+        notices[chat_id] += 1
+        return await bot.send(**kwargs)
+
+    ctx: Any = SimpleNamespace(bot=SimpleNamespace(send_message=send_message), args=[])
+    updates = [make_update(bot, "location", RESIDENTS + i, rng) for i in range(STORM)]
+    start = time.perf_counter()
+    await asyncio.gather(*(commands.location_callback(u, ctx) for u in updates))
+    elapsed = time.perf_counter() - start
+    commands.JOINS = None
+    assert len(state.users) == RESIDENTS + STORM
+    return elapsed, sum(notices.values()), max(notices.values(), default=0)
+
+
+def main() -> None:
+    logging.disable(logging.INFO)  # the callbacks log every update
+    print(f"{STORM} newcomers into {RESIDENTS} users, {RANGE_KM} km range")
+    print(f"{'mode':>8} {'total ms':>9} {'notices':>8} {'max/user':>9}")
+    for mode in ("single", "batched"):
+        elapsed, sent, most = asyncio.run(run(mode))
+        print(f"{mode:>8} {elapsed * 1e3:>9.0f} {sent:>8} {most:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Population-wide neighbor statistics: per-user queries versus the self-join.
+
+The baseline runs :meth:`AppState.count_neighbors` once per user (what the
+stats would cost under the event-loop lock). The self-join runs on a snapshot,
+in-process and on a process pool; the pool only pays off with several CPUs::
+
+    python -m benchmarks.bench_join
+"""
+
+from __future__ import annotations
+
+import os
+import time
+
+from benchmarks._common import city_coords, populate
+from tchaka.join import JoinStats, self_join_stats
+from tchaka.state import AppState
+
+RANGE_KM = 1.0
+SIZES = (10_000, 50_000, 200_000)
+PER_USER_MAX = 50_000
+
+
+def per_user_seconds(coords: list[tuple[float, float]]) -> float:
+    state = populate(AppState(cell_km=RANGE_KM), coords)
+    start = time.perf_counter()
+    for uid in state.users:
+        state.count_neighbors(uid, RANGE_KM)
+    return time.perf_counter() - start
+
+
+def bench(n: int, workers: int) -> tuple[str, float, float, JoinStats]:
+    """(per-user s, in-process s, pool s, stats) at population ``n``."""
+    coords = city_coords(n)
+    per_user = "skipped"
+    if n <= PER_USER_MAX:
+        per_user = f"{per_user_seconds(coords):.2f}"
+    start = time.perf_counter()
+    stats = self_join_stats(coords, RANGE_KM, workers=1)
+    inline = time.perf_counter() - start
+    start = time.perf_counter()
+    self_join_stats(coords, RANGE_KM, workers=workers)
+    pool = time.perf_counter() - start
+    return per_user, inline, pool, stats
+
+
+def main() -> None:
+    workers = os.cpu_count() or 1
+    print(f"pool workers: {workers}")
+    print(
+        f"{'users':>8} {'per-user s':>11} {'join s':>8} {'pool s':>8} "
+        f"{'fanout':>8} {'max':>6}"
+    )
+    for n in SIZES:
+        per_user, inline, pool, stats = bench(n, workers)
+        print(
+            f"{n:>8} {per_user:>11} {inline:>8.2f} {pool:>8.2f} "
+            f"{stats.mean_fanout:>8.1f} {stats.max_neighborhood:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
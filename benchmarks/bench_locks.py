@@ -0,0 +1,156 @@
+"""Lock contention with many concurrent callbacks on one event loop.
+
+Part 1 replays ``CALLBACKS`` concurrent relays in a city. Each one takes a
+recipient snapshot, then "sends" to every recipient -- yielding to the loop
+per send, as real I/O would -- and tracks each returned message id:
+
+- ``global``: one lock for the snapshot and one acquisition per tracked id
+  (the previous code path);
+- ``sharded``: one lock per grid cell, taken for the cells around the sender
+  in sorted order (a fixed lock ordering), plus one lock per chat-id shard
+  for each tracked id;
+- ``single``: one lock for the snapshot, tracking each id without a lock (a
+  single state call is atomic on the event loop);
+- ``chunked``: as ``single``, but the returned ids are committed with one
+  ``track_many`` call per ``TRACK_CHUNK`` sends (the current code path).
+
+Part 2 measures the longest event-loop stall while the idle sweep evicts
+``n`` users in a single lock hold versus in batches::
+
+    python -m benchmarks.bench_locks
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from contextlib import AsyncExitStack
+from unittest.mock import AsyncMock
+
+from benchmarks._common import populate
+from benchmarks.bench_move import crowd
+from tchaka.core import EVICT_BATCH_SIZE, TRACK_CHUNK, evict_idle_users
+from tchaka.spatial import Cell
+from tchaka.state import AppState
+
+RANGE_KM = 0.5
+CALLBACKS = 500
+POPULATION = 5_000
+CHAT_SHARDS = 64
+SWEEP_SIZES = (10_000, 50_000)
+
+
+async def relay_global(state: AppState, sender: str) -> None:
+    async with state.lock:
+        recipients = state.recipients(sender, RANGE_KM)
+    for chat_id in recipients:
+        await asyncio.sleep(0)
+        async with state.lock:
+            state.track_message(chat_id, 1)
+
+
+async def relay_single(state: AppState, sender: str) -> None:
+    async with state.lock:
+        recipients = state.recipients(sender, RANGE_KM)
+    for chat_id in recipients:
+        await asyncio.sleep(0)
+        state.track_message(chat_id, 1)
+
+
+async def relay_chunked(state: AppState, sender: str) -> None:
+    async with state.lock:
+        recipients = state.recipients(sender, RANGE_KM)
+    pending: list[tuple[int, int]] = []
+    for chat_id in recipients:
+        await asyncio.sleep(0)
+        pending.append((chat_id, 1))
+        if len(pending) >= TRACK_CHUNK:
+            state.track_many(pending)
+            pending = []
+    state.track_many(pending)
+
+
+async def relay_sharded(
+    state: AppState,
+    sender: str,
+    cells: dict[Cell, asyncio.Lock],
+    chats: list[asyncio.Lock],
+) -> None:
+    rec = state.users[sender]
+    home = state.index.cell_of(*rec.coord)
+    around = sorted(state.index.cells_around(home, RANGE_KM, state.index._cells))
+    async with AsyncExitStack() as stack:
+        for cell in around:
+            await stack.enter_async_context(cells.setdefault(cell, asyncio.Lock()))
+        recipients = state.recipients(sender, RANGE_KM)
+    for chat_id in recipients:
+        await asyncio.sleep(0)
+        async with chats[chat_id % CHAT_SHARDS]:
+            state.track_message(chat_id, 1)
+
+
+async def relays(design: str) -> float:
+    """Wall seconds for ``CALLBACKS`` concurrent relays with ``design``."""
+    state = populate(
+        AppState(cell_km=RANGE_KM, adjacency_km=RANGE_KM),
+        crowd(POPULATION, random.Random(0)),
+    )
+    senders = random.Random(1).sample(list(state.users), CALLBACKS)
+    cells: dict[Cell, asyncio.Lock] = {}
+    chats = [asyncio.Lock() for _ in range(CHAT_SHARDS)]
+    if design == "global":
+        tasks = [relay_global(state, s) for s in senders]
+    elif design == "sharded":
+        tasks = [relay_sharded(state, s, cells, chats) for s in senders]
+    elif design == "single":
+        tasks = [relay_single(state, s) for s in senders]
+    else:
+        tasks = [relay_chunked(state, s) for s in senders]
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - start
+
+
+async def sweep_stall(n: int, batch_size: int) -> float:
+    """Longest gap (ms) seen by a ticker while ``n`` idle users are evicted."""
+    state = populate(AppState(), crowd(n, random.Random(0)))
+    longest = 0.0
+    done = False
+
+    async def ticker() -> None:
+        nonlocal longest
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            longest = max(longest, now - last)
+            last = now
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    await evict_idle_users(AsyncMock(), state, now=1.0, ttl=0.5, batch_size=batch_size)
+    done = True
+    await tick
+    return longest * 1e3
+
+
+async def main_async() -> None:
+    print(f"{CALLBACKS} concurrent relays, {POPULATION} users")
+    print(f"{'design':>10} {'seconds':>10}")
+    for design in ("global", "sharded", "single", "chunked"):
+        print(f"{design:>10} {await relays(design):>10.3f}")
+    print()
+    print(f"{'evicted':>10} {'one hold ms':>12} {'batched ms':>12}")
+    for n in SWEEP_SIZES:
+        single = await sweep_stall(n, n)
+        batched = await sweep_stall(n, EVICT_BATCH_SIZE)
+        print(f"{n:>10} {single:>12.1f} {batched:>12.1f}")
+
+
+def main() -> None:
+    asyncio.run(main_async())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Resident bytes per registered user, for capacity planning.
+
+Everything tchaka knows lives in RAM, so memory per user decides how many
+users one process can hold. ``tracemalloc`` measures the heap growth of
+building the records (``record B``) and of registering them (``total B``,
+which adds the state maps, cached unit vectors and the grid index). Sparse
+(uniform) and clustered (city) populations differ in grid overhead: a lone
+user pays for a whole cell bucket::
+
+    python -m benchmarks.bench_memory
+
+At 100k users (bytes per user, record / total)::
+
+    pre-index baseline (dict records, no index)   289 / 372
+    slotted record holding a Coord                249 / 1002 uniform, 731 cities
+    slotted record, inline lat/lon                193 / 946 uniform, 675 cities
+
+The rest of the total is what the indexes add per user: the cached unit
+vector (a 3-tuple of floats), the expiry wheel entry and the grid bucket.
+"""
+
+from __future__ import annotations
+
+import gc
+import tracemalloc
+
+from benchmarks._common import city_coords, random_coords
+from tchaka.state import AppState, Coord, UserRecord
+
+CELL_KM = 5.0
+SIZES = (100_000, 1_000_000)
+
+
+def bench(coords: list[tuple[float, float]]) -> tuple[float, float]:
+    """(record bytes, total bytes) per user for one population."""
+    n = len(coords)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        records = [
+            UserRecord(f"u{i:07x}", 1_000_000_000 + i, Coord(lat, lon), 0.0)
+            for i, (lat, lon) in enumerate(coords)
+        ]
+        built, _ = tracemalloc.get_traced_memory()
+        state = AppState(cell_km=CELL_KM)
+        for rec in records:
+            state.register(rec)
+        del records  # the state now holds the only references
+        total, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return built / n, total / n
+
+
+def main() -> None:
+    print(f"{'users':>9} {'layout':>8} {'record B':>9} {'total B':>8} {'MiB':>8}")
+    for n in SIZES:
+        for layout, coords in (
+            ("uniform", random_coords(n)),
+            ("cities", city_coords(n)),
+        ):
+            record, total = bench(coords)
+            mib = total * n / 2**20
+            print(f"{n:>9} {layout:>8} {record:>9.0f} {total:>8.0f} {mib:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Cost of one live-location move in a dense crowd.
+
+Models an event: ``n`` users live-sharing within a few kilometres, each update
+a short random step. A move re-buckets the user in the grid (O(1)), refreshes
+its unit vector and re-links only its own adjacency edges, so the cost tracks
+the size of one neighborhood, not the population::
+
+    python -m benchmarks.bench_move
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+
+from benchmarks._common import per_call_us, populate
+from tchaka.state import AppState, Coord
+
+RANGE_KM = 0.5
+SIZES = (1_000, 5_000, 20_000)
+MOVES = 2_000
+CENTER = (52.52, 13.405)
+SPREAD_DEG = 0.05  # about 5 km across
+STEP_DEG = 0.0002  # about 20 m per update
+
+
+def crowd(n: int, rng: random.Random) -> list[tuple[float, float]]:
+    return [
+        (
+            CENTER[0] + rng.uniform(-1, 1) * SPREAD_DEG / 2,
+            CENTER[1] + rng.uniform(-1, 1) * SPREAD_DEG / 2,
+        )
+        for _ in range(n)
+    ]
+
+
+def bench(n: int, *, adjacency: bool) -> tuple[float, float]:
+    """Mean move microseconds and mean neighborhood size at population ``n``."""
+    rng = random.Random(0)
+    state = populate(
+        AppState(cell_km=RANGE_KM, adjacency_km=RANGE_KM if adjacency else None),
+        crowd(n, rng),
+    )
+    ids = itertools.cycle(list(state.users))
+
+    def move() -> None:
+        rec = state.users[next(ids)]
+        lat = rec.coord.lat + rng.uniform(-STEP_DEG, STEP_DEG)
+        lon = rec.coord.lon + rng.uniform(-STEP_DEG, STEP_DEG)
+        state.move(rec.user_id, Coord(lat, lon), RANGE_KM)
+
+    us = per_call_us(move, MOVES)
+    sample = list(state.users)[:200]
+    size = sum(state.count_neighbors(uid, RANGE_KM) for uid in sample) / len(sample)
+    return us, size
+
+
+def main() -> None:
+    print(f"{'users':>8} {'nbrs':>8} {'move us':>10} {'move+adj us':>12}")
+    for n in SIZES:
+        plain, size = bench(n, adjacency=False)
+        linked, _ = bench(n, adjacency=True)
+        print(f"{n:>8} {size:>8.1f} {plain:>10.1f} {linked:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
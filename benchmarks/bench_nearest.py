@@ -0,0 +1,57 @@
+"""k-nearest query for /check versus sorting every neighbor distance.
+
+In a dense crowd a user has hundreds of neighbors. :meth:`AppState.nearest`
+keeps a size-``k`` heap keyed by squared chord length and only runs haversine
+on the ``k`` it keeps; the baseline computes and sorts every distance. Both
+read the materialized adjacency, as the bot does::
+
+    python -m benchmarks.bench_nearest
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+
+from benchmarks._common import per_call_us, populate
+from benchmarks.bench_move import crowd
+from tchaka.geo import haversine_distance
+from tchaka.state import AppState
+
+RANGE_KM = 1.0
+K = 3
+SIZES = (1_000, 5_000, 20_000)
+QUERIES = 300
+
+
+def sort_all(state: AppState, user_id: str) -> list[float]:
+    """The k smallest distances by computing and sorting all of them."""
+    origin = state.users[user_id].coord
+    return sorted(
+        haversine_distance(*origin, *rec.coord)
+        for rec in state.neighbors(user_id, RANGE_KM)
+    )[:K]
+
+
+def bench(n: int) -> tuple[float, float, float]:
+    """Mean (sort us, nearest us, neighbors) per query at population ``n``."""
+    state = populate(
+        AppState(cell_km=RANGE_KM, adjacency_km=RANGE_KM), crowd(n, random.Random(0))
+    )
+    sample = list(state.users)[:QUERIES]
+    ids = itertools.cycle(sample)
+    full = per_call_us(lambda: sort_all(state, next(ids)), QUERIES)
+    heap = per_call_us(lambda: state.nearest(next(ids), K, RANGE_KM), QUERIES)
+    size = sum(state.count_neighbors(uid, RANGE_KM) for uid in sample) / len(sample)
+    return full, heap, size
+
+
+def main() -> None:
+    print(f"{'users':>8} {'nbrs':>8} {'sort us':>10} {'nearest us':>11}")
+    for n in SIZES:
+        full, heap, size = bench(n)
+        print(f"{n:>8} {size:>8.1f} {full:>10.1f} {heap:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
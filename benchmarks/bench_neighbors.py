@@ -0,0 +1,52 @@
+"""Neighbor query cost versus population size.
+
+Compares the old full scan (haversine against every user) with the grid-indexed
+:meth:`AppState.neighbors`. The indexed query should stay roughly flat as the
+population grows, while the scan grows linearly::
+
+    python -m benchmarks.bench_neighbors
+"""
+
+from __future__ import annotations
+
+import itertools
+
+from benchmarks._common import per_call_us, populate, random_coords
+from tchaka.geo import haversine_distance
+from tchaka.state import AppState, UserRecord
+
+RANGE_KM = 5.0
+SIZES = (1_000, 10_000, 100_000)
+QUERIES = 200
+
+
+def full_scan(state: AppState, user_id: str, threshold_km: float) -> list[UserRecord]:
+    """The pre-index implementation, kept as the baseline."""
+    origin = state.users[user_id]
+    return [
+        rec
+        for uid, rec in state.users.items()
+        if uid != user_id
+        and haversine_distance(*origin.coord, *rec.coord) <= threshold_km
+    ]
+
+
+def bench(n: int) -> tuple[float, float]:
+    """Mean (scan, index) microseconds per query at population ``n``."""
+    state = populate(AppState(cell_km=RANGE_KM), random_coords(n))
+    ids = itertools.cycle(list(state.users)[:QUERIES])
+    scan_reps = max(QUERIES * 1_000 // n, 5)
+    scan = per_call_us(lambda: full_scan(state, next(ids), RANGE_KM), scan_reps)
+    index = per_call_us(lambda: state.neighbors(next(ids), RANGE_KM), QUERIES)
+    return scan, index
+
+
+def main() -> None:
+    print(f"{'users':>10} {'scan us/query':>15} {'index us/query':>15}")
+    for n in SIZES:
+        scan, index = bench(n)
+        print(f"{n:>10} {scan:>15.1f} {index:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Neighbor queries when every user picks their own radius (``/range``).
+
+Each user gets a random override (or none) up to the configured range. The
+grid stays sized from the configured range, so a query still visits only the
+cells around the sender; the table shows the candidates examined per query
+staying flat while the population grows, next to the full-scan baseline::
+
+    python -m benchmarks.bench_range
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+
+from benchmarks._common import per_call_us, random_coords
+from tchaka.geo import haversine_distance
+from tchaka.state import AppState, Coord, UserRecord
+
+RANGE_KM = 5.0
+RADII = (None, 0.5, 1.0, 2.0, 5.0, 50.0)  # 50 km is capped to RANGE_KM
+SIZES = (1_000, 10_000, 100_000)
+QUERIES = 200
+
+
+def mixed_state(n: int, *, seed: int = 0) -> AppState:
+    rng = random.Random(seed)
+    state = AppState(cell_km=RANGE_KM)
+    for i, (lat, lon) in enumerate(random_coords(n, seed=seed)):
+        rec = UserRecord(f"u{i}", i, Coord(lat, lon), 0.0, range_km=rng.choice(RADII))
+        state.register(rec)
+    return state
+
+
+def full_scan(state: AppState, user_id: str, threshold_km: float) -> list[UserRecord]:
+    """Brute-force mutual ``min(rA, rB)`` neighborhood, the baseline."""
+    origin = state.users[user_id]
+    mine = state.effective_range(origin, threshold_km)
+    return [
+        rec
+        for uid, rec in state.users.items()
+        if uid != user_id
+        and haversine_distance(*origin.coord, *rec.coord)
+        <= min(mine, state.effective_range(rec, threshold_km))
+    ]
+
+
+def bench(n: int) -> tuple[float, float, float]:
+    """Mean (scan us, index us, candidates) per query at population ``n``."""
+    state = mixed_state(n)
+    sample = list(state.users)[:QUERIES]
+    ids = itertools.cycle(sample)
+    scan_reps = max(QUERIES * 1_000 // n, 5)
+    scan = per_call_us(lambda: full_scan(state, next(ids), RANGE_KM), scan_reps)
+    index = per_call_us(lambda: state.neighbors(next(ids), RANGE_KM), QUERIES)
+    visited = 0
+    for uid in sample:
+        rec = state.users[uid]
+        radius = state.effective_range(rec, RANGE_KM)
+        visited += sum(1 for _ in state.index.candidates(*rec.coord, radius))
+    return scan, index, visited / len(sample)
+
+
+def main() -> None:
+    print(f"{'users':>10} {'scan us':>12} {'index us':>12} {'candidates':>12}")
+    for n in SIZES:
+        scan, index, candidates = bench(n)
+        print(f"{n:>10} {scan:>12.1f} {index:>12.1f} {candidates:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
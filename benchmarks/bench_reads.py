@@ -0,0 +1,111 @@
+"""Read latency while writes run continuously: lock, no lock, copy-on-write.
+
+``READERS`` tasks take relay recipient snapshots while ``WRITERS`` tasks
+apply live-location moves in batches of ``BATCH`` per lock hold, all on one
+event loop for ``SECONDS``:
+
+- ``locked``: readers take ``state.lock`` for the query (the previous path);
+- ``lock-free``: readers query directly, as ``/check`` and the relay do now
+  (nothing awaits under the lock, so a synchronous read is consistent);
+- ``cow``: after each batch the writer publishes an immutable copy of the
+  records, unit vectors and grid, and readers query the latest copy.
+
+Read latency is the time from a reader resuming to its query returning::
+
+    python -m benchmarks.bench_reads
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import random
+import statistics
+import time
+
+from benchmarks._common import populate
+from benchmarks.bench_move import crowd
+from tchaka.state import AppState, Coord
+
+RANGE_KM = 0.5
+READERS = 20
+WRITERS = 4
+BATCH = 50
+SECONDS = 2.0
+SIZES = (5_000, 20_000)
+
+
+def publish(state: AppState) -> AppState:
+    """An immutable-by-convention copy of everything a query reads."""
+    snap = copy.copy(state)
+    snap.users = {uid: copy.copy(rec) for uid, rec in state.users.items()}
+    snap.units = dict(state.units)
+    snap.index = copy.copy(state.index)
+    snap.index._cells = {c: set(b) for c, b in state.index._cells.items()}
+    snap.index._where = dict(state.index._where)
+    return snap
+
+
+async def run(n: int, mode: str) -> tuple[list[float], int, list[float]]:
+    """(read latencies s, moves applied, publish times s) for one mode."""
+    state = populate(AppState(cell_km=RANGE_KM), crowd(n, random.Random(0)))
+    ids = list(state.users)
+    current = publish(state) if mode == "cow" else state
+    latencies: list[float] = []
+    publishes: list[float] = []
+    moves = 0
+    deadline = time.perf_counter() + SECONDS
+
+    async def reader(seed: int) -> None:
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            if mode == "locked":
+                async with state.lock:
+                    state.recipients(rng.choice(ids), RANGE_KM)
+            else:
+                current.recipients(rng.choice(ids), RANGE_KM)
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0)
+
+    async def writer(seed: int) -> None:
+        nonlocal current, moves
+        rng = random.Random(seed)
+        targets = crowd(BATCH, rng)
+        while time.perf_counter() < deadline:
+            async with state.lock:
+                for lat, lon in targets:
+                    state.move(rng.choice(ids), Coord(lat, lon), RANGE_KM)
+                moves += BATCH
+                if mode == "cow":
+                    start = time.perf_counter()
+                    current = publish(state)
+                    publishes.append(time.perf_counter() - start)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(
+        *(reader(i) for i in range(READERS)),
+        *(writer(100 + i) for i in range(WRITERS)),
+    )
+    return latencies, moves, publishes
+
+
+def main() -> None:
+    print(
+        f"{'users':>7} {'mode':>9} {'reads/s':>9} {'p50 us':>8} {'p99 us':>8}"
+        f" {'moves/s':>9} {'publish ms':>11}"
+    )
+    for n in SIZES:
+        for mode in ("locked", "lock-free", "cow"):
+            latencies, moves, publishes = asyncio.run(run(n, mode))
+            p50 = statistics.median(latencies) * 1e6
+            p99 = statistics.quantiles(latencies, n=100)[98] * 1e6
+            pub = statistics.fmean(publishes) * 1e3 if publishes else 0.0
+            print(
+                f"{n:>7} {mode:>9} {len(latencies) / SECONDS:>9.0f} {p50:>8.1f}"
+                f" {p99:>8.1f} {moves / SECONDS:>9.0f} {pub:>11.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Update throughput of the sharded mode by number of worker processes.
+
+A :class:`~tchaka.shard.ShardRouter` feeds ``USERS`` registrations, then
+``QUERIES`` relay messages from random users, to N worker processes over the
+real socket transport. Each worker runs a state-level handler in place of the
+Telegram callbacks: a location registers or moves the user, a message
+computes its relay recipients. Users live around ``CITIES`` city centers, so
+the stripes hold similar loads and few users sit within range of a border.
+
+``router/s`` repeats the query phase with workers that skip the state work,
+which bounds what the single router process can forward. Scaling needs one
+free core per worker plus one for the router (``os.cpu_count()`` is
+printed)::
+
+    python -m benchmarks.bench_shards
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import socket
+import time
+
+from benchmarks._common import city_coords
+from tchaka.shard import ShardRouter, ShardWorker, Stripes, spawn_workers
+from tchaka.state import AppState, Coord, UserRecord
+
+RANGE_KM = 5.0
+USERS = 20_000
+QUERIES = 20_000
+CITIES = 400
+WORKERS = (1, 2, 4)
+
+
+def bench_worker(index: int, sock: socket.socket, work: bool) -> None:
+    """Worker process: serve the router with the state-level handler."""
+    state = AppState(cell_km=RANGE_KM)
+
+    async def handle(chat_id: int, payload: bytes) -> None:
+        if not work:
+            return
+        data = json.loads(payload)
+        rec = state.user_for_chat(chat_id)
+        if "lat" in data:
+            coord = Coord(data["lat"], data["lon"])
+            if rec is None:
+                state.register(UserRecord(f"u{chat_id}", chat_id, coord, 0.0))
+            else:
+                state.move(rec.user_id, coord, RANGE_KM)
+        elif rec is not None:
+            state.recipients(rec.user_id, RANGE_KM)
+
+    async def serve() -> None:
+        reader, writer = await asyncio.open_unix_connection(sock=sock)
+        await ShardWorker(state, handle).serve(reader, writer)
+
+    asyncio.run(serve())
+
+
+async def drive(n: int, work: bool) -> tuple[float, float]:
+    """(registrations/s, queries/s) with ``n`` workers."""
+    procs, socks = spawn_workers(n, bench_worker, work)
+    router = ShardRouter(Stripes.even(n), RANGE_KM)
+    await router.connect(socks)
+    rng = random.Random(1)
+    coords = city_coords(USERS, cities=CITIES)
+    text = json.dumps({"text": "hello"}).encode()
+    try:
+        await router.barrier()  # every worker is up
+        start = time.perf_counter()
+        for chat_id, (lat, lon) in enumerate(coords):
+            payload = json.dumps({"lat": lat, "lon": lon}).encode()
+            await router.route(chat_id, Coord(lat, lon), payload)
+        await router.barrier()
+        await router.barrier()  # the ghosts of the last users
+        joins = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(QUERIES):
+            await router.route(rng.randrange(USERS), None, text)
+        await router.barrier()
+        queries = time.perf_counter() - start
+    finally:
+        await router.close()
+        for proc in procs:
+            proc.join()
+    return USERS / joins, QUERIES / queries
+
+
+def main() -> None:
+    print(f"cpus: {os.cpu_count()}")
+    print(f"{'workers':>7} {'joins/s':>9} {'queries/s':>10} {'router/s':>9}")
+    for n in WORKERS:
+        joins, queries = asyncio.run(drive(n, work=True))
+        _, ceiling = asyncio.run(drive(n, work=False))
+        print(f"{n:>7} {joins:>9.0f} {queries:>10.0f} {ceiling:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Zone lookup on registration: R-tree versus a linear point-in-polygon scan.
+
+``n`` square venues (about 500 m wide) are scattered over the inhabited band;
+each lookup is a random point near a random venue, so about half land inside
+one. The R-tree descends only into boxes containing the point, so its cost
+grows with the tree depth while the scan tests every polygon::
+
+    python -m benchmarks.bench_zones
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+
+from benchmarks._common import DISTANCE_DEGREE_KM, per_call_us, random_coords
+from tchaka.zones import Zone, ZoneIndex
+
+SIDE_DEG = 0.5 / DISTANCE_DEGREE_KM
+SIZES = (100, 1_000, 10_000)
+QUERIES = 2_000
+
+
+def venues(n: int) -> list[Zone]:
+    return [
+        Zone(
+            f"v{i}",
+            (
+                (
+                    (lat, lon),
+                    (lat, lon + SIDE_DEG),
+                    (lat + SIDE_DEG, lon + SIDE_DEG),
+                    (lat + SIDE_DEG, lon),
+                ),
+            ),
+        )
+        for i, (lat, lon) in enumerate(random_coords(n))
+    ]
+
+
+def linear_scan(zones: list[Zone], lat: float, lon: float) -> Zone | None:
+    return next((z for z in zones if z.contains(lat, lon)), None)
+
+
+def bench(n: int) -> tuple[float, float]:
+    """Mean (scan us, R-tree us) per lookup with ``n`` zones."""
+    zones = venues(n)
+    index = ZoneIndex(zones)
+    rng = random.Random(1)
+    points = []
+    for _ in range(QUERIES):
+        lat, lon, *_ = rng.choice(zones).bbox
+        offset = rng.uniform(-1, 1) * SIDE_DEG
+        points.append((lat + SIDE_DEG / 2 + offset, lon + SIDE_DEG / 2))
+    cycle = itertools.cycle(points)
+    scan_reps = max(QUERIES * 100 // n, 20)
+    scan = per_call_us(lambda: linear_scan(zones, *next(cycle)), scan_reps)
+    tree = per_call_us(lambda: index.locate(*next(cycle)), QUERIES)
+    return scan, tree
+
+
+def main() -> None:
+    print(f"{'zones':>8} {'scan us':>10} {'r-tree us':>10}")
+    for n in SIZES:
+        scan, tree = bench(n)
+        print(f"{n:>8} {scan:>10.1f} {tree:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Single-writer state actor: an alternative to ``state.lock``.
+
+With the lock, every callback acquires ``state.lock`` for its read-modify-write
+and then tracks the id of its reply. With a :class:`StateActor`, one owner task
+applies every state write instead. Callbacks queue operations and, when they
+need the result, await a future:
+
+- :meth:`StateActor.call` queues a function of the state and returns a future
+  of its result (a read-modify-write, like a locked block);
+- :meth:`StateActor.touch` and :meth:`StateActor.track` queue the two most
+  frequent writes without a future: nothing waits for them.
+
+The owner task wakes once per burst and applies up to ``max_batch`` queued
+operations in one synchronous pass, in submission order. Consecutive touches
+are coalesced (the latest timestamp per user wins) and applied just before
+the next call or at the end of the pass, so a call always sees every write
+queued before it. Between passes it yields to the event loop.
+
+Reads still go straight to the state: the actor's pass, like a locked block,
+never awaits, so a synchronous read sees the state between two passes. For
+the same reason the writes left outside the actor stay safe: the idle sweep
+and the stats snapshot keep using ``state.lock`` (their critical sections are
+synchronous too), and the relay and join fan-outs of :mod:`tchaka.core` track
+each returned id with one direct state call.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+from tchaka.state import AppState
+
+__all__ = ["DEFAULT_ACTOR_BATCH", "StateActor"]
+
+T = TypeVar("T")
+
+# Operations applied per pass before the event loop gets a turn.
+DEFAULT_ACTOR_BATCH = 1024
+
+_CALL, _TOUCH, _TRACK = range(3)
+
+
+class StateActor:
+    """The one task that writes to ``state``."""
+
+    def __init__(
+        self, state: AppState, *, max_batch: int = DEFAULT_ACTOR_BATCH
+    ) -> None:
+        if max_batch < 1:
+            raise ValueError(f"max_batch must be positive, got {max_batch!r}")
+        self.state = state
+        self.max_batch = max_batch
+        # (kind, a, b): (_CALL, fn, future), (_TOUCH, user_id, now) or
+        # (_TRACK, chat_id, message_id).
+        self._queue: deque[tuple[int, Any, Any]] = deque()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._closing = False
+        self.passes = 0
+        self.applied = 0
+
+    def start(self) -> None:
+        """Start the owner task on the running loop."""
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        """Apply what is still queued, then stop the owner task."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wake.set()
+        await self._task
+        self._task = None
+
+    def call(self, fn: Callable[[AppState], T]) -> asyncio.Future[T]:
+        """Queue ``fn(state)``; the future resolves to its result (or error).
+
+        Raises ``RuntimeError`` once the actor is closing: the call would
+        never run, and its caller would wait forever.
+        """
+        if self._closing:
+            raise RuntimeError("the state actor is closed")
+        future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        self._queue.append((_CALL, fn, future))
+        self._wake.set()
+        return future
+
+    def touch(self, user_id: str, now: float) -> None:
+        """Queue :meth:`AppState.touch` without waiting for it."""
+        self._queue.append((_TOUCH, user_id, now))
+        self._wake.set()
+
+    def track(self, chat_id: int, message_id: int) -> None:
+        """Queue :meth:`AppState.track_message` without waiting for it."""
+        self._queue.append((_TRACK, chat_id, message_id))
+        self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self._queue:
+                self._pass()
+                if self._queue:
+                    await asyncio.sleep(0)  # callbacks run between passes
+            if self._closing:
+                return
+
+    def _pass(self) -> None:
+        """Apply up to ``max_batch`` queued operations, in order."""
+        state, queue = self.state, self._queue
+        touches: dict[str, float] = {}
+        n = min(len(queue), self.max_batch)
+        for _ in range(n):
+            kind, a, b = queue.popleft()
+            if kind == _TOUCH:
+                touches[a] = b
+            elif kind == _TRACK:
+                state.track_message(a, b)
+            else:
+                if touches:
+                    _apply_touches(state, touches)
+                    touches = {}
+                if b.cancelled():
+                    continue  # its caller is gone: do not apply it
+                try:
+                    b.set_result(a(state))
+                except Exception as exc:  # noqa: BLE001 - re-raised by the caller
+                    b.set_exception(exc)
+        if touches:
+            _apply_touches(state, touches)
+        self.passes += 1
+        self.applied += n
+
+
+def _apply_touches(state: AppState, touches: dict[str, float]) -> None:
+    for user_id, now in touches.items():
+        state.touch(user_id, now)
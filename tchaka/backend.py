@@ -0,0 +1,370 @@
+"""Pluggable state backends: the in-memory default and Redis GEO.
+
+:class:`StateBackend` is the population as the relay, /check and join paths
+see it: the :class:`~tchaka.state.AppState` queries they rely on, as
+coroutines (register, remove_by_chat, user_for_chat, track_message,
+pop_tracked, touch, neighbors, count_neighbors, nearest, recipients and
+idle_user_ids). Two implementations:
+
+- :class:`MemoryBackend` wraps the process's own :class:`AppState` (the
+  default): every call is one synchronous state call and never suspends, so
+  the read paths still take no lock (see :mod:`tchaka.state`).
+- :class:`RedisBackend` keeps the population in Redis, so several bot
+  replicas share it (``TCHAKA_BACKEND=redis``). Coordinates live in one GEO
+  set and neighbor queries use ``GEOSEARCH``. Every operation is at most two
+  round trips: the commands of one step go out as one pipeline, and those
+  that must be atomic as one ``MULTI``/``EXEC`` transaction. A pool of
+  connections (``from_url``) lets concurrent callbacks run their round trips
+  side by side.
+
+The local :class:`AppState` still holds this process's own users, and every
+callback writes there first (moves, /range, tracked ids, the idle sweep and
+the handoff work on it alone). A ``shared`` backend additionally gets those
+users' registrations, positions, ranges and departures (see
+:mod:`tchaka.commands`), and the relay, /check and join fan-outs read it, so
+they reach the users of every replica. Zones and density-adaptive ranges have
+no Redis implementation; a move only notifies this process's users, and the
+ids of relayed messages are tracked by the process that sent them.
+
+Redis layout (``prefix`` defaults to ``tchaka:``)::
+
+    {prefix}geo           GEO set      user_id -> (lon, lat)
+    {prefix}user:{uid}    hash         chat, lat, lon, lang, range, moved
+    {prefix}chats         hash         chat_id -> user_id
+    {prefix}active        sorted set   user_id -> last activity (idle sweeps)
+    {prefix}msgs:{chat}   list         tracked message ids
+
+Replicas allocate user ids on their own, so :meth:`RedisBackend.register`
+claims the id and the chat in the shared store (``HSETNX``) before writing
+anything else; a replica that loses the race gets a ``ValueError``.
+
+Distances are Redis's (geohash cells of under a metre, a slightly larger Earth
+radius), so a pair within a metre of the radius may be decided differently
+than by :class:`AppState`. Ranges are the configured threshold, narrowed by
+``/range`` overrides, and stay mutual.
+
+``redis`` is an optional dependency (the ``redis`` extra), only needed by
+:meth:`RedisBackend.from_url`.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Protocol, runtime_checkable
+
+from tchaka.state import AppState, Coord, UserRecord
+
+__all__ = ["MemoryBackend", "RedisBackend", "StateBackend"]
+DEFAULT_REDIS_PREFIX = "tchaka:"
+DEFAULT_REDIS_CONNECTIONS = 16
+
+
+@runtime_checkable
+class StateBackend(Protocol):
+    """Where the population lives. Mirrors the :class:`AppState` methods of
+    the same names, as coroutines; an absent user has no neighbors.
+
+    ``shared`` is true when other processes see the population too: the
+    callbacks then publish their own users' changes to it.
+    """
+
+    shared: bool
+
+    async def register(self, rec: UserRecord) -> None: ...
+
+    async def remove_by_chat(self, chat_id: int) -> UserRecord | None: ...
+
+    async def user_for_chat(self, chat_id: int) -> UserRecord | None: ...
+
+    async def track_message(self, chat_id: int, message_id: int) -> None: ...
+
+    async def pop_tracked(self, chat_id: int) -> list[int]: ...
+
+    async def touch(self, user_id: str, now: float) -> None: ...
+
+    async def neighbors(
+        self, user_id: str, threshold_km: float
+    ) -> list[UserRecord]: ...
+
+    async def count_neighbors(self, user_id: str, threshold_km: float) -> int: ...
+
+    async def nearest(
+        self, user_id: str, k: int, threshold_km: float
+    ) -> list[tuple[float, UserRecord]]: ...
+
+    async def recipients(
+        self, user_id: str, threshold_km: float, *, limit: int | None = None
+    ) -> list[int]: ...
+
+    async def idle_user_ids(self, now: float, ttl_seconds: float) -> list[str]: ...
+
+
+class MemoryBackend:
+    """:class:`StateBackend` over one process's :class:`AppState`."""
+
+    shared = False  # the callbacks write to the state already
+
+    def __init__(self, state: AppState | None = None) -> None:
+        self.state = AppState() if state is None else state
+
+    async def register(self, rec: UserRecord) -> None:
+        self.state.register(rec)
+
+    async def remove_by_chat(self, chat_id: int) -> UserRecord | None:
+        return self.state.remove_by_chat(chat_id)
+
+    async def user_for_chat(self, chat_id: int) -> UserRecord | None:
+        return self.state.user_for_chat(chat_id)
+
+    async def track_message(self, chat_id: int, message_id: int) -> None:
+        self.state.track_message(chat_id, message_id)
+
+    async def pop_tracked(self, chat_id: int) -> list[int]:
+        return self.state.pop_tracked(chat_id)
+
+    async def touch(self, user_id: str, now: float) -> None:
+        self.state.touch(user_id, now)
+
+    async def neighbors(self, user_id: str, threshold_km: float) -> list[UserRecord]:
+        if user_id not in self.state.users:
+            return []
+        return self.state.neighbors(user_id, threshold_km)
+
+    async def count_neighbors(self, user_id: str, threshold_km: float) -> int:
+        if user_id not in self.state.users:
+            return 0
+        return self.state.count_neighbors(user_id, threshold_km)
+
+    async def nearest(
+        self, user_id: str, k: int, threshold_km: float
+    ) -> list[tuple[float, UserRecord]]:
+        if user_id not in self.state.users:
+            return []
+        return self.state.nearest(user_id, k, threshold_km)
+
+    async def recipients(
+        self, user_id: str, threshold_km: float, *, limit: int | None = None
+    ) -> list[int]:
+        if user_id not in self.state.users:
+            return []
+        return self.state.recipients(user_id, threshold_km, limit=limit)
+
+    async def idle_user_ids(self, now: float, ttl_seconds: float) -> list[str]:
+        return self.state.idle_user_ids(now, ttl_seconds)
+
+
+class RedisBackend:
+    """:class:`StateBackend` over Redis GEO commands.
+
+    ``client`` is a ``redis.asyncio.Redis`` created with
+    ``decode_responses=True`` (see :meth:`from_url`), or a stand-in with the
+    same methods.
+    """
+
+    shared = True
+
+    def __init__(self, client: Any, *, prefix: str = DEFAULT_REDIS_PREFIX) -> None:
+        self.client = client
+        self._geo = f"{prefix}geo"
+        self._chats = f"{prefix}chats"
+        self._active = f"{prefix}active"
+        self._user = f"{prefix}user:"
+        self._msgs = f"{prefix}msgs:"
+
+    @classmethod
+    def from_url(
+        cls,
+        url: str,
+        *,
+        max_connections: int = DEFAULT_REDIS_CONNECTIONS,
+        prefix: str = DEFAULT_REDIS_PREFIX,
+    ) -> RedisBackend:
+        """Connect through a pool of up to ``max_connections`` connections."""
+        try:
+            from redis import (  # type: ignore[import-not-found, unused-ignore]
+                asyncio as aioredis,
+            )
+        except ImportError as exc:  # optional dependency
+            raise RuntimeError(
+                "RedisBackend requires redis (poetry install -E redis)"
+            ) from exc
+        pool = aioredis.ConnectionPool.from_url(
+            url, max_connections=max_connections, decode_responses=True
+        )
+        return cls(aioredis.Redis(connection_pool=pool), prefix=prefix)
+
+    async def register(self, rec: UserRecord) -> None:
+        """Claim the user id and the chat, then write the record, its
+        position and activity: two transactions.
+
+        Raises ``ValueError`` if the id or the chat belongs to another
+        registration (as :meth:`AppState.register` does for a taken id),
+        and then leaves the store as it was. Registering the same id and chat
+        again overwrites the record.
+        """
+        user_key, chat = self._user + rec.user_id, str(rec.chat_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hsetnx(self._chats, chat, rec.user_id)
+        pipe.hget(self._chats, chat)
+        pipe.hsetnx(user_key, "chat", chat)
+        pipe.hget(user_key, "chat")
+        new_chat, chat_owner, new_user, user_chat = await pipe.execute()
+        if chat_owner != rec.user_id or user_chat != chat:
+            if new_chat or new_user:  # undo the half of the claim we won
+                pipe = self.client.pipeline(transaction=True)
+                if new_chat:
+                    pipe.hdel(self._chats, chat)
+                if new_user:
+                    pipe.delete(user_key)
+                await pipe.execute()
+            if user_chat != chat:
+                raise ValueError(f"user id {rec.user_id!r} is taken")
+            raise ValueError(f"chat {rec.chat_id} is registered as {chat_owner!r}")
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(user_key, mapping=_fields(rec))
+        pipe.geoadd(self._geo, [rec.lon, rec.lat, rec.user_id])
+        pipe.zadd(self._active, {rec.user_id: rec.last_active_ts})
+        await pipe.execute()
+
+    async def remove_by_chat(self, chat_id: int) -> UserRecord | None:
+        user_id = await self.client.hget(self._chats, str(chat_id))
+        if user_id is None:
+            return None
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hgetall(self._user + user_id)
+        pipe.zscore(self._active, user_id)
+        pipe.delete(self._user + user_id)
+        pipe.hdel(self._chats, str(chat_id))
+        pipe.zrem(self._geo, user_id)
+        pipe.zrem(self._active, user_id)
+        fields, ts, *_ = await pipe.execute()
+        return _record(user_id, fields, ts) if fields else None
+
+    async def user_for_chat(self, chat_id: int) -> UserRecord | None:
+        user_id = await self.client.hget(self._chats, str(chat_id))
+        if user_id is None:
+            return None
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(self._user + user_id)
+        pipe.zscore(self._active, user_id)
+        fields, ts = await pipe.execute()
+        return _record(user_id, fields, ts) if fields else None
+
+    async def track_message(self, chat_id: int, message_id: int) -> None:
+        await self.client.rpush(self._msgs + str(chat_id), message_id)
+
+    async def pop_tracked(self, chat_id: int) -> list[int]:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.lrange(self._msgs + str(chat_id), 0, -1)
+        pipe.delete(self._msgs + str(chat_id))
+        ids, _ = await pipe.execute()
+        return sorted({int(mid) for mid in ids})
+
+    async def touch(self, user_id: str, now: float) -> None:
+        """Only an existing user is touched (``ZADD XX``)."""
+        await self.client.zadd(self._active, {user_id: now}, xx=True)
+
+    async def neighbors(self, user_id: str, threshold_km: float) -> list[UserRecord]:
+        """Records within both ranges of ``user_id``, nearest first."""
+        return [rec for _, rec in await self._near(user_id, threshold_km)]
+
+    async def count_neighbors(self, user_id: str, threshold_km: float) -> int:
+        return len(await self.recipients(user_id, threshold_km))
+
+    async def nearest(
+        self, user_id: str, k: int, threshold_km: float
+    ) -> list[tuple[float, UserRecord]]:
+        """The ``k`` nearest :meth:`neighbors` as ``(distance_km, record)``."""
+        return (await self._near(user_id, threshold_km))[:k] if k > 0 else []
+
+    async def recipients(
+        self, user_id: str, threshold_km: float, *, limit: int | None = None
+    ) -> list[int]:
+        """Chat ids of :meth:`neighbors`, nearest first, at most ``limit``."""
+        found = await self._search(user_id, threshold_km)
+        if not found:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for other, _ in found:
+            pipe.hmget(self._user + other, ["chat", "range"])
+        chats = [
+            int(chat)
+            for (_, km), (chat, range_km) in zip(
+                found, await pipe.execute(), strict=True
+            )
+            if chat is not None and km <= _range(range_km, threshold_km)
+        ]
+        return chats if limit is None else chats[:limit]
+
+    async def idle_user_ids(self, now: float, ttl_seconds: float) -> list[str]:
+        return list(
+            await self.client.zrangebyscore(self._active, "-inf", now - ttl_seconds)
+        )
+
+    async def _near(
+        self, user_id: str, threshold_km: float
+    ) -> list[tuple[float, UserRecord]]:
+        """:meth:`neighbors` with their distance in km, nearest first."""
+        found = await self._search(user_id, threshold_km)
+        if not found:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for other, _ in found:
+            pipe.hgetall(self._user + other)
+        pipe.zmscore(self._active, [other for other, _ in found])
+        *rows, times = await pipe.execute()
+        return [
+            (km, _record(other, fields, ts))
+            for (other, km), fields, ts in zip(found, rows, times, strict=True)
+            if fields and km <= _range(fields.get("range"), threshold_km)
+        ]
+
+    async def _search(
+        self, user_id: str, threshold_km: float
+    ) -> list[tuple[str, float]]:
+        """Other members within ``user_id``'s own range, nearest first, with
+        their distance in km: one round trip."""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hget(self._user + user_id, "range")
+        pipe.geosearch(
+            self._geo,
+            member=user_id,
+            radius=threshold_km,
+            unit="km",
+            sort="ASC",
+            withdist=True,
+        )
+        own_range, found = await pipe.execute(raise_on_error=False)
+        if isinstance(found, Exception):
+            return []  # not registered: no such member
+        radius = _range(own_range, threshold_km)
+        return [(other, km) for other, km in found if other != user_id and km <= radius]
+
+
+def _fields(rec: UserRecord) -> dict[str, str]:
+    """Hash fields of a record; the exact coordinate is kept here, as the GEO
+    set only holds it to geohash precision."""
+    return {
+        "chat": str(rec.chat_id),
+        "lat": repr(rec.lat),
+        "lon": repr(rec.lon),
+        "lang": rec.lang,
+        "range": "" if rec.range_km is None else repr(rec.range_km),
+        "moved": "" if rec.moved_ts is None else repr(rec.moved_ts),
+    }
+
+
+def _record(user_id: str, fields: dict[str, str], ts: float | None) -> UserRecord:
+    return UserRecord(
+        user_id,
+        int(fields["chat"]),
+        Coord(float(fields["lat"]), float(fields["lon"])),
+        0.0 if ts is None else float(ts),
+        fields["lang"],
+        float(fields["range"]) if fields["range"] else None,
+        float(fields["moved"]) if fields["moved"] else None,
+    )
+
+
+def _range(raw: str | None, threshold_km: float) -> float:
+    """Effective range from a stored override (capped by the threshold)."""
+    return min(float(raw), threshold_km) if raw else threshold_km
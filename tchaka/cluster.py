@@ -0,0 +1,403 @@
+"""Transitive proximity clustering (union-find over the spatial grid).
+
+This backs the analytic :func:`tchaka.geo.group_coordinates` helper; the
+user-facing "people around you" semantics stay the ego-centric, non-transitive
+:meth:`AppState.neighbors`.
+
+- :func:`cluster_points` clusters a batch. Sparse inputs (a few candidates
+  per point in cells several thresholds wide) compare the candidate pairs in
+  one flat loop, which beats any per-cell bookkeeping. Dense inputs use cells
+  half the threshold wide instead, so every cell whose diagonal fits in the
+  threshold is a clique and its points are merged without a single distance
+  test. Cells are then only compared with nearby cells whose components still
+  differ, stopping at the first pair found in range.
+- :class:`IncrementalClusters` adds or removes one point at a time. A removal
+  only re-labels the affected component when it actually splits, which is
+  detected by a search that stops as soon as the removed point's former
+  neighbors are reconnected.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable, Hashable, Iterable, Sequence
+from itertools import count
+from math import degrees
+from typing import Generic, NamedTuple, TypeVar
+
+from tchaka.geo import (
+    EARTH_RADIUS_KM,
+    Vec3,
+    chord_sq_bounds,
+    haversine_distance,
+    unit_vector,
+)
+from tchaka.spatial import Cell, GridIndex
+
+__all__ = ["IncrementalClusters", "cluster_points"]
+
+K = TypeVar("K", bound=Hashable)
+
+_MIN_CELL_KM = 1e-3  # a zero threshold still needs positive cells
+_CLIQUE_MAX_KM = 1_000.0  # beyond this, curvature makes corner diagonals unsafe
+_CLIQUE_MARGIN = 0.9
+# Sparse pass: cells this many thresholds wide, used while they leave at most
+# _PAIR_BUDGET candidate pairs per point (see bench_cluster for the crossover).
+_WIDE_CELL_FACTOR = 8.0
+_PAIR_BUDGET = 256.0
+_LAT_PAD = 1e-9  # relative padding so float error never rejects a pair in range
+
+
+def _chord_sq(a: Vec3, b: Vec3) -> float:
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+def cluster_points(
+    coordinates: Sequence[tuple[float, float]],
+    threshold_km: float,
+    *,
+    pair_budget: float = _PAIR_BUDGET,
+) -> list[int]:
+    """Single-linkage clusters of points linked when within ``threshold_km``.
+
+    Returns, for each input position, the index of its cluster's
+    representative point. Equivalent to union-find over every pair, without
+    looking at every pair.
+
+    Points are first bucketed into wide cells. When that leaves at most
+    ``pair_budget`` candidate pairs per point, the candidates are compared
+    directly (:func:`_link_pairs`); denser inputs go through the clique cells
+    of :func:`_link_cells` instead.
+    """
+    n = len(coordinates)
+    parent = list(range(n))
+    size = [1] * n
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int) -> None:
+        ri, rj = find(i), find(j)
+        if ri == rj:
+            return
+        if size[ri] < size[rj]:
+            ri, rj = rj, ri
+        parent[rj] = ri
+        size[ri] += size[rj]
+
+    sure, maybe = chord_sq_bounds(threshold_km)
+    units: list[Vec3 | None] = [None] * n  # only tested points ever need one
+
+    def unit(i: int) -> Vec3:
+        u = units[i]
+        if u is None:
+            u = units[i] = unit_vector(*coordinates[i])
+        return u
+
+    def close(i: int, j: int) -> bool:
+        chord_sq = _chord_sq(unit(i), unit(j))
+        if chord_sq < sure:
+            return True
+        return chord_sq <= maybe and (
+            haversine_distance(*coordinates[i], *coordinates[j]) <= threshold_km
+        )
+
+    links = _Links(find, union, close)
+    wide: GridIndex[int] = GridIndex(
+        max(threshold_km * _WIDE_CELL_FACTOR, _MIN_CELL_KM)
+    )
+    cells = _bucket(wide, coordinates)
+    ahead = {
+        cell: [
+            other
+            for other in wide.cells_around(cell, threshold_km, cells)
+            if other > cell
+        ]
+        for cell in cells
+    }
+    pairs = sum(
+        len(members) * (len(members) + sum(len(cells[o]) for o in ahead[cell]))
+        for cell, members in cells.items()
+    )
+    if pairs <= pair_budget * n:
+        _link_pairs(coordinates, threshold_km, cells, ahead, links)
+    else:
+        _link_cells(coordinates, threshold_km, links)
+    return [find(i) for i in range(n)]
+
+
+class _Links(NamedTuple):
+    """The union-find and distance test shared by both linking passes."""
+
+    find: Callable[[int], int]
+    union: Callable[[int, int], None]
+    close: Callable[[int, int], bool]
+
+
+def _bucket(
+    grid: GridIndex[int], coordinates: Sequence[tuple[float, float]]
+) -> dict[Cell, list[int]]:
+    cells: dict[Cell, list[int]] = {}
+    for i, (lat, lon) in enumerate(coordinates):
+        cells.setdefault(grid.cell_of(lat, lon), []).append(i)
+    return cells
+
+
+def _link_pairs(
+    coordinates: Sequence[tuple[float, float]],
+    threshold_km: float,
+    cells: dict[Cell, list[int]],
+    ahead: dict[Cell, list[Cell]],
+    links: _Links,
+) -> None:
+    """Sparse input: compare each point of a cell with its cell and the
+    cells ahead of it, in one flat loop and without per-cell bookkeeping.
+
+    A latitude difference is never more than the angular distance, so the
+    cell's block is sorted by latitude and each point only scans the slice
+    within ``threshold_km`` of its own latitude (pairs inside one cell are
+    seen from both ends, which is harmless).
+    """
+    find, union = links.find, links.union
+    lat_gap = degrees(threshold_km / EARTH_RADIUS_KM) * (1 + _LAT_PAD) + _LAT_PAD
+    sure, maybe = chord_sq_bounds(threshold_km)
+    lats = [lat for lat, _ in coordinates]
+    units = [unit_vector(lat, lon) for lat, lon in coordinates]
+    for cell, members in cells.items():
+        block = sorted(
+            members + [j for other in ahead[cell] for j in cells[other]],
+            key=lats.__getitem__,
+        )
+        block_lats = [lats[j] for j in block]
+        for i in members:
+            lat = lats[i]
+            x, y, z = units[i]
+            lo = bisect_left(block_lats, lat - lat_gap)
+            hi = bisect_right(block_lats, lat + lat_gap, lo)
+            root = find(i)
+            for j in block[lo:hi]:
+                xj, yj, zj = units[j]
+                chord_sq = (x - xj) ** 2 + (y - yj) ** 2 + (z - zj) ** 2
+                if (
+                    chord_sq < sure
+                    or (
+                        chord_sq <= maybe
+                        and haversine_distance(*coordinates[i], *coordinates[j])
+                        <= threshold_km
+                    )
+                ) and find(j) != root:
+                    union(i, j)
+                    root = find(i)
+
+
+def _link_cells(
+    coordinates: Sequence[tuple[float, float]], threshold_km: float, links: _Links
+) -> None:
+    """Dense input: cells half the threshold wide, merged as cliques."""
+    find, union, close = links
+    grid: GridIndex[int] = GridIndex(max(threshold_km / 2, _MIN_CELL_KM))
+    cells = _bucket(grid, coordinates)
+    # 1. Inside each cell: cliques merge outright, others compare pairs. A
+    #    clique cell ends up with a single root, which lets step 2 compare it
+    #    with another cell by one ``find`` each.
+    clique_rows: dict[int, bool] = {}
+    single_root: set[Cell] = set()
+    for cell, members in cells.items():
+        row = cell[0]
+        if row not in clique_rows:
+            clique_rows[row] = _is_clique(grid, cell, threshold_km)
+        if clique_rows[row] or len(members) == 1:
+            for j in members[1:]:
+                union(members[0], j)
+            single_root.add(cell)
+            continue
+        for a, i in enumerate(members):
+            for j in members[a + 1 :]:
+                if find(i) != find(j) and close(i, j):
+                    union(i, j)
+
+    # 2. Across cells: adjacent cells first, so most farther pairs are already
+    #    joined by then and are skipped without a distance test.
+    def link(cell: Cell, other: Cell) -> None:
+        mine, theirs = cells[cell], cells[other]
+        if cell in single_root and other in single_root:
+            if find(mine[0]) == find(theirs[0]):
+                return  # already joined: no distance test needed
+            hit = next(((i, j) for i in mine for j in theirs if close(i, j)), None)
+            if hit is not None:
+                union(*hit)
+            return
+        for i_group in _by_root(mine, find):
+            for j_group in _by_root(theirs, find):
+                if find(i_group[0]) == find(j_group[0]):
+                    continue
+                hit = next(
+                    ((i, j) for i in i_group for j in j_group if close(i, j)), None
+                )
+                if hit is not None:
+                    union(*hit)
+
+    farther: list[tuple[Cell, Cell]] = []
+    for cell in cells:
+        row, col = cell
+        for other in grid.cells_around(cell, threshold_km, cells):
+            if other <= cell:
+                continue  # each unordered pair once
+            if other[0] - row <= 1 and abs(other[1] - col) <= 1:
+                link(cell, other)
+            else:
+                farther.append((cell, other))
+    for cell, other in farther:
+        link(cell, other)
+
+
+def _by_root(members: list[int], find: Callable[[int], int]) -> list[list[int]]:
+    """Split ``members`` by their current union-find root."""
+    groups: dict[int, list[int]] = {}
+    for i in members:
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+def _is_clique(grid: GridIndex[K], cell: Cell, threshold_km: float) -> bool:
+    """Whether any two points of ``cell`` are guaranteed to be in range."""
+    if threshold_km > _CLIQUE_MAX_KM:
+        return False
+    lat_lo, lon_lo, lat_hi, lon_hi = grid.cell_bounds(cell)
+    diagonal = max(
+        haversine_distance(lat_lo, lon_lo, lat_hi, lon_hi),
+        haversine_distance(lat_hi, lon_lo, lat_lo, lon_hi),
+    )
+    return diagonal <= threshold_km * _CLIQUE_MARGIN
+
+
+class IncrementalClusters(Generic[K]):
+    """Single-linkage clusters maintained one point at a time.
+
+    Equivalent to re-running :func:`cluster_points` after every change, but an
+    :meth:`add` only looks at the cells around the new point and a
+    :meth:`remove` only touches the removed point's own component.
+    """
+
+    def __init__(self, threshold_km: float) -> None:
+        self.threshold_km = threshold_km
+        self._sure, self._maybe = chord_sq_bounds(threshold_km)
+        self._index: GridIndex[K] = GridIndex(max(threshold_km, _MIN_CELL_KM))
+        self._coords: dict[K, tuple[float, float]] = {}
+        self._units: dict[K, Vec3] = {}
+        self._label: dict[K, int] = {}
+        self._members: dict[int, set[K]] = {}
+        self._labels = count()
+
+    def __len__(self) -> int:
+        return len(self._coords)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._coords
+
+    # ------------------------------------------------------------------ #
+    # Queries
+    # ------------------------------------------------------------------ #
+    def cluster_of(self, key: K) -> set[K]:
+        """The members of ``key``'s cluster (a live view; do not mutate)."""
+        return self._members[self._label[key]]
+
+    def clusters(self) -> list[set[K]]:
+        """Every cluster, as live member sets."""
+        return list(self._members.values())
+
+    # ------------------------------------------------------------------ #
+    # Mutators
+    # ------------------------------------------------------------------ #
+    def add(self, key: K, lat: float, lon: float) -> None:
+        """Insert ``key`` and merge every cluster it now links. Re-adding moves."""
+        if key in self._coords:
+            self.remove(key)
+        self._coords[key] = (lat, lon)
+        self._units[key] = unit_vector(lat, lon)
+        self._index.insert(key, lat, lon)
+        label = next(self._labels)
+        self._label[key] = label
+        self._members[label] = {key}
+        for other in self._near(key, None):
+            if self._label[other] != self._label[key]:
+                self._merge(self._label[key], self._label[other])
+
+    def remove(self, key: K) -> bool:
+        """Drop ``key``; split its cluster only if it was a bridge."""
+        if key not in self._coords:
+            return False
+        former = list(self._near(key, None))  # all in key's own component
+        label = self._label.pop(key)
+        component = self._members[label]
+        component.discard(key)
+        self._index.remove(key)
+        del self._coords[key], self._units[key]
+        if not component:
+            del self._members[label]
+            return True
+
+        if not former:  # unreachable for a connected component; be safe
+            self._relabel(component)
+            del self._members[label]
+            return True
+
+        # Search from one former neighbor until all of them are reached.
+        pending = set(former)
+        start = former[0]
+        seen = {start}
+        frontier = [start]
+        pending.discard(start)
+        while frontier and pending:
+            for other in self._near(frontier.pop(), component):
+                if other not in seen:
+                    seen.add(other)
+                    pending.discard(other)
+                    frontier.append(other)
+        if pending:
+            self._relabel(component)
+            del self._members[label]
+        return True
+
+    def _near(self, key: K, within: set[K] | None) -> Iterable[K]:
+        """Keys in range of ``key`` (optionally restricted to ``within``)."""
+        lat, lon = self._coords[key]
+        unit = self._units[key]
+        for other in self._index.candidates(lat, lon, self.threshold_km):
+            if other == key or (within is not None and other not in within):
+                continue
+            chord_sq = _chord_sq(unit, self._units[other])
+            if chord_sq < self._sure or (
+                chord_sq <= self._maybe
+                and haversine_distance(lat, lon, *self._coords[other])
+                <= self.threshold_km
+            ):
+                yield other
+
+    def _merge(self, a: int, b: int) -> None:
+        if len(self._members[a]) < len(self._members[b]):
+            a, b = b, a
+        moved = self._members.pop(b)
+        for key in moved:
+            self._label[key] = a
+        self._members[a] |= moved
+
+    def _relabel(self, component: set[K]) -> None:
+        """Split ``component`` into its connected pieces under fresh labels."""
+        unvisited = set(component)
+        while unvisited:
+            label = next(self._labels)
+            root = unvisited.pop()
+            piece = {root}
+            frontier = [root]
+            while frontier:
+                for other in self._near(frontier.pop(), unvisited):
+                    unvisited.discard(other)
+                    piece.add(other)
+                    frontier.append(other)
+            for key in piece:
+                self._label[key] = label
+            self._members[label] = piece
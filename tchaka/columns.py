@@ -0,0 +1,82 @@
+"""Struct-of-arrays coordinate storage for vectorized neighbor queries.
+
+:class:`CoordColumns` keeps every registered coordinate in two parallel
+``float64`` arrays plus a ``slot -> user_id`` list, so one radius query is a
+single :func:`~tchaka.geo.haversine_many` pass over contiguous memory instead of
+a Python loop over records. Removal swaps the last slot into the freed one, so
+the live slots are always the dense prefix ``[0, len)``.
+
+Requires NumPy (an optional dependency); :class:`AppState` only builds a
+column store when :data:`~tchaka.geo.HAS_NUMPY` is true and otherwise keeps the
+pure-Python path.
+"""
+
+from __future__ import annotations
+
+from tchaka.geo import haversine_many
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None  # type: ignore[assignment]
+
+__all__ = ["CoordColumns"]
+
+_INITIAL_CAPACITY = 1024
+
+
+class CoordColumns:
+    """Parallel lat/lon arrays with a dense slot map."""
+
+    def __init__(self, capacity: int = _INITIAL_CAPACITY) -> None:
+        if np is None:
+            raise RuntimeError("CoordColumns requires numpy (pip install numpy)")
+        self._lats = np.empty(max(capacity, 1), dtype=np.float64)
+        self._lons = np.empty(max(capacity, 1), dtype=np.float64)
+        self._slot_ids: list[str] = []
+        self._slots: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._slot_ids)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._slots
+
+    def insert(self, key: str, lat: float, lon: float) -> None:
+        """Store ``key`` at ``(lat, lon)``; re-inserting a key overwrites it."""
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = len(self._slot_ids)
+            if slot == len(self._lats):
+                self._grow()
+            self._slot_ids.append(key)
+            self._slots[key] = slot
+        self._lats[slot] = lat
+        self._lons[slot] = lon
+
+    def remove(self, key: str) -> bool:
+        """Drop ``key`` by moving the last slot into its place (O(1))."""
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return False
+        last = len(self._slot_ids) - 1
+        last_key = self._slot_ids.pop()
+        if slot != last:
+            self._lats[slot] = self._lats[last]
+            self._lons[slot] = self._lons[last]
+            self._slot_ids[slot] = last_key
+            self._slots[last_key] = slot
+        return True
+
+    def within(self, lat: float, lon: float, radius_km: float) -> list[str]:
+        """Keys whose great-circle distance to ``(lat, lon)`` is <= the radius."""
+        n = len(self._slot_ids)
+        if n == 0:
+            return []
+        dist = haversine_many(lat, lon, self._lats[:n], self._lons[:n])
+        return [self._slot_ids[i] for i in np.flatnonzero(dist <= radius_km)]
+
+    def _grow(self) -> None:
+        size = len(self._lats) * 2
+        self._lats = np.resize(self._lats, size)
+        self._lons = np.resize(self._lons, size)
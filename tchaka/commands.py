@@ -2,52 +2,83 @@
 
 These callbacks are intentionally thin: they parse the ``Update``, do fast
 in-memory work under ``STATE.lock``, snapshot any recipient list, release the
-lock, then perform Telegram I/O. They contain no geospatial math (that lives in
-:mod:`tchaka.core` / :mod:`tchaka.geo`).
-
-Runtime singletons (``STATE``, ``SETTINGS``, ``CLOCK``) are initialized by
-:mod:`tchaka.main` via :func:`configure`. Tests may call :func:`configure`
-directly with a :class:`FakeClock` and a custom :class:`Settings`.
+lock, then perform Telegram I/O. Tracking the id of a reply afterwards is a
+single state call and takes no lock (see :mod:`tchaka.state`). They contain no
+geospatial math (that lives in :mod:`tchaka.core` / :mod:`tchaka.geo`).
+
+With a :class:`~tchaka.actor.StateActor` configured (``ACTOR``), the locked
+blocks run on the actor instead (:func:`_apply`), and touches and tracked ids
+are queued to it without waiting (:func:`_touch`, :func:`_track`).
+
+With a :class:`~tchaka.ingest.Batcher` configured (``JOINS``), the first
+locations of new users are registered and announced in batches
+(:func:`register_arrivals`).
+
+The relay, /check and join fan-outs find the users around through
+``BACKEND`` (:mod:`tchaka.backend`), by default a
+:class:`~tchaka.backend.MemoryBackend` over ``STATE`` whose calls never
+suspend. A ``shared`` backend (Redis) also holds other replicas' users: the
+registrations, moves, ranges and departures of this process's users are
+published to it (:func:`_share`) once ``STATE`` has them.
+
+Runtime singletons (``STATE``, ``SETTINGS``, ``CLOCK``, ``ACTOR``, ``JOINS``,
+``BACKEND``) are initialized by :mod:`tchaka.main` via :func:`configure`. Tests may call
+:func:`configure` directly with a :class:`FakeClock` and a custom
+:class:`Settings`.
 """
 
 from __future__ import annotations
 
+import asyncio
 import html
 import json
 import logging
 import traceback
+from collections.abc import Callable
+from typing import NamedTuple, TypeVar
 
-from telegram import Update
+from telegram import Bot, Update
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
+from tchaka.actor import StateActor
+from tchaka.backend import MemoryBackend, StateBackend
 from tchaka.config import LANG_MESSAGES, Settings, load_settings
 from tchaka.core import (
+    NEAREST_K,
     build_reply_excerpt,
     cleanup_messages,
-    count_nearby,
+    distance_bucket,
     format_relay_body,
+    join_notices,
     notify_group_join,
+    notify_group_joins,
     register_user,
+    register_users,
     relay_message,
 )
-from tchaka.state import AppState, Coord
+from tchaka.ingest import Batcher
+from tchaka.state import AppState, Coord, UserRecord
 from tchaka.utils import (
     Clock,
     SystemClock,
-    build_user_hash,
     build_welcome_location_message_for_current_user,
     get_user_and_message,
     html_format_text,
 )
 
 _LOGGER = logging.getLogger(__name__)
+T = TypeVar("T")
 
 # Runtime singletons (configured at startup). Defaults let tests import the
 # module without a real token; main.py calls configure() with loaded settings.
 STATE: AppState = AppState()
 CLOCK: Clock = SystemClock()
 SETTINGS: Settings | None = None
+ACTOR: StateActor | None = None  # None: writes take STATE.lock
+# Batches newcomers' registrations (register_arrivals); None: one at a time.
+JOINS: Batcher[Arrival, Placement] | None = None
+BACKEND: StateBackend = MemoryBackend(STATE)  # the population the fan-outs see
 
 
 def configure(
@@ -55,15 +86,66 @@ def configure(
     state: AppState | None = None,
     settings: Settings | None = None,
     clock: Clock | None = None,
+    actor: StateActor | None = None,
+    joins: Batcher[Arrival, Placement] | None = None,
+    backend: StateBackend | None = None,
 ) -> None:
-    """Wire the module-level singletons. Called by main.py and tests."""
-    global STATE, SETTINGS, CLOCK
+    """Wire the module-level singletons. Called by main.py and tests.
+
+    A new ``state`` comes with a :class:`MemoryBackend` over it, unless a
+    ``backend`` is given too.
+    """
+    global STATE, SETTINGS, CLOCK, ACTOR, JOINS, BACKEND
     if state is not None:
         STATE = state
+        BACKEND = MemoryBackend(state)
+        reset_live_locations()  # held for the previous state's users
     if settings is not None:
         SETTINGS = settings
     if clock is not None:
         CLOCK = clock
+    if actor is not None:
+        ACTOR = actor
+    if joins is not None:
+        JOINS = joins
+    if backend is not None:
+        BACKEND = backend
+
+
+async def _apply(fn: Callable[[AppState], T]) -> T:
+    """Run the read-modify-write ``fn(STATE)`` on the actor, or under the lock."""
+    if ACTOR is not None:
+        return await ACTOR.call(fn)
+    async with STATE.lock:
+        return fn(STATE)
+
+
+def _touch(user_id: str, now: float) -> None:
+    if ACTOR is not None:
+        ACTOR.touch(user_id, now)
+    else:
+        STATE.touch(user_id, now)
+
+
+def _track(chat_id: int, message_id: int) -> None:
+    if ACTOR is not None:
+        ACTOR.track(chat_id, message_id)
+    else:
+        STATE.track_message(chat_id, message_id)
+
+
+async def _share(rec: UserRecord) -> bool:
+    """Publish ``rec`` (new, moved or re-ranged) to the shared ``BACKEND``.
+
+    False if another replica holds its id or chat there: the user then stays
+    local to this process.
+    """
+    try:
+        await BACKEND.register(rec)
+    except ValueError as exc:
+        _LOGGER.warning("user %s not shared: %s", rec.user_id, exc)
+        return False
+    return True
 
 
 def _settings() -> Settings:
@@ -74,6 +156,11 @@ def _settings() -> Settings:
     return SETTINGS
 
 
+def _fanout_limit() -> int | None:
+    """The recipient cap for one relay or join notification (None: no cap)."""
+    return _settings().max_fanout or None
+
+
 def _lang(language_code: str | None) -> dict[str, str]:
     return LANG_MESSAGES.get(language_code or "en", LANG_MESSAGES["en"])
 
@@ -82,66 +169,131 @@ async def start_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None
     """Greet the user and record the inbound + reply message ids."""
     user, message = await get_user_and_message(update)
 
-    async with STATE.lock:
-        rec = STATE.user_for_chat(message.chat_id)
-        if rec is not None:
-            STATE.touch(rec.user_id, CLOCK.now())
-        STATE.track_message(message.chat_id, message.message_id)
+    # Two single writes: no lock (see tchaka.state), nothing to wait for.
+    rec = STATE.user_for_chat(message.chat_id)
+    if rec is not None:
+        _touch(rec.user_id, CLOCK.now())
+    _track(message.chat_id, message.message_id)
 
     welcome_message = _lang(user.language_code)["WELCOME_MESSAGE"]
     sent = await message.reply_text(text=html_format_text(welcome_message))
-    async with STATE.lock:
-        STATE.track_message(message.chat_id, sent.message_id)
+    _track(message.chat_id, sent.message_id)
     _LOGGER.info("/start :: chat_id=%s", message.chat_id)
 
 
 async def check_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
-    """Report how many other users are within the configured range."""
+    """Report how many other users are within range, and coarse distance
+    buckets (never exact distances) of the nearest few."""
     user, message = await get_user_and_message(update)
     lang = _lang(user.language_code)
     threshold = _settings().distance_threshold_km
 
-    async with STATE.lock:
-        STATE.track_message(message.chat_id, message.message_id)
-        rec = STATE.user_for_chat(message.chat_id)
-        if rec is None:
-            reply_text = lang["CHECK_NOT_REGISTERED"]
+    # Read path: the default backend never suspends, so no lock (see
+    # tchaka.state).
+    _track(message.chat_id, message.message_id)
+    rec = STATE.user_for_chat(message.chat_id)
+    if rec is None:
+        reply_text = lang["CHECK_NOT_REGISTERED"]
+    else:
+        _touch(rec.user_id, CLOCK.now())
+        count = await BACKEND.count_neighbors(rec.user_id, threshold)
+        if count == 0:
+            reply_text = lang["CHECK_ALONE"]
         else:
-            STATE.touch(rec.user_id, CLOCK.now())
-            count = count_nearby(STATE, rec.user_id, threshold)
-            reply_text = (
-                lang["CHECK_ALONE"]
-                if count == 0
-                else lang["CHECK_RESULT"].format(n=count)
+            nearest = await BACKEND.nearest(rec.user_id, NEAREST_K, threshold)
+            buckets = [distance_bucket(km) for km, _ in nearest]
+            reply_text = "\n".join(
+                (
+                    lang["CHECK_RESULT"].format(n=count),
+                    lang["CHECK_NEAREST"].format(buckets=", ".join(buckets)),
+                )
             )
 
     sent = await message.reply_text(text=html_format_text(reply_text))
-    async with STATE.lock:
-        STATE.track_message(message.chat_id, sent.message_id)
+    _track(message.chat_id, sent.message_id)
     _LOGGER.info("/check :: chat_id=%s", message.chat_id)
 
 
+_RANGE_RESET_WORDS = frozenset({"reset", "off", "default"})
+
+
+async def range_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show, narrow, or reset the user's own radius (``/range [km|reset]``).
+
+    The override is capped by the configured range and applies mutually: two
+    users only see each other when each is within the other's radius.
+    """
+    user, message = await get_user_and_message(update)
+    lang = _lang(user.language_code)
+    threshold = _settings().distance_threshold_km
+    arg = ctx.args[0].strip().lower() if ctx.args else None
+
+    def update_range(state: AppState) -> str:
+        state.track_message(message.chat_id, message.message_id)
+        rec = state.user_for_chat(message.chat_id)
+        if rec is None:
+            return lang["CHECK_NOT_REGISTERED"]
+        state.touch(rec.user_id, CLOCK.now())
+        key = "RANGE_CURRENT"
+        if arg in _RANGE_RESET_WORDS:
+            state.set_range(rec.user_id, None)
+            key = "RANGE_SET"
+        elif arg is not None:
+            km = _parse_range(arg, state.max_range(threshold))
+            if km is None:
+                key = "RANGE_INVALID"
+            else:
+                state.set_range(rec.user_id, km)
+                key = "RANGE_SET"
+        return lang[key].format(
+            km=state.effective_range(rec, threshold),
+            max=state.max_range(threshold),
+        )
+
+    reply_text = await _apply(update_range)
+    if BACKEND.shared and arg is not None:
+        rec = STATE.user_for_chat(message.chat_id)
+        if rec is not None:
+            await _share(rec)
+    sent = await message.reply_text(text=html_format_text(reply_text))
+    _track(message.chat_id, sent.message_id)
+    _LOGGER.info("/range :: chat_id=%s", message.chat_id)
+
+
+def _parse_range(raw: str, max_km: float) -> float | None:
+    """A positive kilometre value up to ``max_km``, or ``None`` if ``raw`` is
+    not one (as ``RANGE_INVALID`` tells the user)."""
+    try:
+        km = float(raw.removesuffix("km"))
+    except ValueError:
+        return None
+    return km if 0 < km <= max_km else None
+
+
 async def stop_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
     """Remove the user from all state and purge their tracked messages."""
     _, message = await get_user_and_message(update)
 
-    async with STATE.lock:
-        STATE.track_message(message.chat_id, message.message_id)
-        rec = STATE.remove_by_chat(message.chat_id)
-        if rec is None:
-            msg = "Not in the current chat flow, bot stopped."
-            msg_ids: set[int] = STATE.pop_tracked(message.chat_id)
-            given_user_name = f"chat_id {message.chat_id}"
-        else:
-            given_user_name = rec.user_id
-            msg = (
-                f"Thanks using tchaka {rec.user_id}, bot stopped.\n"
-                "All messages are going to be deleted."
-            )
-            msg_ids = STATE.pop_tracked(message.chat_id)
+    def remove(state: AppState) -> tuple[UserRecord | None, list[int]]:
+        state.track_message(message.chat_id, message.message_id)
+        rec = state.remove_by_chat(message.chat_id)
+        return rec, state.pop_tracked(message.chat_id)
+
+    rec, msg_ids = await _apply(remove)
+    if rec is not None and BACKEND.shared:
+        await BACKEND.remove_by_chat(message.chat_id)
+    if rec is None:
+        msg = "Not in the current chat flow, bot stopped."
+        given_user_name = f"chat_id {message.chat_id}"
+    else:
+        given_user_name = rec.user_id
+        msg = (
+            f"Thanks using tchaka {rec.user_id}, bot stopped.\n"
+            "All messages are going to be deleted."
+        )
 
     sent = await message.reply_text(text=html_format_text(msg))
-    msg_ids.add(sent.message_id)
+    msg_ids.append(sent.message_id)
 
     await cleanup_messages(ctx.bot, message.chat_id, msg_ids)
     _LOGGER.info("/stop :: %s", given_user_name)
@@ -151,34 +303,36 @@ async def help_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
     """Reply with the localized help message."""
     user, message = await get_user_and_message(update)
 
-    async with STATE.lock:
-        rec = STATE.user_for_chat(message.chat_id)
-        if rec is not None:
-            STATE.touch(rec.user_id, CLOCK.now())
-        STATE.track_message(message.chat_id, message.message_id)
+    rec = STATE.user_for_chat(message.chat_id)
+    if rec is not None:
+        _touch(rec.user_id, CLOCK.now())
+    _track(message.chat_id, message.message_id)
 
     help_message = _lang(user.language_code)["HELP_MESSAGE"]
     sent = await message.reply_text(text=html_format_text(help_message))
-    async with STATE.lock:
-        STATE.track_message(message.chat_id, sent.message_id)
+    _track(message.chat_id, sent.message_id)
     _LOGGER.info("/help :: chat_id=%s", message.chat_id)
 
 
 async def echo_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
-    """Relay a text message to everyone within the sender's range."""
+    """Relay a text message to everyone within the sender's range.
+
+    Past the fan-out cap only the nearest recipients get it, nearest first.
+    """
     _, message = await get_user_and_message(update)
     threshold = _settings().distance_threshold_km
     max_chars = _settings().max_relay_chars
 
-    async with STATE.lock:
-        rec = STATE.user_for_chat(message.chat_id)
-        if rec is None:
-            # not registered -> do nothing
-            _LOGGER.info("/echo :: unregistered chat_id=%s", message.chat_id)
-            return
-        STATE.touch(rec.user_id, CLOCK.now())
-        recipients = [n.chat_id for n in STATE.neighbors(rec.user_id, threshold)]
-        sender_id = rec.user_id
+    # Read path: the default backend takes the snapshot without suspending,
+    # so without the lock.
+    rec = STATE.user_for_chat(message.chat_id)
+    if rec is None:
+        # not registered -> do nothing
+        _LOGGER.info("/echo :: unregistered chat_id=%s", message.chat_id)
+        return
+    _touch(rec.user_id, CLOCK.now())
+    recipients = await BACKEND.recipients(rec.user_id, threshold, limit=_fanout_limit())
+    sender_id = rec.user_id
 
     if not recipients:
         return
@@ -190,47 +344,318 @@ async def echo_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
     _LOGGER.info("/echo :: sender=%s recipients=%d", sender_id, len(recipients))
 
 
+# Location updates still being handled. With a join window they run as
+# non-blocking handler tasks, which the update queue does not wait for, so a
+# handoff waits for them here (drain_locations).
+_LOCATING: set[asyncio.Task[None]] = set()
+
+
 async def location_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
-    """Register a new user from their location and notify nearby users."""
+    """Register a new user from their location and notify nearby users.
+
+    A location from an already registered user moves them instead (see
+    :func:`live_location_callback`); only the users newly in range are
+    notified.
+    """
+    task = asyncio.current_task()
+    if task is not None:
+        _LOCATING.add(task)
+    try:
+        await _locate(update, ctx)
+    finally:
+        _LOCATING.discard(task)  # type: ignore[arg-type]
+
+
+async def drain_locations() -> None:
+    """Wait until no location update is being handled (before a handoff)."""
+    while _LOCATING:
+        await asyncio.wait(set(_LOCATING))
+
+
+async def _locate(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> None:
     user, message = await get_user_and_message(update)
     threshold = _settings().distance_threshold_km
 
     if (location := message.location) is None:
         raise ValueError("Location unable to be extracted")
+    coord = Coord(location.latitude, location.longitude)
 
-    user_new_name = await build_user_hash(user.full_name)
-
-    async with STATE.lock:
-        if STATE.user_for_chat(message.chat_id) is not None:
-            return  # already tracked (idempotent)
-        rec = register_user(
-            STATE,
-            user_id=user_new_name,
-            chat_id=message.chat_id,
-            coord=Coord(location.latitude, location.longitude),
-            lang=user.language_code or "en",
-            clock=CLOCK,
+    def place(state: AppState) -> tuple[UserRecord, list[int], int, bool]:
+        rec = state.user_for_chat(message.chat_id)
+        joined = rec is None
+        if rec is None:
+            rec = register_user(
+                state,
+                user_id=state.allocate_user_id(),
+                chat_id=message.chat_id,
+                coord=coord,
+                lang=user.language_code or "en",
+                clock=CLOCK,
+            )
+            recipients = state.recipients(rec.user_id, threshold, limit=_fanout_limit())
+        else:
+            now = CLOCK.now()
+            state.touch(rec.user_id, now)
+            rec.moved_ts = now
+            recipients = state.move(
+                rec.user_id, coord, threshold, limit=_fanout_limit()
+            )
+            _drop_live(message.chat_id)  # a newer position
+        state.track_message(message.chat_id, message.message_id)
+        count = state.count_neighbors(rec.user_id, threshold)
+        return rec, recipients, count, joined
+
+    if JOINS is not None and STATE.user_for_chat(message.chat_id) is None:
+        # A newcomer: registered and announced with the rest of its window.
+        placement = await JOINS.submit(
+            Arrival(
+                ctx.bot,
+                message.chat_id,
+                message.message_id,
+                coord,
+                user.language_code or "en",
+            )
+        )
+        if placement is None:
+            _LOGGER.error("/location :: chat %s not registered", message.chat_id)
+            return
+        rec, count = placement
+    else:
+        rec, recipients, count, joined = await _apply(place)
+        if BACKEND.shared and await _share(rec):
+            # The other replicas' users count too; a move still only notifies
+            # the users of this process newly in range.
+            if joined:
+                recipients = await BACKEND.recipients(
+                    rec.user_id, threshold, limit=_fanout_limit()
+                )
+            count = await BACKEND.count_neighbors(rec.user_id, threshold)
+        await notify_group_join(
+            ctx.bot, STATE, new_user=rec, recipients_snapshot=recipients
         )
-        STATE.track_message(message.chat_id, message.message_id)
-        recipients = [n.chat_id for n in STATE.neighbors(rec.user_id, threshold)]
-        count = len(recipients)
-
-    await notify_group_join(
-        ctx.bot, STATE, new_user=rec, recipients_snapshot=recipients
-    )
 
     sent = await message.reply_markdown(
         text=html_format_text(
             build_welcome_location_message_for_current_user(
-                user_new_name,
+                rec.user_id,
                 count,
                 user.language_code or "en",
             )
         )
     )
-    async with STATE.lock:
-        STATE.track_message(message.chat_id, sent.message_id)
-    _LOGGER.info("/location :: user=%s neighbors=%d", user_new_name, count)
+    _track(message.chat_id, sent.message_id)
+    _LOGGER.info("/location :: user=%s neighbors=%d", rec.user_id, count)
+
+
+class Arrival(NamedTuple):
+    """A new user's first location, waiting for its batch (see ``JOINS``)."""
+
+    bot: Bot
+    chat_id: int
+    message_id: int
+    coord: Coord
+    lang: str
+
+
+# A newcomer's record and neighbor count once its batch is registered (None:
+# its chat is not registered after all).
+Placement = tuple[UserRecord, int] | None
+
+
+async def register_arrivals(arrivals: list[Arrival]) -> list[Placement]:
+    """Flush of ``JOINS``: register one window of newcomers together and
+    notify each neighbor once; returns each arrival's record and neighbor
+    count. A chat that sent several locations is placed at the last one."""
+    threshold = _settings().distance_threshold_km
+    latest = {arrival.chat_id: arrival for arrival in arrivals}
+
+    def place_all(
+        state: AppState,
+    ) -> tuple[list[UserRecord], dict[int, list[str]], list[Placement]]:
+        newcomers = register_users(
+            state,
+            ((a.chat_id, a.coord, a.lang) for a in latest.values()),
+            clock=CLOCK,
+        )
+        state.track_many([(a.chat_id, a.message_id) for a in arrivals])
+        notices = join_notices(state, newcomers, threshold, limit=_fanout_limit())
+        placed: list[Placement] = []
+        for arrival in arrivals:
+            rec = state.user_for_chat(arrival.chat_id)
+            # Registered above, or before; None tells the caller otherwise.
+            placed.append(
+                None
+                if rec is None
+                else (rec, state.count_neighbors(rec.user_id, threshold))
+            )
+        return newcomers, notices, placed
+
+    newcomers, notices, placed = await _apply(place_all)
+    if BACKEND.shared:
+        notices, placed = await _share_arrivals(newcomers, placed, threshold)
+    await notify_group_joins(arrivals[0].bot, STATE, notices)
+    _LOGGER.info(
+        "/location :: batch of %d newcomer(s), %d notified",
+        len(latest),
+        len(notices),
+    )
+    return placed
+
+
+async def _share_arrivals(
+    newcomers: list[UserRecord], placed: list[Placement], threshold: float
+) -> tuple[dict[int, list[str]], list[Placement]]:
+    """:func:`register_arrivals` over the shared ``BACKEND``: publish the
+    newcomers one by one, each announced to the users there before it (as
+    :func:`~tchaka.core.join_notices` does), and count their neighbors there."""
+    notices: dict[int, list[str]] = {}
+    for rec in newcomers:
+        if not await _share(rec):
+            continue
+        limit = _fanout_limit()
+        for chat_id in await BACKEND.recipients(rec.user_id, threshold, limit=limit):
+            notices.setdefault(chat_id, []).append(rec.user_id)
+    counts: dict[str, int] = {}
+    shared: list[Placement] = []
+    for placement in placed:
+        if placement is not None:
+            rec = placement[0]
+            if rec.user_id not in counts:
+                counts[rec.user_id] = await BACKEND.count_neighbors(
+                    rec.user_id, threshold
+                )
+            placement = rec, counts[rec.user_id]
+        shared.append(placement)
+    return notices, shared
+
+
+async def live_location_callback(
+    update: Update, ctx: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Follow a live location: move the user, notify the newly-in-range.
+
+    Telegram delivers live locations as a stream of edits to the original
+    location message. Moves are debounced per user (at most one every
+    ``live_debounce_seconds``): an edit inside the window still counts as
+    activity, and the latest one is held and applied when the window ends, so
+    a user who stops moving ends up at their last position. Edits from
+    unregistered chats (e.g. after /stop) are ignored.
+    """
+    _, message = await get_user_and_message(update, edited=True)
+    if (location := message.location) is None:
+        return
+    coord = Coord(location.latitude, location.longitude)
+    await _follow_live(ctx.bot, message.chat_id, coord)
+
+
+# Live positions held back by the debounce, per chat: the latest one and the
+# timer that applies it when the window ends (_flush_live). Only touched from
+# the state pass of a move, so holding and superseding never interleave.
+class _Held(NamedTuple):
+    bot: Bot
+    coord: Coord
+    timer: asyncio.TimerHandle
+
+
+_LIVE_PENDING: dict[int, _Held] = {}
+_LIVE_FLUSHES: set[asyncio.Task[None]] = set()
+
+
+async def _follow_live(
+    bot: Bot, chat_id: int, coord: Coord, *, trailing: bool = False
+) -> None:
+    """Apply a live position now, or hold it until the debounce window ends.
+
+    ``trailing`` is the held position of a window that has just ended: it is
+    applied as is, and counts as no new activity.
+    """
+    settings = _settings()
+
+    def follow(state: AppState) -> tuple[UserRecord, list[int]] | None:
+        rec = state.user_for_chat(chat_id)
+        if rec is None:
+            return None
+        now = CLOCK.now()
+        if not trailing:
+            state.touch(rec.user_id, now)
+            if rec.moved_ts is not None:
+                wait = rec.moved_ts + settings.live_debounce_seconds - now
+                if wait > 0:
+                    _hold_live(bot, chat_id, coord, wait)
+                    return None
+            _drop_live(chat_id)  # superseded by this newer position
+        rec.moved_ts = now
+        return rec, state.move(
+            rec.user_id,
+            coord,
+            settings.distance_threshold_km,
+            limit=_fanout_limit(),
+        )
+
+    moved = await _apply(follow)
+    if moved is None:
+        return
+    rec, recipients = moved
+    if BACKEND.shared:
+        await _share(rec)
+    if recipients:
+        await notify_group_join(
+            bot, STATE, new_user=rec, recipients_snapshot=recipients
+        )
+    _LOGGER.debug("/live :: user=%s newly_near=%d", rec.user_id, len(recipients))
+
+
+def _hold_live(bot: Bot, chat_id: int, coord: Coord, delay: float) -> None:
+    held = _LIVE_PENDING.get(chat_id)
+    timer = (
+        asyncio.get_running_loop().call_later(delay, _flush_live, chat_id)
+        if held is None
+        else held.timer
+    )
+    _LIVE_PENDING[chat_id] = _Held(bot, coord, timer)
+
+
+def _drop_live(chat_id: int) -> None:
+    held = _LIVE_PENDING.pop(chat_id, None)
+    if held is not None:
+        held.timer.cancel()
+
+
+def reset_live_locations() -> None:
+    """Forget every held live position (a new state is configured)."""
+    for held in _LIVE_PENDING.values():
+        held.timer.cancel()
+    _LIVE_PENDING.clear()
+
+
+def _flush_live(chat_id: int) -> None:
+    """Timer callback: apply the position held for ``chat_id``, if still
+    pending (a newer location may have replaced it)."""
+    held = _LIVE_PENDING.pop(chat_id, None)
+    if held is None:
+        return
+    bot, coord, _ = held
+    task = asyncio.get_running_loop().create_task(_trail_live(bot, chat_id, coord))
+    _LIVE_FLUSHES.add(task)
+    task.add_done_callback(_LIVE_FLUSHES.discard)
+
+
+async def _trail_live(bot: Bot, chat_id: int, coord: Coord) -> None:
+    try:
+        await _follow_live(bot, chat_id, coord, trailing=True)
+    except Exception:
+        # No update to hand to error_handler: a timer started this move.
+        _LOGGER.exception("Failed to apply the held live location of %s", chat_id)
+
+
+async def flush_live_locations() -> None:
+    """Apply every held live position now, and wait for the flushes already
+    running (before a handoff, so no position is left behind)."""
+    pending = list(_LIVE_PENDING.items())
+    reset_live_locations()
+    for chat_id, (bot, coord, _) in pending:
+        await _trail_live(bot, chat_id, coord)
+    await asyncio.gather(*_LIVE_FLUSHES)
 
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -25,6 +25,25 @@ DEFAULT_IDLE_TTL_SECONDS = 3600
 DEFAULT_SWEEP_INTERVAL_SECONDS = 300
 DEFAULT_MAX_RELAY_CHARS = 500
 DEFAULT_MAX_ERROR_CHARS = 3500  # stays under Telegram's 4096-char hard limit
+DEFAULT_COLUMNAR = False
+DEFAULT_ADJACENCY = False  # neighborhoods recomputed per query
+DEFAULT_LIVE_DEBOUNCE_SECONDS = 15.0
+DEFAULT_ADAPTIVE_K = 0  # density-adaptive ranges off
+DEFAULT_ADAPTIVE_MAX_KM = 50.0
+DISTANCE_MODES = ("chord", "equirect")
+DEFAULT_DISTANCE_MODE = "chord"
+DEFAULT_EQUIRECT_LIMIT_KM = 50.0
+DEFAULT_MAX_FANOUT = 0  # recipients per relay; 0 means no cap
+DEFAULT_MAX_TRACKED_PER_CHAT = 0  # message ids kept per chat; 0 means no cap
+DEFAULT_TRACKED_BUDGET_KB = 0  # memory for all tracked ids; 0 means no cap
+DEFAULT_SHARDS = 1  # worker processes; 1 runs everything in one process
+DEFAULT_STATE_ACTOR = False  # writes take the state lock
+DEFAULT_JOIN_BATCH_SECONDS = 0.0  # newcomers registered one at a time
+BACKENDS = ("memory", "redis")  # where the population lives (tchaka.backend)
+DEFAULT_BACKEND = "memory"
+
+_TRUTHY = frozenset({"1", "true", "yes", "on"})
+_FALSY = frozenset({"0", "false", "no", "off"})
 
 
 @dataclass(frozen=True)
@@ -38,6 +57,23 @@ class Settings:
     sweep_interval_seconds: int
     max_relay_chars: int
     max_error_chars: int
+    columnar: bool = DEFAULT_COLUMNAR
+    adjacency: bool = DEFAULT_ADJACENCY  # materialized neighborhoods (AppState)
+    live_debounce_seconds: float = DEFAULT_LIVE_DEBOUNCE_SECONDS
+    adaptive_k: int = DEFAULT_ADAPTIVE_K
+    adaptive_max_km: float = DEFAULT_ADAPTIVE_MAX_KM
+    zones_file: str | None = None  # GeoJSON venue polygons (tchaka.zones)
+    distance_mode: str = DEFAULT_DISTANCE_MODE  # one of DISTANCE_MODES
+    equirect_limit_km: float = DEFAULT_EQUIRECT_LIMIT_KM
+    max_fanout: int = DEFAULT_MAX_FANOUT
+    max_tracked_per_chat: int = DEFAULT_MAX_TRACKED_PER_CHAT
+    tracked_budget_kb: int = DEFAULT_TRACKED_BUDGET_KB
+    shards: int = DEFAULT_SHARDS  # longitude stripes, one process each
+    state_actor: bool = DEFAULT_STATE_ACTOR  # single-writer actor (tchaka.actor)
+    handoff_socket: str | None = None  # restart handoff socket (tchaka.handoff)
+    join_batch_seconds: float = DEFAULT_JOIN_BATCH_SECONDS  # tchaka.ingest window
+    backend: str = DEFAULT_BACKEND  # one of BACKENDS
+    redis_url: str | None = None  # the shared store of TCHAKA_BACKEND=redis
 
 
 def _get_float(name: str, default: float) -> float:
@@ -62,6 +98,37 @@ def _get_int(name: str, default: int) -> int:
         return default
 
 
+def _get_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    candidate = raw.strip().lower()
+    if candidate in _TRUTHY:
+        return True
+    if candidate in _FALSY:
+        return False
+    _LOGGER.warning("Invalid bool for %s=%r; using default %s", name, raw, default)
+    return default
+
+
+def _get_str(name: str) -> str | None:
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return None
+    return raw.strip()
+
+
+def _get_choice(name: str, default: str, choices: tuple[str, ...]) -> str:
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    candidate = raw.strip().lower()
+    if candidate in choices:
+        return candidate
+    _LOGGER.warning("Invalid value for %s=%r; using default %s", name, raw, default)
+    return default
+
+
 def _parse_developer_chat_id(raw: str | None) -> int | None:
     if raw is None or raw.strip() == "":
         return None
@@ -91,6 +158,35 @@ def load_settings() -> Settings:
         ),
         max_relay_chars=_get_int("TCHAKA_MAX_RELAY_CHARS", DEFAULT_MAX_RELAY_CHARS),
         max_error_chars=_get_int("TCHAKA_MAX_ERROR_CHARS", DEFAULT_MAX_ERROR_CHARS),
+        columnar=_get_bool("TCHAKA_COLUMNAR", DEFAULT_COLUMNAR),
+        adjacency=_get_bool("TCHAKA_ADJACENCY", DEFAULT_ADJACENCY),
+        live_debounce_seconds=_get_float(
+            "TCHAKA_LIVE_DEBOUNCE_SECONDS", DEFAULT_LIVE_DEBOUNCE_SECONDS
+        ),
+        adaptive_k=_get_int("TCHAKA_ADAPTIVE_K", DEFAULT_ADAPTIVE_K),
+        adaptive_max_km=_get_float("TCHAKA_ADAPTIVE_MAX_KM", DEFAULT_ADAPTIVE_MAX_KM),
+        zones_file=_get_str("TCHAKA_ZONES_FILE"),
+        distance_mode=_get_choice(
+            "TCHAKA_DISTANCE_MODE", DEFAULT_DISTANCE_MODE, DISTANCE_MODES
+        ),
+        equirect_limit_km=_get_float(
+            "TCHAKA_EQUIRECT_LIMIT_KM", DEFAULT_EQUIRECT_LIMIT_KM
+        ),
+        max_fanout=max(_get_int("TCHAKA_MAX_FANOUT", DEFAULT_MAX_FANOUT), 0),
+        max_tracked_per_chat=max(
+            _get_int("TCHAKA_MAX_TRACKED_PER_CHAT", DEFAULT_MAX_TRACKED_PER_CHAT), 0
+        ),
+        tracked_budget_kb=max(
+            _get_int("TCHAKA_TRACKED_BUDGET_KB", DEFAULT_TRACKED_BUDGET_KB), 0
+        ),
+        shards=max(_get_int("TCHAKA_SHARDS", DEFAULT_SHARDS), 1),
+        state_actor=_get_bool("TCHAKA_STATE_ACTOR", DEFAULT_STATE_ACTOR),
+        handoff_socket=_get_str("TCHAKA_HANDOFF_SOCKET"),
+        join_batch_seconds=_get_float(
+            "TCHAKA_JOIN_BATCH_SECONDS", DEFAULT_JOIN_BATCH_SECONDS
+        ),
+        backend=_get_choice("TCHAKA_BACKEND", DEFAULT_BACKEND, BACKENDS),
+        redis_url=_get_str("TCHAKA_REDIS_URL"),
     )
 
 
@@ -108,12 +204,14 @@ ne se sauvegardes)""",
         "HELP_MESSAGE": """/start - Pour demarrer.
 /help - Comment cela fonctionne.
 /check - Voir combien de personnes sont autour de vous.
+/range <km> - Réduire votre rayon (/range reset pour revenir au défaut).
 /stop - Pour stoper le bot et cleaner toutes vos infos.
 
 Si vous avez toujours un problème, veuillez contacter le dév
 @sanixdarker.""",
         "CHECK_RESULT": "Il y a {n} personne(s) autour de vous.",
         "CHECK_ALONE": "Personne autour de vous pour le moment.",
+        "CHECK_NEAREST": "Les plus proches : {buckets}.",
         "CHECK_NOT_REGISTERED": (
             "Envoyez d'abord votre localisation pour rejoindre une zone."
         ),
@@ -121,6 +219,11 @@ Si vous avez toujours un problème, veuillez contacter le dév
             "Vous avez été retiré de la zone pour cause d'inactivité. "
             "Renvoyez votre localisation pour revenir."
         ),
+        "RANGE_CURRENT": "Votre rayon est de {km:g} km.",
+        "RANGE_SET": "Votre rayon est maintenant de {km:g} km.",
+        "RANGE_INVALID": (
+            "Usage : /range <km> (plus de 0, au plus {max:g} km), ou /range reset."
+        ),
     },
     "en": {
         "WELCOME_MESSAGE": """Welcome to Tchaka!
@@ -128,6 +231,7 @@ Start by sending your localisation and get guided (No worries, it is anonym and
         "HELP_MESSAGE": """/start - To get started.
 /help - How it works
 /check - See how many people are around you.
+/range <km> - Narrow your radius (/range reset to go back to the default).
 /stop - To Stop the bot and clean all your infos.
 
 If you still have a
@@ -135,10 +239,16 @@ problem, please contact the developer at @sanixdarker.
 """,
         "CHECK_RESULT": "There are {n} person(s) around you.",
         "CHECK_ALONE": "Nobody around you right now.",
+        "CHECK_NEAREST": "Nearest: {buckets}.",
         "CHECK_NOT_REGISTERED": "Send your location first to join an area.",
         "IDLE_EVICTED": (
             "You were removed from the area due to inactivity. "
             "Send your location again to come back."
         ),
+        "RANGE_CURRENT": "Your radius is {km:g} km.",
+        "RANGE_SET": "Your radius is now {km:g} km.",
+        "RANGE_INVALID": (
+            "Usage: /range <km> (above 0, at most {max:g} km), or /range reset."
+        ),
     },
 }
@@ -6,17 +6,26 @@ registration, neighbor counting, join notification, message relay, message
 cleanup, and idle eviction.
 
 Concurrency rules (see design "Concurrency Model"):
-- Every read-modify-write on :class:`AppState` happens while holding
-  ``state.lock``.
+- Every multi-step read-modify-write on :class:`AppState` happens while
+  holding ``state.lock``. A single state call is atomic on the event loop and
+  takes no lock. Fan-outs collect the returned message ids and commit them
+  with one :meth:`AppState.track_many` call per ``TRACK_CHUNK`` sends, so a
+  relay to thousands of chats makes a handful of state calls, none long.
 - Network I/O is **never** performed while holding the lock. Callers snapshot
-  the recipient list under the lock, release it, send, then briefly re-acquire
-  to track the real returned message ids.
+  the recipient list (under the lock, or in one synchronous run of calls),
+  send, then track the real returned message ids.
+- Read paths that never await between their calls (``/check``, the relay
+  recipient snapshot) take no lock: since nothing awaits under the lock, they
+  always see the state between two complete critical sections.
+- Long sweeps hold the lock in batches and yield to the event loop between
+  them, so callbacks keep being served during a large eviction.
 """
 
 from __future__ import annotations
 
 import asyncio
 import logging
+from collections.abc import Iterable, Sequence
 from typing import TYPE_CHECKING
 
 from telegram.constants import ParseMode
@@ -24,6 +33,7 @@ from telegram.error import BadRequest, Forbidden
 
 # Re-export the pure geo helpers so existing imports keep working.
 from tchaka.geo import EARTH_RADIUS_KM, group_coordinates, haversine_distance
+from tchaka.join import JoinStats, self_join_stats
 from tchaka.state import AppState, Coord, UserRecord
 from tchaka.utils import Clock, html_format_text, safe_truncate
 
@@ -35,8 +45,15 @@ __all__ = [
     "haversine_distance",
     "group_coordinates",
     "count_nearby",
+    "distance_bucket",
+    "nearest_buckets",
+    "neighbor_stats",
     "register_user",
+    "register_users",
+    "join_notices",
+    "join_text",
     "notify_group_join",
+    "notify_group_joins",
     "relay_message",
     "cleanup_messages",
     "evict_idle_users",
@@ -45,6 +62,16 @@ __all__ = [
 
 _LOGGER = logging.getLogger(__name__)
 MAX_BAD_REQUEST_ERROR = 10
+# Upper edges of the distance buckets shown by /check. Coarse on purpose: an
+# exact (or fine) distance would let users trilaterate each other.
+NEAREST_BUCKETS_KM = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0)
+NEAREST_K = 3
+# Users evicted per lock hold; the event loop runs other callbacks in between.
+EVICT_BATCH_SIZE = 500
+# Returned message ids committed per state call during a fan-out.
+TRACK_CHUNK = 256
+# Newcomers named in one aggregated join notice; the rest are only counted.
+JOIN_NAMES_SHOWN = 5
 
 
 # --------------------------------------------------------------------------- #
@@ -53,7 +80,61 @@ MAX_BAD_REQUEST_ERROR = 10
 def count_nearby(state: AppState, user_id: str, threshold_km: float) -> int:
     """Number of OTHER users within ``threshold_km`` of ``user_id``. Excludes
     the requesting user."""
-    return len(state.neighbors(user_id, threshold_km))
+    return state.count_neighbors(user_id, threshold_km)
+
+
+def distance_bucket(km: float) -> str:
+    """Coarse label of a distance, e.g. ``"0–500 m"``, ``"1–2 km"``, ``"100+ km"``.
+
+    Labels avoid ``<``/``>``: replies go through :func:`html_format_text`.
+    """
+    lo = 0.0
+    for hi in NEAREST_BUCKETS_KM:
+        if km < hi:
+            if hi < 1.0:
+                return f"{lo * 1000:g}–{hi * 1000:g} m"
+            if lo >= 1.0:
+                return f"{lo:g}–{hi:g} km"
+            return f"{_format_km(lo)}–{_format_km(hi)}"
+        lo = hi
+    return f"{lo:g}+ km"
+
+
+def _format_km(km: float) -> str:
+    return f"{km * 1000:g} m" if km < 1.0 else f"{km:g} km"
+
+
+def nearest_buckets(
+    state: AppState, user_id: str, threshold_km: float, k: int = NEAREST_K
+) -> list[str]:
+    """Distance buckets of ``user_id``'s ``k`` nearest neighbors, nearest first."""
+    return [distance_bucket(km) for km, _ in state.nearest(user_id, k, threshold_km)]
+
+
+async def neighbor_stats(
+    state: AppState, threshold_km: float, *, workers: int | None = None
+) -> JoinStats:
+    """Population-wide neighborhood statistics (capacity planning).
+
+    Only the coordinate snapshot is taken under ``state.lock``; the self-join
+    itself runs in a worker thread (and its process pool), so the bot keeps
+    serving updates meanwhile. The result reflects the snapshot. In
+    density-adaptive mode each user's range is resolved under the lock.
+    Geofenced zones are not modelled: every user is joined by radius.
+    """
+    async with state.lock:
+        coords = [rec.coord for rec in state.users.values()]
+        ranges: list[float | None]
+        if state.adaptive_k > 0:
+            ranges = [
+                state.effective_range(rec, threshold_km) for rec in state.users.values()
+            ]
+        else:
+            ranges = [rec.range_km for rec in state.users.values()]
+        radius = state.max_range(threshold_km)
+    return await asyncio.to_thread(
+        self_join_stats, coords, radius, ranges=ranges, workers=workers
+    )
 
 
 # --------------------------------------------------------------------------- #
@@ -84,6 +165,59 @@ def register_user(
     return rec
 
 
+def register_users(
+    state: AppState,
+    arrivals: Iterable[tuple[int, Coord, str]],
+    *,
+    clock: Clock,
+) -> list[UserRecord]:
+    """Register a batch of ``(chat_id, coord, lang)`` newcomers with fresh
+    ids, in one critical section (caller holds ``state.lock``).
+
+    A chat registered meanwhile is skipped; the records of the others are
+    returned in arrival order.
+    """
+    return [
+        register_user(
+            state,
+            user_id=state.allocate_user_id(),
+            chat_id=chat_id,
+            coord=coord,
+            lang=lang,
+            clock=clock,
+        )
+        for chat_id, coord, lang in arrivals
+        if state.user_for_chat(chat_id) is None
+    ]
+
+
+def join_notices(
+    state: AppState,
+    newcomers: Sequence[UserRecord],
+    threshold_km: float,
+    *,
+    limit: int | None = None,
+) -> dict[int, list[str]]:
+    """One pass over a registered batch: recipient chat id -> the user ids of
+    the ``newcomers`` that joined within its range, in joining order.
+
+    As if the batch had registered one by one, a newcomer hears only of those
+    after it, and never of itself: each newcomer's recipients leave out the
+    later ones before the fan-out cap, so the cap keeps the same nearest users
+    as a registration on its own would.
+    """
+    later = {rec.user_id for rec in newcomers}
+    notices: dict[int, list[str]] = {}
+    for rec in newcomers:
+        later.discard(rec.user_id)
+        recipients = state.recipients(
+            rec.user_id, threshold_km, limit=limit, exclude=later
+        )
+        for chat_id in recipients:
+            notices.setdefault(chat_id, []).append(rec.user_id)
+    return notices
+
+
 # --------------------------------------------------------------------------- #
 # Message formatting
 # --------------------------------------------------------------------------- #
@@ -118,25 +252,40 @@ async def notify_group_join(
     """Notify ONLY the chat ids in ``recipients_snapshot`` that a new user
     joined.
 
-    ``recipients_snapshot`` must have been built under the lock and must
-    contain only neighbors within range of ``new_user`` and must exclude the
-    new user's own chat id.
+    ``recipients_snapshot`` must have been built atomically (see the module
+    docstring), must contain only neighbors within range of ``new_user`` and
+    must exclude the new user's own chat id.
     """
-    text = html_format_text(f"{new_user.user_id} joined the area...")
+    text = join_text([new_user.user_id])
+    await _fan_out(bot, state, text, recipients_snapshot, action="join notify")
 
-    async def _send(chat_id: int) -> None:
-        try:
-            sent = await bot.send_message(
-                chat_id=chat_id, text=text, parse_mode=ParseMode.MARKDOWN
-            )
-            async with state.lock:
-                state.track_message(chat_id, sent.message_id)
-        except (Forbidden, BadRequest):
-            _LOGGER.debug("join notify failed for chat_id=%s", chat_id)
-        except Exception:
-            _LOGGER.exception("unexpected error notifying chat_id=%s", chat_id)
 
-    await asyncio.gather(*(_send(cid) for cid in recipients_snapshot))
+async def notify_group_joins(
+    bot: Bot, state: AppState, notices: dict[int, list[str]]
+) -> None:
+    """Send each chat of ``notices`` (see :func:`join_notices`) one notice for
+    all the users that joined near it. Chats with the same newcomers share
+    one fan-out."""
+    by_text: dict[str, list[int]] = {}
+    for chat_id, user_ids in notices.items():
+        by_text.setdefault(join_text(user_ids), []).append(chat_id)
+    await asyncio.gather(
+        *(
+            _fan_out(bot, state, text, chat_ids, action="join notify")
+            for text, chat_ids in by_text.items()
+        )
+    )
+
+
+def join_text(user_ids: Sequence[str]) -> str:
+    """The join notice for ``user_ids``: named one by one up to
+    ``JOIN_NAMES_SHOWN``, then counted."""
+    if len(user_ids) == 1:
+        return html_format_text(f"{user_ids[0]} joined the area...")
+    names = ", ".join(user_ids[:JOIN_NAMES_SHOWN])
+    if len(user_ids) > JOIN_NAMES_SHOWN:
+        names += f" and {len(user_ids) - JOIN_NAMES_SHOWN} more"
+    return html_format_text(f"{len(user_ids)} people joined the area: {names}")
 
 
 # --------------------------------------------------------------------------- #
@@ -151,23 +300,47 @@ async def relay_message(
 ) -> None:
     """Deliver ``body`` to each chat id in ``recipients_snapshot``.
 
-    The snapshot excludes the sender by construction. Only message ids actually
-    returned by Telegram are tracked (no fabricated ids -- fixes Issue #7).
+    The snapshot excludes the sender by construction. Sends are started in
+    snapshot order, so a nearest-first snapshot is delivered nearest first.
+    Only message ids actually returned by Telegram are tracked (no fabricated
+    ids -- fixes Issue #7).
     """
+    await _fan_out(bot, state, body, recipients_snapshot, action="relay")
+
+
+async def _fan_out(
+    bot: Bot,
+    state: AppState,
+    text: str,
+    chat_ids: list[int],
+    *,
+    action: str,
+    chunk: int = TRACK_CHUNK,
+) -> None:
+    """Send ``text`` to every chat concurrently and track the returned ids,
+    ``chunk`` at a time, with :meth:`AppState.track_many`. A failed send is
+    logged and skipped."""
+    pending: list[tuple[int, int]] = []
 
     async def _send(chat_id: int) -> None:
+        nonlocal pending
         try:
             sent = await bot.send_message(
-                chat_id=chat_id, text=body, parse_mode=ParseMode.MARKDOWN
+                chat_id=chat_id, text=text, parse_mode=ParseMode.MARKDOWN
             )
-            async with state.lock:
-                state.track_message(chat_id, sent.message_id)
         except (Forbidden, BadRequest):
-            _LOGGER.debug("relay failed for chat_id=%s", chat_id)
+            _LOGGER.debug("%s failed for chat_id=%s", action, chat_id)
+            return
         except Exception:
-            _LOGGER.exception("unexpected error relaying to chat_id=%s", chat_id)
+            _LOGGER.exception("unexpected %s error for chat_id=%s", action, chat_id)
+            return
+        pending.append((chat_id, sent.message_id))
+        if len(pending) >= chunk:
+            state.track_many(pending)
+            pending = []
 
-    await asyncio.gather(*(_send(cid) for cid in recipients_snapshot))
+    await asyncio.gather(*(_send(cid) for cid in chat_ids))
+    state.track_many(pending)
 
 
 # --------------------------------------------------------------------------- #
@@ -208,26 +381,35 @@ async def evict_idle_users(
     *,
     now: float,
     ttl: float,
+    batch_size: int = EVICT_BATCH_SIZE,
 ) -> list[str]:
     """Evict every user idle for at least ``ttl`` seconds as of ``now``.
 
-    Phase 1 (under lock): identify idle users, remove them fully from state,
-    and collect their tracked message ids. Phase 2 (no lock): best-effort
-    delete those messages. Returns the list of evicted user ids.
+    Phase 1 (under lock, ``batch_size`` users at a time): identify idle users
+    (:meth:`AppState.idle_user_ids` only visits the ones that are due),
+    remove them fully from state, and collect their tracked message ids.
+    Between batches the lock is released and the event loop serves other
+    callbacks; a user who became active (or left) meanwhile is skipped.
+    Phase 2 (no lock): best-effort delete those messages. Returns the list of
+    evicted user ids.
     """
-    to_clean: list[tuple[int, set[int]]] = []
+    to_clean: list[tuple[int, list[int]]] = []
     evicted: list[str] = []
 
     async with state.lock:
         idle_ids = state.idle_user_ids(now, ttl)
-        for uid in idle_ids:
-            rec = state.users.get(uid)
-            if rec is None:
-                continue
-            state.remove_by_chat(rec.chat_id)
-            msg_ids = state.pop_tracked(rec.chat_id)
-            to_clean.append((rec.chat_id, msg_ids))
-            evicted.append(uid)
+    for start in range(0, len(idle_ids), batch_size):
+        if start:
+            await asyncio.sleep(0)
+        async with state.lock:
+            for uid in idle_ids[start : start + batch_size]:
+                rec = state.users.get(uid)
+                if rec is None or now - rec.last_active_ts < ttl:
+                    continue
+                state.remove_by_chat(rec.chat_id)
+                msg_ids = state.pop_tracked(rec.chat_id)
+                to_clean.append((rec.chat_id, msg_ids))
+                evicted.append(uid)
 
     for chat_id, msg_ids in to_clean:
         await cleanup_messages(bot, chat_id, msg_ids)
@@ -9,16 +9,48 @@ they can be exhaustively property-tested in isolation and reused by both
 from __future__ import annotations
 
 from collections import defaultdict
-from math import atan2, cos, radians, sin, sqrt
+from collections.abc import Sequence
+from math import atan2, cos, degrees, pi, radians, sin, sqrt
+from typing import Any
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency; pure-Python fallbacks apply
+    np = None  # type: ignore[assignment]
 
 __all__ = [
     "EARTH_RADIUS_KM",
+    "HAS_NUMPY",
     "haversine_distance",
+    "haversine_many",
+    "unit_vector",
+    "chord_sq_bounds",
+    "EQUIRECT_MAX_LAT",
+    "equirect_point",
+    "equirect_sq",
+    "equirect_distance",
+    "equirect_error_bound",
+    "equirect_sq_bounds",
+    "equirect_covers",
     "group_coordinates",
 ]
 
+HAS_NUMPY = np is not None
+_CHORD_REL_BAND = 1e-9  # squared-chord band where haversine has the final say
+_CHORD_ABS_BAND = 1e-24
+
+Vec3 = tuple[float, float, float]
+EqPoint = tuple[float, float, float]  # (phi, lambda, cos(phi)), radians
+
+# Equirectangular error model: for two points within ``d`` km of each other,
+# both at ``|lat| <= EQUIRECT_MAX_LAT``, the relative error of
+# :func:`equirect_distance` is below ``(d / R)**2 / (4 * cos(max_lat)**2)``
+# (measured worst case: about a fifth of that), plus float noise.
+EQUIRECT_MAX_LAT = 80.0
+_EQUIRECT_ERROR_COEF = 0.25
+_EQUIRECT_REL_FLOOR = 1e-9
+
 EARTH_RADIUS_KM = 6_371.0088
-_DISTANCE_DEGREE_KM = 111.32  # mean km length of 1 degree of latitude
 
 
 def haversine_distance(
@@ -45,75 +77,173 @@ def haversine_distance(
     return radius * 2 * atan2(sqrt(a), sqrt(1 - a))
 
 
-def _hash_cell(lat: float, lon: float, cell_km: float) -> tuple[int, int]:
-    """Bucket a lat/lon into a square cell of about *cell_km* km."""
-    step = cell_km / _DISTANCE_DEGREE_KM
-    return int(lat / step), int(lon / step)
+def haversine_many(
+    origin_lat: float,
+    origin_lon: float,
+    lats: Sequence[float] | Any,
+    lons: Sequence[float] | Any,
+    /,
+    *,
+    radius: float = EARTH_RADIUS_KM,
+) -> Any:
+    """Great-circle distances **in kilometres** from one origin to many points.
+
+    With NumPy installed, ``lats``/``lons`` may be arrays (or sequences) and the
+    result is a ``float64`` array computed in a single vectorized pass. Without
+    NumPy this falls back to a list built with :func:`haversine_distance`.
+    Both paths satisfy the same P-GEO-* properties as the scalar function.
+    """
+    if np is None:
+        return [
+            haversine_distance(origin_lat, origin_lon, lat, lon, radius=radius)
+            for lat, lon in zip(lats, lons, strict=True)
+        ]
+    phi1, lam1 = radians(origin_lat), radians(origin_lon)
+    phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+    lam2 = np.radians(np.asarray(lons, dtype=np.float64))
+    a = (
+        np.sin((phi2 - phi1) / 2) ** 2
+        + cos(phi1) * np.cos(phi2) * np.sin((lam2 - lam1) / 2) ** 2
+    )
+    a = np.clip(a, 0.0, 1.0)
+    return radius * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def unit_vector(lat: float, lon: float) -> Vec3:
+    """The 3D unit vector (on a unit sphere) of a WGS-84 point.
+
+    Computed once per coordinate; two points' squared chord length is then the
+    squared Euclidean distance between their unit vectors -- no trig needed.
+    """
+    phi, lam = radians(lat), radians(lon)
+    cos_phi = cos(phi)
+    return cos_phi * cos(lam), cos_phi * sin(lam), sin(phi)
+
+
+def chord_sq_bounds(
+    radius_km: float, *, radius: float = EARTH_RADIUS_KM
+) -> tuple[float, float]:
+    """Squared-chord thresholds equivalent to a great-circle ``radius_km``.
+
+    Returns ``(sure, maybe)``: a pair whose squared chord is ``< sure`` is
+    within range, one whose squared chord is ``> maybe`` is not, and the thin
+    band in between (float noise around the exact threshold) should be settled
+    with :func:`haversine_distance` so both tests agree exactly.
+    """
+    theta = max(radius_km, 0.0) / radius
+    limit = 4.0 if theta >= pi else (2 * sin(theta / 2)) ** 2
+    band = limit * _CHORD_REL_BAND + _CHORD_ABS_BAND
+    return limit - band, limit + band
+
+
+def equirect_point(lat: float, lon: float) -> EqPoint:
+    """Per-point cache for :func:`equirect_sq`: radians plus ``cos(lat)``."""
+    phi = radians(lat)
+    return phi, radians(lon), cos(phi)
+
+
+def equirect_sq(a: EqPoint, b: EqPoint) -> float:
+    """Squared equirectangular distance, scaled: ``(2 * d / R) ** 2``.
+
+    The longitude difference is scaled by the mean of the two cached cosines
+    (symmetric in ``a`` and ``b``) and is *not* wrapped: callers keep the
+    pair away from the antimeridian. The scale avoids any division, so the
+    hot loop is two subtractions and three multiplications.
+    """
+    x = (b[1] - a[1]) * (a[2] + b[2])
+    y = b[0] - a[0]
+    return x * x + 4 * y * y
+
+
+def equirect_distance(
+    a: EqPoint, b: EqPoint, *, radius: float = EARTH_RADIUS_KM
+) -> float:
+    """Equirectangular approximation of the distance **in kilometres**.
+
+    Accurate to :func:`equirect_error_bound` for nearby points away from the
+    poles and the antimeridian; use :func:`haversine_distance` elsewhere.
+    """
+    return radius * sqrt(equirect_sq(a, b)) / 2
+
+
+def equirect_error_bound(
+    limit_km: float, *, max_lat: float = EQUIRECT_MAX_LAT
+) -> float:
+    """Maximum relative error of :func:`equirect_distance` for pairs within
+    ``limit_km`` of each other, both at ``|lat| <= max_lat``."""
+    theta = limit_km / EARTH_RADIUS_KM
+    return _EQUIRECT_ERROR_COEF * theta**2 / cos(radians(max_lat)) ** 2 + (
+        _EQUIRECT_REL_FLOOR
+    )
+
+
+def equirect_sq_bounds(
+    radius_km: float, limit_km: float, *, max_lat: float = EQUIRECT_MAX_LAT
+) -> tuple[float, float]:
+    """:func:`equirect_sq` thresholds equivalent to a great-circle
+    ``radius_km <= limit_km``, like :func:`chord_sq_bounds`.
+
+    Returns ``(sure, maybe)``: a pair whose value is ``< sure`` is within
+    range, one whose value is ``> maybe`` is not; the band in between is the
+    error bound around the radius and must be settled with
+    :func:`haversine_distance`.
+
+    The guarantee covers every pair with both points at ``|lat| <= max_lat``
+    and within about a thousand kilometres of each other (``d * (1 - eps(d))``
+    keeps growing past ``limit_km`` until then), far beyond any candidate a
+    grid query returns.
+    """
+    if radius_km > limit_km:
+        raise ValueError("radius_km exceeds the limit of the error bound")
+    eps = equirect_error_bound(limit_km, max_lat=max_lat)
+    scaled = 2 * max(radius_km, 0.0) / EARTH_RADIUS_KM
+    # The absolute band covers distances haversine rounds to zero.
+    return (
+        (scaled * (1 - eps)) ** 2 - _CHORD_ABS_BAND,
+        (scaled * (1 + eps)) ** 2 + _CHORD_ABS_BAND,
+    )
+
+
+def equirect_covers(
+    lat: float, lon: float, radius_km: float, *, max_lat: float = EQUIRECT_MAX_LAT
+) -> bool:
+    """Whether every point within ``radius_km`` of ``(lat, lon)`` stays at
+    ``|lat| <= max_lat`` and on the same side of the antimeridian, i.e. inside
+    the domain of :func:`equirect_sq_bounds`."""
+    reach = degrees(radius_km / EARTH_RADIUS_KM)
+    if abs(lat) + reach > max_lat:
+        return False
+    return abs(lon) + reach / cos(radians(max_lat)) < 180.0
 
 
 def group_coordinates(
     coordinates: list[tuple[float, float]],
     *,
-    distance_threshold: int = 100,
+    distance_threshold: float = 100,
     user_coords: tuple[float, float] | None = None,
 ) -> tuple[dict[str, list[tuple[float, float]]], int]:
     """Cluster *coordinates* by geographic proximity (union-find over a spatial
-    hash).
+    grid sized from ``distance_threshold``; see :mod:`tchaka.cluster`).
 
     NOTE: this is a transitive clustering retained only as an internal
     analytic helper. The user-facing "people around you" semantics use the
     ego-centric, non-transitive neighborhood in :meth:`AppState.neighbors`
-    instead (see the design's Grouping Model Decision).
+    instead (see the design's Grouping Model Decision). For clusters kept up to
+    date one point at a time use :class:`tchaka.cluster.IncrementalClusters`.
 
     ``returns (groups, n_users_in_current_user_group)``
     """
+    # Imported here: tchaka.cluster builds on this module's primitives.
+    from tchaka.cluster import cluster_points
 
     if not coordinates:
         return {}, 0
 
-    cell_km = max(distance_threshold, 50)  # at least 50 km cells for hashing
-    cells: dict[tuple[int, int], list[int]] = defaultdict(list)
-    for idx, (lat, lon) in enumerate(coordinates):
-        cells[_hash_cell(lat, lon, cell_km)].append(idx)
-
-    parent = list(range(len(coordinates)))
-
-    def find(i: int) -> int:
-        while parent[i] != i:
-            parent[i] = parent[parent[i]]
-            i = parent[i]
-        return i
-
-    def union(i: int, j: int) -> None:
-        pi, pj = find(i), find(j)
-        if pi != pj:
-            parent[pj] = pi
-
-    neighbours = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
-
-    for (cx, cy), idxs in cells.items():
-        candidate_idxs: list[int] = []
-        for dx, dy in neighbours:
-            candidate_idxs.extend(cells.get((cx + dx, cy + dy), []))
-
-        for i in idxs:
-            lat_i, lon_i = coordinates[i]
-            for j in candidate_idxs:
-                if j <= i:
-                    continue  # skip duplicate checks
-                lat_j, lon_j = coordinates[j]
-                if (
-                    abs(lat_i - lat_j) * _DISTANCE_DEGREE_KM > distance_threshold
-                    or abs(lon_i - lon_j) * _DISTANCE_DEGREE_KM > distance_threshold
-                ):
-                    continue  # cheap reject
-                if haversine_distance(lat_i, lon_i, lat_j, lon_j) <= distance_threshold:
-                    union(i, j)
-
     groups: dict[str, list[tuple[float, float]]] = defaultdict(list)
-    for idx, coord in enumerate(coordinates):
-        gid = f"G-{find(idx)}"
-        groups[gid].append(coord)
+    for coord, root in zip(
+        coordinates, cluster_points(coordinates, distance_threshold), strict=True
+    ):
+        groups[f"G-{root}"].append(coord)
 
     users_in_same_group = 0
     if user_coords is not None:
@@ -0,0 +1,241 @@
+"""Zero-downtime restart: the running process hands its state to the next.
+
+tchaka saves nothing to disk, so a plain restart empties
+:class:`~tchaka.state.AppState`. Everyone then has to send their location
+again, and the resulting storm of registrations and join notices hits the
+new process all at once. With ``TCHAKA_HANDOFF_SOCKET`` set, the state
+travels from the old process to the new one over a local Unix socket
+instead:
+
+1. A process listens on the socket once it runs (:class:`HandoffServer`). A
+   new process first connects to it (:func:`receive_state`).
+2. The old process pauses. It stops polling and waits until the updates it
+   already fetched are handled (non-blocking location handlers included),
+   its actor has drained and its jobs are paused. No write is lost, and the
+   two processes never poll at once (Telegram answers a second poller with
+   409 Conflict).
+3. Under ``state.lock`` the old process serializes the state
+   (:func:`dump_state`) and sends it as one frame.
+4. The new process confirms it received the frame, loads it
+   (:func:`load_state`), acknowledges the load and starts polling. The old
+   process exits on the acknowledgement. Without one (the new process failed
+   or died, or a step timed out), the old process resumes polling.
+
+Every step is bounded by ``HANDOFF_TIMEOUT_S`` except the load itself, which
+takes as long as the state is large (tens of seconds with a dense
+adjacency). Once the frame is received the old process waits for the
+outcome as long as the connection stays open: a new process that fails
+closes it, and one that dies has it closed by the kernel.
+
+Wire format: little-endian. A header carries the magic, the format version
+and the counts. Each user follows as its chat id and its record, packed as
+the shard protocol packs it (:func:`~tchaka.shard.pack_record`). Then each
+tracked chat follows as its chat id, its number of runs and the raw
+run-length arrays of :class:`~tchaka.tracked.MessageIds`, least recently
+tracked first. The spatial index, the expiry wheel, the adjacency and the
+zone membership are not sent. :meth:`AppState.register` derives them from the
+records while loading. Sending them would tie the format to the cell size
+and cost more bytes than the rebuild costs time. The state exists only in
+the two processes' memory and in the socket buffer.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import gc
+import logging
+import os
+import struct
+from collections.abc import Awaitable, Callable
+
+from tchaka.shard import pack_record, unpack_record
+from tchaka.state import AppState
+from tchaka.tracked import MessageIds
+
+__all__ = [
+    "HANDOFF_TIMEOUT_S",
+    "HandoffServer",
+    "dump_state",
+    "load_state",
+    "receive_state",
+]
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"TCHK"
+VERSION = 2
+# Longest wait for the other process at each step of a handoff.
+HANDOFF_TIMEOUT_S = 30.0
+
+_HEAD = struct.Struct("<4sHII")  # magic, version, users, tracked chats
+_CHAT = struct.Struct("<q")  # chat id, then its record
+_RUNS = struct.Struct("<qI")  # chat id, runs, then starts and ends as int64
+_HELLO = struct.Struct("<4sH")  # magic, version
+_SIZE = struct.Struct("<Q")  # state frame length
+_GOT = b"\x02"  # frame received, loading
+_ACK = b"\x01"  # loaded, polling next
+
+
+def dump_state(state: AppState) -> bytes:
+    """The users and tracked message ids of ``state``, in the wire format."""
+    parts = [_HEAD.pack(MAGIC, VERSION, len(state.users), len(state.tracked_msgs))]
+    for rec in state.users.values():
+        parts.append(_CHAT.pack(rec.chat_id))
+        parts.append(pack_record(rec))
+    for chat_id, ids in state.tracked_msgs.items():
+        parts.append(_RUNS.pack(chat_id, ids.runs))
+        parts.append(ids.to_bytes())
+    return b"".join(parts)
+
+
+def load_state(state: AppState, buf: bytes) -> int:
+    """Register the dumped users into the empty ``state`` and restore their
+    tracked ids; returns the number of users."""
+    magic, version, n_users, n_chats = _HEAD.unpack_from(buf)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"not a version {VERSION} handoff: {magic!r} v{version}")
+    if state.users or len(state.tracked_msgs):
+        raise ValueError("a handoff loads into an empty state")
+    # Every object built here lives on: collecting would rescan them in vain.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _load(state, buf, n_users, n_chats)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _load(state: AppState, buf: bytes, n_users: int, n_chats: int) -> int:
+    offset = _HEAD.size
+    for _ in range(n_users):
+        (chat_id,) = _CHAT.unpack_from(buf, offset)
+        rec, offset = unpack_record(chat_id, buf, offset + _CHAT.size)
+        state.register(rec)
+    for _ in range(n_chats):
+        chat_id, runs = _RUNS.unpack_from(buf, offset)
+        offset += _RUNS.size
+        end = offset + 16 * runs
+        state.tracked_msgs.restore(chat_id, MessageIds.from_bytes(buf[offset:end]))
+        offset = end
+    if offset != len(buf):
+        raise ValueError(f"{len(buf) - offset} trailing bytes in the handoff")
+    return n_users
+
+
+async def receive_state(
+    path: str, state: AppState, *, timeout: float = HANDOFF_TIMEOUT_S
+) -> int | None:
+    """Take the state over from the process listening on ``path``.
+
+    Returns the number of users loaded, or ``None`` if no process listens
+    there (a first start, or a stale socket file). Any other failure raises:
+    the old process then resumes, and this one should not start.
+    """
+    try:
+        reader, writer = await asyncio.open_unix_connection(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    try:
+        writer.write(_HELLO.pack(MAGIC, VERSION))
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readexactly(_SIZE.size), timeout)
+        (size,) = _SIZE.unpack(head)
+        buf = await asyncio.wait_for(reader.readexactly(size), timeout)
+        writer.write(_GOT)
+        await writer.drain()
+        loaded = load_state(state, buf)
+        writer.write(_ACK)
+        await writer.drain()
+    finally:
+        writer.close()
+    return loaded
+
+
+class HandoffServer:
+    """Listens on ``path`` and hands ``state`` to the first process asking.
+
+    ``pause()`` must leave the state quiescent (no polling, no pending
+    writes); ``resume()`` undoes it if the handoff fails; ``done()`` is
+    called once the new process has the state, to end this one.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        state: AppState,
+        *,
+        pause: Callable[[], Awaitable[None]],
+        resume: Callable[[], Awaitable[None]],
+        done: Callable[[], None],
+        timeout: float = HANDOFF_TIMEOUT_S,
+    ) -> None:
+        self.path = path
+        self.state = state
+        self.pause = pause
+        self.resume = resume
+        self.done = done
+        self.timeout = timeout
+        self.handed_off = False
+        self._busy = False
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self) -> None:
+        """Listen on ``path``, replacing a stale or handed-over socket file."""
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve, self.path)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            hello = await asyncio.wait_for(
+                reader.readexactly(_HELLO.size), self.timeout
+            )
+            if _HELLO.unpack(hello) != (MAGIC, VERSION):
+                _LOGGER.warning("handoff refused: unknown request %r", hello)
+                return
+            if self._busy or self.handed_off:
+                return  # one handoff at a time, and only one
+            self._busy = True
+            try:
+                await self._hand_off(reader, writer)
+            finally:
+                self._busy = False
+        except (OSError, asyncio.IncompleteReadError, TimeoutError) as exc:
+            _LOGGER.warning("handoff request failed: %r", exc)
+        finally:
+            writer.close()
+
+    async def _hand_off(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        await self.pause()
+        try:
+            async with self.state.lock:
+                buf = dump_state(self.state)
+            writer.write(_SIZE.pack(len(buf)))
+            writer.write(buf)
+            await writer.drain()
+            got = await asyncio.wait_for(reader.readexactly(len(_GOT)), self.timeout)
+            # The load has no deadline: it ends in an ack or a closed socket.
+            ack = await reader.readexactly(len(_ACK)) if got == _GOT else got
+        except (OSError, asyncio.IncompleteReadError, TimeoutError) as exc:
+            _LOGGER.error("handoff failed (%r); resuming", exc)
+            await self.resume()
+            return
+        if ack != _ACK:
+            _LOGGER.error("handoff not acknowledged; resuming")
+            await self.resume()
+            return
+        self.handed_off = True
+        _LOGGER.info("handed %d user(s) to the new process", len(self.state.users))
+        self.done()
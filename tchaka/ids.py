@@ -0,0 +1,93 @@
+"""Allocation of anonymized user ids that never collide.
+
+A user id is ``"u"`` followed by ``length`` hex digits: a short, random display
+handle that says nothing about the user. Drawing it at random is not enough
+on its own. Five digits give about a million ids, so by the birthday bound
+two of ~1,200 users share one with even odds, and a shared id would merge two
+users in :class:`~tchaka.state.AppState`. :class:`UserIdAllocator` therefore:
+
+- checks every candidate against the live users (a dict lookup, O(1)) and
+  draws again on a hit;
+- keeps the space sparse: once the live users would fill more than
+  ``MAX_LOAD`` of it, new ids get one more digit (existing ids keep theirs),
+  so a draw almost never needs a retry;
+- keeps a pool of ids drawn ahead of time (:meth:`UserIdAllocator.refill`,
+  run periodically by the bot), so registration pops one instead of drawing;
+- optionally draws from one residue class (``stride``/``offset``): each shard
+  worker allocates from its own class, so users that later meet in another
+  worker (as a migrated user or a ghost) cannot share an id.
+"""
+
+from __future__ import annotations
+
+import secrets
+from collections import deque
+from collections.abc import Collection
+
+__all__ = ["DEFAULT_ID_LENGTH", "DEFAULT_ID_POOL", "UserIdAllocator"]
+
+DEFAULT_ID_LENGTH = 5  # hex digits, as the previous hashed ids
+DEFAULT_ID_POOL = 256  # ids drawn ahead of registrations
+# Largest share of the id space live users may fill before ids grow a digit.
+MAX_LOAD = 1 / 64
+
+
+class UserIdAllocator:
+    """Draws ``u<hex>`` ids unique among the live ones."""
+
+    def __init__(
+        self,
+        *,
+        length: int = DEFAULT_ID_LENGTH,
+        pool_size: int = DEFAULT_ID_POOL,
+        stride: int = 1,
+        offset: int = 0,
+    ) -> None:
+        if length < 1 or pool_size < 0 or not 0 <= offset < stride:
+            raise ValueError("need length >= 1, pool_size >= 0, 0 <= offset < stride")
+        self.length = length
+        self.pool_size = pool_size
+        self.stride = stride
+        self.offset = offset
+        self.pool: deque[str] = deque()
+        self.retries = 0  # draws that hit a live id
+
+    def allocate(self, live: Collection[str]) -> str:
+        """A new id not in ``live`` (e.g. ``AppState.users``); first grows the
+        length if ``live`` is crowding the space."""
+        self._grow_for(len(live))
+        while self.pool:
+            user_id = self.pool.popleft()
+            if user_id not in live:
+                return user_id
+            self.retries += 1
+        while (user_id := self._draw()) in live:
+            self.retries += 1
+        return user_id
+
+    def refill(self, n_live: int = 0) -> int:
+        """Top the pool up to ``pool_size``; the number of ids drawn.
+
+        Sized for ``n_live`` users plus the whole pool, so the pooled ids are
+        not discarded by a growth before they are used.
+        """
+        self._grow_for(n_live + self.pool_size)
+        missing = self.pool_size - len(self.pool)
+        for _ in range(missing):
+            self.pool.append(self._draw())
+        return max(missing, 0)
+
+    def _grow_for(self, n_live: int) -> None:
+        grown = False
+        while n_live + 1 > (16**self.length // self.stride) * MAX_LOAD:
+            self.length += 1
+            grown = True
+        if grown:
+            self.pool.clear()  # drawn at the old length
+
+    def _draw(self) -> str:
+        value = secrets.randbits(4 * self.length)
+        value -= (value - self.offset) % self.stride
+        if value < 0:
+            value += self.stride
+        return f"u{value:0{self.length}x}"
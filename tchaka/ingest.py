@@ -0,0 +1,98 @@
+"""Batched ingestion: the updates that arrive together are applied together.
+
+After an outage, or when an event starts, hundreds of new users send their
+location within seconds. Registered one by one, each would take the state
+lock, run its own neighbor query and send its own join notices, so a user
+already in the area gets one message per newcomer. With
+``TCHAKA_JOIN_BATCH_SECONDS`` set, :func:`tchaka.commands.location_callback`
+submits new users to a :class:`Batcher` instead:
+
+- the first submission opens a window of ``window_s`` seconds (or until
+  ``max_batch`` items wait), after which one ``flush`` handles everything
+  submitted meanwhile, in submission order;
+- each submitter awaits its own result, or the error of the whole batch;
+- ``flush`` (:func:`tchaka.commands.register_arrivals`) registers the batch
+  in one critical section, computes the new neighbor pairs in one pass
+  (:func:`tchaka.core.join_notices`) and sends every recipient one notice for
+  all the newcomers near it (:func:`tchaka.core.notify_group_joins`).
+
+A lone registration waits one window longer than before; this is the price
+of the aggregation, and why the window is opt-in and short.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Generic, TypeVar
+
+__all__ = ["DEFAULT_BATCH_MAX", "Batcher"]
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Items that flush a window early, so one storm cannot build a huge batch.
+DEFAULT_BATCH_MAX = 1000
+
+
+class Batcher(Generic[T, R]):
+    """Collects items for ``window_s`` and hands them to ``flush`` at once;
+    ``flush`` returns one result per item, in order."""
+
+    def __init__(
+        self,
+        window_s: float,
+        flush: Callable[[list[T]], Awaitable[list[R]]],
+        *,
+        max_batch: int = DEFAULT_BATCH_MAX,
+    ) -> None:
+        if window_s < 0 or max_batch < 1:
+            raise ValueError("need window_s >= 0 and max_batch >= 1")
+        self.window_s = window_s
+        self.flush = flush
+        self.max_batch = max_batch
+        self.batches = 0
+        self.items = 0
+        self._pending: list[tuple[T, asyncio.Future[R]]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushing: set[asyncio.Task[None]] = set()
+
+    async def submit(self, item: T) -> R:
+        """Queue ``item`` and wait for its batch to be flushed."""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[R] = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_s, self._start_flush)
+        return await future
+
+    async def close(self) -> None:
+        """Flush what is waiting now and wait for every flush to finish."""
+        if self._pending:
+            self._start_flush()
+        await asyncio.gather(*self._flushing)
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._flush(batch))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _flush(self, batch: list[tuple[T, asyncio.Future[R]]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.flush([item for item, _ in batch])
+        except Exception as exc:  # noqa: BLE001 - re-raised by every submitter
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), result in zip(batch, results, strict=True):
+            if not future.done():  # a cancelled submitter
+                future.set_result(result)
@@ -0,0 +1,184 @@
+"""Bulk all-pairs radius self-join for capacity planning.
+
+:func:`self_join_stats` answers, for a frozen snapshot of coordinates, how many
+users each user can reach -- the distribution that drives fan-out cost --
+without running one :meth:`AppState.neighbors` query per user under the lock.
+
+- Points are bucketed into grid cells sized from the largest radius. Each cell
+  is the *home* of its points, and a point's degree is counted only from its
+  home cell, so the cells partition the work exactly.
+- Chunks of home cells are spread over a :class:`ProcessPoolExecutor`. The
+  snapshot is shipped once per worker (pool initializer), tasks only carry
+  cell ids and return small degree histograms that are merged at the end.
+- Radii are mutual like the live query: a pair counts when it is within both
+  points' radii. Distances use the chord test against cached unit vectors;
+  haversine only settles pairs within float noise of a radius.
+
+Use :func:`tchaka.core.neighbor_stats` to run it on the live state without
+blocking the bot.
+"""
+
+from __future__ import annotations
+
+import os
+from collections import Counter
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from tchaka.geo import Vec3, chord_sq_bounds, haversine_distance, unit_vector
+from tchaka.spatial import Cell, GridIndex
+
+__all__ = ["JoinStats", "self_join_stats"]
+
+_MIN_CELL_KM = 1e-3
+_CHUNKS_PER_WORKER = 4  # small chunks even out dense and sparse areas
+
+
+@dataclass(frozen=True)
+class JoinStats:
+    """Aggregate neighborhood statistics of one snapshot."""
+
+    users: int
+    pairs: int  # unordered pairs within range of each other
+    degree_histogram: dict[int, int]  # neighbor count -> number of users
+
+    @property
+    def mean_fanout(self) -> float:
+        """Expected recipients of one message from a random user."""
+        return 2 * self.pairs / self.users if self.users else 0.0
+
+    @property
+    def max_neighborhood(self) -> int:
+        return max(self.degree_histogram, default=0)
+
+
+class _Joiner:
+    """Buckets and per-point caches of one snapshot (built once per process)."""
+
+    def __init__(
+        self, coordinates: Sequence[tuple[float, float]], ranges: Sequence[float]
+    ) -> None:
+        self.coords = list(coordinates)
+        self.ranges = list(ranges)
+        self.max_range = max(self.ranges, default=0.0)
+        self.units: list[Vec3] = [unit_vector(lat, lon) for lat, lon in self.coords]
+        # The bounds are monotonic in the radius, so the bounds of a pair's
+        # min(rA, rB) are the smaller of the two points' own bounds.
+        self.bounds = [chord_sq_bounds(r) for r in self.ranges]
+        self.grid: GridIndex[int] = GridIndex(max(self.max_range, _MIN_CELL_KM))
+        self.cells: dict[Cell, list[int]] = {}
+        for i, (lat, lon) in enumerate(self.coords):
+            self.cells.setdefault(self.grid.cell_of(lat, lon), []).append(i)
+
+    def degrees(self, home_cells: Sequence[Cell]) -> Counter[int]:
+        """Degree contributions of the cell pairs owned by ``home_cells``.
+
+        Each unordered pair of cells is owned by the smaller cell, so every
+        point pair is tested once and credited to both points; the caller sums
+        the contributions of all chunks.
+        """
+        coords, ranges, units, bounds = (
+            self.coords,
+            self.ranges,
+            self.units,
+            self.bounds,
+        )
+        degrees: Counter[int] = Counter()
+
+        def close(i: int, j: int) -> bool:
+            ix, iy, iz = units[i]
+            jx, jy, jz = units[j]
+            chord_sq = (jx - ix) ** 2 + (jy - iy) ** 2 + (jz - iz) ** 2
+            (sure_i, maybe_i), (sure_j, maybe_j) = bounds[i], bounds[j]
+            if chord_sq < sure_i and chord_sq < sure_j:
+                return True
+            return (
+                chord_sq <= maybe_i
+                and chord_sq <= maybe_j
+                and (
+                    haversine_distance(*coords[i], *coords[j])
+                    <= min(ranges[i], ranges[j])
+                )
+            )
+
+        for cell in home_cells:
+            mine = self.cells[cell]
+            for a, i in enumerate(mine):
+                for j in mine[a + 1 :]:
+                    if close(i, j):
+                        degrees[i] += 1
+                        degrees[j] += 1
+            for other in self.grid.cells_around(cell, self.max_range, self.cells):
+                if other <= cell:
+                    continue
+                for j in self.cells[other]:
+                    for i in mine:
+                        if close(i, j):
+                            degrees[i] += 1
+                            degrees[j] += 1
+        return degrees
+
+
+_WORKER: _Joiner | None = None  # per-process snapshot (see _init_worker)
+
+
+def _init_worker(
+    coordinates: Sequence[tuple[float, float]], ranges: Sequence[float]
+) -> None:
+    global _WORKER
+    _WORKER = _Joiner(coordinates, ranges)
+
+
+def _degrees_task(home_cells: list[Cell]) -> Counter[int]:
+    assert _WORKER is not None, "pool started without _init_worker"
+    return _WORKER.degrees(home_cells)
+
+
+def self_join_stats(
+    coordinates: Sequence[tuple[float, float]],
+    radius_km: float,
+    *,
+    ranges: Sequence[float | None] | None = None,
+    workers: int | None = None,
+) -> JoinStats:
+    """Neighbor-count statistics of every point against every other point.
+
+    ``ranges`` optionally gives a per-point radius (``None`` entries use
+    ``radius_km``), capped by ``radius_km`` like :meth:`AppState.effective_range`.
+    ``workers`` is the process count (``None``: one per CPU); ``0`` or ``1``
+    runs in the calling process, which is cheaper for small snapshots.
+
+    Blocks until done; call it from a thread (or use
+    :func:`tchaka.core.neighbor_stats`) when an event loop is running.
+    """
+    if ranges is None:
+        capped = [radius_km] * len(coordinates)
+    else:
+        capped = [radius_km if r is None else min(r, radius_km) for r in ranges]
+    n_workers = workers if workers is not None else os.cpu_count() or 1
+
+    if n_workers <= 1:
+        joiner = _Joiner(coordinates, capped)
+        degrees = joiner.degrees(list(joiner.cells))
+    else:
+        grid: GridIndex[int] = GridIndex(max(max(capped, default=0.0), _MIN_CELL_KM))
+        home_cells = list({grid.cell_of(lat, lon) for lat, lon in coordinates})
+        n_chunks = n_workers * _CHUNKS_PER_WORKER
+        chunks = [home_cells[k::n_chunks] for k in range(n_chunks)]
+        degrees = Counter()
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=(list(coordinates), capped),
+        ) as pool:
+            for part in pool.map(_degrees_task, [c for c in chunks if c]):
+                degrees.update(part)
+
+    histogram = Counter(degrees.values())
+    histogram[0] = len(coordinates) - len(degrees)
+    return JoinStats(
+        users=len(coordinates),
+        pairs=degrees.total() // 2,
+        degree_histogram={d: k for d, k in sorted(histogram.items()) if k},
+    )
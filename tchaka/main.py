@@ -3,12 +3,19 @@
 Builds the Telegram ``Application``, wires the runtime singletons into the
 callback module, schedules the idle-eviction job, emits the startup-success log
 at the right time (via ``post_init`` -- not after the blocking ``run_polling``),
-and starts long-polling.
+and starts long-polling. With ``TCHAKA_SHARDS > 1`` the polling process only
+routes updates to shard worker processes instead (:mod:`tchaka.shard`). With
+``TCHAKA_HANDOFF_SOCKET`` a restart takes the state over from the running
+process before polling (:mod:`tchaka.handoff`). With ``TCHAKA_BACKEND=redis``
+the population is shared with other replicas (:mod:`tchaka.backend`).
 """
 
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
+import socket
 
 from telegram import Update
 from telegram.ext import (
@@ -16,77 +23,370 @@ from telegram.ext import (
     CommandHandler,
     ContextTypes,
     MessageHandler,
+    TypeHandler,
     filters,
 )
 
 import tchaka.commands as commands
+from tchaka.actor import StateActor
+from tchaka.backend import MemoryBackend, RedisBackend, StateBackend
 from tchaka.commands import (
     check_callback,
     echo_callback,
     error_handler,
     help_callback,
+    live_location_callback,
     location_callback,
+    range_callback,
     start_callback,
     stop_callback,
 )
 from tchaka.config import Settings, load_settings
-from tchaka.core import evict_idle_users
+from tchaka.core import cleanup_messages, evict_idle_users
+from tchaka.handoff import HandoffServer, receive_state
+from tchaka.ids import UserIdAllocator
+from tchaka.ingest import Batcher
+from tchaka.shard import ShardRouter, ShardWorker, Stripes, spawn_workers
+from tchaka.spatial import DEFAULT_CELL_KM
 from tchaka.state import AppState
+from tchaka.tracked import TrackedMessages
 from tchaka.utils import Clock, SystemClock
+from tchaka.zones import ZoneIndex, load_zones
 
 _LOGGER = logging.getLogger(__name__)
 
+# Floor of the idle-sweep delay, so a zero sweep interval cannot spin.
+MIN_SWEEP_DELAY_SECONDS = 1.0
+# Seconds between top-ups of the pre-drawn user id pool (AppState.ids).
+ID_REFILL_SECONDS = 5.0
+
+NEW_LOCATION = filters.UpdateType.MESSAGE & filters.LOCATION
 HANDLERS = [
     CommandHandler("start", start_callback),
     CommandHandler("stop", stop_callback),
     CommandHandler("check", check_callback),
     CommandHandler("help", help_callback),
-    MessageHandler(filters.LOCATION, location_callback),
+    CommandHandler("range", range_callback),
+    MessageHandler(NEW_LOCATION, location_callback),
+    MessageHandler(
+        filters.UpdateType.EDITED_MESSAGE & filters.LOCATION, live_location_callback
+    ),
     MessageHandler(filters.TEXT & ~filters.COMMAND, echo_callback),
 ]
 
 
+def next_sweep_delay(state: AppState, settings: Settings, now: float) -> float:
+    """Seconds until the next idle sweep: when the next user comes due, but
+    at least ``sweep_interval_seconds`` so nearby deadlines share one sweep.
+
+    Nobody can be due later than a full TTL from now (shard ghosts, which are
+    never due, are not waited for).
+    """
+    ttl = settings.idle_ttl_seconds
+    due = state.next_idle_at(ttl)
+    delay = ttl if due is None else min(due - now, ttl)
+    return max(delay, settings.sweep_interval_seconds, MIN_SWEEP_DELAY_SECONDS)
+
+
 async def idle_job(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """JobQueue callback: evict idle users on each sweep."""
+    """JobQueue callback: evict the idle users, then schedule the next
+    sweep for when the next user is due.
+
+    In a shard worker the job's data is the :class:`ShardWorker`, which then
+    reports the evicted users to the router.
+    """
     settings = commands.SETTINGS
     if settings is None:
         return
-    evicted = await evict_idle_users(
-        context.bot,
-        commands.STATE,
-        now=commands.CLOCK.now(),
-        ttl=settings.idle_ttl_seconds,
+    worker = context.job.data if context.job is not None else None
+    state, backend = commands.STATE, commands.BACKEND
+    now, ttl = commands.CLOCK.now(), settings.idle_ttl_seconds
+    try:
+        # The chats of the users due, to withdraw the evicted ones from a
+        # shared backend.
+        chats = (
+            {uid: state.users[uid].chat_id for uid in state.idle_user_ids(now, ttl)}
+            if backend.shared
+            else {}
+        )
+        evicted = await evict_idle_users(context.bot, state, now=now, ttl=ttl)
+        if evicted:
+            _LOGGER.info("idle sweep evicted %d user(s)", len(evicted))
+        for uid in evicted:
+            if uid in chats:
+                await backend.remove_by_chat(chats[uid])
+    finally:
+        if isinstance(worker, ShardWorker):
+            worker.report_removed()
+        # Always re-arm: a failed sweep must not stop eviction for good.
+        if context.job_queue is not None:
+            context.job_queue.run_once(
+                idle_job,
+                when=next_sweep_delay(commands.STATE, settings, commands.CLOCK.now()),
+                data=worker,
+            )
+
+
+async def ids_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback: top up the pool of pre-drawn user ids, so that
+    registrations pop an id instead of drawing one."""
+    state = commands.STATE
+    state.ids.refill(len(state.users))
+
+
+async def take_over(
+    application: Application, path: str, state: AppState, actor: StateActor | None
+) -> HandoffServer:
+    """Load the state of the process listening on ``path``, if any, then
+    listen there for the next process (see :mod:`tchaka.handoff`)."""
+    loaded = await receive_state(path, state)
+    if loaded is not None:
+        _LOGGER.info("took %d user(s) over from the previous process", loaded)
+
+    async def pause() -> None:
+        if application.updater is not None:
+            await application.updater.stop()
+        await application.update_queue.join()  # the updates already fetched
+        await commands.drain_locations()  # ... and their non-blocking handlers
+        if commands.JOINS is not None:
+            await commands.JOINS.close()  # the newcomers of an open window
+        await commands.flush_live_locations()  # the held live positions
+        if actor is not None:
+            await actor.close()
+        if application.job_queue is not None:
+            application.job_queue.scheduler.pause()
+
+    async def resume() -> None:
+        if application.job_queue is not None:
+            application.job_queue.scheduler.resume()
+        if actor is not None:
+            actor.start()
+        if application.updater is not None:
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+
+    server = HandoffServer(
+        path, state, pause=pause, resume=resume, done=application.stop_running
     )
-    if evicted:
-        _LOGGER.info("idle sweep evicted %d user(s)", len(evicted))
+    await server.start()
+    return server
 
 
 def build_application(settings: Settings, state: AppState, clock: Clock) -> Application:
     """Build and wire the Telegram application (factory; no polling)."""
-    commands.configure(state=state, settings=settings, clock=clock)
+    actor = StateActor(state) if settings.state_actor else None
+    joins = build_join_batcher(settings)
+    commands.configure(
+        state=state,
+        settings=settings,
+        clock=clock,
+        actor=actor,
+        joins=joins,
+        backend=build_backend(settings, state),
+    )
+
+    handoff: HandoffServer | None = None
 
     async def _post_init(application: Application) -> None:
+        nonlocal handoff
+        # Before anything reads the state: it may come from the old process.
+        if settings.handoff_socket is not None:
+            handoff = await take_over(
+                application, settings.handoff_socket, state, actor
+            )
+        if actor is not None:
+            actor.start()
         if application.job_queue is not None:
+            application.job_queue.run_once(
+                idle_job, when=next_sweep_delay(state, settings, clock.now())
+            )
             application.job_queue.run_repeating(
-                idle_job,
-                interval=settings.sweep_interval_seconds,
-                first=settings.sweep_interval_seconds,
+                ids_job, interval=ID_REFILL_SECONDS, first=0
             )
         # Emitted at startup (after init), not after the blocking run_polling.
         _LOGGER.info("tchaka started successfully...")
 
+    async def _post_shutdown(application: Application) -> None:
+        if handoff is not None:
+            await handoff.close()
+        if joins is not None:
+            await joins.close()
+        if actor is not None:
+            await actor.close()
+
     application = (
-        Application.builder().token(settings.tg_token).post_init(_post_init).build()
+        Application.builder()
+        .token(settings.tg_token)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+        .build()
     )
     for handler in HANDLERS:
+        if joins is not None and handler.callback is location_callback:
+            # Each location waits for its batch: the next updates must not.
+            handler = MessageHandler(NEW_LOCATION, location_callback, block=False)
         application.add_handler(handler)
     application.add_error_handler(error_handler)
     return application
 
 
+def load_zone_index(path: str | None) -> ZoneIndex | None:
+    """Index the zones file, or ``None`` (with a warning) if it is unusable;
+    like any malformed setting, a bad file does not stop the bot."""
+    if path is None:
+        return None
+    try:
+        zones = load_zones(path)
+    except (OSError, ValueError) as exc:
+        _LOGGER.warning("Cannot load zones from %s (%s); zones disabled", path, exc)
+        return None
+    _LOGGER.info("Loaded %d zones from %s", len(zones), path)
+    return ZoneIndex(zones)
+
+
+def build_state(settings: Settings) -> AppState:
+    """The state configured by ``settings`` (one per process or shard)."""
+    # Cells about one range wide keep a neighbor query to a 3x3 block.
+    range_km = settings.distance_threshold_km
+    adjacency = settings.adjacency
+    if adjacency and settings.adaptive_k > 0:
+        # Adaptive ranges change as neighbors come and go: no adjacency.
+        _LOGGER.warning("TCHAKA_ADJACENCY is ignored with TCHAKA_ADAPTIVE_K")
+        adjacency = False
+    return AppState(
+        cell_km=range_km if range_km > 0 else DEFAULT_CELL_KM,
+        columnar=settings.columnar,
+        # Memory grows with the square of a crowd: opt-in (see bench_adjacency).
+        adjacency_km=range_km if adjacency else None,
+        adaptive_k=settings.adaptive_k,
+        adaptive_max_km=settings.adaptive_max_km,
+        zones=load_zone_index(settings.zones_file),
+        equirect_km=(
+            settings.equirect_limit_km if settings.distance_mode == "equirect" else None
+        ),
+        tracked_msgs=TrackedMessages(
+            per_chat=settings.max_tracked_per_chat,
+            budget_bytes=settings.tracked_budget_kb * 1024,
+        ),
+    )
+
+
+def build_join_batcher(
+    settings: Settings,
+) -> Batcher[commands.Arrival, commands.Placement] | None:
+    """The batcher of newcomers' registrations, if a window is configured."""
+    if settings.join_batch_seconds <= 0:
+        return None
+    return Batcher(settings.join_batch_seconds, commands.register_arrivals)
+
+
+def shard_halo_km(settings: Settings) -> float:
+    """How far from its stripe a user is copied into a shard: the largest
+    range any user can have."""
+    if settings.adaptive_k > 0:
+        return max(settings.distance_threshold_km, settings.adaptive_max_km)
+    return settings.distance_threshold_km
+
+
+def build_backend(settings: Settings, state: AppState) -> StateBackend:
+    """The population the fan-outs see (``TCHAKA_BACKEND``): ``state`` itself,
+    or the Redis store shared with the other replicas."""
+    if settings.backend == "redis":
+        if settings.redis_url is not None:
+            return RedisBackend.from_url(settings.redis_url)
+        _LOGGER.warning("TCHAKA_BACKEND=redis needs TCHAKA_REDIS_URL; using memory")
+    return MemoryBackend(state)
+
+
+def run_shard_worker(index: int, sock: socket.socket, settings: Settings) -> None:
+    """Entry point of a shard worker process (see :func:`run_sharded`)."""
+    asyncio.run(_serve_shard(index, sock, settings))
+
+
+async def _serve_shard(index: int, sock: socket.socket, settings: Settings) -> None:
+    state = build_state(settings)
+    # Ids from this worker's residue class: never shared with another worker's.
+    state.ids = UserIdAllocator(stride=settings.shards, offset=index)
+    clock = SystemClock()
+    actor = StateActor(state) if settings.state_actor else None
+    # No join batches: a worker handles its frames one at a time.
+    commands.configure(state=state, settings=settings, clock=clock, actor=actor)
+    # No updater: updates come from the router, not from polling.
+    application = Application.builder().token(settings.tg_token).updater(None).build()
+    for handler in HANDLERS:
+        application.add_handler(handler)
+    application.add_error_handler(error_handler)
+
+    async def handle(chat_id: int, payload: bytes) -> None:
+        update = Update.de_json(json.loads(payload), application.bot)
+        await application.process_update(update)
+
+    async def cleanup(chat_id: int, msg_ids: list[int]) -> None:
+        await cleanup_messages(application.bot, chat_id, msg_ids)
+
+    worker = ShardWorker(state, handle, cleanup)
+    async with application:
+        await application.start()
+        if actor is not None:
+            actor.start()
+        if application.job_queue is not None:
+            application.job_queue.run_once(
+                idle_job,
+                when=next_sweep_delay(state, settings, clock.now()),
+                data=worker,
+            )
+            application.job_queue.run_repeating(
+                ids_job, interval=ID_REFILL_SECONDS, first=0
+            )
+        reader, writer = await asyncio.open_unix_connection(sock=sock)
+        _LOGGER.info("tchaka shard %d started", index)
+        try:
+            await worker.serve(reader, writer)
+        finally:
+            writer.close()
+            if actor is not None:
+                await actor.close()
+            await application.stop()
+
+
+def run_sharded(settings: Settings) -> None:
+    """Poll in this process and route the updates to ``settings.shards``
+    worker processes, one per longitude stripe."""
+    stripes = Stripes.even(settings.shards)
+    procs, socks = spawn_workers(len(stripes), run_shard_worker, settings)
+    router = ShardRouter(stripes, shard_halo_km(settings))
+    commands.configure(settings=settings)  # for the error handler
+
+    async def _post_init(application: Application) -> None:
+        await router.connect(socks)
+        _LOGGER.info("tchaka started successfully with %d shards...", len(stripes))
+
+    async def _post_shutdown(application: Application) -> None:
+        await router.close()  # workers exit when their socket closes
+        for proc in procs:
+            proc.join(timeout=10)
+
+    application = (
+        Application.builder()
+        .token(settings.tg_token)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+        .build()
+    )
+    application.add_handler(TypeHandler(Update, router.forward))
+    application.add_error_handler(error_handler)
+    application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+
 def main() -> None:
     settings = load_settings()
-    state = AppState()
+    if settings.shards > 1:
+        if settings.handoff_socket is not None:
+            _LOGGER.warning("TCHAKA_HANDOFF_SOCKET is ignored with shards")
+        if settings.backend != "memory":
+            _LOGGER.warning("TCHAKA_BACKEND is ignored with shards")
+        run_sharded(settings)
+        return
+    state = build_state(settings)
     clock = SystemClock()
     application = build_application(settings, state, clock)
     application.run_polling(allowed_updates=Update.ALL_TYPES)
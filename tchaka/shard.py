@@ -0,0 +1,489 @@
+"""Multi-process geographic sharding: a router and N shard workers.
+
+One process with one :class:`~tchaka.state.AppState` runs on one core. In
+sharded mode (``TCHAKA_SHARDS > 1``, see :func:`tchaka.main.run_sharded`) the
+polling process becomes a :class:`ShardRouter` that forwards every update to
+one of N worker processes, each running the usual callbacks over its own
+``AppState``.
+
+Design notes:
+
+- The world is cut into longitude :class:`Stripes`. A user is *owned* by the
+  worker of the stripe holding their location: registrations are routed there
+  and the user's chat follows them. When a location update lands in another
+  stripe, the router first moves the record and its tracked message ids from
+  the old owner to the new one (``RELEASE``/``ADOPT``), then forwards the
+  update. Other updates of chats without a user (``/start``, ``/help``) go to
+  worker ``chat_id % N``, which keeps tracking the replies it sent and deletes
+  them when the user leaves, like a ghost holder.
+- Border queries: every owned user is also copied, read-only, into each other
+  worker whose stripe lies within ``halo_km`` of them (a *ghost*). With the
+  halo at least the largest range, every user within range of an owned user
+  is present in the owner's state, so each query is answered by one worker,
+  from memory, exactly as in a single process -- a query never waits on the
+  adjacent shard. Workers report their owned users' changes (``PUT``/``DROP``)
+  and the router keeps the ghosts in step; a ghost trails its user by that
+  one hop.
+- Ghosts never come due for eviction (:data:`GHOST_TS`); the owner evicts the
+  user and the router then drops the ghosts (``GONE``). A worker tracks the
+  messages it sent to a ghost under the ghost's chat: it deletes them itself
+  when the user leaves, and hands them to the owner (``TRACKED``/``TRACK``)
+  when the user moves out of its halo.
+- Transport: one ``socketpair`` (``AF_UNIX``) per worker, carrying frames of a
+  13-byte header (payload length, op, chat id) and a binary payload. Updates
+  travel as compact JSON (their only lossless form); records are packed with
+  :mod:`struct` and message ids as an ``int64`` array. Frames on one socket
+  are handled in order, so a worker applies the updates of a chat in the
+  order they were polled.
+- Zones must be smaller than the halo, and an adaptive range of a border user
+  is computed from a partial view in the other workers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import socket
+import struct
+from array import array
+from bisect import bisect_right
+from collections import deque
+from collections.abc import Awaitable, Callable, Coroutine
+from dataclasses import dataclass
+from enum import IntEnum
+from math import asin, cos, degrees, isnan, nan, pi, radians, sin
+from multiprocessing.process import BaseProcess
+from typing import TYPE_CHECKING, Any
+
+from tchaka.geo import EARTH_RADIUS_KM
+from tchaka.state import AppState, Coord, UserRecord
+
+if TYPE_CHECKING:
+    from telegram import Update
+
+__all__ = [
+    "GHOST_TS",
+    "Op",
+    "ShardRouter",
+    "ShardWorker",
+    "Stripes",
+    "pack_handover",
+    "pack_record",
+    "spawn_workers",
+    "unpack_handover",
+    "unpack_record",
+]
+
+_LOGGER = logging.getLogger(__name__)
+
+# Activity time of a ghost: never idle, the owner evicts the user.
+GHOST_TS = 1e18
+_HEADER = struct.Struct("<IBq")  # payload length, op, chat id
+_RECORD = struct.Struct("<dddddB")  # lat, lon, active, range, moved, id length
+_HALO_PAD = 1e-9  # relative padding so float error never drops a border shard
+
+
+class Op(IntEnum):
+    """Frame kinds. Router to worker first, then worker to router."""
+
+    UPDATE = 1  # a Telegram update, as JSON
+    GHOST = 2  # insert or refresh a ghost record
+    UNGHOST = 3  # the user left the halo: hand its tracked ids back
+    GONE = 4  # the user left tchaka: delete what was sent to them
+    RELEASE = 5  # give up the chat: answer RELEASED with record and ids
+    ADOPT = 6  # take over a chat released by another worker
+    TRACK = 7  # track ids handed back for an owned chat
+    SYNC = 8  # answer SYNCED once every earlier frame is handled
+    PUT = 20  # an owned user was added, moved or changed range
+    DROP = 21  # an owned user was removed (/stop, eviction)
+    RELEASED = 22
+    TRACKED = 23
+    SYNCED = 24
+
+
+@dataclass(frozen=True)
+class Stripes:
+    """Longitude stripes: shard ``i`` covers ``[cuts[i-1], cuts[i])``, the
+    first one from -180 and the last one up to 180."""
+
+    cuts: tuple[float, ...] = ()
+
+    def __post_init__(self) -> None:
+        if list(self.cuts) != sorted(set(self.cuts)) or any(
+            not -180.0 < c < 180.0 for c in self.cuts
+        ):
+            raise ValueError("cuts must be increasing and inside (-180, 180)")
+
+    @classmethod
+    def even(cls, n: int) -> Stripes:
+        """``n`` stripes of equal width."""
+        if n < 1:
+            raise ValueError("need at least one stripe")
+        return cls(tuple(-180.0 + 360.0 * i / n for i in range(1, n)))
+
+    def __len__(self) -> int:
+        return len(self.cuts) + 1
+
+    def shard_of(self, lon: float) -> int:
+        """The stripe holding longitude ``lon``."""
+        if not -180.0 <= lon < 180.0:
+            lon = (lon + 180.0) % 360.0 - 180.0
+        return bisect_right(self.cuts, lon)
+
+    def shards_near(self, lat: float, lon: float, km: float) -> set[int]:
+        """Every stripe holding a point within ``km`` of ``(lat, lon)`` (and
+        possibly a few more near the poles)."""
+        everything = set(range(len(self)))
+        ang = max(km, 0.0) / EARTH_RADIUS_KM * (1 + _HALO_PAD) + _HALO_PAD
+        if ang >= pi / 2 or abs(lat) + degrees(ang) >= 90.0:
+            return everything  # the cap reaches a pole
+        # Widest longitude offset of the spherical cap (as in GridIndex._box).
+        dlon = degrees(asin(min(sin(ang) / cos(radians(lat)), 1.0)))
+        if dlon >= 180.0:
+            return everything
+        lo = self.shard_of(lon - dlon)
+        hi = self.shard_of(lon + dlon)
+        if -180.0 <= lon - dlon and lon + dlon < 180.0:
+            return set(range(lo, hi + 1))
+        return set(range(lo, len(self))) | set(range(hi + 1))  # antimeridian
+
+
+# --------------------------------------------------------------------------- #
+# Wire encoding
+# --------------------------------------------------------------------------- #
+def _frame(op: Op, chat_id: int, payload: bytes = b"") -> bytes:
+    return _HEADER.pack(len(payload), op, chat_id) + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> tuple[Op, int, bytes]:
+    size, op, chat_id = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return Op(op), chat_id, await reader.readexactly(size) if size else b""
+
+
+def pack_record(rec: UserRecord) -> bytes:
+    """Binary form of a record, without its chat id (carried by the frame)."""
+    user_id = rec.user_id.encode()
+    lang = rec.lang.encode()
+    return b"".join(
+        (
+            _RECORD.pack(
+                rec.lat,
+                rec.lon,
+                rec.last_active_ts,
+                nan if rec.range_km is None else rec.range_km,
+                nan if rec.moved_ts is None else rec.moved_ts,
+                len(user_id),
+            ),
+            user_id,
+            bytes((len(lang),)),
+            lang,
+        )
+    )
+
+
+def unpack_record(chat_id: int, buf: bytes, offset: int = 0) -> tuple[UserRecord, int]:
+    """Inverse of :func:`pack_record`; returns the record and the offset just
+    past it."""
+    lat, lon, active, range_km, moved, n_id = _RECORD.unpack_from(buf, offset)
+    offset += _RECORD.size
+    user_id = buf[offset : offset + n_id].decode()
+    offset += n_id
+    n_lang = buf[offset]
+    lang = buf[offset + 1 : offset + 1 + n_lang].decode()
+    rec = UserRecord(
+        user_id,
+        chat_id,
+        Coord(lat, lon),
+        active,
+        lang,
+        None if isnan(range_km) else range_km,
+        None if isnan(moved) else moved,
+    )
+    return rec, offset + 1 + n_lang
+
+
+def pack_handover(rec: UserRecord | None, msg_ids: list[int]) -> bytes:
+    """A released chat: its record, if any, then its tracked message ids."""
+    head = b"\x00" if rec is None else b"\x01" + pack_record(rec)
+    return head + array("q", msg_ids).tobytes()
+
+
+def unpack_handover(chat_id: int, buf: bytes) -> tuple[UserRecord | None, list[int]]:
+    rec: UserRecord | None = None
+    offset = 1
+    if buf[0]:
+        rec, offset = unpack_record(chat_id, buf, 1)
+    return rec, _unpack_ids(buf[offset:])
+
+
+def _unpack_ids(buf: bytes) -> list[int]:
+    ids = array("q")
+    ids.frombytes(buf)
+    return ids.tolist()
+
+
+def spawn_workers(
+    n: int, target: Callable[..., None], *args: Any
+) -> tuple[list[BaseProcess], list[socket.socket]]:
+    """Start ``n`` processes running ``target(index, sock, *args)``; returns
+    them and the router's end of each one's socket."""
+    mp = multiprocessing.get_context("spawn")  # no inherited event loop
+    procs: list[BaseProcess] = []
+    socks: list[socket.socket] = []
+    for index in range(n):
+        ours, theirs = socket.socketpair()
+        proc = mp.Process(
+            target=target,
+            args=(index, theirs, *args),
+            name=f"tchaka-shard-{index}",
+            daemon=True,
+        )
+        proc.start()
+        theirs.close()
+        procs.append(proc)
+        socks.append(ours)
+    return procs, socks
+
+
+# --------------------------------------------------------------------------- #
+# Worker side
+# --------------------------------------------------------------------------- #
+UpdateHandler = Callable[[int, bytes], Awaitable[None]]
+Cleanup = Callable[[int, list[int]], Coroutine[Any, Any, None]]
+
+
+class ShardWorker:
+    """Applies the router's frames to one shard's state.
+
+    ``handle(chat_id, payload)`` processes an update (the Telegram callbacks in
+    production); ``cleanup(chat_id, ids)`` deletes the messages this worker
+    sent to a ghost whose user is gone.
+    """
+
+    def __init__(
+        self, state: AppState, handle: UpdateHandler, cleanup: Cleanup | None = None
+    ) -> None:
+        self.state = state
+        self.handle = handle
+        self.cleanup = cleanup
+        self.ghosts: set[int] = set()  # chat ids of the ghost records
+        # chat_id -> (user_id, coord, range) last reported to the router
+        self.owned: dict[int, tuple[str, Coord, float | None]] = {}
+        self._writer: asyncio.StreamWriter | None = None
+        self._cleanups: set[asyncio.Task[None]] = set()
+
+    async def serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Handle frames until the router closes the socket."""
+        self._writer = writer
+        while True:
+            try:
+                op, chat_id, payload = await _read_frame(reader)
+            except asyncio.IncompleteReadError:
+                break
+            if op is Op.UPDATE:
+                await self.handle(chat_id, payload)
+                self.report(chat_id)
+            else:
+                self.apply(op, chat_id, payload)
+            await writer.drain()
+        await asyncio.gather(*self._cleanups)
+
+    def apply(self, op: Op, chat_id: int, payload: bytes) -> None:
+        """Apply one state frame (synchronously, so atomically)."""
+        state = self.state
+        if op is Op.GHOST:
+            ghost, _ = unpack_record(chat_id, payload)
+            ghost.last_active_ts, ghost.moved_ts = GHOST_TS, None
+            self._drop_ghost(chat_id)
+            state.register(ghost)
+            self.ghosts.add(chat_id)
+        elif op is Op.UNGHOST:
+            self._drop_ghost(chat_id)
+            if ids := state.pop_tracked(chat_id):
+                self._send(Op.TRACKED, chat_id, array("q", ids).tobytes())
+        elif op is Op.GONE:
+            self._drop_ghost(chat_id)
+            ids = state.pop_tracked(chat_id)
+            if ids and self.cleanup is not None:
+                task = asyncio.create_task(self.cleanup(chat_id, ids))
+                self._cleanups.add(task)
+                task.add_done_callback(self._cleanups.discard)
+        elif op is Op.RELEASE:
+            released = None if chat_id in self.ghosts else state.remove_by_chat(chat_id)
+            self.owned.pop(chat_id, None)
+            ids = state.pop_tracked(chat_id)
+            self._send(Op.RELEASED, chat_id, pack_handover(released, ids))
+        elif op is Op.ADOPT:
+            adopted, ids = unpack_handover(chat_id, payload)
+            self._drop_ghost(chat_id)
+            if adopted is not None:
+                adopted.moved_ts = None  # the pending move must not be debounced
+                state.register(adopted)
+            for mid in ids:
+                state.track_message(chat_id, mid)
+            self.report(chat_id)
+        elif op is Op.TRACK:
+            for mid in _unpack_ids(payload):
+                state.track_message(chat_id, mid)
+        elif op is Op.SYNC:
+            self._send(Op.SYNCED, chat_id)
+        else:
+            raise ValueError(f"unexpected frame {op!r}")
+
+    def report(self, chat_id: int) -> None:
+        """Tell the router if the chat's owned user changed where or how far
+        ghosts need it."""
+        rec = self.state.user_for_chat(chat_id)
+        if rec is None or chat_id in self.ghosts:
+            if self.owned.pop(chat_id, None) is not None:
+                self._send(Op.DROP, chat_id)
+            return
+        view = (rec.user_id, rec.coord, rec.range_km)
+        if self.owned.get(chat_id) != view:
+            self.owned[chat_id] = view
+            self._send(Op.PUT, chat_id, pack_record(rec))
+
+    def report_removed(self) -> None:
+        """Report every owned user removed outside an update (eviction)."""
+        chat_to_user = self.state.chat_to_user
+        for chat_id in [c for c in self.owned if c not in chat_to_user]:
+            self.report(chat_id)
+
+    def _drop_ghost(self, chat_id: int) -> None:
+        if chat_id in self.ghosts:
+            self.ghosts.discard(chat_id)
+            self.state.remove_by_chat(chat_id)
+
+    def _send(self, op: Op, chat_id: int, payload: bytes = b"") -> None:
+        if self._writer is not None:
+            self._writer.write(_frame(op, chat_id, payload))
+
+
+# --------------------------------------------------------------------------- #
+# Router side
+# --------------------------------------------------------------------------- #
+class ShardRouter:
+    """Routes updates to the owning worker and keeps the ghosts in step."""
+
+    def __init__(self, stripes: Stripes, halo_km: float) -> None:
+        self.stripes = stripes
+        self.halo_km = halo_km
+        self.owner: dict[int, int] = {}  # chat_id -> owning worker
+        self.ghosts: dict[int, set[int]] = {}  # chat_id -> workers holding one
+        self._writers: list[asyncio.StreamWriter] = []
+        self._listeners: list[asyncio.Task[None]] = []
+        self._releases: dict[int, asyncio.Future[bytes]] = {}
+        self._syncs: list[deque[asyncio.Future[None]]] = []
+
+    async def connect(self, socks: list[socket.socket]) -> None:
+        """Start talking to one worker per stripe."""
+        if len(socks) != len(self.stripes):
+            raise ValueError("need one worker per stripe")
+        for index, sock in enumerate(socks):
+            reader, writer = await asyncio.open_unix_connection(sock=sock)
+            self._writers.append(writer)
+            self._syncs.append(deque())
+            self._listeners.append(asyncio.create_task(self._listen(index, reader)))
+
+    async def close(self) -> None:
+        for writer in self._writers:
+            writer.close()
+        for task in self._listeners:
+            task.cancel()
+        await asyncio.gather(*self._listeners, return_exceptions=True)
+
+    def shard_for(self, chat_id: int) -> int:
+        return self.owner.get(chat_id, chat_id % len(self.stripes))
+
+    async def forward(self, update: Update, ctx: object) -> None:
+        """Handler for every polled update (a ``TypeHandler`` callback)."""
+        chat, message = update.effective_chat, update.effective_message
+        if chat is None:
+            return
+        location = None
+        if message is not None and message.location is not None:
+            location = Coord(message.location.latitude, message.location.longitude)
+        payload = json.dumps(update.to_dict(), separators=(",", ":")).encode()
+        await self.route(chat.id, location, payload)
+
+    async def route(self, chat_id: int, location: Coord | None, payload: bytes) -> None:
+        """Send an update to the worker that owns (or is about to own) its
+        chat, moving the chat first when the location changes stripe."""
+        shard = self.shard_for(chat_id)
+        if location is not None:
+            target = self.stripes.shard_of(location.lon)
+            if target != shard and chat_id in self.owner:
+                await self._migrate(chat_id, shard, target)
+            # Claimed now: the worker's PUT for a new user comes later.
+            self.owner[chat_id] = shard = target
+        writer = self._writers[shard]
+        writer.write(_frame(Op.UPDATE, chat_id, payload))
+        await writer.drain()
+
+    async def barrier(self) -> None:
+        """Wait until every worker has handled every frame sent so far."""
+        waits = []
+        for index, writer in enumerate(self._writers):
+            done = asyncio.get_running_loop().create_future()
+            self._syncs[index].append(done)
+            writer.write(_frame(Op.SYNC, 0))
+            waits.append(done)
+        await asyncio.gather(*waits)
+
+    async def _migrate(self, chat_id: int, source: int, target: int) -> None:
+        released = asyncio.get_running_loop().create_future()
+        self._releases[chat_id] = released
+        self._send(source, Op.RELEASE, chat_id)
+        payload = await released
+        if (holders := self.ghosts.get(chat_id)) is not None:
+            holders.discard(target)  # the adopted record replaces the ghost
+        self._send(target, Op.ADOPT, chat_id, payload)
+
+    async def _listen(self, index: int, reader: asyncio.StreamReader) -> None:
+        # Never waits on a write: a worker blocked writing to us must still
+        # be read from, or both ends would wait on each other.
+        while True:
+            try:
+                op, chat_id, payload = await _read_frame(reader)
+            except asyncio.IncompleteReadError:
+                _LOGGER.error("shard %d closed its socket", index)
+                return
+            if op is Op.PUT:
+                self._placed(index, chat_id, payload)
+            elif op is Op.DROP:
+                self.owner.pop(chat_id, None)
+                holders = self.ghosts.pop(chat_id, set())
+                holders.add(chat_id % len(self.stripes))  # its /start replies
+                holders.discard(index)
+                for holder in holders:
+                    self._send(holder, Op.GONE, chat_id)
+            elif op is Op.RELEASED:
+                self._releases.pop(chat_id).set_result(payload)
+            elif op is Op.TRACKED:
+                if (owner := self.owner.get(chat_id)) is not None:
+                    self._send(owner, Op.TRACK, chat_id, payload)
+            elif op is Op.SYNCED:
+                self._syncs[index].popleft().set_result(None)
+
+    def _placed(self, index: int, chat_id: int, payload: bytes) -> None:
+        """Owned user ``chat_id`` of worker ``index`` is at the record in
+        ``payload``: refresh its ghosts."""
+        self.owner[chat_id] = index
+        lat, lon = _RECORD.unpack_from(payload)[:2]
+        near = self.stripes.shards_near(lat, lon, self.halo_km)
+        near.discard(index)
+        for holder in near:
+            self._send(holder, Op.GHOST, chat_id, payload)
+        for holder in self.ghosts.get(chat_id, set()) - near:
+            self._send(holder, Op.UNGHOST, chat_id)
+        if near:
+            self.ghosts[chat_id] = near
+        else:
+            self.ghosts.pop(chat_id, None)
+
+    def _send(self, index: int, op: Op, chat_id: int, payload: bytes = b"") -> None:
+        self._writers[index].write(_frame(op, chat_id, payload))
@@ -0,0 +1,254 @@
+"""Cell-bucketed spatial index for the ego-centric neighborhood query.
+
+:class:`GridIndex` buckets keys (user ids) into equal-angle latitude/longitude
+cells of about ``cell_km`` kilometres. A radius query converts the radius into
+an exact great-circle bounding box and only visits the cells overlapping it, so
+:meth:`AppState.neighbors` no longer scans every registered user.
+
+The index only answers "which keys *might* be within the radius" -- callers
+still apply the exact distance test to the returned candidates. Candidates are
+a superset of the true neighborhood (no false negatives), including across the
+antimeridian and near the poles, where the box widens to every longitude.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Hashable, Iterable, Iterator, Mapping
+from math import asin, ceil, cos, degrees, floor, pi, radians, sin
+from typing import Generic, TypeVar
+
+from tchaka.geo import EARTH_RADIUS_KM
+
+__all__ = ["DEFAULT_CELL_KM", "GridIndex"]
+
+DEFAULT_CELL_KM = 5.0
+_DISTANCE_DEGREE_KM = 111.32  # mean km length of 1 degree of latitude
+_BOX_PAD = 1e-9  # relative padding so float error never drops a boundary point
+
+Cell = tuple[int, int]
+_RowBox = tuple[tuple[int, int], tuple[int, int] | None]
+K = TypeVar("K", bound=Hashable)
+
+
+class GridIndex(Generic[K]):
+    """Mapping of keys to lat/lon grid cells, queryable by radius."""
+
+    def __init__(self, cell_km: float = DEFAULT_CELL_KM) -> None:
+        if cell_km <= 0:
+            raise ValueError(f"cell_km must be positive, got {cell_km!r}")
+        self.cell_km = cell_km
+        self._step = min(cell_km / _DISTANCE_DEGREE_KM, 180.0)  # degrees
+        self._n_rows = ceil(180.0 / self._step)
+        self._n_cols = ceil(360.0 / self._step)
+        self._cells: dict[Cell, set[K]] = {}
+        # key -> packed cell id (row * n_cols + col): one small int per key
+        # instead of a (row, col) tuple keeps the reverse map compact.
+        self._where: dict[K, int] = {}
+        # (row, radius) -> row span and column offsets shared by a whole row
+        self._row_boxes: dict[tuple[int, float], _RowBox] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._where
+
+    # ------------------------------------------------------------------ #
+    # Cell arithmetic
+    # ------------------------------------------------------------------ #
+    def _row(self, lat: float) -> int:
+        return min(max(floor((lat + 90.0) / self._step), 0), self._n_rows - 1)
+
+    def _col(self, lon: float) -> int:
+        return min(max(floor((lon + 180.0) / self._step), 0), self._n_cols - 1)
+
+    def cell_of(self, lat: float, lon: float) -> Cell:
+        """Return the ``(row, col)`` cell holding a WGS-84 point."""
+        # _row and _col inlined: this runs once per insert and per point of a
+        # batch clustering.
+        if not -180.0 <= lon < 180.0:
+            lon = _wrap_lon(lon)
+        step = self._step
+        return (
+            min(max(floor((lat + 90.0) / step), 0), self._n_rows - 1),
+            min(max(floor((lon + 180.0) / step), 0), self._n_cols - 1),
+        )
+
+    def cell_bounds(self, cell: Cell) -> tuple[float, float, float, float]:
+        """``(lat_lo, lon_lo, lat_hi, lon_hi)`` of a cell, clipped to the globe."""
+        row, col = cell
+        return (
+            -90.0 + row * self._step,
+            -180.0 + col * self._step,
+            min(-90.0 + (row + 1) * self._step, 90.0),
+            min(-180.0 + (col + 1) * self._step, 180.0),
+        )
+
+    # ------------------------------------------------------------------ #
+    # Mutators
+    # ------------------------------------------------------------------ #
+    def insert(self, key: K, lat: float, lon: float) -> None:
+        """Index ``key`` at ``(lat, lon)``; re-inserting a key moves it (O(1),
+        and free when the key stays in its cell)."""
+        cell = self.cell_of(lat, lon)
+        packed = cell[0] * self._n_cols + cell[1]
+        current = self._where.get(key)
+        if current == packed:
+            return
+        if current is not None:
+            self.remove(key)
+        self._cells.setdefault(cell, set()).add(key)
+        self._where[key] = packed
+
+    def remove(self, key: K) -> bool:
+        """Drop ``key`` from the index. Returns ``False`` if it was absent."""
+        packed = self._where.pop(key, None)
+        if packed is None:
+            return False
+        cell = divmod(packed, self._n_cols)
+        bucket = self._cells[cell]
+        bucket.discard(key)
+        if not bucket:
+            del self._cells[cell]  # keep the occupied-cell map sparse
+        return True
+
+    # ------------------------------------------------------------------ #
+    # Queries
+    # ------------------------------------------------------------------ #
+    def cells(self) -> Iterator[tuple[Cell, set[K]]]:
+        """Yield every occupied ``(cell, members)`` pair (members are live)."""
+        yield from self._cells.items()
+
+    def cells_near(
+        self, lat: float, lon: float, radius_km: float
+    ) -> Iterator[tuple[Cell, set[K]]]:
+        """Yield the occupied cells that may hold points within ``radius_km``."""
+        lon = _wrap_lon(lon)
+        box = self._box(lat, lat, lon, lon, radius_km)
+        for cell in _occupied_in_box(box, self._cells):
+            yield cell, self._cells[cell]
+
+    def candidates(self, lat: float, lon: float, radius_km: float) -> Iterator[K]:
+        """Yield every key that may lie within ``radius_km`` of ``(lat, lon)``."""
+        for _, members in self.cells_near(lat, lon, radius_km):
+            yield from members
+
+    def rings(
+        self, lat: float, lon: float, radii: Iterable[float]
+    ) -> Iterator[tuple[float, list[K]]]:
+        """Expanding ring search: for each radius (increasing), yield it with
+        the keys of the cells it newly brings into range.
+
+        After the step for radius ``r`` every key within ``r`` of the point
+        has been yielded; cells already visited are never re-yielded, so the
+        caller can stop as soon as it has seen enough.
+        """
+        lon = _wrap_lon(lon)
+        seen: set[Cell] = set()
+        for radius in radii:
+            box = self._box(lat, lat, lon, lon, radius)
+            fresh = [c for c in _occupied_in_box(box, self._cells) if c not in seen]
+            seen.update(fresh)
+            yield radius, [key for cell in fresh for key in self._cells[cell]]
+
+    def cells_around(
+        self, cell: Cell, radius_km: float, occupied: Mapping[Cell, object]
+    ) -> list[Cell]:
+        """The cells of ``occupied`` that may hold a point within ``radius_km``
+        of *any* point of ``cell`` (for cell-to-cell joins over a caller-owned
+        bucketing that uses this grid's :meth:`cell_of`)."""
+        row, col = cell
+        row_box = self._row_boxes.get((row, radius_km))
+        if row_box is None:
+            row_box = self._row_boxes[row, radius_km] = self._row_box(row, radius_km)
+        rows, offsets = row_box
+        if offsets is not None:
+            c0, c1 = col + offsets[0], col + offsets[1]
+            if c0 >= 0 and c1 < self._n_cols - 1:  # no wrap, no short last column
+                return _occupied_in_box((rows, [(c0, c1)]), occupied)
+        lat_lo, lon_lo, lat_hi, lon_hi = self.cell_bounds(cell)
+        box = self._box(lat_lo, lat_hi, lon_lo, lon_hi, radius_km)
+        return _occupied_in_box(box, occupied)
+
+    def _row_box(self, row: int, radius_km: float) -> _RowBox:
+        """Box of a mid-row cell, with columns as offsets from that cell.
+
+        Every cell of a row has the same width, so the offsets carry over to
+        the whole row; they are widened by one column to absorb rounding.
+        """
+        ref = self._n_cols // 2
+        lat_lo, lon_lo, lat_hi, lon_hi = self.cell_bounds((row, ref))
+        rows, spans = self._box(lat_lo, lat_hi, lon_lo, lon_hi, radius_km)
+        if len(spans) != 1 or spans[0] == (0, self._n_cols - 1):
+            return rows, None
+        return rows, (spans[0][0] - ref - 1, spans[0][1] - ref + 1)
+
+    def _box(
+        self,
+        lat_lo: float,
+        lat_hi: float,
+        lon_lo: float,
+        lon_hi: float,
+        radius_km: float,
+    ) -> tuple[tuple[int, int], list[tuple[int, int]]]:
+        """Row span and column spans covering the radius around a lat/lon
+        rectangle (a single point when the bounds coincide)."""
+        full_cols = [(0, self._n_cols - 1)]
+        ang = max(radius_km, 0.0) / EARTH_RADIUS_KM * (1 + _BOX_PAD) + _BOX_PAD
+        if ang >= pi:
+            return (0, self._n_rows - 1), full_cols
+
+        dlat = degrees(ang)
+        lat_lo, lat_hi = lat_lo - dlat, lat_hi + dlat
+        rows = (self._row(lat_lo), self._row(lat_hi))
+        if lat_lo <= -90.0 or lat_hi >= 90.0:
+            return rows, full_cols  # the cap contains a pole
+
+        # Widest longitude offset of the spherical cap (Matuschek's formula),
+        # taken at the rectangle's most poleward latitude.
+        poleward = max(abs(lat_lo + dlat), abs(lat_hi - dlat))
+        dlon = degrees(asin(min(sin(ang) / cos(radians(poleward)), 1.0)))
+        if dlon >= 180.0 or lon_hi - lon_lo + 2 * dlon >= 360.0:
+            return rows, full_cols
+        lon_lo, lon_hi = lon_lo - dlon, lon_hi + dlon
+        if lon_lo < -180.0:
+            spans = [(lon_lo + 360.0, 180.0), (-180.0, lon_hi)]
+        elif lon_hi >= 180.0:
+            spans = [(lon_lo, 180.0), (-180.0, lon_hi - 360.0)]
+        else:
+            spans = [(lon_lo, lon_hi)]
+        return rows, [(self._col(lo), self._col(hi)) for lo, hi in spans]
+
+
+def _occupied_in_box(
+    box: tuple[tuple[int, int], list[tuple[int, int]]],
+    occupied: Mapping[Cell, object],
+) -> list[Cell]:
+    """Occupied cells inside a row/column box.
+
+    Visits only the cells of the box, or walks the occupied cells instead when
+    the box covers more cells than are occupied (very large radii, polar caps),
+    so the cost is bounded either way.
+    """
+    (r0, r1), col_ranges = box
+    n_box = (r1 - r0 + 1) * sum(c1 - c0 + 1 for c0, c1 in col_ranges)
+    if n_box > len(occupied):
+        return [
+            (row, col)
+            for row, col in occupied
+            if r0 <= row <= r1 and any(c0 <= col <= c1 for c0, c1 in col_ranges)
+        ]
+    return [
+        (row, col)
+        for row in range(r0, r1 + 1)
+        for c0, c1 in col_ranges
+        for col in range(c0, c1 + 1)
+        if (row, col) in occupied
+    ]
+
+
+def _wrap_lon(lon: float) -> float:
+    """Normalize a longitude into ``[-180, 180)``."""
+    if -180.0 <= lon < 180.0:
+        return lon
+    return (lon + 180.0) % 360.0 - 180.0
@@ -12,32 +12,110 @@ Design notes (see ``.kiro/specs/tchaka-product-improvements/design.md``):
   never collide (fixes the float-tuple-key bug).
 - The user registry is keyed by a stable anonymized ``user_id``.
 - ``tracked_msgs`` only ever holds *real* message ids (sent by the bot or
-  received from a user) -- no fabricated/incremented ids.
+  received from a user) -- no fabricated/incremented ids. They are stored as
+  run-length intervals and may be capped (:mod:`tchaka.tracked`).
 - The dataclass methods themselves are plain (not async) and do **not** acquire
   the lock.  Callers acquire ``state.lock`` around any read-modify-write
   sequence and never perform network I/O while holding it.
+- Every callback and job runs on one event loop and no method awaits, so a
+  *single* method call is already atomic: the lock only has to cover
+  sequences of calls. Lone calls such as :meth:`track_message` after a send
+  take no lock. The lock is deliberately not sharded by cell: shards could not
+  run in parallel on one loop, and a query spanning nine cells would pay nine
+  acquisitions instead of one.
+- Rule: never ``await`` while holding ``state.lock``. Writers then only ever
+  leave the state between two complete critical sections, so a reader that
+  runs its calls without awaiting (``/check``, the relay recipient query)
+  sees one consistent version without taking the lock -- the isolation an
+  immutable copy-on-write snapshot would give, without copying the users and
+  the index on every write (see ``benchmarks/bench_reads.py``). Readers in
+  another thread must copy what they need under the lock instead, as
+  :func:`tchaka.core.neighbor_stats` does.
 
 State invariants (enforced by the mutators):
 
 - I1 -- Bijection consistency: every ``chat_to_user`` entry points to a record
   carrying that same chat id, and every record's chat id resolves back.
 - I2 -- Unique identity: each ``user_id`` and each ``chat_id`` appears once.
+  New ids come from :attr:`ids` (:meth:`allocate_user_id`), which never hands
+  out a live one; :meth:`register` refuses an id owned by another chat.
 - I3 -- Full removal: :meth:`remove_by_chat` + :meth:`pop_tracked` leave no
   dangling references.
 - I4 -- Real ids only: :meth:`track_message` records only real ids.
 - I5 -- Coordinate values, not keys.
+- I6 -- Index consistency: :attr:`index` (and :attr:`columns`, when enabled)
+  holds exactly the keys of ``users``, at each record's coordinate, and
+  :attr:`units` caches each record's unit vector.
+- I7 -- Adjacency consistency: when ``adjacency_km`` is set, ``adjacency``
+  holds, for every user, exactly the users within range of each other (each
+  side's effective range), mapped to their chat id. The relation is symmetric.
+- I8 -- Zone consistency: when ``zones`` is set, ``zone_of`` maps exactly the
+  users located in a zone to its name and ``zone_members`` is its inverse
+  (no empty sets).
+- I9 -- Expiry buckets: :attr:`expiry` holds every user exactly once, in the
+  bucket of slot ``last_active_ts // expiry_slot_s``, mapped to that same
+  timestamp. The timestamp is only changed through :meth:`touch`, which
+  updates (or moves) the entry in O(1).
+
+Per-user ranges (``/range``) are mutual: two users see each other when their
+distance is within *both* effective ranges, i.e. ``min(rA, rB)``. Every
+effective range is capped by the configured threshold, so the grid (sized from
+that threshold) still answers each query from the cells around the sender; the
+other side's range only filters the candidates.
+
+Density-adaptive mode (``adaptive_k > 0``) grows each user's base range from
+the configured threshold until at least ``adaptive_k`` other users are within
+it, capped at ``adaptive_max_km`` (see :meth:`AppState.adaptive_range`). It is
+computed on demand by a ring search over the grid, so the cost follows the
+cells visited, not the population. Pairs stay mutual, so a rural user only
+reaches a town user within the town user's (smaller) range. Adaptive ranges
+move whenever users nearby come and go, so the mode cannot be combined with a
+materialized adjacency.
+
+Geofenced zones (``zones``, see :mod:`tchaka.zones`) replace the radius inside
+a venue: a user located in a zone has the zone's whole membership as neighbors,
+read from one set, and users outside every zone never reach into a zone (nor
+the other way), which keeps the relation symmetric. Membership is updated on
+register, move and removal only.
 """
 
 from __future__ import annotations
 
 import asyncio
+import heapq
+import logging
+from collections.abc import Iterable
+from collections.abc import Set as AbstractSet
 from dataclasses import dataclass, field
+from math import dist
 from typing import NamedTuple
 
-from tchaka.geo import haversine_distance
+from tchaka.columns import CoordColumns
+from tchaka.geo import (
+    HAS_NUMPY,
+    EqPoint,
+    Vec3,
+    chord_sq_bounds,
+    equirect_covers,
+    equirect_point,
+    equirect_sq_bounds,
+    haversine_distance,
+    unit_vector,
+)
+from tchaka.ids import UserIdAllocator
+from tchaka.spatial import DEFAULT_CELL_KM, GridIndex
+from tchaka.tracked import TrackedMessages
+from tchaka.zones import ZoneIndex
 
 __all__ = ["Coord", "UserRecord", "AppState"]
 
+_LOGGER = logging.getLogger(__name__)
+
+# Above this many candidates per kept neighbor, _nearest_ids selects with a
+# heap before sorting; below it a plain sort is faster.
+_SELECT_SORT_FACTOR = 8
+DEFAULT_EXPIRY_SLOT_S = 60.0
+
 
 class Coord(NamedTuple):
     """A WGS-84 latitude/longitude pair. A value type, never a mapping key."""
@@ -46,16 +124,50 @@ class Coord(NamedTuple):
     lon: float
 
 
-@dataclass
+@dataclass(slots=True, init=False)
 class UserRecord:
-    """Everything tchaka knows about an active user (all in memory)."""
+    """Everything tchaka knows about an active user (all in memory).
+
+    Slotted: without a per-instance ``__dict__`` a record is ~90 bytes instead
+    of ~350, which dominates memory at a million users (see bench_memory). The
+    position is kept as two inline floats rather than a :class:`Coord`, which
+    saves a 64-byte tuple per user; :attr:`coord` builds one on demand.
+    """
 
     user_id: str  # anonymized stable hash, e.g. "u1a2b3"
     chat_id: int
-    coord: Coord
+    lat: float
+    lon: float
     last_active_ts: float  # epoch seconds, sourced from an injected Clock
-    lang: str = "en"
-    range_km: float | None = None  # reserved: per-user override (deferred R8)
+    lang: str
+    range_km: float | None  # per-user override set by /range (R8)
+    moved_ts: float | None  # last applied live-location move
+
+    def __init__(
+        self,
+        user_id: str,
+        chat_id: int,
+        coord: Coord,
+        last_active_ts: float,
+        lang: str = "en",
+        range_km: float | None = None,
+        moved_ts: float | None = None,
+    ) -> None:
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.lat, self.lon = coord
+        self.last_active_ts = last_active_ts
+        self.lang = lang
+        self.range_km = range_km
+        self.moved_ts = moved_ts
+
+    @property
+    def coord(self) -> Coord:
+        return Coord(self.lat, self.lon)
+
+    @coord.setter
+    def coord(self, coord: Coord) -> None:
+        self.lat, self.lon = coord
 
 
 @dataclass
@@ -64,8 +176,57 @@ class AppState:
 
     chat_to_user: dict[int, str] = field(default_factory=dict)
     users: dict[str, UserRecord] = field(default_factory=dict)
-    tracked_msgs: dict[int, set[int]] = field(default_factory=dict)
+    # Idle-eviction timing wheel: slot -> {user_id: last_active_ts} of the
+    # users last active in it (I9). A sweep only opens the slots that are due.
+    expiry_slot_s: float = DEFAULT_EXPIRY_SLOT_S
+    expiry: dict[int, dict[str, float]] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    # chat_id -> run-length encoded message ids, optionally capped.
+    tracked_msgs: TrackedMessages = field(default_factory=TrackedMessages)
     lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Anonymized id source: unique among ``users`` (I2), pool refilled by a job.
+    ids: UserIdAllocator = field(default_factory=UserIdAllocator, repr=False)
+    # Grid cell size; the configured range is a good choice (see main.py).
+    cell_km: float = DEFAULT_CELL_KM
+    # Opt-in struct-of-arrays store: one vectorized pass per neighbor query.
+    columnar: bool = False
+    index: GridIndex[str] = field(init=False, repr=False)
+    # user_id -> 3D unit vector of the record's coordinate (set on register).
+    units: dict[str, Vec3] = field(init=False, repr=False, default_factory=dict)
+    # Radii up to this (km) are tested with the equirectangular approximation
+    # instead of the chord (None: chord only); see geo.equirect_sq_bounds.
+    equirect_km: float | None = None
+    # user_id -> cached equirectangular point, only when equirect_km is set.
+    eq_points: dict[str, EqPoint] = field(init=False, repr=False, default_factory=dict)
+    columns: CoordColumns | None = field(init=False, repr=False, default=None)
+    # Range whose neighborhoods are kept materialized (None disables it).
+    adjacency_km: float | None = None
+    # user_id -> {neighbor user_id: neighbor chat_id}, symmetric (I7).
+    adjacency: dict[str, dict[str, int]] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    # Density-adaptive ranges: grow until this many neighbors (0 disables) ...
+    adaptive_k: int = 0
+    # ... but never beyond this (km).
+    adaptive_max_km: float = 0.0
+    # Static geofenced zones (None disables them).
+    zones: ZoneIndex | None = None
+    # user_id -> zone name, and zone name -> member user ids (I8).
+    zone_of: dict[str, str] = field(init=False, repr=False, default_factory=dict)
+    zone_members: dict[str, set[str]] = field(
+        init=False, repr=False, default_factory=dict
+    )
+
+    def __post_init__(self) -> None:
+        if self.adaptive_k > 0 and self.adjacency_km is not None:
+            raise ValueError("adaptive ranges cannot use a materialized adjacency")
+        self.index = GridIndex(self.cell_km)
+        if self.columnar:
+            if HAS_NUMPY:
+                self.columns = CoordColumns()
+            else:
+                _LOGGER.warning("numpy not installed; columnar store disabled")
 
     # ------------------------------------------------------------------ #
     # Mutators (callers hold ``self.lock``)
@@ -74,12 +235,35 @@ class AppState:
         """Insert a new user record and its chat mapping.
 
         Postconditions: ``users[rec.user_id] is rec`` and
-        ``chat_to_user[rec.chat_id] == rec.user_id`` (maintains I1, I2).
-        Idempotency at the chat level is the caller's responsibility (check
-        :meth:`user_for_chat` first).
+        ``chat_to_user[rec.chat_id] == rec.user_id`` (maintains I1, I2) and the
+        record is indexed at its coordinate (I6). Idempotency at the chat level
+        is the caller's responsibility (check :meth:`user_for_chat` first).
+        Raises ``ValueError`` if ``rec.user_id`` belongs to another chat.
         """
+        old = self.users.get(rec.user_id)
+        if old is not None:
+            if old.chat_id != rec.chat_id:
+                raise ValueError(f"user id {rec.user_id!r} is taken")
+            self._unlink(rec.user_id)  # overwritten record: drop stale edges
+            self._expire_drop(rec.user_id, old.last_active_ts)
         self.users[rec.user_id] = rec
         self.chat_to_user[rec.chat_id] = rec.user_id
+        self.expiry.setdefault(self._slot(rec.last_active_ts), {})[rec.user_id] = (
+            rec.last_active_ts
+        )
+        self.index.insert(rec.user_id, rec.lat, rec.lon)
+        self.units[rec.user_id] = unit_vector(rec.lat, rec.lon)
+        if self.equirect_km is not None:
+            self.eq_points[rec.user_id] = equirect_point(rec.lat, rec.lon)
+        if self.columns is not None:
+            self.columns.insert(rec.user_id, rec.lat, rec.lon)
+        self._place(rec)
+        if self.adjacency_km is not None:
+            self._link(rec, self.adjacency_km)
+
+    def allocate_user_id(self) -> str:
+        """A fresh id for :meth:`register`, unique among the live users."""
+        return self.ids.allocate(self.users)
 
     def remove_by_chat(self, chat_id: int) -> UserRecord | None:
         """Remove the user owning ``chat_id``. Safe if absent (idempotent).
@@ -90,29 +274,211 @@ class AppState:
         user_id = self.chat_to_user.pop(chat_id, None)
         if user_id is None:
             return None
-        return self.users.pop(user_id, None)
+        self.index.remove(user_id)
+        self.units.pop(user_id, None)
+        self.eq_points.pop(user_id, None)
+        if self.columns is not None:
+            self.columns.remove(user_id)
+        self._unlink(user_id)
+        self._leave_zone(user_id)
+        rec = self.users.pop(user_id, None)
+        if rec is not None:
+            self._expire_drop(user_id, rec.last_active_ts)
+        return rec
+
+    def move(
+        self,
+        user_id: str,
+        coord: Coord,
+        threshold_km: float,
+        *,
+        limit: int | None = None,
+    ) -> list[int]:
+        """Move ``user_id`` to ``coord`` (a live-location update).
+
+        Every structure is updated in place: the grid move is O(1), the
+        adjacency only re-links the user's own edges. Returns the chat ids of
+        the neighbors that are newly in range (at ``threshold_km``), i.e. the
+        only ones a join notification should go to; with ``limit`` (the
+        fan-out cap), only the ``limit`` nearest of them, nearest first, as
+        for a join (see :meth:`recipients`). No-op if absent.
+        """
+        rec = self.users.get(user_id)
+        if rec is None:
+            return []
+        old, (ox, oy, oz) = rec.coord, self.units[user_id]
+        old_zone = self.zone_of.get(user_id)
+        rec.coord = coord
+        self.index.insert(user_id, coord.lat, coord.lon)
+        self.units[user_id] = unit_vector(coord.lat, coord.lon)
+        if self.equirect_km is not None:
+            self.eq_points[user_id] = equirect_point(*coord)
+        if self.columns is not None:
+            self.columns.insert(user_id, coord.lat, coord.lon)
+        zone = self._place(rec)
+        if self.adjacency_km is not None:
+            self._relink(rec, self.adjacency_km)
+        if zone is not None or old_zone is not None:
+            # Zone users only ever saw their zone: nothing is kept across a
+            # zone change, and a move within the zone changes nothing.
+            if zone == old_zone:
+                return []
+            return self.recipients(user_id, threshold_km, limit=limit)
+        # "Newly" is decided per new neighbor against the old position (same
+        # chord test as a query), which is cheaper than a second query.
+        radius = self.effective_range(rec, threshold_km)
+        sure, maybe = chord_sq_bounds(radius)
+        newly: list[UserRecord] = []
+        for other in self.neighbors(user_id, threshold_km):
+            x, y, z = self.units[other.user_id]
+            chord_sq = (x - ox) ** 2 + (y - oy) ** 2 + (z - oz) ** 2
+            was_near = (
+                chord_sq < sure
+                or (
+                    chord_sq <= maybe
+                    and haversine_distance(*old, other.lat, other.lon) <= radius
+                )
+            ) and self._within_theirs(old, other, radius, threshold_km)
+            if not was_near:
+                newly.append(other)
+        if limit is not None:
+            # Ranked by chord from the new position, as in _nearest_ids.
+            here = self.units[user_id]
+            newly = heapq.nsmallest(
+                max(limit, 0), newly, key=lambda o: dist(here, self.units[o.user_id])
+            )
+        return [other.chat_id for other in newly]
+
+    def set_range(self, user_id: str, range_km: float | None) -> None:
+        """Set (or clear, with ``None``) ``user_id``'s range override.
+
+        Keeps the materialized adjacency in step (I7): the user's edges are
+        recomputed, which only touches the cells around the user. No-op if the
+        user is absent.
+        """
+        rec = self.users.get(user_id)
+        if rec is None:
+            return
+        rec.range_km = range_km
+        if self.adjacency_km is not None:
+            self._relink(rec, self.adjacency_km)
+
+    def _link(self, rec: UserRecord, range_km: float) -> None:
+        """Materialize ``rec``'s neighborhood and add it to each neighbor's."""
+        mine: dict[str, int] = {}
+        if rec.user_id not in self.zone_of:  # zone users have no radius edges
+            for other in self._scan_neighbors(rec.user_id, range_km):
+                mine[other.user_id] = other.chat_id
+                self.adjacency[other.user_id][rec.user_id] = rec.chat_id
+        self.adjacency[rec.user_id] = mine
+
+    def _relink(self, rec: UserRecord, range_km: float) -> None:
+        """Recompute ``rec``'s edges, touching only neighbors that changed."""
+        before = self.adjacency.get(rec.user_id, {})
+        self._link(rec, range_km)
+        for other_id in before.keys() - self.adjacency[rec.user_id].keys():
+            self.adjacency[other_id].pop(rec.user_id, None)
+
+    def _unlink(self, user_id: str) -> None:
+        """Drop ``user_id`` from its own and every neighbor's adjacency."""
+        for other_id in self.adjacency.pop(user_id, {}):
+            self.adjacency[other_id].pop(user_id, None)
+
+    def _place(self, rec: UserRecord) -> str | None:
+        """Update ``rec``'s zone membership from its coordinate (I8) and
+        return its zone name, if any."""
+        if self.zones is None:
+            return None
+        zone = self.zones.locate(rec.lat, rec.lon)
+        name = None if zone is None else zone.name
+        if self.zone_of.get(rec.user_id) != name:
+            self._leave_zone(rec.user_id)
+            if name is not None:
+                self.zone_of[rec.user_id] = name
+                self.zone_members.setdefault(name, set()).add(rec.user_id)
+        return name
+
+    def _leave_zone(self, user_id: str) -> None:
+        name = self.zone_of.pop(user_id, None)
+        if name is not None:
+            members = self.zone_members[name]
+            members.discard(user_id)
+            if not members:
+                del self.zone_members[name]
 
     def track_message(self, chat_id: int, message_id: int) -> None:
         """Record a *real* message id for later cleanup (maintains I4).
 
         Set semantics make this idempotent: tracking the same id twice stores
-        it once.
+        it once. The per-chat cap and global budget of :attr:`tracked_msgs`
+        may drop the oldest ids (see :mod:`tchaka.tracked`).
         """
-        self.tracked_msgs.setdefault(chat_id, set()).add(message_id)
+        self.tracked_msgs.add(chat_id, message_id)
+
+    def track_many(self, pairs: Iterable[tuple[int, int]]) -> None:
+        """:meth:`track_message` for each ``(chat_id, message_id)`` pair, in
+        one call: a fan-out commits its returned ids at once."""
+        self.tracked_msgs.add_many(pairs)
 
-    def pop_tracked(self, chat_id: int) -> set[int]:
-        """Remove and return the set of tracked message ids for ``chat_id``."""
-        return self.tracked_msgs.pop(chat_id, set())
+    def pop_tracked(self, chat_id: int) -> list[int]:
+        """Remove and return the tracked message ids of ``chat_id``, oldest
+        first."""
+        return self.tracked_msgs.pop(chat_id)
 
     def touch(self, user_id: str, now: float) -> None:
         """Update a user's last-activity timestamp. No-op if user is absent."""
         rec = self.users.get(user_id)
         if rec is not None:
+            slot = self._slot(now)
+            if slot != self._slot(rec.last_active_ts):
+                self._expire_drop(user_id, rec.last_active_ts)
+            self.expiry.setdefault(slot, {})[user_id] = now
             rec.last_active_ts = now
 
+    def _slot(self, ts: float) -> int:
+        return int(ts // self.expiry_slot_s)
+
+    def _expire_drop(self, user_id: str, ts: float) -> None:
+        slot = self._slot(ts)
+        bucket = self.expiry[slot]
+        del bucket[user_id]
+        if not bucket:
+            del self.expiry[slot]
+
     # ------------------------------------------------------------------ #
     # Pure queries (no mutation)
     # ------------------------------------------------------------------ #
+    def idle_user_ids(self, now: float, ttl_seconds: float) -> list[str]:
+        """Return user ids idle for at least ``ttl_seconds`` as of ``now``.
+
+        Only opens the :attr:`expiry` slots old enough to hold idle users,
+        oldest first. Slots entirely due are taken whole; only the few at the
+        cutoff compare timestamps. The cost follows the idle users, not the
+        population, and never touches the records.
+        """
+        idle: list[str] = []
+        step = self.expiry_slot_s
+        for slot in sorted(self.expiry):
+            bucket = self.expiry[slot]
+            # One slot of margin on each side: float floor division may round
+            # a timestamp into a neighbouring slot.
+            if now - (slot + 2) * step >= ttl_seconds:
+                idle.extend(bucket)
+            elif now - (slot - 1) * step >= ttl_seconds:
+                idle.extend(
+                    uid for uid, ts in bucket.items() if now - ts >= ttl_seconds
+                )
+            else:
+                break
+        return idle
+
+    def next_idle_at(self, ttl_seconds: float) -> float | None:
+        """Time the next user may become idle (``None`` without users); at
+        most one slot early."""
+        if not self.expiry:
+            return None
+        return min(self.expiry) * self.expiry_slot_s + ttl_seconds
+
     def user_for_chat(self, chat_id: int) -> UserRecord | None:
         """Resolve the record owning ``chat_id`` (or ``None``)."""
         user_id = self.chat_to_user.get(chat_id)
@@ -121,40 +487,285 @@ class AppState:
         return self.users.get(user_id)
 
     def effective_range(self, rec: UserRecord, global_threshold_km: float) -> float:
-        """Range to use for ``rec``: the per-user override capped by the global
-        threshold, else the global threshold (R8 scaffolding)."""
+        """Range to use for ``rec``: the per-user override capped by the base
+        range, else the base range. The base range is the global threshold,
+        or :meth:`adaptive_range` in density-adaptive mode."""
+        base = global_threshold_km
+        if self.adaptive_k > 0:
+            base = self.adaptive_range(rec, global_threshold_km)
         if rec.range_km is None:
-            return global_threshold_km
-        return min(rec.range_km, global_threshold_km)
+            return base
+        return min(rec.range_km, base)
+
+    def max_range(self, global_threshold_km: float) -> float:
+        """Upper bound of every :meth:`effective_range`."""
+        if self.adaptive_k > 0:
+            return max(global_threshold_km, self.adaptive_max_km)
+        return global_threshold_km
+
+    def adaptive_range(self, rec: UserRecord, global_threshold_km: float) -> float:
+        """Smallest range, from the threshold up to ``adaptive_max_km``, that
+        holds ``adaptive_k`` other users (ignoring their own ranges).
+
+        Expanding ring search: the search radius starts at the threshold and
+        doubles; each step only visits the grid cells newly covered and stops
+        once ``adaptive_k`` users are surely within the radius searched so far,
+        so dense areas stop at the first step.
+        """
+        cap = self.max_range(global_threshold_km)
+        radius = global_threshold_km if global_threshold_km > 0 else self.cell_km
+        radii = [min(radius, cap)]
+        while radii[-1] < cap:
+            radii.append(min(radii[-1] * 2, cap))
+        ox, oy, oz = self.units[rec.user_id]
+        units = self.units
+        found: list[tuple[float, str]] = []
+        for step, members in self.index.rings(rec.lat, rec.lon, radii):
+            found.extend(
+                ((x - ox) ** 2 + (y - oy) ** 2 + (z - oz) ** 2, uid)
+                for uid in members
+                if uid != rec.user_id and uid not in self.zone_of
+                for x, y, z in (units[uid],)
+            )
+            sure, _ = chord_sq_bounds(step)
+            if sum(1 for chord_sq, _ in found if chord_sq < sure) >= self.adaptive_k:
+                _, kth = heapq.nsmallest(self.adaptive_k, found)[-1]
+                other = self.users[kth]
+                kth_km = haversine_distance(rec.lat, rec.lon, other.lat, other.lon)
+                return max(global_threshold_km, kth_km)
+        return cap
 
     def neighbors(self, user_id: str, threshold_km: float) -> list[UserRecord]:
-        """Return other users within ``threshold_km`` of ``user_id``.
+        """Return other users within range of ``user_id``.
 
+        A pair is in range when its distance is within both users' effective
+        ranges (each capped by ``threshold_km``).
         Ego-centric and symmetric per pair, but **not** transitive. Excludes
         the requesting user. Pure (no mutation). Requires ``user_id`` present.
+        When ``threshold_km`` is the materialized ``adjacency_km`` the answer
+        is read from :attr:`adjacency` instead of being recomputed. Inside a
+        zone, the neighbors are the other zone members.
+        """
+        peers = self._zone_peers(user_id)
+        if peers is not None:
+            return [self.users[uid] for uid in peers if uid != user_id]
+        cached = self._cached_neighborhood(user_id, threshold_km)
+        if cached is not None:
+            return [self.users[uid] for uid in cached]
+        return self._scan_neighbors(user_id, threshold_km)
+
+    def count_neighbors(self, user_id: str, threshold_km: float) -> int:
+        """``len(neighbors(...))``, O(1) when the neighborhood is materialized
+        or the user is in a zone."""
+        peers = self._zone_peers(user_id)
+        if peers is not None:
+            return len(peers) - 1
+        cached = self._cached_neighborhood(user_id, threshold_km)
+        if cached is not None:
+            return len(cached)
+        return len(self._scan_neighbors(user_id, threshold_km))
+
+    def recipients(
+        self,
+        user_id: str,
+        threshold_km: float,
+        *,
+        limit: int | None = None,
+        exclude: AbstractSet[str] = frozenset(),
+    ) -> list[int]:
+        """Chat ids of ``user_id``'s neighbors: the relay/join fan-out list.
+
+        Neighbors whose user id is in ``exclude`` are left out before the cap.
+        With ``limit`` (the fan-out cap), only the ``limit`` nearest of the
+        others are kept, nearest first (see :meth:`nearest`). A fresh list,
+        safe to use after releasing the lock.
+        """
+        if limit is not None:
+            return [
+                self.users[uid].chat_id
+                for uid in self._nearest_ids(user_id, limit, threshold_km, exclude)
+            ]
+        peers = self._zone_peers(user_id)
+        if peers is not None:
+            return [
+                self.users[uid].chat_id
+                for uid in peers
+                if uid != user_id and uid not in exclude
+            ]
+        cached = self._cached_neighborhood(user_id, threshold_km)
+        if cached is not None:
+            if not exclude:
+                return list(cached.values())
+            return [chat for uid, chat in cached.items() if uid not in exclude]
+        return [
+            n.chat_id
+            for n in self._scan_neighbors(user_id, threshold_km)
+            if n.user_id not in exclude
+        ]
+
+    def nearest(
+        self, user_id: str, k: int, threshold_km: float
+    ) -> list[tuple[float, UserRecord]]:
+        """The ``k`` nearest :meth:`neighbors` as ``(distance_km, record)``,
+        nearest first.
+
+        A partial sort: neighbors are ranked by chord length (monotonic in
+        distance, so no trig per candidate; see :meth:`_nearest_ids`) and
+        haversine is only computed for the ``k`` kept.
+        """
+        origin = self.users[user_id].coord
+        return [
+            (haversine_distance(*origin, rec.lat, rec.lon), rec)
+            for uid in self._nearest_ids(user_id, k, threshold_km)
+            for rec in (self.users[uid],)
+        ]
+
+    def _nearest_ids(
+        self,
+        user_id: str,
+        k: int,
+        threshold_km: float,
+        exclude: AbstractSet[str] = frozenset(),
+    ) -> list[str]:
+        """Ids of the ``k`` nearest neighbors not in ``exclude``, nearest first.
+
+        Chord lengths come from one C-level :func:`math.dist` per neighbor.
+        Large neighborhoods are cut with a size-``k`` heap over the bare
+        floats (the ``k``-th smallest is the cutoff), so only about ``k`` ids
+        get sorted; small ones, where a C sort beats the Python-level heap
+        loop, are sorted directly.
+        """
+        if k <= 0:
+            return []
+        peers = self._zone_peers(user_id)
+        cached = self._cached_neighborhood(user_id, threshold_km)
+        if peers is not None:
+            ids = [uid for uid in peers if uid != user_id]
+        elif cached is not None:
+            ids = list(cached)
+        else:
+            ids = [n.user_id for n in self._scan_neighbors(user_id, threshold_km)]
+        if exclude:
+            ids = [uid for uid in ids if uid not in exclude]
+        origin, units = self.units[user_id], self.units
+        keys = [dist(units[uid], origin) for uid in ids]
+        picked: Iterable[int] = range(len(ids))
+        if len(ids) > k * _SELECT_SORT_FACTOR:
+            cutoff = heapq.nsmallest(k, keys)[-1]
+            picked = [i for i, key in enumerate(keys) if key <= cutoff]
+        return [ids[i] for i in sorted(picked, key=keys.__getitem__)[:k]]
+
+    def _zone_peers(self, user_id: str) -> set[str] | None:
+        """Members of ``user_id``'s zone (itself included), if it is in one."""
+        name = self.zone_of.get(user_id)
+        return None if name is None else self.zone_members[name]
+
+    def _cached_neighborhood(
+        self, user_id: str, threshold_km: float
+    ) -> dict[str, int] | None:
+        if threshold_km != self.adjacency_km:
+            return None
+        return self.adjacency.get(user_id)
+
+    def _scan_neighbors(self, user_id: str, threshold_km: float) -> list[UserRecord]:
+        """Compute :meth:`neighbors` from the spatial structures.
+
+        Only the grid cells around the origin are visited (see
+        :class:`~tchaka.spatial.GridIndex`) and each candidate is tested by
+        squared chord length between cached unit vectors, so the loop does no
+        trig; haversine only settles pairs within float noise of the radius.
+        With the column store enabled the whole population is instead tested
+        in one vectorized pass.
+
+        The query runs at the sender's range; candidates with a smaller
+        override of their own are then held to that (the mutual ``min``).
+        Users inside a zone are never radius neighbors.
+
+        In equirectangular mode (``equirect_km``) queries whose whole disc is
+        inside the approximation's domain use :meth:`_scan_equirect` instead
+        of the chord test.
         """
         origin = self.users[user_id]
+        here = origin.coord
         radius = self.effective_range(origin, threshold_km)
+        if self.columns is not None:
+            return [
+                rec
+                for uid in self.columns.within(*here, radius)
+                if uid != user_id
+                and uid not in self.zone_of
+                and self._within_theirs(
+                    here, rec := self.users[uid], radius, threshold_km
+                )
+            ]
+        if (
+            self.equirect_km is not None
+            and radius <= self.equirect_km
+            and equirect_covers(*here, radius)
+        ):
+            return self._scan_equirect(origin, radius, threshold_km)
+        sure, maybe = chord_sq_bounds(radius)
+        ox, oy, oz = self.units[user_id]
+        units, zone_of = self.units, self.zone_of
         result: list[UserRecord] = []
-        for uid, rec in self.users.items():
-            if uid == user_id:
+        for uid in self.index.candidates(*here, radius):
+            if uid == user_id or uid in zone_of:
+                continue
+            x, y, z = units[uid]
+            chord_sq = (x - ox) ** 2 + (y - oy) ** 2 + (z - oz) ** 2
+            if chord_sq > maybe:
                 continue
+            rec = self.users[uid]
             if (
-                haversine_distance(
-                    origin.coord.lat,
-                    origin.coord.lon,
-                    rec.coord.lat,
-                    rec.coord.lon,
-                )
-                <= radius
-            ):
+                chord_sq < sure or haversine_distance(*here, rec.lat, rec.lon) <= radius
+            ) and self._within_theirs(here, rec, radius, threshold_km):
                 result.append(rec)
         return result
 
-    def idle_user_ids(self, now: float, ttl_seconds: float) -> list[str]:
-        """Return user ids idle for at least ``ttl_seconds`` as of ``now``."""
-        return [
-            uid
-            for uid, rec in self.users.items()
-            if now - rec.last_active_ts >= ttl_seconds
-        ]
+    def _scan_equirect(
+        self, origin: UserRecord, radius: float, threshold_km: float
+    ) -> list[UserRecord]:
+        """The grid loop of :meth:`_scan_neighbors` with the equirectangular
+        test: two subtractions and three products per candidate, with
+        haversine settling only the error band around ``radius``."""
+        assert self.equirect_km is not None
+        sure, maybe = equirect_sq_bounds(radius, self.equirect_km)
+        user_id, here = origin.user_id, origin.coord
+        o_phi, o_lam, o_cos = self.eq_points[user_id]
+        points, zone_of = self.eq_points, self.zone_of
+        result: list[UserRecord] = []
+        for uid in self.index.candidates(*here, radius):
+            if uid == user_id or uid in zone_of:
+                continue
+            phi, lam, cos_phi = points[uid]
+            x = (lam - o_lam) * (cos_phi + o_cos)
+            y = phi - o_phi
+            q = x * x + 4 * y * y
+            if q > maybe:
+                continue
+            rec = self.users[uid]
+            if (
+                q < sure or haversine_distance(*here, rec.lat, rec.lon) <= radius
+            ) and self._within_theirs(here, rec, radius, threshold_km):
+                result.append(rec)
+        return result
+
+    def _within_theirs(
+        self, origin: Coord, rec: UserRecord, radius: float, threshold_km: float
+    ) -> bool:
+        """Whether ``origin`` (already within ``radius`` of ``rec``) is also
+        within ``rec``'s own effective range.
+
+        Every base range is at least the threshold, so within it only an
+        override below ``radius`` can exclude: most candidates return without
+        a distance computation, and adaptive ranges are only computed for
+        candidates beyond the threshold.
+        """
+        if radius <= threshold_km and (rec.range_km is None or rec.range_km >= radius):
+            return True
+        distance = haversine_distance(*origin, rec.lat, rec.lon)
+        if rec.range_km is not None and distance > rec.range_km:
+            return False
+        return distance <= threshold_km or distance <= self.effective_range(
+            rec, threshold_km
+        )
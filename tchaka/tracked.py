@@ -0,0 +1,225 @@
+"""Compact storage for the message ids tracked per chat for cleanup.
+
+Every message the bot sends to, or receives from, a chat is tracked so that
+``/stop`` and idle eviction can delete it. A long-lived user in a busy area
+piles up thousands of ids, and a ``set[int]`` costs ~60 bytes per id.
+
+- Telegram message ids are increasing within a chat and, in a private chat
+  with the bot, nearly consecutive. :class:`MessageIds` therefore stores
+  sorted, disjoint runs ``[start, end]`` in two ``array('q')`` columns: 16
+  bytes per run, whatever its length. Appending the next id extends the last
+  run in O(1); an out-of-order id is bisected in and merged with its
+  neighbours.
+- :class:`TrackedMessages` maps chat ids to their runs. An optional per-chat
+  cap keeps the newest ``per_chat`` ids of each chat, and an optional global
+  budget (estimated bytes) drops whole runs oldest-first from the chat
+  tracked least recently. Dropping is safe to do early: Telegram refuses to
+  delete messages older than 48 hours anyway, and cleanup is best-effort.
+"""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+
+__all__ = ["MessageIds", "TrackedMessages"]
+
+RUN_BYTES = 16  # one int64 start + one int64 end
+# Rough fixed cost of one tracked chat: the two empty arrays, the MessageIds
+# object and its mapping entry (measured on CPython 3.11).
+CHAT_BYTES = 384
+
+
+class MessageIds:
+    """Sorted set of message ids stored as run-length intervals."""
+
+    __slots__ = ("_count", "_ends", "_starts")
+
+    def __init__(self) -> None:
+        self._starts = array("q")
+        self._ends = array("q")  # inclusive
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[int]:
+        """Ids in increasing order."""
+        for start, end in zip(self._starts, self._ends, strict=True):
+            yield from range(start, end + 1)
+
+    def __contains__(self, message_id: object) -> bool:
+        if not isinstance(message_id, int):
+            return False
+        i = bisect_right(self._starts, message_id) - 1
+        return i >= 0 and message_id <= self._ends[i]
+
+    def __repr__(self) -> str:
+        runs = ", ".join(
+            f"{s}-{e}" for s, e in zip(self._starts, self._ends, strict=True)
+        )
+        return f"MessageIds({runs})"
+
+    @property
+    def runs(self) -> int:
+        return len(self._starts)
+
+    def add(self, message_id: int) -> None:
+        """Insert an id; already-present ids are ignored."""
+        starts, ends = self._starts, self._ends
+        if not starts or message_id > ends[-1] + 1:
+            starts.append(message_id)
+            ends.append(message_id)
+        elif message_id == ends[-1] + 1:
+            ends[-1] = message_id  # the common case: the next id in the chat
+        else:
+            i = bisect_right(starts, message_id) - 1
+            if i >= 0 and message_id <= ends[i]:
+                return
+            joins_left = i >= 0 and ends[i] + 1 == message_id
+            joins_right = i + 1 < len(starts) and starts[i + 1] - 1 == message_id
+            if joins_left and joins_right:
+                ends[i] = ends[i + 1]
+                del starts[i + 1], ends[i + 1]
+            elif joins_left:
+                ends[i] = message_id
+            elif joins_right:
+                starts[i + 1] = message_id
+            else:
+                starts.insert(i + 1, message_id)
+                ends.insert(i + 1, message_id)
+        self._count += 1
+
+    def to_bytes(self) -> bytes:
+        """The runs as raw ``int64`` starts then ends (see :meth:`from_bytes`)."""
+        return self._starts.tobytes() + self._ends.tobytes()
+
+    @classmethod
+    def from_bytes(cls, buf: bytes) -> MessageIds:
+        """Inverse of :meth:`to_bytes`."""
+        ids = cls()
+        ids._starts.frombytes(buf[: len(buf) // 2])
+        ids._ends.frombytes(buf[len(buf) // 2 :])
+        ids._count = sum(ids._ends) - sum(ids._starts) + len(ids._starts)
+        return ids
+
+    def drop_oldest(self, n: int) -> None:
+        """Forget the ``n`` smallest ids."""
+        starts, ends = self._starts, self._ends
+        while n > 0 and starts:
+            size = ends[0] - starts[0] + 1
+            if size > n:
+                starts[0] += n
+                self._count -= n
+                return
+            del starts[0], ends[0]
+            self._count -= size
+            n -= size
+
+    def drop_oldest_run(self) -> int:
+        """Forget the oldest run; returns the number of ids dropped."""
+        if not self._starts:
+            return 0
+        size = self._ends[0] - self._starts[0] + 1
+        del self._starts[0], self._ends[0]
+        self._count -= size
+        return size
+
+
+class TrackedMessages:
+    """``chat_id -> MessageIds`` with an optional per-chat cap and global
+    byte budget (``0`` disables either)."""
+
+    def __init__(self, *, per_chat: int = 0, budget_bytes: int = 0) -> None:
+        if per_chat < 0 or budget_bytes < 0:
+            raise ValueError("caps must be non-negative")
+        self.per_chat = per_chat
+        self.budget_bytes = budget_bytes
+        self.dropped = 0  # ids forgotten because of a cap
+        # Least recently tracked chat first, so the budget drops from it.
+        self._chats: OrderedDict[int, MessageIds] = OrderedDict()
+        self._runs = 0
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._chats)
+
+    def __contains__(self, chat_id: object) -> bool:
+        return chat_id in self._chats
+
+    def __getitem__(self, chat_id: int) -> MessageIds:
+        return self._chats[chat_id]
+
+    def get(self, chat_id: int) -> MessageIds | None:
+        return self._chats.get(chat_id)
+
+    def items(self) -> Iterator[tuple[int, MessageIds]]:
+        yield from self._chats.items()
+
+    @property
+    def nbytes(self) -> int:
+        """Estimated memory held by the stored ids."""
+        return len(self._chats) * CHAT_BYTES + self._runs * RUN_BYTES
+
+    def add(self, chat_id: int, message_id: int) -> None:
+        """Track one id, then enforce the caps."""
+        self._add(chat_id, message_id)
+        if self.budget_bytes:
+            self._shrink_to_budget()
+
+    def add_many(self, pairs: Iterable[tuple[int, int]]) -> None:
+        """Track ``(chat_id, message_id)`` pairs; the global budget is
+        enforced once, after the last."""
+        for chat_id, message_id in pairs:
+            self._add(chat_id, message_id)
+        if self.budget_bytes:
+            self._shrink_to_budget()
+
+    def _add(self, chat_id: int, message_id: int) -> None:
+        """Track one id under the per-chat cap."""
+        ids = self._chats.get(chat_id)
+        if ids is None:
+            ids = self._chats[chat_id] = MessageIds()
+        else:
+            self._chats.move_to_end(chat_id)
+        runs = ids.runs
+        ids.add(message_id)
+        if self.per_chat and len(ids) > self.per_chat:
+            self.dropped += len(ids) - self.per_chat
+            ids.drop_oldest(len(ids) - self.per_chat)
+        self._runs += ids.runs - runs
+
+    def restore(self, chat_id: int, ids: MessageIds) -> None:
+        """Store a chat's ids as the most recently tracked, replacing any; the
+        caps are then enforced (a restored state may have other caps)."""
+        if (old := self._chats.pop(chat_id, None)) is not None:
+            self._runs -= old.runs
+        if self.per_chat and len(ids) > self.per_chat:
+            self.dropped += len(ids) - self.per_chat
+            ids.drop_oldest(len(ids) - self.per_chat)
+        if ids.runs:
+            self._chats[chat_id] = ids
+            self._runs += ids.runs
+        if self.budget_bytes:
+            self._shrink_to_budget()
+
+    def pop(self, chat_id: int) -> list[int]:
+        """Remove a chat and return its ids in increasing order."""
+        ids = self._chats.pop(chat_id, None)
+        if ids is None:
+            return []
+        self._runs -= ids.runs
+        return list(ids)
+
+    def _shrink_to_budget(self) -> None:
+        # Never drops the newest run of the most recently tracked chat.
+        while self.nbytes > self.budget_bytes and self._runs > 1:
+            chat_id, ids = next(iter(self._chats.items()))
+            self.dropped += ids.drop_oldest_run()
+            self._runs -= 1
+            if not ids.runs:
+                del self._chats[chat_id]
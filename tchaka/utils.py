@@ -32,16 +32,22 @@ def html_format_text(strr: str) -> str:
     return html.escape(str(safe_truncate(strr, MAX_STR_SENT_BACK)))
 
 
-async def get_user_and_message(update: Update) -> tuple[User, Message]:
+async def get_user_and_message(
+    update: Update, *, edited: bool = False
+) -> tuple[User, Message]:
     """Return the effective user and message from an ``update``.
 
+    With ``edited=True`` the message is the update's ``edited_message`` (live
+    location updates arrive as edits).
+
     Recomputed on every call (no caching): an ``Update`` is unhashable and a
     coroutine result cannot be meaningfully memoized, so the previous
     ``@lru_cache`` was both broken and risky.
 
     Raises ``ValueError`` if either is ``None`` or the sender is a bot.
     """
-    if (user := update.effective_user) is None or (message := update.message) is None:
+    message = update.edited_message if edited else update.message
+    if (user := update.effective_user) is None or message is None:
         raise ValueError(f"user or message is None :: {update}")
 
     if user.is_bot is True:
@@ -0,0 +1,188 @@
+"""Operator-defined geofenced zones (festival grounds, campuses, venues).
+
+Inside a zone, "around you" means "inside this venue": every user located in a
+zone relays to the zone's whole membership, whatever the distance, and users
+outside every zone keep the radius behaviour (see :class:`~tchaka.state.AppState`).
+
+- Zones are static: loaded once at startup from a GeoJSON file
+  (:func:`load_zones`) and never mutated, so the index is bulk-loaded.
+- :class:`ZoneIndex` is an R-tree packed with Sort-Tile-Recursive: leaves hold
+  up to ``fanout`` zone bounding boxes, internal nodes the boxes of their
+  children. :meth:`ZoneIndex.locate` only descends into boxes containing the
+  point, then runs the exact point-in-polygon test on the few zones left, so a
+  lookup is logarithmic in the number of zones.
+- Polygons are tested in plain lat/lon (even-odd ray casting over every ring,
+  so holes work). That is exact enough at venue scale; zones must not cross
+  the antimeridian.
+- Overlapping zones resolve to the first one in file order.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TypeVar
+
+__all__ = ["Zone", "ZoneIndex", "load_zones"]
+
+Vertex = tuple[float, float]  # (lat, lon)
+Ring = tuple[Vertex, ...]
+BBox = tuple[float, float, float, float]  # (min_lat, min_lon, max_lat, max_lon)
+
+T = TypeVar("T")
+
+DEFAULT_FANOUT = 8
+
+
+@dataclass(frozen=True)
+class Zone:
+    """A named polygon; ``rings`` are the outer ring(s) and any holes."""
+
+    name: str
+    rings: tuple[Ring, ...]
+    bbox: BBox = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if not self.rings or any(len(ring) < 3 for ring in self.rings):
+            raise ValueError(f"zone {self.name!r} needs rings of 3+ vertices")
+        lats = [lat for ring in self.rings for lat, _ in ring]
+        lons = [lon for ring in self.rings for _, lon in ring]
+        object.__setattr__(self, "bbox", (min(lats), min(lons), max(lats), max(lons)))
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Even-odd point-in-polygon test over every ring."""
+        inside = False
+        for ring in self.rings:
+            prev_lat, prev_lon = ring[-1]
+            for cur_lat, cur_lon in ring:
+                if (cur_lat > lat) != (prev_lat > lat):
+                    cross = cur_lon + (lat - cur_lat) * (prev_lon - cur_lon) / (
+                        prev_lat - cur_lat
+                    )
+                    if lon < cross:
+                        inside = not inside
+                prev_lat, prev_lon = cur_lat, cur_lon
+        return inside
+
+
+def _in_box(box: BBox, lat: float, lon: float) -> bool:
+    return box[0] <= lat <= box[2] and box[1] <= lon <= box[3]
+
+
+def _union(boxes: Sequence[BBox]) -> BBox:
+    return (
+        min(b[0] for b in boxes),
+        min(b[1] for b in boxes),
+        max(b[2] for b in boxes),
+        max(b[3] for b in boxes),
+    )
+
+
+@dataclass
+class _Node:
+    bbox: BBox
+    children: list[_Node] = field(default_factory=list)  # internal nodes
+    entries: list[int] = field(default_factory=list)  # leaves: zone positions
+
+
+def _pack(items: list[tuple[BBox, T]], fanout: int) -> list[list[T]]:
+    """Sort-Tile-Recursive grouping: vertical slabs by latitude, then runs of
+    ``fanout`` by longitude within each slab."""
+    n_groups = math.ceil(len(items) / fanout)
+    slab = fanout * math.ceil(math.sqrt(n_groups))
+    by_lat = sorted(items, key=lambda it: it[0][0] + it[0][2])
+    groups: list[list[T]] = []
+    for start in range(0, len(by_lat), slab):
+        run = sorted(by_lat[start : start + slab], key=lambda it: it[0][1] + it[0][3])
+        groups.extend(
+            [obj for _, obj in run[i : i + fanout]] for i in range(0, len(run), fanout)
+        )
+    return groups
+
+
+class ZoneIndex:
+    """Static R-tree over zone bounding boxes (see the module docstring)."""
+
+    def __init__(self, zones: Sequence[Zone], *, fanout: int = DEFAULT_FANOUT):
+        if fanout < 2:
+            raise ValueError("fanout must be at least 2")
+        self.zones = list(zones)
+        names = [zone.name for zone in self.zones]
+        if len(set(names)) != len(names):
+            raise ValueError("zone names must be unique")
+        self._root: _Node | None = None
+        if not self.zones:
+            return
+        leaves = [
+            _Node(_union([self.zones[i].bbox for i in group]), entries=group)
+            for group in _pack([(z.bbox, i) for i, z in enumerate(self.zones)], fanout)
+        ]
+        level = leaves
+        while len(level) > 1:
+            level = [
+                _Node(_union([c.bbox for c in group]), children=group)
+                for group in _pack([(node.bbox, node) for node in level], fanout)
+            ]
+        self._root = level[0]
+
+    def __len__(self) -> int:
+        return len(self.zones)
+
+    def locate(self, lat: float, lon: float) -> Zone | None:
+        """The zone containing the point (first in file order), or ``None``."""
+        if self._root is None or not _in_box(self._root.bbox, lat, lon):
+            return None
+        best: int | None = None
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            for i in node.entries:
+                if (best is None or i < best) and (
+                    _in_box(self.zones[i].bbox, lat, lon)
+                    and self.zones[i].contains(lat, lon)
+                ):
+                    best = i
+            stack.extend(c for c in node.children if _in_box(c.bbox, lat, lon))
+        return None if best is None else self.zones[best]
+
+
+def _rings(coordinates: list[list[list[float]]]) -> tuple[Ring, ...]:
+    # GeoJSON positions are [lon, lat]; a ring repeats its first vertex last.
+    out = []
+    for ring in coordinates:
+        vertices = tuple((float(lat), float(lon)) for lon, lat, *_ in ring)
+        if len(vertices) > 1 and vertices[0] == vertices[-1]:
+            vertices = vertices[:-1]
+        out.append(vertices)
+    return tuple(out)
+
+
+def load_zones(path: str | Path) -> list[Zone]:
+    """Read zones from a GeoJSON ``FeatureCollection``.
+
+    Each ``Polygon`` or ``MultiPolygon`` feature is one zone, named by its
+    ``name`` property (else ``zone<i>``). Raises :class:`ValueError` on a
+    malformed file and :class:`OSError` if it cannot be read.
+    """
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if data.get("type") != "FeatureCollection":
+        raise ValueError("zones file must be a GeoJSON FeatureCollection")
+    zones = []
+    for i, feature in enumerate(data.get("features", [])):
+        try:
+            geometry = feature.get("geometry") or {}
+            kind, coordinates = geometry.get("type"), geometry.get("coordinates", [])
+            if kind == "Polygon":
+                rings = _rings(coordinates)
+            elif kind == "MultiPolygon":
+                rings = tuple(r for polygon in coordinates for r in _rings(polygon))
+            else:
+                raise ValueError(f"unsupported geometry {kind!r}")
+            name = (feature.get("properties") or {}).get("name") or f"zone{i}"
+            zones.append(Zone(str(name), rings))
+        except (AttributeError, TypeError, ValueError) as exc:
+            raise ValueError(f"feature {i}: {exc}") from exc
+    return zones
@@ -0,0 +1,96 @@
+"""Tests for the single-writer state actor (tchaka.actor).
+
+The callbacks themselves run on an actor in test_commands.py; these cover the
+queue: ordering, batching, touch coalescing, errors and shutdown.
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from tchaka.actor import StateActor
+from tchaka.state import AppState, Coord, UserRecord
+
+
+@pytest.fixture
+async def actor() -> StateActor:
+    state = AppState()
+    state.register(UserRecord("u1", 1, Coord(0.0, 0.0), 0.0))
+    return StateActor(state, max_batch=3)
+
+
+async def test_operations_apply_in_order_in_batches(actor: StateActor) -> None:
+    actor.start()
+    actor.track(1, 10)
+    actor.touch("u1", 5.0)
+    popped = actor.call(lambda s: s.pop_tracked(1))
+    actor.track(1, 11)
+    actor.touch("u1", 6.0)
+    seen = actor.call(lambda s: (s.users["u1"].last_active_ts, s.pop_tracked(1)))
+    assert await popped == [10]
+    assert await seen == (6.0, [11])
+    assert actor.applied == 6
+    assert actor.passes == 2  # max_batch=3
+
+
+async def test_touches_are_coalesced(actor: StateActor) -> None:
+    calls: list[tuple[str, float]] = []
+    touch = actor.state.touch
+
+    def counting_touch(user_id: str, now: float) -> None:
+        calls.append((user_id, now))
+        touch(user_id, now)
+
+    actor.state.touch = counting_touch  # type: ignore[method-assign]
+    actor.max_batch = 100
+    for now in (1.0, 2.0, 3.0):
+        actor.touch("u1", now)
+    actor.touch("nobody", 3.0)  # absent: a no-op, as AppState.touch
+    actor.start()
+    await actor.close()
+    assert calls == [("u1", 3.0), ("nobody", 3.0)]
+    assert actor.state.users["u1"].last_active_ts == 3.0
+
+
+async def test_errors_reach_the_caller_only(actor: StateActor) -> None:
+    actor.start()
+    failing = actor.call(lambda s: s.users["missing"])
+    ok = actor.call(lambda s: len(s.users))
+    with pytest.raises(KeyError):
+        await failing
+    assert await ok == 1
+
+
+async def test_cancelled_calls_are_skipped(actor: StateActor) -> None:
+    ran: list[int] = []
+    cancelled = actor.call(lambda s: ran.append(1))
+    cancelled.cancel()
+    actor.start()
+    await actor.call(lambda s: ran.append(2))
+    assert ran == [2]
+
+
+async def test_close_drains_the_queue(actor: StateActor) -> None:
+    actor.start()
+    await asyncio.sleep(0)
+    for mid in range(10):
+        actor.track(1, mid)
+    await actor.close()
+    assert actor.state.pop_tracked(1) == list(range(10))
+    await actor.close()  # idempotent
+
+
+async def test_call_after_close_raises(actor: StateActor) -> None:
+    actor.start()
+    await actor.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        actor.call(lambda s: s)
+    actor.start()  # resumed
+    assert (await actor.call(lambda s: s)) is actor.state
+
+
+def test_batch_must_be_positive() -> None:
+    with pytest.raises(ValueError):
+        StateActor(AppState(), max_batch=0)
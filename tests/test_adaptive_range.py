@@ -0,0 +1,107 @@
+"""Tests for density-adaptive ranges (``AppState(adaptive_k=...)``).
+
+A user's base range grows from the configured threshold until ``adaptive_k``
+other users are within it, capped at ``adaptive_max_km``; pairs stay mutual.
+
+Property coverage:
+- P-ADA-1 the adaptive range is the distance to the k-th nearest other user,
+  clamped to ``[threshold, adaptive_max_km]``
+- P-ADA-2 neighbors equal the brute-force mutual relation on effective ranges
+"""
+
+from __future__ import annotations
+
+import pytest
+from hypothesis import assume, given, settings
+from hypothesis import strategies as st
+
+from tchaka.geo import haversine_distance
+from tchaka.state import AppState, Coord, UserRecord
+
+THRESHOLD_KM = 5.0
+MAX_KM = 60.0
+
+# A region a few hundred kilometres across, so ranges hit both bounds.
+lats = st.floats(min_value=48.0, max_value=50.0, allow_nan=False)
+lons = st.floats(min_value=2.0, max_value=5.0, allow_nan=False)
+overrides = st.none() | st.floats(min_value=0.5, max_value=100.0, allow_nan=False)
+
+
+def _state(points, k: int) -> AppState:
+    state = AppState(cell_km=THRESHOLD_KM, adaptive_k=k, adaptive_max_km=MAX_KM)
+    for i, (lat, lon, range_km) in enumerate(points):
+        state.register(UserRecord(f"u{i}", i, Coord(lat, lon), 0.0, range_km))
+    return state
+
+
+def _expected(state: AppState, rec: UserRecord, k: int) -> float:
+    distances = sorted(
+        haversine_distance(*rec.coord, *other.coord)
+        for uid, other in state.users.items()
+        if uid != rec.user_id
+    )
+    # Distances within float noise of the cap may settle either way.
+    assume(all(abs(d - MAX_KM) > 1e-6 for d in distances))
+    kth = distances[k - 1] if len(distances) >= k else MAX_KM
+    return min(max(kth, THRESHOLD_KM), MAX_KM)
+
+
+@settings(max_examples=100)
+@given(
+    st.lists(st.tuples(lats, lons, st.none()), min_size=1, max_size=25),
+    st.integers(min_value=1, max_value=6),
+)
+def test_adaptive_range_is_kth_nearest(points, k):
+    state = _state(points, k)
+    for rec in state.users.values():
+        got = state.adaptive_range(rec, THRESHOLD_KM)
+        assert got == pytest.approx(_expected(state, rec, k), abs=1e-9)  # P-ADA-1
+
+
+@settings(max_examples=100)
+@given(
+    st.lists(st.tuples(lats, lons, overrides), min_size=1, max_size=20),
+    st.integers(min_value=1, max_value=4),
+)
+def test_neighbors_match_mutual_brute_force(points, k):
+    state = _state(points, k)
+    ranges = {
+        uid: state.effective_range(rec, THRESHOLD_KM)
+        for uid, rec in state.users.items()
+    }
+    for uid, rec in state.users.items():
+        expected = set()
+        for other_id, other in state.users.items():
+            if other_id == uid:
+                continue
+            d = haversine_distance(*rec.coord, *other.coord)
+            limit = min(ranges[uid], ranges[other_id])
+            assume(abs(d - limit) > 1e-6)
+            if d <= limit:
+                expected.add(other_id)
+        got = {r.user_id for r in state.neighbors(uid, THRESHOLD_KM)}
+        assert got == expected  # P-ADA-2
+
+
+def test_sparse_user_reaches_farther_than_dense_user() -> None:
+    state = AppState(cell_km=THRESHOLD_KM, adaptive_k=2, adaptive_max_km=MAX_KM)
+    state.register(UserRecord("town1", 1, Coord(48.8566, 2.3522), 0.0))
+    state.register(UserRecord("town2", 2, Coord(48.8570, 2.3530), 0.0))
+    state.register(UserRecord("town3", 3, Coord(48.8580, 2.3540), 0.0))
+    # ~20 km from the town, nobody else around.
+    state.register(UserRecord("farm", 4, Coord(49.0366, 2.3522), 0.0))
+    town, farm = state.users["town1"], state.users["farm"]
+    assert state.effective_range(town, THRESHOLD_KM) == THRESHOLD_KM
+    assert state.effective_range(farm, THRESHOLD_KM) > 19.0
+    # Mutual: the farm's wide range does not pull it into the town's.
+    assert state.neighbors("farm", THRESHOLD_KM) == []
+    assert {r.user_id for r in state.neighbors("town1", THRESHOLD_KM)} == {
+        "town2",
+        "town3",
+    }
+    assert state.max_range(THRESHOLD_KM) == MAX_KM
+
+
+def test_adaptive_rejects_adjacency() -> None:
+    with pytest.raises(ValueError, match="adjacency"):
+        AppState(adaptive_k=3, adjacency_km=THRESHOLD_KM)
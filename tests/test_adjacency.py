@@ -0,0 +1,114 @@
+"""Tests for the incrementally maintained neighbor adjacency (I7).
+
+Property coverage:
+- P-ADJ-1 after any sequence of registrations and removals, the materialized
+  adjacency equals a from-scratch neighborhood computation
+- P-ADJ-2 the adjacency is symmetric
+"""
+
+from __future__ import annotations
+
+from unittest.mock import AsyncMock
+
+import pytest
+from hypothesis import given, settings
+from hypothesis import strategies as st
+
+from tchaka.core import count_nearby, evict_idle_users
+from tchaka.geo import haversine_distance
+from tchaka.state import AppState, Coord, UserRecord
+
+RANGE_KM = 5.0
+
+
+def _state() -> AppState:
+    state = AppState(adjacency_km=RANGE_KM)
+    state.register(UserRecord("a", 1, Coord(52.5200, 13.4050), 0.0))
+    state.register(UserRecord("b", 2, Coord(52.5201, 13.4051), 0.0))  # ~13 m
+    state.register(UserRecord("c", 3, Coord(48.8566, 2.3522), 0.0))  # Paris
+    return state
+
+
+def test_register_links_both_sides() -> None:
+    state = _state()
+    assert state.adjacency["a"] == {"b": 2}
+    assert state.adjacency["b"] == {"a": 1}
+    assert state.adjacency["c"] == {}
+    assert state.recipients("a", RANGE_KM) == [2]
+    assert count_nearby(state, "a", RANGE_KM) == 1
+
+
+def test_remove_unlinks_neighbors() -> None:
+    state = _state()
+    state.remove_by_chat(2)
+    assert "b" not in state.adjacency
+    assert state.adjacency["a"] == {}
+    assert state.recipients("a", RANGE_KM) == []
+
+
+def test_other_thresholds_are_computed() -> None:
+    state = _state()
+    # not the materialized range -> falls back to a spatial query
+    assert count_nearby(state, "a", threshold_km=2000.0) == 2
+    assert sorted(state.recipients("a", 2000.0)) == [2, 3]
+
+
+def test_move_relinks_and_reports_newly_in_range() -> None:
+    state = _state()
+    # c walks from Paris to Berlin: a and b are newly in range
+    assert sorted(state.move("c", Coord(52.5202, 13.4052), RANGE_KM)) == [1, 2]
+    assert state.adjacency["a"] == {"b": 2, "c": 3}
+    # a small step inside the neighborhood reports nobody new
+    assert state.move("c", Coord(52.5203, 13.4053), RANGE_KM) == []
+    # ... and walking away unlinks both sides
+    assert state.move("c", Coord(48.8566, 2.3522), RANGE_KM) == []
+    assert state.adjacency["a"] == {"b": 2}
+    assert state.adjacency["c"] == {}
+    assert state.move("ghost", Coord(0.0, 0.0), RANGE_KM) == []
+
+
+def test_move_limit_keeps_nearest_newly_in_range() -> None:
+    state = _state()
+    state.register(UserRecord("d", 4, Coord(52.5300, 13.4050), 0.0))  # ~1 km
+    # c walks next to a and b: three newly in range, the cap keeps two
+    assert state.move("c", Coord(52.5202, 13.4052), RANGE_KM, limit=2) == [2, 1]
+    assert state.adjacency["c"] == {"a": 1, "b": 2, "d": 4}  # links are uncapped
+
+
+@pytest.mark.asyncio
+async def test_eviction_unlinks_neighbors() -> None:
+    state = _state()
+    state.touch("a", 7200.0)
+    state.touch("c", 7200.0)
+    evicted = await evict_idle_users(AsyncMock(), state, now=7200.0, ttl=3600)
+    assert evicted == ["b"]
+    assert state.adjacency["a"] == {}
+
+
+lats = st.floats(min_value=52.4, max_value=52.6, allow_nan=False)
+lons = st.floats(min_value=13.3, max_value=13.5, allow_nan=False)
+
+
+@settings(max_examples=100)
+@given(
+    st.lists(st.tuples(lats, lons), min_size=1, max_size=30),
+    st.lists(st.integers(min_value=0, max_value=29), max_size=15),
+)
+def test_adjacency_matches_recomputation(coords, removals):
+    state = AppState(adjacency_km=RANGE_KM)
+    for i, (lat, lon) in enumerate(coords):
+        state.register(UserRecord(f"u{i}", i, Coord(lat, lon), 0.0))
+    for chat_id in removals:
+        state.remove_by_chat(chat_id)
+
+    assert state.adjacency.keys() == state.users.keys()
+    for uid, rec in state.users.items():
+        expected = {
+            other_id: other.chat_id
+            for other_id, other in state.users.items()
+            if other_id != uid
+            and haversine_distance(*rec.coord, *other.coord) <= RANGE_KM
+        }
+        assert state.adjacency[uid] == expected  # P-ADJ-1
+        for other_id in expected:
+            assert uid in state.adjacency[other_id]  # P-ADJ-2
@@ -0,0 +1,197 @@
+"""Tests for the state backends (tchaka.backend).
+
+The Redis store runs over :class:`~benchmarks._redis.LocalRedis`; a
+:class:`~tchaka.backend.MemoryBackend` holding the same users is the
+reference. The callbacks run over both in test_commands.py.
+
+Property coverage:
+- P-BKD-1 the Redis backend's neighbors, counts, nearest and recipients equal
+  the in-memory ones, range overrides included, except for pairs within a
+  metre of a range
+- P-BKD-2 every Redis backend operation takes at most two round trips
+- P-BKD-3 a user id or chat held by another registration is never
+  overwritten: the losing registration raises and writes nothing
+"""
+
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from benchmarks._redis import LocalRedis
+from tchaka.backend import MemoryBackend, RedisBackend, StateBackend
+from tchaka.geo import haversine_distance
+from tchaka.state import AppState, Coord, UserRecord
+
+RANGE_KM = 5.0
+
+
+@pytest.fixture
+def backend() -> RedisBackend:
+    return RedisBackend(LocalRedis())
+
+
+def test_backends_follow_the_protocol(backend: RedisBackend) -> None:
+    memory = MemoryBackend()
+    assert isinstance(memory, StateBackend) and not memory.shared
+    assert isinstance(backend, StateBackend) and backend.shared
+
+
+async def test_memory_backend_is_the_state() -> None:
+    state = AppState()
+    memory = MemoryBackend(state)
+    await memory.register(UserRecord("u1", 1, Coord(0.0, 0.0), 0.0))
+    await memory.register(UserRecord("u2", 2, Coord(0.0, 0.01), 0.0))
+    assert state.chat_to_user == {1: "u1", 2: "u2"}
+    assert await memory.recipients("u1", RANGE_KM) == [2]
+    assert await memory.count_neighbors("u1", RANGE_KM) == 1
+    assert [rec.user_id for _, rec in await memory.nearest("u1", 3, RANGE_KM)] == ["u2"]
+    # an absent user has no neighbors
+    assert await memory.neighbors("nobody", RANGE_KM) == []
+    assert await memory.count_neighbors("nobody", RANGE_KM) == 0
+    assert await memory.nearest("nobody", 3, RANGE_KM) == []
+    assert await memory.recipients("nobody", RANGE_KM) == []
+    assert await memory.remove_by_chat(1) is not None
+    assert "u1" not in state.users
+
+
+async def test_register_lookup_remove(backend: RedisBackend) -> None:
+    rec = UserRecord("u1", -100, Coord(48.8566, 2.3522), 12.5, "fr", 2.5, 10.0)
+    await backend.register(rec)
+    assert await backend.user_for_chat(-100) == rec
+    assert await backend.user_for_chat(7) is None
+    assert await backend.remove_by_chat(-100) == rec
+    assert await backend.remove_by_chat(-100) is None
+    assert await backend.user_for_chat(-100) is None
+
+
+async def test_register_claims_id_and_chat(backend: RedisBackend) -> None:
+    mine = UserRecord("u1", 1, Coord(0.0, 0.0), 0.0)
+    await backend.register(mine)
+    # another replica allocated the same id for another chat
+    with pytest.raises(ValueError, match="taken"):
+        await backend.register(UserRecord("u1", 2, Coord(1.0, 1.0), 5.0))
+    # ... or another id for the same chat
+    with pytest.raises(ValueError, match="registered"):
+        await backend.register(UserRecord("u2", 1, Coord(1.0, 1.0), 5.0))
+    assert await backend.user_for_chat(1) == mine  # P-BKD-3
+    assert await backend.user_for_chat(2) is None
+    assert await backend.idle_user_ids(1000.0, 1.0) == ["u1"]
+    # the loser retries with a fresh id; the same registration may repeat
+    await backend.register(UserRecord("u3", 2, Coord(1.0, 1.0), 5.0))
+    moved = UserRecord("u1", 1, Coord(0.5, 0.5), 7.0)
+    await backend.register(moved)
+    assert await backend.user_for_chat(1) == moved
+
+
+async def test_tracked_messages(backend: RedisBackend) -> None:
+    for mid in (3, 4, 4, 9):
+        await backend.track_message(1, mid)
+    assert await backend.pop_tracked(1) == [3, 4, 9]
+    assert await backend.pop_tracked(1) == []
+
+
+async def test_touch_and_idle(backend: RedisBackend) -> None:
+    await backend.register(UserRecord("u1", 1, Coord(0.0, 0.0), 0.0))
+    await backend.register(UserRecord("u2", 2, Coord(0.0, 0.0), 0.0))
+    await backend.touch("u1", 100.0)
+    await backend.touch("ghost", 100.0)  # absent: nothing happens
+    assert await backend.idle_user_ids(150.0, 60.0) == ["u2"]
+    rec = await backend.user_for_chat(1)
+    assert rec is not None and rec.last_active_ts == 100.0
+    assert await backend.idle_user_ids(1000.0, 60.0) in (["u1", "u2"], ["u2", "u1"])
+
+
+async def test_ranges_are_mutual(backend: RedisBackend) -> None:
+    await backend.register(UserRecord("me", 1, Coord(52.52, 13.405), 0.0))
+    await backend.register(UserRecord("near", 2, Coord(52.5201, 13.4051), 0.0))
+    # ~7.8 km north, with a 1 km range of its own
+    await backend.register(
+        UserRecord("far", 3, Coord(52.59, 13.405), 0.0, range_km=1.0)
+    )
+    assert [n.user_id for n in await backend.neighbors("me", 10.0)] == ["near"]
+    assert await backend.recipients("far", 10.0) == []
+    assert await backend.recipients("near", 2.0) == [1]
+    assert await backend.neighbors("nobody", 10.0) == []
+
+
+async def test_recipient_limit_keeps_the_nearest(backend: RedisBackend) -> None:
+    state = AppState()
+    for i, km in enumerate([3.0, 1.0, 4.0, 2.0]):
+        state.register(UserRecord(f"u{i}", i, Coord(0.0, km / 111.195), 0.0))
+        await backend.register(UserRecord(f"u{i}", i, Coord(0.0, km / 111.195), 0.0))
+    state.register(UserRecord("me", 99, Coord(0.0, 0.0), 0.0))
+    await backend.register(UserRecord("me", 99, Coord(0.0, 0.0), 0.0))
+    assert state.recipients("me", RANGE_KM, limit=2) == [1, 3]
+    assert await backend.recipients("me", RANGE_KM, limit=2) == [1, 3]
+
+
+async def test_redis_matches_memory_on_a_random_population() -> None:
+    rng = random.Random(3)
+    memory = MemoryBackend(AppState(cell_km=RANGE_KM))
+    redis = RedisBackend(LocalRedis())
+    recs = [
+        UserRecord(
+            f"u{i}",
+            i,
+            Coord(rng.uniform(45.0, 45.15), rng.uniform(3.0, 3.2)),
+            float(i),
+            range_km=rng.choice([None, None, 1.0, 3.0]),
+        )
+        for i in range(200)
+    ]
+    for rec in recs:
+        await memory.register(rec)
+        await redis.register(rec)
+
+    def borderline(a: UserRecord, b: UserRecord) -> bool:
+        km = haversine_distance(*a.coord, *b.coord)
+        ranges = [RANGE_KM, a.range_km or RANGE_KM, b.range_km or RANGE_KM]
+        return any(abs(km - r) < 0.001 for r in ranges)
+
+    by_id = {rec.user_id: rec for rec in recs}
+    for rec in recs:
+        expected = {n.user_id for n in await memory.neighbors(rec.user_id, RANGE_KM)}
+        got = {n.user_id for n in await redis.neighbors(rec.user_id, RANGE_KM)}
+        assert all(borderline(rec, by_id[uid]) for uid in expected ^ got)  # P-BKD-1
+        chats = await redis.recipients(rec.user_id, RANGE_KM)
+        assert set(chats) == {by_id[uid].chat_id for uid in got}  # P-BKD-1
+        if expected == got:
+            count = await memory.count_neighbors(rec.user_id, RANGE_KM)
+            assert await redis.count_neighbors(rec.user_id, RANGE_KM) == count
+            mine = await memory.nearest(rec.user_id, 3, RANGE_KM)
+            theirs = await redis.nearest(rec.user_id, 3, RANGE_KM)
+            assert [r.user_id for _, r in theirs] == [r.user_id for _, r in mine]
+            for (km, _), (redis_km, _) in zip(mine, theirs, strict=True):
+                assert redis_km == pytest.approx(km, abs=0.01)  # P-BKD-1
+
+
+async def test_redis_round_trips() -> None:
+    client = LocalRedis()
+    backend = RedisBackend(client)
+    rec = UserRecord("u1", 1, Coord(0.0, 0.0), 0.0)
+
+    async def trips(call: object) -> int:
+        before = client.round_trips
+        await call  # type: ignore[misc]
+        return client.round_trips - before
+
+    await backend.register(UserRecord("u2", 2, Coord(0.0, 0.001), 0.0))
+    assert await trips(backend.register(rec)) == 2  # P-BKD-2
+    before = client.round_trips
+    with pytest.raises(ValueError):
+        await backend.register(UserRecord("u9", 1, Coord(0.0, 0.0), 0.0))
+    assert client.round_trips - before == 2  # the claim and its rollback
+    assert await trips(backend.user_for_chat(1)) == 2
+    assert await trips(backend.user_for_chat(9)) == 1
+    assert await trips(backend.touch("u1", 5.0)) == 1
+    assert await trips(backend.track_message(1, 10)) == 1
+    assert await trips(backend.recipients("u1", RANGE_KM)) == 2
+    assert await trips(backend.neighbors("u1", RANGE_KM)) == 2
+    assert await trips(backend.count_neighbors("u1", RANGE_KM)) == 2
+    assert await trips(backend.nearest("u1", 3, RANGE_KM)) == 2
+    assert await trips(backend.idle_user_ids(10.0, 1.0)) == 1
+    assert await trips(backend.pop_tracked(1)) == 1
+    assert await trips(backend.remove_by_chat(1)) == 2
+    assert await trips(backend.neighbors("u1", RANGE_KM)) == 1  # gone
@@ -0,0 +1,100 @@
+"""Tests for the transitive clustering helpers (tchaka.cluster / group_coordinates).
+
+Property coverage:
+- P-CLU-1 batch clusters equal brute-force union-find over every pair, on
+  both the pairwise (sparse) and the clique-cell (dense) pass
+- P-CLU-2 incremental add/remove clusters equal a batch re-run
+"""
+
+from __future__ import annotations
+
+from hypothesis import given, settings
+from hypothesis import strategies as st
+
+from tchaka.cluster import IncrementalClusters, cluster_points
+from tchaka.geo import group_coordinates, haversine_distance
+
+
+def _brute_force(coords: list[tuple[float, float]], threshold: float) -> set:
+    parent = list(range(len(coords)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            i = parent[i]
+        return i
+
+    for i, a in enumerate(coords):
+        for j in range(i + 1, len(coords)):
+            if haversine_distance(*a, *coords[j]) <= threshold:
+                parent[find(j)] = find(i)
+    groups: dict[int, set[int]] = {}
+    for i in range(len(coords)):
+        groups.setdefault(find(i), set()).add(i)
+    return {frozenset(g) for g in groups.values()}
+
+
+def _partition(roots: list[int]) -> set:
+    groups: dict[int, set[int]] = {}
+    for i, root in enumerate(roots):
+        groups.setdefault(root, set()).add(i)
+    return {frozenset(g) for g in groups.values()}
+
+
+# A city-sized box (dense, small thresholds) and the whole globe (sparse).
+city = st.tuples(
+    st.floats(min_value=52.40, max_value=52.60),
+    st.floats(min_value=13.2, max_value=13.6),
+)
+globe = st.tuples(
+    st.floats(min_value=-90, max_value=90), st.floats(min_value=-180, max_value=180)
+)
+
+
+@settings(max_examples=150)
+@given(
+    st.one_of(
+        st.lists(city, max_size=40),
+        st.lists(globe, max_size=40),
+    ),
+    st.sampled_from([0.0, 0.5, 2.0, 5.0, 50.0, 2_000.0, 20_100.0]),
+    st.sampled_from([0.0, float("inf")]),  # clique cells, pairwise
+)
+def test_batch_matches_brute_force(coords, threshold, pair_budget):
+    clusters = cluster_points(coords, threshold, pair_budget=pair_budget)
+    assert _partition(clusters) == _brute_force(coords, threshold)  # P-CLU-1
+
+
+@settings(max_examples=100)
+@given(
+    st.lists(city, min_size=1, max_size=30),
+    st.lists(st.integers(min_value=0, max_value=29), max_size=20),
+    st.sampled_from([0.5, 2.0, 5.0]),
+)
+def test_incremental_matches_batch(coords, removals, threshold):
+    clusters: IncrementalClusters[int] = IncrementalClusters(threshold)
+    for i, (lat, lon) in enumerate(coords):
+        clusters.add(i, lat, lon)
+    alive = dict(enumerate(coords))
+    for i in removals:
+        assert clusters.remove(i) is (i in alive)
+        alive.pop(i, None)
+
+    keys = list(alive)
+    expected = {
+        frozenset(keys[i] for i in group)
+        for group in _brute_force([alive[k] for k in keys], threshold)
+    }
+    assert {frozenset(c) for c in clusters.clusters()} == expected  # P-CLU-2
+    for key in keys:
+        assert key in clusters.cluster_of(key)
+
+
+def test_group_coordinates_uses_threshold_sized_cells():
+    # Two Berlin points ~3 km apart and a third ~11 km north of them.
+    coords = [(52.52, 13.405), (52.52, 13.45), (52.62, 13.405)]
+    groups, same = group_coordinates(
+        coords, distance_threshold=5, user_coords=(52.52, 13.405)
+    )
+    assert sorted(len(g) for g in groups.values()) == [1, 2]
+    assert same == 2
+    assert group_coordinates([], distance_threshold=5) == ({}, 0)
@@ -0,0 +1,96 @@
+"""Tests for the vectorized haversine and the struct-of-arrays column store.
+
+Property coverage:
+- P-GEO-1..4 hold for :func:`haversine_many` and it agrees with the scalar
+  :func:`haversine_distance` (both the NumPy and the pure-Python path)
+- P-COL-1 the column store answers the same neighborhood as the scalar scan
+- P-COL-2 swap-remove keeps the slot map dense and consistent
+"""
+
+from __future__ import annotations
+
+from math import pi
+
+import pytest
+from hypothesis import assume, given, settings
+from hypothesis import strategies as st
+
+from tchaka import geo
+from tchaka.geo import EARTH_RADIUS_KM, haversine_distance, haversine_many
+from tchaka.state import AppState, Coord, UserRecord
+
+np = pytest.importorskip("numpy")
+
+from tchaka.columns import CoordColumns
+
+lats = st.floats(min_value=-90, max_value=90, allow_nan=False, allow_infinity=False)
+lons = st.floats(min_value=-180, max_value=180, allow_nan=False, allow_infinity=False)
+points = st.lists(st.tuples(lats, lons), min_size=1, max_size=40)
+EPS = 1e-6
+
+
+@given(lats, lons, points)
+def test_haversine_many_matches_scalar(o_lat, o_lon, pts):
+    got = haversine_many(o_lat, o_lon, [p[0] for p in pts], [p[1] for p in pts])
+    for (lat, lon), d in zip(pts, got, strict=True):
+        assert d >= 0  # P-GEO-1
+        assert d <= pi * EARTH_RADIUS_KM + EPS  # P-GEO-4
+        assert abs(d - haversine_distance(o_lat, o_lon, lat, lon)) <= EPS
+
+
+@given(points)
+def test_haversine_many_identity(pts):
+    for lat, lon in pts:
+        assert haversine_many(lat, lon, [lat], [lon])[0] <= EPS  # P-GEO-2
+
+
+def test_haversine_many_pure_python_fallback(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(geo, "np", None)
+    got = geo.haversine_many(52.52, 13.405, [52.5201, 48.8566], [13.4051, 2.3522])
+    assert isinstance(got, list)
+    assert got == [
+        haversine_distance(52.52, 13.405, 52.5201, 13.4051),
+        haversine_distance(52.52, 13.405, 48.8566, 2.3522),
+    ]
+
+
+def test_swap_remove_keeps_slots_dense() -> None:
+    cols = CoordColumns(capacity=2)
+    for i in range(5):  # forces two resizes
+        cols.insert(f"u{i}", float(i), float(i))
+    assert cols.remove("u1") is True
+    assert cols.remove("u1") is False
+    assert len(cols) == 4
+    assert "u1" not in cols
+    # the last key moved into the freed slot and is still found at its coord
+    assert cols.within(4.0, 4.0, 0.001) == ["u4"]
+    assert sorted(cols.within(2.0, 2.0, 200.0)) == ["u2", "u3"]
+
+
+def _state(coords: list[tuple[float, float]], *, columnar: bool) -> AppState:
+    state = AppState(columnar=columnar)
+    for i, (lat, lon) in enumerate(coords):
+        state.register(UserRecord(f"u{i}", i, Coord(lat, lon), 0.0))
+    return state
+
+
+@settings(max_examples=100)
+@given(points, st.floats(min_value=0.0, max_value=20100, allow_nan=False))
+def test_columnar_neighbors_match_scalar(coords, threshold):
+    # Pairs within float noise of the threshold may legitimately differ.
+    for a in coords:
+        for b in coords:
+            assume(abs(haversine_distance(*a, *b) - threshold) > 1e-6)
+    plain = _state(coords, columnar=False)
+    cols = _state(coords, columnar=True)
+    assert cols.columns is not None
+    for uid in plain.users:
+        expected = {r.user_id for r in plain.neighbors(uid, threshold)}
+        assert {r.user_id for r in cols.neighbors(uid, threshold)} == expected
+    # P-COL-2: removing users keeps both views in step
+    for i in range(0, len(coords), 2):
+        plain.remove_by_chat(i)
+        cols.remove_by_chat(i)
+    for uid in plain.users:
+        expected = {r.user_id for r in plain.neighbors(uid, threshold)}
+        assert {r.user_id for r in cols.neighbors(uid, threshold)} == expected
@@ -5,14 +5,31 @@ Settings:
 - start/help reply and track real ids
 - /check returns counts (not the old "There is ---" stub) and handles the
   unregistered case
+- /check and /echo read without the state lock, so they never wait on a
+  writer
 - /stop fully removes a user from all state
-- /location registers and notifies only neighbors (Issue #6)
-- /echo relays only to neighbors, never the sender
+- /range shows, narrows (mutually) and resets the radius, rejecting bad input
+- /location registers and notifies only neighbors (Issue #6); with a join
+  window, the newcomers of one window are registered together and each
+  neighbor gets one aggregated notice
+- live-location edits move the user, are debounced (the last edit of a burst
+  is applied when the window ends), and notify only the neighbors newly in
+  range
+- /echo relays only to neighbors, never the sender, and past the fan-out cap
+  only to the nearest ones, nearest first; the join notices of a move obey
+  the same cap
+- with a shared (Redis) backend, joins, /check and relays reach the users of
+  other replicas, and this process's users are published and withdrawn
 - error_handler is graceful when DEVELOPER_CHAT_ID is unset (Issue #10)
+
+Every test runs twice: with writes under ``STATE.lock`` and on a
+:class:`~tchaka.actor.StateActor`.
 """
 
 from __future__ import annotations
 
+import asyncio
+from collections.abc import AsyncIterator, Callable
 from unittest.mock import ANY, AsyncMock, MagicMock
 
 import pytest
@@ -20,7 +37,11 @@ from telegram import Message, Update, User
 from telegram.ext import ContextTypes
 
 import tchaka.commands as commands
+from benchmarks._redis import LocalRedis
+from tchaka.actor import StateActor
+from tchaka.backend import RedisBackend
 from tchaka.config import Settings
+from tchaka.ingest import Batcher
 from tchaka.state import AppState, Coord, UserRecord
 from tchaka.utils import FakeClock
 
@@ -30,6 +51,8 @@ def _settings(
     developer_chat_id: int | None = None,
     distance_threshold_km: float = 5.0,
     max_error_chars: int = 3500,
+    max_fanout: int = 0,
+    live_debounce_seconds: float = 15.0,
 ) -> Settings:
     return Settings(
         tg_token="tok",
@@ -39,14 +62,24 @@ def _settings(
         sweep_interval_seconds=300,
         max_relay_chars=500,
         max_error_chars=max_error_chars,
+        max_fanout=max_fanout,
+        live_debounce_seconds=live_debounce_seconds,
     )
 
 
-@pytest.fixture(autouse=True)
-def fresh_state() -> AppState:
+@pytest.fixture(autouse=True, params=["lock", "actor"])
+async def fresh_state(
+    request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch
+) -> AsyncIterator[AppState]:
     state = AppState()
     commands.configure(state=state, settings=_settings(), clock=FakeClock(0.0))
-    return state
+    actor = StateActor(state) if request.param == "actor" else None
+    monkeypatch.setattr(commands, "ACTOR", actor)
+    if actor is not None:
+        actor.start()
+    yield state
+    if actor is not None:
+        await actor.close()
 
 
 @pytest.fixture
@@ -114,6 +147,29 @@ async def test_check_counts_neighbors(
     sent_text = update.message.reply_text.call_args.kwargs["text"]
     assert "1" in sent_text  # exactly one neighbor within 5 km
     assert "---" not in sent_text  # the old stub is gone
+    assert "Nearest: 0–500 m." in sent_text  # a coarse bucket, not a distance
+
+
+@pytest.mark.asyncio
+async def test_reads_do_not_wait_for_the_lock(
+    update: MagicMock, context: MagicMock, fresh_state: AppState
+) -> None:
+    fresh_state.register(UserRecord("me", 123, Coord(52.5200, 13.4050), 0.0))
+    fresh_state.register(UserRecord("near", 999, Coord(52.5201, 13.4051), 0.0))
+    update.message.reply_text = AsyncMock(
+        return_value=type("M", (), {"message_id": 2})()
+    )
+    update.message.text = "hello"
+    update.message.reply_to_message = None
+    context.bot.send_message = AsyncMock(
+        return_value=type("M", (), {"message_id": 7})()
+    )
+    async with fresh_state.lock:  # a writer holds the lock throughout
+        await commands.check_callback(update, context)
+        await commands.echo_callback(update, context)
+    assert "Nearest: 0–500 m." in update.message.reply_text.call_args.kwargs["text"]
+    context.bot.send_message.assert_awaited_once()
+    assert context.bot.send_message.await_args.kwargs["chat_id"] == 999
 
 
 @pytest.mark.asyncio
@@ -131,6 +187,68 @@ async def test_stop_fully_removes(
     assert 123 not in fresh_state.tracked_msgs
 
 
+@pytest.mark.asyncio
+async def test_range_narrows_mutually(
+    update: MagicMock, context: MagicMock, fresh_state: AppState
+) -> None:
+    fresh_state.register(UserRecord("me", 123, Coord(52.5200, 13.4050), 0.0))
+    # ~2.2 km away: inside the 5 km default, outside a 1 km radius
+    fresh_state.register(UserRecord("other", 999, Coord(52.5400, 13.4050), 0.0))
+    update.message.reply_text = AsyncMock(
+        return_value=type("M", (), {"message_id": 2})()
+    )
+    context.args = ["1"]
+    await commands.range_callback(update, context)
+    assert fresh_state.users["me"].range_km == 1.0
+    assert "1 km" in update.message.reply_text.call_args.kwargs["text"]
+    # the other user (no override) no longer sees me either
+    assert fresh_state.neighbors("other", 5.0) == []
+
+    context.args = ["reset"]
+    await commands.range_callback(update, context)
+    assert fresh_state.users["me"].range_km is None
+    assert [r.user_id for r in fresh_state.neighbors("other", 5.0)] == ["me"]
+
+
+@pytest.mark.asyncio
+async def test_range_without_argument_shows_capped_radius(
+    update: MagicMock, context: MagicMock, fresh_state: AppState
+) -> None:
+    fresh_state.register(UserRecord("me", 123, Coord(0.0, 0.0), 0.0, range_km=50.0))
+    update.message.reply_text = AsyncMock(
+        return_value=type("M", (), {"message_id": 2})()
+    )
+    context.args = []
+    await commands.range_callback(update, context)
+    assert "5 km" in update.message.reply_text.call_args.kwargs["text"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("arg", ["abc", "0", "-3", "nan", "inf", "100", "5.01"])
+async def test_range_rejects_invalid(
+    update: MagicMock, context: MagicMock, fresh_state: AppState, arg: str
+) -> None:
+    fresh_state.register(UserRecord("me", 123, Coord(0.0, 0.0), 0.0))
+    update.message.reply_text = AsyncMock(
+        return_value=type("M", (), {"message_id": 2})()
+    )
+    context.args = [arg]
+    await commands.range_callback(update, context)
+    assert fresh_state.users["me"].range_km is None
+    assert "/range" in update.message.reply_text.call_args.kwargs["text"]
+    assert "5 km" in update.message.reply_text.call_args.kwargs["text"]  # the max
+
+
+@pytest.mark.asyncio
+async def test_range_unregistered(update: MagicMock, context: MagicMock) -> None:
+    update.message.reply_text = AsyncMock(
+        return_value=type("M", (), {"message_id": 2})()
+    )
+    context.args = ["2"]
+    await commands.range_callback(update, context)
+    assert "location" in update.message.reply_text.call_args.kwargs["text"].lower()
+
+
 @pytest.mark.asyncio
 async def test_location_registers_and_notifies_only_neighbors(
     update: MagicMock, context: MagicMock, fresh_state: AppState
@@ -156,6 +274,216 @@ async def test_location_registers_and_notifies_only_neighbors(
     assert notified == {999}
 
 
+@pytest.mark.asyncio
+async def test_location_again_moves_instead_of_ignoring(
+    update: MagicMock, context: MagicMock, fresh_state: AppState
+) -> None:
+    fresh_state.register(UserRecord("me", 123, Coord(48.8566, 2.3522), 0.0))
+    fresh_state.register(UserRecord("near", 999, Coord(52.5201, 13.4051), 0.0))
+    update.message.location = type(
+        "L", (), {"latitude": 52.5200, "longitude": 13.4050}
+    )()
+    update.message.reply_markdown = AsyncMock(
+        return_value=type("M", (), {"message_id": 2})()
+    )
+    context.bot.send_message = AsyncMock(
+        return_value=type("M", (), {"message_id": 7})()
+    )
+    await commands.location_callback(update, context)
+    assert fresh_state.users["me"].coord == Coord(52.5200, 13.4050)
+    assert len(fresh_state.users) == 2  # moved, not re-registered
+    notified = {c.kwargs["chat_id"] for c in context.bot.send_message.await_args_list}
+    assert notified == {999}
+
+
+def _location_update(chat_id: int, lat: float, lon: float) -> MagicMock:
+    user = MagicMock(spec=User, language_code="en", full_name="x", is_bot=False)
+    message = MagicMock(spec=Message, chat_id=chat_id, message_id=1)
+    message.location = type("L", (), {"latitude": lat, "longitude": lon})()
+    message.reply_markdown = AsyncMock(return_value=type("M", (), {"message_id": 2})())
+    return MagicMock(spec=Update, effective_user=user, message=message)
+
+
+@pytest.mark.asyncio
+async def test_locations_in_one_window_are_batched(
+    context: MagicMock, fresh_state: AppState, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    joins = Batcher(0.01, commands.register_arrivals)
+    monkeypatch.setattr(commands, "JOINS", joins)
+    fresh_state.register(UserRecord("old", 999, Coord(52.5201, 13.4051), 0.0))
+    fresh_state.register(UserRecord("far", 888, Coord(48.8566, 2.3522), 0.0))
+    context.bot.send_message = AsyncMock(
+        return_value=type("M", (), {"message_id": 7})()
+    )
+    updates = [_location_update(c, 52.52, 13.405) for c in (1, 2, 3)]
+    await asyncio.gather(*(commands.location_callback(u, context) for u in updates))
+
+    assert (joins.batches, joins.items) == (1, 3)
+    new_ids = [fresh_state.chat_to_user[c] for c in (1, 2, 3)]
+    texts = {
+        c.kwargs["chat_id"]: c.kwargs["text"]
+        for c in context.bot.send_message.await_args_list
+    }
+    # one notice per neighbor; a newcomer hears only of those after it
+    assert set(texts) == {999, 1, 2}
+    assert texts[999].startswith("3 people joined the area")
+    assert all(user_id in texts[999] for user_id in new_ids)
+    assert texts[2] == f"{new_ids[2]} joined the area..."
+    for u in updates:  # everyone is welcomed, with their neighbor count
+        u.message.reply_markdown.assert_awaited_once()
+        assert "3" in u.message.reply_markdown.await_args.kwargs["text"]
+
+
+def _live_update(update: MagicMock, lat: float, lon: float) -> MagicMock:
+    update.message = None
+    edited = MagicMock(spec=Message)
+    edited.chat_id = 123
+    edited.message_id = 1
+    edited.location = type("L", (), {"latitude": lat, "longitude": lon})()
+    update.edited_message = edited
+    return update
+
+
+@pytest.mark.asyncio
+async def test_live_location_moves_and_notifies_newly_in_range(
+    update: MagicMock, context: MagicMock, fresh_state: AppState
+) -> None:
+    clock = FakeClock(0.0)
+    commands.configure(clock=clock)
+    fresh_state.register(UserRecord("me", 123, Coord(48.8566, 2.3522), 0.0))
+    fresh_state.register(UserRecord("near", 999, Coord(52.5201, 13.4051), 0.0))
+    context.bot.send_message = AsyncMock(
+        return_value=type("M", (), {"message_id": 7})()
+    )
+    await commands.live_location_callback(
+        _live_update(update, 52.5200, 13.4050), context
+    )
+    assert fresh_state.users["me"].coord == Coord(52.5200, 13.4050)
+    notified = {c.kwargs["chat_id"] for c in context.bot.send_message.await_args_list}
+    assert notified == {999}
+
+    # already in range: a later move notifies nobody again
+    clock.advance(60.0)
+    context.bot.send_message.reset_mock()
+    await commands.live_location_callback(
+        _live_update(update, 52.5202, 13.4052), context
+    )
+    assert fresh_state.users["me"].coord == Coord(52.5202, 13.4052)
+    context.bot.send_message.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_live_location_debounced(
+    update: MagicMock, context: MagicMock, fresh_state: AppState
+) -> None:
+    clock = FakeClock(0.0)
+    commands.configure(clock=clock)
+    fresh_state.register(UserRecord("me", 123, Coord(0.0, 0.0), 0.0))
+    await commands.live_location_callback(_live_update(update, 1.0, 1.0), context)
+    clock.advance(1.0)
+    await commands.live_location_callback(_live_update(update, 2.0, 2.0), context)
+    assert fresh_state.users["me"].coord == Coord(1.0, 1.0)  # held
+    assert fresh_state.users["me"].last_active_ts == 1.0  # but still activity
+    clock.advance(60.0)
+    await commands.live_location_callback(_live_update(update, 3.0, 3.0), context)
+    assert fresh_state.users["me"].coord == Coord(3.0, 3.0)
+    await commands.flush_live_locations()  # the held (2, 2) is superseded
+    assert fresh_state.users["me"].coord == Coord(3.0, 3.0)
+
+
+@pytest.mark.asyncio
+async def test_live_location_burst_ends_at_last_position(
+    update: MagicMock, context: MagicMock, fresh_state: AppState
+) -> None:
+    commands.configure(
+        clock=FakeClock(0.0),
+        settings=_settings(live_debounce_seconds=0.01),
+    )
+    fresh_state.register(UserRecord("me", 123, Coord(0.0, 0.0), 0.0))
+    for step in (1.0, 2.0, 3.0):
+        await commands.live_location_callback(_live_update(update, step, step), context)
+    assert fresh_state.users["me"].coord == Coord(1.0, 1.0)
+    await asyncio.sleep(0.05)  # the window ends: the last edit is applied
+    assert fresh_state.users["me"].coord == Coord(3.0, 3.0)
+
+
+@pytest.mark.asyncio
+async def test_live_location_held_during_a_move_is_kept(
+    update: MagicMock,
+    context: MagicMock,
+    fresh_state: AppState,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    fresh_state.register(UserRecord("me", 123, Coord(0.0, 0.0), 0.0))
+    apply, calls = commands._apply, []
+
+    async def late_first(fn: Callable[[AppState], object]) -> object:
+        result = await apply(fn)
+        calls.append(fn)
+        if len(calls) == 1:
+            await asyncio.sleep(0.01)  # the first move resumes last
+        return result
+
+    monkeypatch.setattr(commands, "_apply", late_first)
+    later = MagicMock(spec=Update, effective_user=update.effective_user)
+    # the second edit is held while the first one's move is still in flight
+    await asyncio.gather(
+        commands.live_location_callback(_live_update(update, 1.0, 1.0), context),
+        commands.live_location_callback(_live_update(later, 2.0, 2.0), context),
+    )
+    assert fresh_state.users["me"].coord == Coord(1.0, 1.0)
+    await commands.flush_live_locations()
+    assert fresh_state.users["me"].coord == Coord(2.0, 2.0)
+
+
+@pytest.mark.asyncio
+async def test_configure_forgets_held_live_locations(
+    update: MagicMock, context: MagicMock, fresh_state: AppState
+) -> None:
+    fresh_state.register(UserRecord("me", 123, Coord(0.0, 0.0), 0.0))
+    await commands.live_location_callback(_live_update(update, 1.0, 1.0), context)
+    await commands.live_location_callback(_live_update(update, 2.0, 2.0), context)
+    commands.configure(state=fresh_state)  # e.g. a rebuilt state
+    await commands.flush_live_locations()
+    assert fresh_state.users["me"].coord == Coord(1.0, 1.0)
+
+
+@pytest.mark.asyncio
+async def test_live_location_unregistered_ignored(
+    update: MagicMock, context: MagicMock, fresh_state: AppState
+) -> None:
+    context.bot.send_message = AsyncMock()
+    await commands.live_location_callback(_live_update(update, 1.0, 1.0), context)
+    assert not fresh_state.users
+    context.bot.send_message.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("live", [True, False])
+async def test_move_join_notices_respect_fanout_cap(
+    update: MagicMock, context: MagicMock, fresh_state: AppState, live: bool
+) -> None:
+    commands.configure(settings=_settings(max_fanout=2))
+    fresh_state.register(UserRecord("me", 123, Coord(48.8566, 2.3522), 0.0))
+    for chat_id, dlat in ((903, 0.003), (901, 0.001), (904, 0.004), (902, 0.002)):
+        fresh_state.register(
+            UserRecord(f"u{chat_id}", chat_id, Coord(52.5200 + dlat, 13.4050), 0.0)
+        )
+    context.bot.send_message = AsyncMock(
+        return_value=type("M", (), {"message_id": 7})()
+    )
+    if live:
+        await commands.live_location_callback(
+            _live_update(update, 52.5200, 13.4050), context
+        )
+    else:
+        await commands.location_callback(
+            _location_update(123, 52.5200, 13.4050), context
+        )
+    notified = {c.kwargs["chat_id"] for c in context.bot.send_message.await_args_list}
+    assert notified == {901, 902}  # 4 newly in range, only the 2 nearest told
+
+
 @pytest.mark.asyncio
 async def test_echo_relays_only_to_neighbors(
     update: MagicMock, context: MagicMock, fresh_state: AppState
@@ -173,6 +501,26 @@ async def test_echo_relays_only_to_neighbors(
     assert recipients == {999}  # near only; not self (123), not far (888)
 
 
+@pytest.mark.asyncio
+async def test_echo_fanout_cap_keeps_nearest_first(
+    update: MagicMock, context: MagicMock, fresh_state: AppState
+) -> None:
+    commands.configure(settings=_settings(max_fanout=2))
+    fresh_state.register(UserRecord("me", 123, Coord(52.5200, 13.4050), 0.0))
+    for chat_id, dlat in ((903, 0.003), (901, 0.001), (904, 0.004), (902, 0.002)):
+        fresh_state.register(
+            UserRecord(f"u{chat_id}", chat_id, Coord(52.5200 + dlat, 13.4050), 0.0)
+        )
+    update.message.text = "hello"
+    update.message.reply_to_message = None
+    context.bot.send_message = AsyncMock(
+        return_value=type("M", (), {"message_id": 7})()
+    )
+    await commands.echo_callback(update, context)
+    order = [c.kwargs["chat_id"] for c in context.bot.send_message.await_args_list]
+    assert order == [901, 902]
+
+
 @pytest.mark.asyncio
 async def test_echo_unregistered_noop(update: MagicMock, context: MagicMock) -> None:
     update.message.text = "hello"
@@ -198,3 +546,78 @@ async def test_error_handler_clips_long_report(context: MagicMock) -> None:
     await commands.error_handler(object(), context)
     sent_text = context.bot.send_message.call_args.kwargs["text"]
     assert len(sent_text) <= 100
+
+
+@pytest.mark.asyncio
+async def test_shared_backend_reaches_other_replicas(
+    update: MagicMock,
+    context: MagicMock,
+    fresh_state: AppState,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    shared = RedisBackend(LocalRedis())
+    monkeypatch.setattr(commands, "BACKEND", shared)
+    # registered with another replica: not in this process's state
+    await shared.register(UserRecord("remote", 999, Coord(52.5201, 13.4051), 0.0))
+    context.bot.send_message = AsyncMock(
+        return_value=type("M", (), {"message_id": 7})()
+    )
+    reply = AsyncMock(return_value=type("M", (), {"message_id": 2})())
+    update.message.reply_markdown = reply
+    update.message.reply_text = reply
+    update.message.location = type("L", (), {"latitude": 52.52, "longitude": 13.405})()
+
+    await commands.location_callback(update, context)
+    me = fresh_state.chat_to_user[123]
+    published = await shared.user_for_chat(123)
+    assert published is not None and published.user_id == me
+    notified = [c.kwargs["chat_id"] for c in context.bot.send_message.await_args_list]
+    assert notified == [999]  # the join notice
+    assert "1" in reply.await_args_list[-1].kwargs["text"]  # one neighbor
+
+    await commands.check_callback(update, context)
+    assert "There are 1 person(s)" in reply.await_args_list[-1].kwargs["text"]
+
+    context.bot.send_message.reset_mock()
+    update.message.text = "hello"
+    update.message.reply_to_message = None
+    await commands.echo_callback(update, context)
+    notified = [c.kwargs["chat_id"] for c in context.bot.send_message.await_args_list]
+    assert notified == [999]  # the relay
+
+    context.args = ["1"]
+    await commands.range_callback(update, context)
+    published = await shared.user_for_chat(123)
+    assert published is not None and published.range_km == 1.0
+
+    await commands.stop_callback(update, context)
+    assert await shared.user_for_chat(123) is None  # withdrawn
+    assert await shared.user_for_chat(999) is not None
+
+
+@pytest.mark.asyncio
+async def test_shared_backend_batch_notices(
+    context: MagicMock, fresh_state: AppState, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    shared = RedisBackend(LocalRedis())
+    monkeypatch.setattr(commands, "BACKEND", shared)
+    monkeypatch.setattr(commands, "JOINS", Batcher(0.01, commands.register_arrivals))
+    await shared.register(UserRecord("remote", 999, Coord(52.5201, 13.4051), 0.0))
+    context.bot.send_message = AsyncMock(
+        return_value=type("M", (), {"message_id": 7})()
+    )
+    updates = [_location_update(c, 52.52, 13.405) for c in (1, 2)]
+    await asyncio.gather(*(commands.location_callback(u, context) for u in updates))
+
+    first, second = (fresh_state.chat_to_user[c] for c in (1, 2))
+    texts = {
+        c.kwargs["chat_id"]: c.kwargs["text"]
+        for c in context.bot.send_message.await_args_list
+    }
+    # as in memory: a newcomer hears only of those after it
+    assert set(texts) == {999, 1}
+    assert texts[999].startswith("2 people joined the area")
+    assert texts[1] == f"{second} joined the area..."
+    assert first in texts[999]
+    for u in updates:  # neighbors counted across replicas
+        assert "2" in u.message.reply_markdown.await_args.kwargs["text"]
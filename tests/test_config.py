@@ -14,11 +14,19 @@ from hypothesis import strategies as st
 
 import tchaka.config as config_module
 from tchaka.config import (
+    DEFAULT_ADAPTIVE_K,
+    DEFAULT_ADAPTIVE_MAX_KM,
+    DEFAULT_EQUIRECT_LIMIT_KM,
     DEFAULT_IDLE_TTL_SECONDS,
+    DEFAULT_LIVE_DEBOUNCE_SECONDS,
     DEFAULT_MAX_ERROR_CHARS,
+    DEFAULT_MAX_FANOUT,
     DEFAULT_MAX_RELAY_CHARS,
+    DEFAULT_MAX_TRACKED_PER_CHAT,
     DEFAULT_RANGE_KM,
+    DEFAULT_SHARDS,
     DEFAULT_SWEEP_INTERVAL_SECONDS,
+    DEFAULT_TRACKED_BUDGET_KB,
     LANG_MESSAGES,
     load_settings,
 )
@@ -33,6 +41,23 @@ def _clear_env(monkeypatch: pytest.MonkeyPatch) -> None:
         "TCHAKA_SWEEP_INTERVAL_SECONDS",
         "TCHAKA_MAX_RELAY_CHARS",
         "TCHAKA_MAX_ERROR_CHARS",
+        "TCHAKA_COLUMNAR",
+        "TCHAKA_ADJACENCY",
+        "TCHAKA_LIVE_DEBOUNCE_SECONDS",
+        "TCHAKA_ADAPTIVE_K",
+        "TCHAKA_ADAPTIVE_MAX_KM",
+        "TCHAKA_ZONES_FILE",
+        "TCHAKA_DISTANCE_MODE",
+        "TCHAKA_EQUIRECT_LIMIT_KM",
+        "TCHAKA_MAX_FANOUT",
+        "TCHAKA_MAX_TRACKED_PER_CHAT",
+        "TCHAKA_TRACKED_BUDGET_KB",
+        "TCHAKA_SHARDS",
+        "TCHAKA_STATE_ACTOR",
+        "TCHAKA_HANDOFF_SOCKET",
+        "TCHAKA_JOIN_BATCH_SECONDS",
+        "TCHAKA_BACKEND",
+        "TCHAKA_REDIS_URL",
     ):
         monkeypatch.delenv(name, raising=False)
 
@@ -48,6 +73,23 @@ def test_defaults_applied_when_unset(monkeypatch: pytest.MonkeyPatch) -> None:
     assert s.sweep_interval_seconds == DEFAULT_SWEEP_INTERVAL_SECONDS
     assert s.max_relay_chars == DEFAULT_MAX_RELAY_CHARS
     assert s.max_error_chars == DEFAULT_MAX_ERROR_CHARS
+    assert s.columnar is False
+    assert s.adjacency is False
+    assert s.live_debounce_seconds == DEFAULT_LIVE_DEBOUNCE_SECONDS
+    assert s.adaptive_k == DEFAULT_ADAPTIVE_K
+    assert s.adaptive_max_km == DEFAULT_ADAPTIVE_MAX_KM
+    assert s.zones_file is None
+    assert s.distance_mode == "chord"
+    assert s.equirect_limit_km == DEFAULT_EQUIRECT_LIMIT_KM
+    assert s.max_fanout == DEFAULT_MAX_FANOUT
+    assert s.max_tracked_per_chat == DEFAULT_MAX_TRACKED_PER_CHAT
+    assert s.tracked_budget_kb == DEFAULT_TRACKED_BUDGET_KB
+    assert s.shards == DEFAULT_SHARDS
+    assert s.state_actor is False
+    assert s.handoff_socket is None
+    assert s.join_batch_seconds == 0.0
+    assert s.backend == "memory"
+    assert s.redis_url is None
 
 
 def test_missing_token_halts(monkeypatch: pytest.MonkeyPatch) -> None:
@@ -81,10 +123,54 @@ def test_valid_values_parsed(monkeypatch: pytest.MonkeyPatch) -> None:
     monkeypatch.setenv("DEVELOPER_CHAT_ID", "-1001234")
     monkeypatch.setenv("TCHAKA_RANGE_KM", "12.5")
     monkeypatch.setenv("TCHAKA_IDLE_TTL_SECONDS", "60")
+    monkeypatch.setenv("TCHAKA_ADJACENCY", "true")
+    monkeypatch.setenv("TCHAKA_LIVE_DEBOUNCE_SECONDS", "2.5")
+    monkeypatch.setenv("TCHAKA_ADAPTIVE_K", "8")
+    monkeypatch.setenv("TCHAKA_ADAPTIVE_MAX_KM", "80")
+    monkeypatch.setenv("TCHAKA_ZONES_FILE", " venues.geojson ")
+    monkeypatch.setenv("TCHAKA_DISTANCE_MODE", "Equirect")
+    monkeypatch.setenv("TCHAKA_EQUIRECT_LIMIT_KM", "20")
+    monkeypatch.setenv("TCHAKA_MAX_FANOUT", "250")
+    monkeypatch.setenv("TCHAKA_MAX_TRACKED_PER_CHAT", "2000")
+    monkeypatch.setenv("TCHAKA_TRACKED_BUDGET_KB", "65536")
+    monkeypatch.setenv("TCHAKA_SHARDS", "4")
+    monkeypatch.setenv("TCHAKA_STATE_ACTOR", "yes")
+    monkeypatch.setenv("TCHAKA_HANDOFF_SOCKET", "/run/tchaka.sock")
+    monkeypatch.setenv("TCHAKA_JOIN_BATCH_SECONDS", "0.5")
+    monkeypatch.setenv("TCHAKA_BACKEND", "Redis")
+    monkeypatch.setenv("TCHAKA_REDIS_URL", "redis://cache:6379/0")
     s = load_settings()
     assert s.developer_chat_id == -1001234
     assert s.distance_threshold_km == 12.5
     assert s.idle_ttl_seconds == 60
+    assert s.adjacency is True
+    assert s.live_debounce_seconds == 2.5
+    assert s.adaptive_k == 8
+    assert s.adaptive_max_km == 80.0
+    assert s.zones_file == "venues.geojson"
+    assert s.distance_mode == "equirect"
+    assert s.equirect_limit_km == 20.0
+    assert s.max_fanout == 250
+    assert s.max_tracked_per_chat == 2000
+    assert s.tracked_budget_kb == 65536
+    assert s.shards == 4
+    assert s.state_actor is True
+    assert s.handoff_socket == "/run/tchaka.sock"
+    assert s.join_batch_seconds == 0.5
+    assert s.backend == "redis"
+    assert s.redis_url == "redis://cache:6379/0"
+
+
+@pytest.mark.parametrize(
+    "raw, expected", [("true", True), ("1", True), ("off", False), ("maybe", False)]
+)
+def test_bool_setting_parsed(
+    monkeypatch: pytest.MonkeyPatch, raw: str, expected: bool
+) -> None:
+    _clear_env(monkeypatch)
+    monkeypatch.setenv("TG_TOKEN", "tok")
+    monkeypatch.setenv("TCHAKA_COLUMNAR", raw)
+    assert load_settings().columnar is expected
 
 
 def test_invalid_developer_chat_id_ignored(monkeypatch: pytest.MonkeyPatch) -> None:
@@ -140,8 +226,12 @@ def test_safe_parse_never_raises_with_token(
         "HELP_MESSAGE",
         "CHECK_RESULT",
         "CHECK_ALONE",
+        "CHECK_NEAREST",
         "CHECK_NOT_REGISTERED",
         "IDLE_EVICTED",
+        "RANGE_CURRENT",
+        "RANGE_SET",
+        "RANGE_INVALID",
     ],
 )
 def test_i18n_keys_present(lang: str, key: str) -> None:
@@ -158,3 +248,17 @@ def test_check_result_formats_count() -> None:
 def test_module_importable() -> None:
     # Guard against import-time crashes.
     importlib.reload(config_module)
+
+
+def test_invalid_distance_mode_falls_back(monkeypatch: pytest.MonkeyPatch) -> None:
+    _clear_env(monkeypatch)
+    monkeypatch.setenv("TG_TOKEN", "tok")
+    monkeypatch.setenv("TCHAKA_DISTANCE_MODE", "manhattan")
+    assert load_settings().distance_mode == "chord"
+
+
+def test_invalid_backend_falls_back(monkeypatch: pytest.MonkeyPatch) -> None:
+    _clear_env(monkeypatch)
+    monkeypatch.setenv("TG_TOKEN", "tok")
+    monkeypatch.setenv("TCHAKA_BACKEND", "memcached")
+    assert load_settings().backend == "memory"
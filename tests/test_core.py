@@ -3,28 +3,42 @@
 Covers worked examples and mock-bot async behavior:
 - haversine known distances
 - count_nearby / neighbors worked example
+- nearest-distance buckets stay coarse (no exact distance leaks)
 - relay_message: same-radius-only, never the sender (P-MSG-1, P-MSG-2)
 - notify_group_join: only neighbors get notified (Issue #6 regression)
-- evict_idle_users with FakeClock (P-ST-4, P-TRK-3)
+- batched registration: join notices follow the joining order, and each
+  chat gets one aggregated notice
+- fan-outs commit the returned ids in chunks, one state call each
+- evict_idle_users with FakeClock (P-ST-4, P-TRK-3), in batches that let
+  other callbacks run
 - cleanup_messages deletes only tracked ids (no fabrication, P-TRK-1)
 - format_relay_body never leaks chat_id / full name (P-ID-1)
 """
 
 from __future__ import annotations
 
+import asyncio
 from unittest.mock import AsyncMock
 
 import pytest
 from pytest_mock import MockerFixture
 
 from tchaka.core import (
+    JOIN_NAMES_SHOWN,
+    TRACK_CHUNK,
     cleanup_messages,
     count_nearby,
+    distance_bucket,
     evict_idle_users,
     format_relay_body,
     haversine_distance,
+    join_notices,
+    join_text,
+    nearest_buckets,
     notify_group_join,
+    notify_group_joins,
     register_user,
+    register_users,
     relay_message,
 )
 from tchaka.state import AppState, Coord, UserRecord
@@ -62,6 +76,33 @@ def test_count_nearby_excludes_self_and_respects_radius():
     assert count_nearby(state, "c", threshold_km=5.0) == 0  # alone
 
 
+@pytest.mark.parametrize(
+    "km, label",
+    [
+        (0.0, "0–500 m"),
+        (0.499, "0–500 m"),
+        (0.5, "500 m–1 km"),
+        (1.5, "1–2 km"),
+        (4.99, "2–5 km"),
+        (75.0, "50–100 km"),
+        (250.0, "100+ km"),
+    ],
+)
+def test_distance_bucket(km: float, label: str) -> None:
+    assert distance_bucket(km) == label
+
+
+def test_nearest_buckets_nearest_first():
+    state = AppState()
+    state.register(UserRecord("me", 1, Coord(52.5200, 13.4050), 0.0))
+    state.register(UserRecord("mid", 2, Coord(52.5400, 13.4050), 0.0))  # ~2.2 km
+    state.register(UserRecord("near", 3, Coord(52.5201, 13.4051), 0.0))  # ~13 m
+    state.register(UserRecord("far", 4, Coord(52.5600, 13.4050), 0.0))  # ~4.4 km
+    assert nearest_buckets(state, "me", 5.0) == ["0–500 m", "2–5 km", "2–5 km"]
+    assert nearest_buckets(state, "me", 5.0, k=1) == ["0–500 m"]
+    assert nearest_buckets(state, "me", 1.0) == ["0–500 m"]  # only within range
+
+
 def test_register_user_no_float_keys():
     state = AppState()
     rec = register_user(
@@ -107,8 +148,8 @@ async def test_relay_only_to_snapshot_recipients():
     sent_chat_ids = {c.kwargs["chat_id"] for c in ctx_bot.send_message.await_args_list}
     assert sent_chat_ids == {111, 222}
     # real returned ids tracked, none fabricated
-    assert state.tracked_msgs[111] == {99}
-    assert state.tracked_msgs[222] == {99}
+    assert list(state.tracked_msgs[111]) == [99]
+    assert list(state.tracked_msgs[222]) == [99]
 
 
 @pytest.mark.asyncio
@@ -150,6 +191,74 @@ async def test_notify_group_join_only_neighbors():
     assert sent_chat_ids == {2}  # not 1 (self), not 3 (far)
 
 
+def test_batch_join_notices_follow_the_joining_order():
+    state = AppState()
+    _seed(state, "old", 9, 52.5200, 13.4050)
+    _seed(state, "far", 8, 48.8566, 2.3522)
+    arrivals = [(1, Coord(52.5201, 13.4051), "en"), (2, Coord(52.5202, 13.4052), "fr")]
+    newcomers = register_users(
+        state, [*arrivals, (9, Coord(0.0, 0.0), "en")], clock=FakeClock(5.0)
+    )
+    assert [rec.chat_id for rec in newcomers] == [1, 2]  # chat 9 already there
+    assert state.users["old"].coord == Coord(52.5200, 13.4050)
+    assert newcomers[1].lang == "fr" and newcomers[1].last_active_ts == 5.0
+    a, b = (rec.user_id for rec in newcomers)
+    # as if one by one: the old user hears of both, the first of the second
+    assert join_notices(state, newcomers, 5.0) == {9: [a, b], 1: [b]}
+
+
+def test_capped_batch_join_notices_match_one_by_one():
+    state = AppState()
+    for i, lat in enumerate((52.5210, 52.5220, 52.5230), start=1):
+        _seed(state, f"e{i}", 10 + i, lat, 13.4050)
+    arrivals = [(1, Coord(52.5200, 13.4050), "en"), (2, Coord(52.5201, 13.4050), "en")]
+    a, b = (rec.user_id for rec in register_users(state, arrivals, clock=FakeClock()))
+    # a's two nearest existing users, not the later b (11 m away) and one more
+    notices = join_notices(state, [state.users[a], state.users[b]], 5.0, limit=2)
+    assert notices == {11: [a, b], 12: [a], 1: [b]}
+
+
+@pytest.mark.asyncio
+async def test_notify_group_joins_sends_one_notice_per_chat():
+    state = AppState()
+    ctx_bot = AsyncMock()
+    ctx_bot.send_message = AsyncMock(return_value=type("M", (), {"message_id": 5})())
+    many = [f"u{i}" for i in range(JOIN_NAMES_SHOWN + 2)]
+    await notify_group_joins(ctx_bot, state, {1: ["ua"], 2: many, 3: many})
+    texts = {
+        c.kwargs["chat_id"]: c.kwargs["text"]
+        for c in ctx_bot.send_message.await_args_list
+    }
+    assert texts[1] == join_text(["ua"]) == "ua joined the area..."
+    assert texts[2] == texts[3] == join_text(many)
+    assert texts[2].startswith(f"{len(many)} people joined the area: u0, u1")
+    assert texts[2].endswith("and 2 more")
+    assert sorted(state.tracked_msgs) == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_fan_out_tracks_in_chunks(mocker: MockerFixture):
+    state = AppState()
+    track_many = mocker.spy(state, "track_many")
+    ids = iter(range(1000, 2000))
+    ctx_bot = AsyncMock()
+
+    async def send_message(chat_id: int, **_: object) -> object:
+        await asyncio.sleep(0)
+        return type("M", (), {"message_id": next(ids)})()
+
+    ctx_bot.send_message = send_message
+    chats = list(range(1, TRACK_CHUNK * 2 + 11))
+    await relay_message(ctx_bot, state, body="hi", recipients_snapshot=chats)
+    assert [len(c.args[0]) for c in track_many.call_args_list] == [
+        TRACK_CHUNK,
+        TRACK_CHUNK,
+        10,
+    ]
+    assert sorted(state.tracked_msgs) == chats
+    assert sum(len(state.tracked_msgs[c]) for c in chats) == len(chats)
+
+
 @pytest.mark.asyncio
 async def test_evict_idle_users_removes_only_idle():
     state = AppState()
@@ -186,6 +295,35 @@ async def test_evict_idle_users_removes_only_idle():
     assert deleted == {100, 101}
 
 
+@pytest.mark.asyncio
+async def test_evict_in_batches_yields_and_skips_reactivated_users():
+    state = AppState()
+    clock = FakeClock(0.0)
+    for i in range(5):
+        register_user(
+            state,
+            user_id=f"u{i}",
+            chat_id=i,
+            coord=Coord(0.0, 0.0),
+            lang="en",
+            clock=clock,
+        )
+    clock.advance(7200)
+
+    async def callback() -> None:
+        # Runs between two batches, while the sweep is in progress.
+        async with state.lock:
+            state.touch("u4", clock.now())
+
+    task = asyncio.create_task(callback())
+    evicted = await evict_idle_users(
+        AsyncMock(), state, now=clock.now(), ttl=3600, batch_size=2
+    )
+    await task
+    assert evicted == ["u0", "u1", "u2", "u3"]
+    assert list(state.users) == ["u4"]
+
+
 @pytest.mark.asyncio
 async def test_cleanup_messages_only_tracked_ids():
     ctx_bot = AsyncMock()
@@ -219,5 +357,5 @@ async def test_relay_skips_blocked_recipient(mocker: MockerFixture):
     ctx_bot.send_message = AsyncMock(side_effect=_send)
     await relay_message(ctx_bot, state, body="hi", recipients_snapshot=[111, 222])
     # 222 still tracked despite 111 failing
-    assert state.tracked_msgs.get(222) == {9}
+    assert list(state.tracked_msgs[222]) == [9]
     assert 111 not in state.tracked_msgs
@@ -0,0 +1,178 @@
+"""Tests for the restart handoff (tchaka.handoff).
+
+Property coverage:
+- P-HND-1 dump then load gives a state with the same users, neighbor
+  answers and tracked ids (in least recently tracked order)
+- P-HND-2 the old process hands its state over only while paused, and ends
+  only once the new process has acknowledged it; otherwise it resumes
+- P-HND-3 a load slower than the handoff timeout still completes: only the
+  transfer is timed, not the rebuild
+"""
+
+from __future__ import annotations
+
+import asyncio
+import socket
+import time
+from pathlib import Path
+
+import pytest
+
+from tchaka import handoff
+from tchaka.handoff import HandoffServer, dump_state, load_state, receive_state
+from tchaka.state import AppState, Coord, UserRecord
+from tchaka.tracked import TrackedMessages
+
+
+def _populated() -> AppState:
+    state = AppState(cell_km=5.0)
+    state.register(UserRecord("ua", 1, Coord(48.85, 2.35), 10.0, "fr"))
+    state.register(UserRecord("ub", 2, Coord(48.86, 2.36), 20.0, "en", 3.0, 15.0))
+    state.register(UserRecord("uccc", 3, Coord(-33.9, 151.2), 30.0))
+    for mid in (5, 6, 7, 9):
+        state.track_message(1, mid)
+    state.track_message(4, 100)  # a chat without a user (a /start reply)
+    state.track_message(2, 50)
+    return state
+
+
+class Process:
+    """The hooks of a serving process, recording what happened."""
+
+    def __init__(self) -> None:
+        self.events: list[str] = []
+
+    async def pause(self) -> None:
+        self.events.append("pause")
+
+    async def resume(self) -> None:
+        self.events.append("resume")
+
+    def done(self) -> None:
+        self.events.append("done")
+
+
+@pytest.fixture
+def path(tmp_path: Path) -> str:
+    return str(tmp_path / "handoff.sock")
+
+
+async def _serve(path: str, state: AppState) -> tuple[HandoffServer, Process]:
+    old = Process()
+    server = HandoffServer(
+        path, state, pause=old.pause, resume=old.resume, done=old.done, timeout=5.0
+    )
+    await server.start()
+    return server, old
+
+
+async def _settle() -> None:
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_dump_and_load_round_trip() -> None:
+    old = _populated()
+    new = AppState(cell_km=5.0)
+    assert load_state(new, dump_state(old)) == 3
+    assert new.users == old.users  # P-HND-1
+    assert new.chat_to_user == old.chat_to_user
+    assert new.recipients("ua", 5.0) == old.recipients("ua", 5.0) == [2]
+    assert new.next_idle_at(60) == old.next_idle_at(60)
+    assert [(c, list(ids)) for c, ids in new.tracked_msgs.items()] == [
+        (1, [5, 6, 7, 9]),
+        (4, [100]),
+        (2, [50]),
+    ]
+
+
+def test_load_applies_the_new_caps_and_rejects_bad_input() -> None:
+    capped = AppState(tracked_msgs=TrackedMessages(per_chat=2))
+    buf = dump_state(_populated())
+    load_state(capped, buf)
+    assert capped.pop_tracked(1) == [7, 9]
+    with pytest.raises(ValueError, match="empty"):
+        load_state(capped, buf)
+    with pytest.raises(ValueError, match="version"):
+        load_state(AppState(), b"XXXX" + buf[4:])
+    with pytest.raises(ValueError, match="trailing"):
+        load_state(AppState(), buf + b"\x00")
+
+
+async def test_handoff_over_the_socket(path: str) -> None:
+    server, old = await _serve(path, _populated())
+    new = AppState(cell_km=5.0)
+    assert await receive_state(path, new) == 3
+    await _settle()  # the old side reads the acknowledgement
+    assert old.events == ["pause", "done"]  # P-HND-2
+    assert server.handed_off
+    assert new.users == server.state.users
+    # the new process listens in turn on the same path
+    successor = HandoffServer(
+        path, new, pause=old.pause, resume=old.resume, done=old.done
+    )
+    await successor.start()
+    assert await receive_state(path, AppState()) == 3
+    await successor.close()
+    await server.close()
+
+
+async def test_failed_load_resumes_the_old_process(path: str) -> None:
+    server, old = await _serve(path, _populated())
+    busy = AppState()
+    busy.register(UserRecord("uz", 9, Coord(0.0, 0.0), 0.0))
+    with pytest.raises(ValueError):
+        await receive_state(path, busy)
+    await _settle()
+    assert old.events == ["pause", "resume"]  # P-HND-2: not done
+    assert not server.handed_off
+    await server.close()
+
+
+async def test_load_slower_than_the_timeout(
+    path: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    old = Process()
+    server = HandoffServer(
+        path,
+        _populated(),
+        pause=old.pause,
+        resume=old.resume,
+        done=old.done,
+        timeout=0.05,
+    )
+    await server.start()
+
+    def slow_load(state: AppState, buf: bytes) -> int:
+        time.sleep(0.3)  # the rebuild of a large state
+        return load_state(state, buf)
+
+    monkeypatch.setattr(handoff, "load_state", slow_load)
+    new = AppState(cell_km=5.0)
+    # The new process has its own event loop, as a separate process would.
+    loaded = await asyncio.to_thread(asyncio.run, receive_state(path, new))
+    assert loaded == 3
+    await _settle()
+    assert old.events == ["pause", "done"]  # P-HND-3: not resumed
+    assert new.users == server.state.users
+    await server.close()
+
+
+async def test_no_previous_process(path: str) -> None:
+    assert await receive_state(path, AppState()) is None
+    stale = socket.socket(socket.AF_UNIX)  # bound but never listening
+    stale.bind(path)
+    try:
+        assert await receive_state(path, AppState()) is None
+    finally:
+        stale.close()
+
+
+async def test_unknown_request_is_refused(path: str) -> None:
+    server, old = await _serve(path, _populated())
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(b"HELLO!")
+    assert await reader.read() == b""
+    writer.close()
+    assert old.events == []
+    await server.close()
@@ -0,0 +1,98 @@
+"""Tests for the anonymized user id allocator (tchaka.ids).
+
+Property coverage:
+- P-IDS-1 an allocated id is never a live one, even in a crowded space
+- P-IDS-2 ids grow a digit before the live users fill ``MAX_LOAD`` of the space
+- P-IDS-3 a worker's ids stay in its residue class, so workers never share one
+- P-IDS-4 ``AppState.register`` refuses an id owned by another chat
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from tchaka.ids import DEFAULT_ID_LENGTH, MAX_LOAD, UserIdAllocator
+from tchaka.state import AppState, Coord, UserRecord
+
+
+def test_ids_are_unique_among_live_users() -> None:
+    ids = UserIdAllocator(length=1, pool_size=0)
+    live: set[str] = set()
+    for _ in range(200):
+        user_id = ids.allocate(live)
+        assert user_id not in live  # P-IDS-1
+        live.add(user_id)
+    assert len(live) == 200
+
+
+def test_length_grows_with_the_live_users() -> None:
+    ids = UserIdAllocator(length=1, pool_size=0)
+    live: set[str] = set()
+    for _ in range(100):
+        live.add(ids.allocate(live))
+        assert len(live) <= 16**ids.length * MAX_LOAD  # P-IDS-2
+    assert ids.length == 4  # 100 ids: 16**3 / 64 = 64 is too few
+    assert {len(user_id) - 1 for user_id in live} == {2, 3, 4}  # old ids kept
+    assert UserIdAllocator().allocate(()).startswith("u")
+    assert len(UserIdAllocator().allocate(())) == 1 + DEFAULT_ID_LENGTH
+
+
+def test_pool_is_drawn_ahead_and_skips_live_ids() -> None:
+    ids = UserIdAllocator(pool_size=4)
+    assert ids.refill() == 4
+    assert ids.refill() == 0
+    first, second = ids.pool[0], ids.pool[1]
+    assert ids.allocate({first}) == second
+    assert ids.retries == 1
+    assert len(ids.pool) == 2
+    ids.allocate(set())  # same length: the pool is kept
+    assert len(ids.pool) == 1
+
+
+def test_growth_discards_the_pool() -> None:
+    ids = UserIdAllocator(length=1, pool_size=1)
+    ids.refill()  # one user fits 16**2 / 64 = 4 ids
+    assert ids.length == 2
+    user_id = ids.allocate({"a", "b", "c", "d"})  # a fifth does not
+    assert len(user_id) == 1 + 3
+    assert not ids.pool
+
+
+@pytest.mark.parametrize("stride", [1, 3, 8])
+def test_ids_stay_in_the_worker_residue_class(stride: int) -> None:
+    for offset in range(stride):
+        ids = UserIdAllocator(length=2, pool_size=16, stride=stride, offset=offset)
+        ids.refill()
+        drawn = [ids.allocate(()) for _ in range(50)]
+        assert all(int(u[1:], 16) % stride == offset for u in drawn)  # P-IDS-3
+
+
+def test_invalid_allocator_arguments() -> None:
+    with pytest.raises(ValueError):
+        UserIdAllocator(length=0)
+    with pytest.raises(ValueError):
+        UserIdAllocator(stride=2, offset=2)
+
+
+def test_state_allocates_and_refuses_taken_ids() -> None:
+    state = AppState()
+    user_id = state.allocate_user_id()
+    state.register(UserRecord(user_id, 1, Coord(0.0, 0.0), 0.0))
+    assert state.allocate_user_id() != user_id
+    with pytest.raises(ValueError):
+        state.register(UserRecord(user_id, 2, Coord(1.0, 1.0), 0.0))  # P-IDS-4
+    assert state.chat_to_user == {1: user_id}
+    # the same chat may re-register its id (a refreshed shard ghost does)
+    state.register(UserRecord(user_id, 1, Coord(1.0, 1.0), 0.0))
+    assert state.users[user_id].coord == Coord(1.0, 1.0)
+
+
+def test_refill_is_sized_for_the_pool() -> None:
+    ids = UserIdAllocator(length=1, pool_size=100)
+    ids.refill(n_live=3)
+    assert ids.length == 4  # 103 users need 16**4 / 64 = 1024 ids
+    live: set[str] = set()
+    for _ in range(100):
+        live.add(ids.allocate(live))
+    assert ids.length == 4
+    assert not ids.pool  # every pooled id was used, none discarded
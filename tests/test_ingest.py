@@ -0,0 +1,80 @@
+"""Tests for the window batcher (tchaka.ingest).
+
+The batched registration itself runs in test_commands.py and test_core.py;
+these cover the window: grouping, early flushes, errors and shutdown.
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from tchaka.ingest import Batcher
+
+
+class Recorder:
+    """A flush that doubles each item and records the batches."""
+
+    def __init__(self) -> None:
+        self.batches: list[list[int]] = []
+
+    async def __call__(self, items: list[int]) -> list[int]:
+        self.batches.append(items)
+        await asyncio.sleep(0)
+        return [2 * item for item in items]
+
+
+async def test_one_window_is_one_flush() -> None:
+    flush = Recorder()
+    batcher = Batcher(0.01, flush)
+    assert await asyncio.gather(*(batcher.submit(i) for i in range(5))) == [
+        0,
+        2,
+        4,
+        6,
+        8,
+    ]
+    assert await batcher.submit(7) == 14  # a new window
+    assert flush.batches == [[0, 1, 2, 3, 4], [7]]
+    assert (batcher.batches, batcher.items) == (2, 6)
+
+
+async def test_a_full_batch_flushes_before_the_window_ends() -> None:
+    flush = Recorder()
+    batcher = Batcher(3600.0, flush, max_batch=2)
+    assert await asyncio.gather(batcher.submit(1), batcher.submit(2)) == [2, 4]
+    pending = asyncio.ensure_future(batcher.submit(3))
+    await asyncio.sleep(0)
+    assert not pending.done()  # waits for its (long) window
+    await batcher.close()
+    assert await pending == 6
+    assert flush.batches == [[1, 2], [3]]
+
+
+async def test_errors_reach_every_submitter() -> None:
+    async def failing(items: list[int]) -> list[int]:
+        raise RuntimeError("boom")
+
+    batcher = Batcher(0.0, failing)
+    results = await asyncio.gather(
+        batcher.submit(1), batcher.submit(2), return_exceptions=True
+    )
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+
+
+async def test_cancelled_submitters_are_skipped() -> None:
+    flush = Recorder()
+    batcher = Batcher(0.01, flush)
+    gone = asyncio.ensure_future(batcher.submit(1))
+    await asyncio.sleep(0)
+    gone.cancel()
+    assert await batcher.submit(2) == 4
+    assert flush.batches == [[1, 2]]  # still applied, only not answered
+
+
+def test_invalid_window() -> None:
+    with pytest.raises(ValueError):
+        Batcher(-1.0, Recorder())
+    with pytest.raises(ValueError):
+        Batcher(0.0, Recorder(), max_batch=0)
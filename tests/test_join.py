@@ -0,0 +1,90 @@
+"""Tests for the bulk radius self-join (tchaka.join).
+
+Property coverage:
+- P-JOIN-1 the degree histogram equals a brute-force all-pairs count, with
+  mutual per-point radii
+- P-JOIN-2 the process pool and the in-process run agree
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+
+import pytest
+from hypothesis import assume, given, settings
+from hypothesis import strategies as st
+
+from tchaka.core import neighbor_stats
+from tchaka.geo import haversine_distance
+from tchaka.join import JoinStats, self_join_stats
+from tchaka.state import AppState, Coord, UserRecord
+
+lats = st.floats(min_value=-90, max_value=90, allow_nan=False, allow_infinity=False)
+lons = st.floats(min_value=-180, max_value=180, allow_nan=False, allow_infinity=False)
+radii = st.none() | st.floats(min_value=0.0, max_value=3000.0, allow_nan=False)
+
+
+def _brute_force(
+    coords: list[tuple[float, float]], ranges: list[float]
+) -> dict[int, int]:
+    degrees: Counter[int] = Counter()
+    for i, a in enumerate(coords):
+        degrees[
+            sum(
+                1
+                for j, b in enumerate(coords)
+                if j != i and haversine_distance(*a, *b) <= min(ranges[i], ranges[j])
+            )
+        ] += 1
+    return dict(degrees)
+
+
+@settings(max_examples=150)
+@given(
+    st.lists(st.tuples(lats, lons, radii), min_size=0, max_size=30),
+    st.floats(min_value=0.0, max_value=2500.0, allow_nan=False),
+)
+def test_histogram_matches_brute_force(points, radius):
+    coords = [(lat, lon) for lat, lon, _ in points]
+    ranges = [radius if r is None else min(r, radius) for _, _, r in points]
+    # Pairs within float noise of their radius may legitimately differ.
+    for i, a in enumerate(coords):
+        for j, b in enumerate(coords):
+            limit = min(ranges[i], ranges[j])
+            assume(i == j or abs(haversine_distance(*a, *b) - limit) > 1e-6)
+    stats = self_join_stats(coords, radius, ranges=[r for _, _, r in points], workers=1)
+    assert stats.degree_histogram == _brute_force(coords, ranges)  # P-JOIN-1
+    assert stats.users == len(coords)
+    assert sum(stats.degree_histogram.values()) == len(coords)
+
+
+def test_pool_matches_in_process() -> None:
+    coords = [(52.5 + i * 0.001, 13.4 + (i % 7) * 0.002) for i in range(300)]
+    coords += [(-33.9 + i * 0.01, 151.2) for i in range(50)]
+    inline = self_join_stats(coords, 2.0, workers=1)
+    pooled = self_join_stats(coords, 2.0, workers=2)
+    assert pooled == inline  # P-JOIN-2
+
+
+def test_derived_stats() -> None:
+    stats = JoinStats(users=4, pairs=3, degree_histogram={1: 2, 2: 2})
+    assert stats.mean_fanout == 1.5
+    assert stats.max_neighborhood == 2
+    empty = self_join_stats([], 5.0, workers=1)
+    assert empty == JoinStats(users=0, pairs=0, degree_histogram={})
+    assert empty.mean_fanout == 0.0
+    assert empty.max_neighborhood == 0
+
+
+@pytest.mark.asyncio
+async def test_neighbor_stats_matches_live_queries() -> None:
+    state = AppState()
+    state.register(UserRecord("a", 1, Coord(52.5200, 13.4050), 0.0))
+    state.register(UserRecord("b", 2, Coord(52.5201, 13.4051), 0.0))
+    state.register(UserRecord("c", 3, Coord(52.5400, 13.4050), 0.0, range_km=1.0))
+    state.register(UserRecord("d", 4, Coord(48.8566, 2.3522), 0.0))
+    stats = await neighbor_stats(state, 5.0, workers=1)
+    live = Counter(state.count_neighbors(uid, 5.0) for uid in state.users)
+    assert stats.degree_histogram == dict(live)
+    assert stats.pairs == 1
+    assert not state.lock.locked()
@@ -7,14 +7,34 @@ they actually run at startup.
 
 from __future__ import annotations
 
+import asyncio
+import dataclasses
 import logging
+from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+from telegram import Message, Update, User
 
 import tchaka.commands as commands
+from benchmarks._redis import LocalRedis
+from tchaka.actor import StateActor
+from tchaka.backend import MemoryBackend, RedisBackend
 from tchaka.config import Settings
-from tchaka.main import HANDLERS, idle_job
+from tchaka.ingest import Batcher
+from tchaka.main import (
+    HANDLERS,
+    ID_REFILL_SECONDS,
+    build_application,
+    build_backend,
+    build_join_batcher,
+    build_state,
+    idle_job,
+    ids_job,
+    next_sweep_delay,
+    take_over,
+)
+from tchaka.shard import GHOST_TS
 from tchaka.state import AppState, Coord, UserRecord
 from tchaka.utils import FakeClock
 
@@ -32,8 +52,8 @@ def _settings() -> Settings:
 
 
 def test_handlers_registered() -> None:
-    # start, stop, check, help, location, echo
-    assert len(HANDLERS) == 6
+    # start, stop, check, help, range, location, live location, echo
+    assert len(HANDLERS) == 8
 
 
 @pytest.mark.asyncio
@@ -53,27 +73,54 @@ async def test_idle_job_evicts_idle_users() -> None:
 
     assert "idle" not in state.users
     assert "active" in state.users
+    # the next sweep is due when "active" (touched at 2h) reaches the TTL
+    ctx.job_queue.run_once.assert_called_once_with(
+        idle_job, when=3600, data=ctx.job.data
+    )
+
+
+def test_sweep_delay_follows_next_due_user() -> None:
+    state = AppState()
+    settings = _settings()
+    assert next_sweep_delay(state, settings, 0.0) == settings.idle_ttl_seconds
+    state.register(UserRecord("a", 1, Coord(0.0, 0.0), last_active_ts=120.0))
+    assert next_sweep_delay(state, settings, 1000.0) == 2720.0
+    # deadlines closer than the sweep interval wait for it
+    assert next_sweep_delay(state, settings, 3650.0) == settings.sweep_interval_seconds
+
+
+def test_sweep_delay_ignores_shard_ghosts() -> None:
+    state = AppState()
+    state.register(UserRecord("ghost", 1, Coord(0.0, 0.0), last_active_ts=GHOST_TS))
+    assert next_sweep_delay(state, _settings(), 0.0) == 3600
 
 
 @pytest.mark.asyncio
+@pytest.mark.parametrize("state_actor", [False, True])
 async def test_post_init_logs_and_schedules(
-    caplog: pytest.LogCaptureFixture, mocker
+    caplog: pytest.LogCaptureFixture,
+    mocker,
+    monkeypatch: pytest.MonkeyPatch,
+    state_actor: bool,
 ) -> None:
     # Capture the REAL post_init closure that build_application registers, then
     # invoke it against a fake application to assert scheduling + logging.
     from tchaka import main as main_module
 
+    monkeypatch.setattr(commands, "ACTOR", None)
     state = AppState()
-    settings = _settings()
+    settings = dataclasses.replace(_settings(), state_actor=state_actor)
 
     captured: dict = {}
 
     class FakeJobQueue:
-        def run_repeating(self, cb, interval, first):  # noqa: ANN001
-            captured["interval"] = interval
-            captured["first"] = first
+        def run_once(self, cb, when):  # noqa: ANN001
+            captured["when"] = when
             captured["cb"] = cb
 
+        def run_repeating(self, cb, interval, first):
+            captured["repeating"] = (cb, interval, first)
+
     class FakeApp:
         job_queue = FakeJobQueue()
 
@@ -91,6 +138,10 @@ async def test_post_init_logs_and_schedules(
             captured["post_init"] = hook
             return self
 
+        def post_shutdown(self, hook):
+            captured["post_shutdown"] = hook
+            return self
+
         def build(self):
             return FakeApp()
 
@@ -105,6 +156,158 @@ async def test_post_init_logs_and_schedules(
     with caplog.at_level(logging.INFO, logger="tchaka.main"):
         await captured["post_init"](FakeApp())
 
-    assert captured["interval"] == settings.sweep_interval_seconds
-    assert captured["first"] == settings.sweep_interval_seconds
+    # nobody is registered yet, so nobody can be due before a full TTL
+    assert captured["when"] == settings.idle_ttl_seconds
+    assert captured["cb"] is idle_job
+    assert captured["repeating"] == (ids_job, ID_REFILL_SECONDS, 0)
     assert any("started successfully" in r.message for r in caplog.records)
+    actor = commands.ACTOR
+    assert (actor is not None) is state_actor
+    if actor is not None:
+        assert (await actor.call(lambda s: s)) is state  # running
+    await captured["post_shutdown"](FakeApp())
+
+
+@pytest.mark.asyncio
+async def test_take_over_pauses_and_stops_the_old_process(tmp_path: Path) -> None:
+    path = str(tmp_path / "handoff.sock")
+    old_state = AppState()
+    old_state.register(UserRecord("u1", 1, Coord(0.0, 0.0), last_active_ts=0.0))
+    old_app = MagicMock()
+    old_app.updater.stop = AsyncMock()
+    old_app.update_queue.join = AsyncMock()
+    first = await take_over(old_app, path, old_state, None)  # nobody to take over
+
+    new_state = AppState()
+    second = await take_over(MagicMock(), path, new_state, None)
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+    assert new_state.users == old_state.users
+    old_app.updater.stop.assert_awaited_once()
+    old_app.update_queue.join.assert_awaited_once()
+    old_app.job_queue.scheduler.pause.assert_called_once()
+    old_app.stop_running.assert_called_once()
+    await first.close()
+    await second.close()
+
+
+@pytest.mark.asyncio
+async def test_take_over_waits_for_a_location_in_flight(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(commands, "ACTOR", None)
+    monkeypatch.setattr(commands, "JOINS", None)
+    path = str(tmp_path / "handoff.sock")
+    old_state = AppState()
+    actor = StateActor(old_state)
+    commands.configure(
+        state=old_state,
+        settings=_settings(),
+        clock=FakeClock(0.0),
+        actor=actor,
+        joins=Batcher(0.01, commands.register_arrivals),
+    )
+    actor.start()
+    old_app = MagicMock()
+    old_app.updater.stop = AsyncMock()
+    old_app.update_queue.join = AsyncMock()
+    first = await take_over(old_app, path, old_state, actor)
+
+    async def slow_reply(**_kwargs: object) -> object:
+        await asyncio.sleep(0.02)  # the welcome is tracked after the window
+        return type("M", (), {"message_id": 2})()
+
+    message = MagicMock(spec=Message, chat_id=1, message_id=1)
+    message.location = type("L", (), {"latitude": 0.0, "longitude": 0.0})()
+    message.reply_markdown = slow_reply
+    user = MagicMock(spec=User, language_code="en", full_name="x", is_bot=False)
+    update = MagicMock(spec=Update, effective_user=user, message=message)
+    locating = asyncio.create_task(commands.location_callback(update, MagicMock()))
+    await asyncio.sleep(0)  # in its join window when the handoff starts
+
+    new_state = AppState()
+    second = await take_over(MagicMock(), path, new_state, None)
+
+    assert locating.done()
+    assert 1 in new_state.chat_to_user  # the newcomer came over
+    assert new_state.pop_tracked(1) == [1, 2]  # with its welcome
+    with pytest.raises(RuntimeError):
+        actor.call(lambda s: s)  # paused: nothing is queued in the old process
+    await first.close()
+    await second.close()
+
+
+def test_batched_locations_do_not_block_the_next_updates(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(commands, "ACTOR", None)
+    monkeypatch.setattr(commands, "JOINS", None)
+    assert build_join_batcher(_settings()) is None
+    settings = dataclasses.replace(
+        _settings(), tg_token="1:fake", join_batch_seconds=0.5
+    )
+    app = build_application(settings, AppState(), FakeClock(0.0))
+    assert commands.JOINS is not None
+    assert commands.JOINS.window_s == 0.5
+    blocking = {handler.callback.__name__: handler.block for handler in app.handlers[0]}
+    assert blocking["location_callback"] is False
+    assert blocking["live_location_callback"] is not False  # the default
+
+
+def test_adjacency_is_opt_in(caplog: pytest.LogCaptureFixture) -> None:
+    assert build_state(_settings()).adjacency_km is None
+    opted = dataclasses.replace(_settings(), adjacency=True)
+    assert build_state(opted).adjacency_km == 5.0
+    with caplog.at_level(logging.WARNING):
+        state = build_state(dataclasses.replace(opted, adaptive_k=3))
+    assert state.adjacency_km is None
+    assert "TCHAKA_ADJACENCY is ignored" in caplog.text
+
+
+def test_backend_selector(
+    caplog: pytest.LogCaptureFixture, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    state = AppState()
+    memory = build_backend(_settings(), state)
+    assert isinstance(memory, MemoryBackend) and memory.state is state
+    redis = dataclasses.replace(_settings(), backend="redis")
+    with caplog.at_level(logging.WARNING):
+        assert isinstance(build_backend(redis, state), MemoryBackend)
+    assert "needs TCHAKA_REDIS_URL" in caplog.text
+    urls: list[str] = []
+
+    def from_url(url: str) -> RedisBackend:
+        urls.append(url)
+        return RedisBackend(LocalRedis())
+
+    monkeypatch.setattr(RedisBackend, "from_url", from_url)
+    url = "redis://cache:6379/0"
+    shared = build_backend(dataclasses.replace(redis, redis_url=url), state)
+    assert isinstance(shared, RedisBackend) and urls == [url]
+
+
+@pytest.mark.asyncio
+async def test_idle_job_withdraws_from_a_shared_backend(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    state = AppState()
+    clock = FakeClock(0.0)
+    shared = RedisBackend(LocalRedis())
+    commands.configure(state=state, settings=_settings(), clock=clock)
+    monkeypatch.setattr(commands, "BACKEND", shared)
+    for rec in (
+        UserRecord("idle", 1, Coord(0.0, 0.0), last_active_ts=0.0),
+        UserRecord("active", 2, Coord(0.0, 0.0), last_active_ts=0.0),
+    ):
+        state.register(rec)
+        await shared.register(rec)
+    clock.advance(7200)
+    state.touch("active", clock.now())
+
+    ctx = MagicMock()
+    ctx.bot = AsyncMock()
+    await idle_job(ctx)
+
+    assert await shared.user_for_chat(1) is None
+    assert await shared.user_for_chat(2) is not None
@@ -6,22 +6,40 @@ Property coverage:
 - P-GEO-3 symmetry
 - P-GEO-4 bounded by pi * R
 - P-GEO-5 triangle inequality
+- P-GEO-6 the squared-chord test on cached unit vectors agrees with haversine
+- P-GEO-7 the equirectangular distance is within its documented error bound
+- P-GEO-8 the equirectangular test never misclassifies a pair outside its band
 - P-NBR-1 every neighbor within threshold
 - P-NBR-2 excludes self
 - P-NBR-3 pair-membership symmetry (the property the old union-find violated)
 - P-NBR-4 completeness (no false negatives)
 - P-NBR-5 order independence / determinism
 - P-NBR-6 monotonic in threshold
+- P-NBR-7 the k nearest are the k smallest neighbor distances, in order;
+  a capped recipient list is their chat ids, uncapped it is every neighbor
+- P-NBR-8 equirectangular mode returns the same neighbors as the chord test
 """
 
 from __future__ import annotations
 
+from itertools import pairwise
 from math import pi
 
-from hypothesis import given, settings
+from hypothesis import assume, given, settings
 from hypothesis import strategies as st
 
-from tchaka.geo import EARTH_RADIUS_KM, haversine_distance
+from tchaka.geo import (
+    EARTH_RADIUS_KM,
+    EQUIRECT_MAX_LAT,
+    chord_sq_bounds,
+    equirect_distance,
+    equirect_error_bound,
+    equirect_point,
+    equirect_sq,
+    equirect_sq_bounds,
+    haversine_distance,
+    unit_vector,
+)
 from tchaka.state import AppState, Coord, UserRecord
 
 lats = st.floats(min_value=-90, max_value=90, allow_nan=False, allow_infinity=False)
@@ -56,6 +74,65 @@ def test_haversine_triangle_inequality(a_lat, a_lon, b_lat, b_lon, c_lat, c_lon)
     assert d_ac <= d_ab + d_bc + 1e-6 * (1 + d_ab + d_bc)
 
 
+@given(lats, lons, lats, lons, st.floats(min_value=0.0, max_value=20100))
+def test_chord_test_agrees_with_haversine(a_lat, a_lon, b_lat, b_lon, radius):
+    ax, ay, az = unit_vector(a_lat, a_lon)
+    bx, by, bz = unit_vector(b_lat, b_lon)
+    chord_sq = (ax - bx) ** 2 + (ay - by) ** 2 + (az - bz) ** 2
+    sure, maybe = chord_sq_bounds(radius)
+    d = haversine_distance(a_lat, a_lon, b_lat, b_lon)
+    # P-GEO-6: outside the thin noise band the trig-free test is decisive.
+    if chord_sq < sure:
+        assert d <= radius
+    if chord_sq > maybe:
+        assert d > radius
+
+
+# Pairs inside the equirectangular domain: both within the latitude band, up to
+# ~1100 km apart, never across the antimeridian.
+band_lats = st.floats(min_value=-EQUIRECT_MAX_LAT, max_value=EQUIRECT_MAX_LAT)
+offsets = (
+    st.floats(min_value=-10.0, max_value=10.0)
+    | st.floats(-0.5, 0.5)
+    | st.floats(-0.03, 0.03)  # within the 5 km limit often enough
+)
+limits = st.sampled_from([5.0, 50.0, 100.0])
+
+
+@settings(max_examples=300)
+@given(band_lats, st.floats(min_value=-170, max_value=170), offsets, offsets, limits)
+def test_equirect_error_bound(lat, lon, dlat, dlon, limit):
+    b_lat = min(max(lat + dlat, -EQUIRECT_MAX_LAT), EQUIRECT_MAX_LAT)
+    d = haversine_distance(lat, lon, b_lat, lon + dlon)
+    assume(1e-3 < d <= limit)
+    approx = equirect_distance(
+        equirect_point(lat, lon), equirect_point(b_lat, lon + dlon)
+    )
+    assert abs(approx - d) <= equirect_error_bound(limit) * d + 1e-9  # P-GEO-7
+
+
+@settings(max_examples=300)
+@given(
+    band_lats,
+    st.floats(min_value=-170, max_value=170),
+    offsets,
+    offsets,
+    limits,
+    st.floats(min_value=0.0, max_value=1.0),
+)
+def test_equirect_test_agrees_with_haversine(lat, lon, dlat, dlon, limit, frac):
+    b_lat = min(max(lat + dlat, -EQUIRECT_MAX_LAT), EQUIRECT_MAX_LAT)
+    radius = limit * frac
+    q = equirect_sq(equirect_point(lat, lon), equirect_point(b_lat, lon + dlon))
+    sure, maybe = equirect_sq_bounds(radius, limit)
+    d = haversine_distance(lat, lon, b_lat, lon + dlon)
+    # P-GEO-8: outside the error band the approximation is decisive.
+    if q < sure:
+        assert d <= radius
+    if q > maybe:
+        assert d > radius
+
+
 # --------------------------------------------------------------------------- #
 # Neighborhood properties
 # --------------------------------------------------------------------------- #
@@ -155,3 +232,47 @@ def test_neighbors_monotonic_in_threshold(coords, t1, t2):
         small = {n.user_id for n in state.neighbors(uid, lo)}
         big = {n.user_id for n in state.neighbors(uid, hi)}
         assert small <= big  # P-NBR-6
+
+
+@settings(max_examples=100)
+@given(coord_lists, thresholds, st.integers(min_value=0, max_value=5))
+def test_nearest_is_partial_sort_of_neighbors(coords, threshold, k):
+    state = _build_state(coords)
+    for uid, rec in state.users.items():
+        distances = sorted(
+            haversine_distance(*rec.coord, *n.coord)
+            for n in state.neighbors(uid, threshold)
+        )
+        # ties (or near-ties) may be ranked either way
+        assume(all(b - a > 1e-9 for a, b in pairwise(distances)))
+        nearest = state.nearest(uid, k, threshold)
+        assert [km for km, _ in nearest] == distances[:k]  # P-NBR-7
+        capped = state.recipients(uid, threshold, limit=k)
+        assert capped == [n.chat_id for _, n in nearest]
+        assert sorted(state.recipients(uid, threshold)) == sorted(
+            n.chat_id for n in state.neighbors(uid, threshold)
+        )
+
+
+@settings(max_examples=100)
+@given(
+    st.lists(
+        # A city, the antimeridian and the edge of the latitude band.
+        st.sampled_from([(48.8, 2.3), (-17.0, 179.7), (79.8, 20.0)]).flatmap(
+            lambda c: st.tuples(
+                st.floats(c[0] - 0.3, c[0] + 0.3), st.floats(c[1] - 0.3, c[1] + 0.3)
+            )
+        ),
+        min_size=1,
+        max_size=25,
+    ),
+    st.floats(min_value=0.0, max_value=60.0),
+)
+def test_equirect_mode_matches_chord(coords, threshold):
+    chord = _build_state(coords)
+    equirect = AppState(equirect_km=50.0)
+    for rec in chord.users.values():
+        equirect.register(UserRecord(rec.user_id, rec.chat_id, rec.coord, 0.0))
+    for uid in chord.users:
+        got = {n.user_id for n in equirect.neighbors(uid, threshold)}
+        assert got == {n.user_id for n in chord.neighbors(uid, threshold)}  # P-NBR-8
@@ -1,13 +1,21 @@
-"""Tests for the deferred per-user range override scaffolding (Requirement 8).
+"""Tests for the per-user range override (Requirement 8, the `/range` command).
 
-The `/range` command is intentionally NOT shipped yet; this only verifies the
-data model reserves the field and that `neighbors`/`count_nearby` honor
-`min(override, configured)` when an override is present.
+Verifies that `neighbors`/`count_nearby` honor `min(override, configured)` and
+that overrides are mutual: a pair is in range only within both users' ranges,
+from either side and with or without the materialized adjacency (the command
+itself is covered in test_commands.py).
+
+Property coverage:
+- P-RNG-1 neighbors equal the brute-force mutual ``min(rA, rB)`` relation
 """
 
 from __future__ import annotations
 
+from hypothesis import given, settings
+from hypothesis import strategies as st
+
 from tchaka.core import count_nearby
+from tchaka.geo import haversine_distance
 from tchaka.state import AppState, Coord, UserRecord
 
 
@@ -51,3 +59,54 @@ def test_effective_range_helper() -> None:
     assert state.effective_range(rec, 5.0) == 2.0  # override smaller
     rec.range_km = 50.0
     assert state.effective_range(rec, 5.0) == 5.0  # capped by global
+
+
+def test_override_is_mutual() -> None:
+    state = _state_two_users()
+    # "near" narrows to 1 m: "me" no longer sees it, although "me" has no
+    # override of its own
+    state.set_range("near", 0.001)
+    assert count_nearby(state, "me", threshold_km=10.0) == 1
+    assert count_nearby(state, "near", threshold_km=10.0) == 0
+
+
+def test_set_range_updates_adjacency() -> None:
+    state = AppState(adjacency_km=10.0)
+    for rec in _state_two_users().users.values():
+        state.register(rec)
+    assert state.adjacency["me"].keys() == {"near", "midrange"}
+    state.set_range("midrange", 1.0)
+    assert state.adjacency["me"].keys() == {"near"}
+    assert state.adjacency["midrange"] == {}
+    state.set_range("midrange", None)
+    assert state.adjacency["midrange"].keys() == {"me", "near"}
+    state.set_range("ghost", 1.0)  # absent user: no-op
+
+
+lats = st.floats(min_value=52.3, max_value=52.7, allow_nan=False)
+lons = st.floats(min_value=13.2, max_value=13.6, allow_nan=False)
+overrides = st.none() | st.floats(min_value=0.1, max_value=40.0, allow_nan=False)
+
+
+@settings(max_examples=100)
+@given(
+    st.lists(st.tuples(lats, lons, overrides), min_size=1, max_size=25),
+    st.floats(min_value=0.0, max_value=30.0, allow_nan=False),
+)
+def test_neighbors_match_mutual_brute_force(users, threshold):
+    state = AppState(cell_km=max(threshold, 1.0), adjacency_km=threshold)
+    for i, (lat, lon, range_km) in enumerate(users):
+        state.register(UserRecord(f"u{i}", i, Coord(lat, lon), 0.0, range_km=range_km))
+    for uid, rec in state.users.items():
+        expected = {
+            other_id
+            for other_id, other in state.users.items()
+            if other_id != uid
+            and haversine_distance(*rec.coord, *other.coord)
+            <= min(
+                state.effective_range(rec, threshold),
+                state.effective_range(other, threshold),
+            )
+        }
+        assert {r.user_id for r in state.neighbors(uid, threshold)} == expected
+        assert state.adjacency[uid].keys() == expected  # P-RNG-1
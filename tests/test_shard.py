@@ -0,0 +1,220 @@
+"""Tests for geographic sharding (tchaka.shard).
+
+The router and the workers run in one process here, over real socket pairs,
+with a small state-level update handler instead of the Telegram callbacks.
+
+Property coverage:
+- P-SHD-1 every stripe holding a point within ``km`` of a location is among
+  ``shards_near`` of it, across the antimeridian too
+- P-SHD-2 each user is owned by the worker of its stripe, and its neighbors
+  in that worker are exactly its neighbors in one unsharded state, border
+  users included
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import socket
+from typing import Self
+
+import pytest
+from hypothesis import given
+from hypothesis import strategies as st
+
+from tchaka.geo import haversine_distance
+from tchaka.shard import (
+    GHOST_TS,
+    ShardRouter,
+    ShardWorker,
+    Stripes,
+    pack_handover,
+    pack_record,
+    unpack_handover,
+    unpack_record,
+)
+from tchaka.state import AppState, Coord, UserRecord
+
+RANGE_KM = 5.0
+
+
+def test_stripes() -> None:
+    stripes = Stripes.even(4)
+    assert stripes.cuts == (-90.0, 0.0, 90.0)
+    assert [stripes.shard_of(lon) for lon in (-180.0, -90.0, 0.0, 179.9)] == [
+        0,
+        1,
+        2,
+        3,
+    ]
+    assert stripes.shard_of(180.0) == 0  # wraps
+    assert stripes.shards_near(0.0, 45.0, 10.0) == {2}
+    assert stripes.shards_near(0.0, 179.99, 10.0) == {3, 0}
+    assert stripes.shards_near(89.99, 45.0, 10.0) == {0, 1, 2, 3}
+    with pytest.raises(ValueError):
+        Stripes((10.0, -10.0))
+
+
+@given(
+    st.floats(min_value=-85, max_value=85),
+    st.floats(min_value=-180, max_value=179.999),
+    st.floats(min_value=-0.2, max_value=0.2),
+    st.floats(min_value=-0.5, max_value=0.5),
+    st.lists(st.floats(min_value=-179.9, max_value=179.9), max_size=6, unique=True),
+)
+def test_shards_near_covers_the_range(
+    lat: float, lon: float, dlat: float, dlon: float, cuts: list[float]
+) -> None:
+    stripes = Stripes(tuple(sorted(cuts)))
+    other = (lat + dlat, (lon + dlon + 180.0) % 360.0 - 180.0)
+    km = haversine_distance(lat, lon, *other)
+    assert stripes.shard_of(other[1]) in stripes.shards_near(lat, lon, km)  # P-SHD-1
+
+
+def test_record_encoding_round_trips() -> None:
+    rec = UserRecord("u1a2b3", -100123, Coord(48.85, 2.35), 1234.5, "fr", 2.5, 1200.0)
+    assert unpack_record(rec.chat_id, pack_record(rec)) == (rec, len(pack_record(rec)))
+    bare = UserRecord("ü", 7, Coord(-1.0, -2.0), 0.0)
+    assert unpack_record(7, pack_record(bare))[0] == bare
+    assert unpack_handover(7, pack_handover(bare, [3, 4, 9])) == (bare, [3, 4, 9])
+    assert unpack_handover(7, pack_handover(None, [])) == (None, [])
+
+
+class Cluster:
+    """A router and one in-process worker per stripe.
+
+    Update payloads are JSON: ``{"lat", "lon"}`` registers or moves the chat's
+    user, ``{"relay": id}`` tracks message ``id`` for every neighbor of the
+    sender, and ``{"stop": true}`` removes the user (as ``/stop`` does).
+    """
+
+    def __init__(self, stripes: Stripes) -> None:
+        self.stripes = stripes
+        self.router = ShardRouter(stripes, RANGE_KM)
+        self.states = [AppState(cell_km=RANGE_KM) for _ in range(len(stripes))]
+        self.cleaned: list[tuple[int, int, list[int]]] = []
+        self.workers = [self._worker(i) for i in range(len(stripes))]
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def _worker(self, index: int) -> ShardWorker:
+        state = self.states[index]
+
+        async def handle(chat_id: int, payload: bytes) -> None:
+            data = json.loads(payload)
+            rec = state.user_for_chat(chat_id)
+            if "lat" in data:
+                coord = Coord(data["lat"], data["lon"])
+                if rec is None:
+                    state.register(UserRecord(f"u{chat_id}", chat_id, coord, 0.0))
+                else:
+                    state.move(rec.user_id, coord, RANGE_KM)
+            elif "relay" in data and rec is not None:
+                for other in state.recipients(rec.user_id, RANGE_KM):
+                    state.track_message(other, data["relay"])
+            elif "stop" in data:
+                state.remove_by_chat(chat_id)
+                state.pop_tracked(chat_id)
+
+        async def cleanup(chat_id: int, msg_ids: list[int]) -> None:
+            self.cleaned.append((index, chat_id, msg_ids))
+
+        return ShardWorker(state, handle, cleanup)
+
+    async def __aenter__(self) -> Self:
+        ours = []
+        for worker in self.workers:
+            a, b = socket.socketpair()
+            ours.append(a)
+            reader, writer = await asyncio.open_unix_connection(sock=b)
+            self._tasks.append(asyncio.create_task(worker.serve(reader, writer)))
+        await self.router.connect(ours)
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        await self.router.close()
+        await asyncio.gather(*self._tasks)
+
+    async def send(self, chat_id: int, **data: object) -> None:
+        location = None
+        if "lat" in data:
+            location = Coord(data["lat"], data["lon"])  # type: ignore[arg-type]
+        await self.router.route(chat_id, location, json.dumps(data).encode())
+
+    async def settle(self) -> None:
+        """Wait for the follow-up frames too: a moved user's ghosts are
+        refreshed a hop later, and ids handed back reach the owner after two
+        more."""
+        for _ in range(3):
+            await self.router.barrier()
+
+
+async def test_sharded_neighbors_match_one_state() -> None:
+    rng = random.Random(7)
+    single = AppState(cell_km=RANGE_KM)
+    # A 30 km wide town cut by two stripe borders.
+    async with Cluster(Stripes((-0.1, 0.1))) as cluster:
+        for chat_id in range(1, 301):
+            lat, lon = rng.uniform(45.0, 45.2), rng.uniform(-0.2, 0.2)
+            await cluster.send(chat_id, lat=lat, lon=lon)
+            single.register(UserRecord(f"u{chat_id}", chat_id, Coord(lat, lon), 0.0))
+        for chat_id in rng.sample(range(1, 301), 100):  # some cross a border
+            lat, lon = rng.uniform(45.0, 45.2), rng.uniform(-0.2, 0.2)
+            await cluster.send(chat_id, lat=lat, lon=lon)
+            single.move(f"u{chat_id}", Coord(lat, lon), RANGE_KM)
+        await cluster.settle()
+
+        for chat_id in range(1, 301):
+            rec = single.users[f"u{chat_id}"]
+            owner = cluster.router.owner[chat_id]
+            assert owner == cluster.stripes.shard_of(rec.coord.lon)  # P-SHD-2
+            assert chat_id in cluster.workers[owner].owned
+            state = cluster.states[owner]
+            assert state.users[rec.user_id] == rec
+            assert sorted(state.recipients(rec.user_id, RANGE_KM)) == sorted(
+                single.recipients(rec.user_id, RANGE_KM)
+            )
+        ghosts = sum(len(w.ghosts) for w in cluster.workers)
+        assert 0 < ghosts < 300
+        assert sum(len(s.users) for s in cluster.states) == 300 + ghosts
+
+
+async def test_ghosts_follow_their_user() -> None:
+    async with Cluster(Stripes((0.0,))) as cluster:
+        await cluster.send(1, lat=10.0, lon=-0.01)  # owned by 0, ghost in 1
+        await cluster.send(2, lat=10.0, lon=0.01)  # owned by 1, ghost in 0
+        await cluster.settle()
+        assert cluster.workers[1].ghosts == {1}
+        assert cluster.states[1].users["u1"].last_active_ts == GHOST_TS
+        assert cluster.states[0].idle_user_ids(GHOST_TS / 2, 60.0) == ["u1"]
+
+        await cluster.send(2, relay=100)  # worker 1 tracks 100 for ghost 1
+        await cluster.send(1, lat=10.0, lon=-1.0)  # out of worker 1's halo
+        await cluster.settle()
+        assert cluster.workers[1].ghosts == set()
+        assert "u1" not in cluster.states[1].users
+        assert list(cluster.states[0].tracked_msgs[1]) == [100]
+
+        await cluster.send(2, lat=10.0, lon=-0.02)  # crosses into stripe 0
+        await cluster.settle()
+        assert cluster.router.owner[2] == 0
+        assert cluster.workers[1].ghosts == {2}  # still within the halo
+        assert cluster.workers[0].ghosts == set()
+
+        await cluster.send(2, stop=True)
+        await cluster.settle()
+        assert 2 not in cluster.router.owner
+        assert all("u2" not in state.users for state in cluster.states)
+        assert cluster.cleaned == []  # nothing was sent to the ghost
+
+
+async def test_gone_user_messages_are_deleted_by_ghost_holders() -> None:
+    async with Cluster(Stripes((0.0,))) as cluster:
+        await cluster.send(1, lat=10.0, lon=-0.01)
+        await cluster.send(2, lat=10.0, lon=0.01)
+        await cluster.settle()  # ghosts trail their owner's update by a hop
+        await cluster.send(2, relay=7)
+        await cluster.send(1, stop=True)
+        await cluster.settle()
+        assert cluster.cleaned == [(1, 1, [7])]
+        assert cluster.workers[1].ghosts == set()
@@ -0,0 +1,92 @@
+"""Tests for the cell-bucketed spatial index (tchaka.spatial).
+
+Property coverage:
+- P-IDX-1 candidates are a superset of the exact neighborhood (no false
+  negatives), including across the antimeridian and around the poles
+- P-IDX-2 insert/remove keep the index in step with its keys
+"""
+
+from __future__ import annotations
+
+import pytest
+from hypothesis import given, settings
+from hypothesis import strategies as st
+
+from tchaka.geo import haversine_distance
+from tchaka.spatial import GridIndex
+
+lats = st.floats(min_value=-90, max_value=90, allow_nan=False, allow_infinity=False)
+lons = st.floats(min_value=-180, max_value=180, allow_nan=False, allow_infinity=False)
+
+
+def test_rejects_non_positive_cell_size() -> None:
+    with pytest.raises(ValueError):
+        GridIndex(0)
+
+
+def test_insert_remove_and_move() -> None:
+    index: GridIndex[str] = GridIndex(5.0)
+    index.insert("a", 52.5200, 13.4050)
+    assert "a" in index
+    assert len(index) == 1
+    # re-inserting moves the key instead of duplicating it
+    index.insert("a", 48.8566, 2.3522)
+    assert len(index) == 1
+    assert list(index.candidates(48.8566, 2.3522, 1.0)) == ["a"]
+    assert list(index.candidates(52.5200, 13.4050, 1.0)) == []
+    assert index.remove("a") is True
+    assert index.remove("a") is False
+    assert len(index) == 0
+
+
+def test_remove_from_corner_cells() -> None:
+    # cells are tracked per key as packed ids; the extreme rows and columns
+    # must unpack back to the bucket they were added to
+    index: GridIndex[str] = GridIndex(5.0)
+    corners = {"sw": (-90.0, -180.0), "ne": (90.0, 179.999), "nw": (90.0, -180.0)}
+    for key, (lat, lon) in corners.items():
+        index.insert(key, lat, lon)
+    for key in corners:
+        assert index.remove(key) is True
+    assert list(index.cells()) == []
+
+
+def test_query_visits_only_nearby_cells() -> None:
+    index: GridIndex[str] = GridIndex(5.0)
+    index.insert("berlin", 52.5200, 13.4050)
+    index.insert("berlin-near", 52.5201, 13.4051)
+    index.insert("paris", 48.8566, 2.3522)
+    assert set(index.candidates(52.5200, 13.4050, 5.0)) == {"berlin", "berlin-near"}
+
+
+def test_antimeridian_wraps() -> None:
+    index: GridIndex[str] = GridIndex(5.0)
+    index.insert("east", 0.0, 179.99)
+    index.insert("west", 0.0, -179.99)
+    assert "west" in set(index.candidates(0.0, 179.99, 5.0))
+    assert "east" in set(index.candidates(0.0, -179.99, 5.0))
+
+
+def test_polar_cap_covers_every_longitude() -> None:
+    index: GridIndex[str] = GridIndex(5.0)
+    index.insert("a", 89.99, 0.0)
+    index.insert("b", 89.99, 180.0)
+    assert set(index.candidates(89.99, 90.0, 5.0)) == {"a", "b"}
+
+
+@settings(max_examples=150)
+@given(
+    st.lists(st.tuples(lats, lons), min_size=1, max_size=30),
+    lats,
+    lons,
+    st.floats(min_value=0.0, max_value=20100, allow_nan=False),
+    st.sampled_from([0.5, 5.0, 50.0, 5000.0]),
+)
+def test_candidates_superset_of_exact(points, lat, lon, radius, cell_km):
+    index: GridIndex[str] = GridIndex(cell_km)
+    for i, (p_lat, p_lon) in enumerate(points):
+        index.insert(str(i), p_lat, p_lon)
+    got = set(index.candidates(lat, lon, radius))
+    for i, (p_lat, p_lon) in enumerate(points):
+        if haversine_distance(lat, lon, p_lat, p_lon) <= radius:
+            assert str(i) in got  # P-IDX-1
@@ -1,8 +1,8 @@
 """Stateful property-based tests for :class:`AppState` invariants.
 
 Drives a Hypothesis ``RuleBasedStateMachine`` through arbitrary sequences of
-register / stop / track / touch / evict operations and asserts the state
-invariants from the design hold after *every* step.
+register / move / stop / track / touch / evict / set-range operations and
+asserts the state invariants from the design hold after *every* step.
 
 Property coverage:
 - P-ST-1  bijection consistency (I1, I2)
@@ -12,6 +12,10 @@ Property coverage:
 - P-ST-5  touch monotonicity (active users survive eviction)
 - P-TRK-1 tracked ids are a subset of the real ids ever tracked (no fabrication)
 - P-TRK-2 tracking is idempotent (set semantics)
+- P-IDX-2 the spatial index holds exactly the registered users (I6)
+- P-ADJ-1 the materialized adjacency matches a from-scratch query (I7)
+- P-EXP-1 the expiry buckets hold every user once, in its slot (I9), and find
+  exactly the users a full scan finds
 """
 
 from __future__ import annotations
@@ -19,18 +23,20 @@ from __future__ import annotations
 from hypothesis import strategies as st
 from hypothesis.stateful import RuleBasedStateMachine, invariant, rule
 
+from tchaka.geo import unit_vector
 from tchaka.state import AppState, Coord, UserRecord
 
 lats = st.floats(min_value=-90, max_value=90, allow_nan=False, allow_infinity=False)
 lons = st.floats(min_value=-180, max_value=180, allow_nan=False, allow_infinity=False)
 chat_ids = st.integers(min_value=1, max_value=50)
 msg_ids = st.integers(min_value=1, max_value=10_000)
+ADJACENCY_KM = 1_000.0
 
 
 class AppStateMachine(RuleBasedStateMachine):
     def __init__(self) -> None:
         super().__init__()
-        self.state = AppState()
+        self.state = AppState(adjacency_km=ADJACENCY_KM)
         self.clock = 0.0
         # Shadow model of every message id we ever legitimately tracked, per
         # chat. Used to prove tracked_msgs never contains a fabricated id.
@@ -51,6 +57,26 @@ class AppStateMachine(RuleBasedStateMachine):
                 )
             )
 
+    @rule(chat_id=chat_ids, lat=lats, lon=lons)
+    def move(self, chat_id: int, lat: float, lon: float) -> None:
+        rec = self.state.user_for_chat(chat_id)
+        if rec is not None:
+            before = {
+                r.chat_id for r in self.state.neighbors(rec.user_id, ADJACENCY_KM)
+            }
+            newly = self.state.move(rec.user_id, Coord(lat, lon), ADJACENCY_KM)
+            after = {r.chat_id for r in self.state.neighbors(rec.user_id, ADJACENCY_KM)}
+            assert set(newly) == after - before
+
+    @rule(
+        chat_id=chat_ids,
+        range_km=st.none() | st.floats(min_value=0.001, max_value=2_000.0),
+    )
+    def set_range(self, chat_id: int, range_km: float | None) -> None:
+        rec = self.state.user_for_chat(chat_id)
+        if rec is not None:
+            self.state.set_range(rec.user_id, range_km)
+
     @rule(chat_id=chat_ids)
     def stop(self, chat_id: int) -> None:
         self.state.remove_by_chat(chat_id)
@@ -74,6 +100,11 @@ class AppStateMachine(RuleBasedStateMachine):
     @rule(ttl=st.floats(min_value=0, max_value=5_000, allow_nan=False))
     def evict(self, ttl: float) -> None:
         idle = self.state.idle_user_ids(self.clock, ttl)
+        assert set(idle) == {  # P-EXP-1
+            uid
+            for uid, rec in self.state.users.items()
+            if self.clock - rec.last_active_ts >= ttl
+        }
         # snapshot which users are *not* idle so we can assert they survive
         survivors = {
             uid
@@ -102,10 +133,41 @@ class AppStateMachine(RuleBasedStateMachine):
         for uid, rec in self.state.users.items():
             assert self.state.chat_to_user.get(rec.chat_id) == uid
 
+    @invariant()
+    def index_consistent(self) -> None:  # P-IDX-2
+        assert len(self.state.index) == len(self.state.users)
+        for uid, rec in self.state.users.items():
+            assert uid in set(self.state.index.candidates(*rec.coord, 0.0))
+            assert self.state.units[uid] == unit_vector(*rec.coord)
+        assert self.state.units.keys() == self.state.users.keys()
+
+    @invariant()
+    def adjacency_consistent(self) -> None:  # P-ADJ-1
+        assert self.state.adjacency.keys() == self.state.users.keys()
+        for uid, nbrs in self.state.adjacency.items():
+            scanned = {r.user_id for r in self.state._scan_neighbors(uid, ADJACENCY_KM)}
+            assert nbrs.keys() == scanned
+
+    @invariant()
+    def expiry_covers_users(self) -> None:  # P-EXP-1
+        entries = {
+            uid: (slot, ts)
+            for slot, bucket in self.state.expiry.items()
+            for uid, ts in bucket.items()
+        }
+        assert sum(map(len, self.state.expiry.values())) == len(entries)
+        assert entries == {
+            uid: (
+                int(rec.last_active_ts // self.state.expiry_slot_s),
+                rec.last_active_ts,
+            )
+            for uid, rec in self.state.users.items()
+        }
+
     @invariant()
     def no_fabricated_ids(self) -> None:  # P-TRK-1 / P-TRK-2
         for cid, tracked in self.state.tracked_msgs.items():
-            assert tracked <= self.ever_tracked.get(cid, set())
+            assert set(tracked) <= self.ever_tracked.get(cid, set())
 
 
 TestAppStateMachine = AppStateMachine.TestCase
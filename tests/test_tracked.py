@@ -0,0 +1,108 @@
+"""Tests for the compact tracked-message store (tchaka.tracked).
+
+Property coverage:
+- P-TRK-4 run-length ids behave like a sorted set under any insertion order
+- P-TRK-5 the per-chat cap keeps exactly the newest ids, and the global
+  budget holds the estimated size under its limit by dropping the least
+  recently tracked chat's oldest ids first
+"""
+
+from __future__ import annotations
+
+import pytest
+from hypothesis import given
+from hypothesis import strategies as st
+
+from tchaka.tracked import CHAT_BYTES, RUN_BYTES, MessageIds, TrackedMessages
+
+
+@given(st.lists(st.integers(min_value=1, max_value=200), max_size=80))
+def test_runs_match_a_set(ids: list[int]) -> None:
+    store = MessageIds()
+    for mid in ids:
+        store.add(mid)
+    assert list(store) == sorted(set(ids))  # P-TRK-4
+    assert len(store) == len(set(ids))
+    assert all(mid in store for mid in ids)
+    assert 0 not in store
+    # runs are maximal: no two of them touch
+    values = sorted(set(ids))
+    assert store.runs == sum(1 for a, b in zip([None, *values], values) if a != b - 1)
+
+
+def test_consecutive_ids_share_one_run() -> None:
+    store = MessageIds()
+    for mid in range(1000, 6000):
+        store.add(mid)
+    assert store.runs == 1
+    assert len(store) == 5000
+
+
+@given(
+    st.lists(st.integers(min_value=1, max_value=300), max_size=80),
+    st.integers(min_value=1, max_value=20),
+)
+def test_per_chat_cap_keeps_newest(ids: list[int], cap: int) -> None:
+    tracked = TrackedMessages(per_chat=cap)
+    kept: set[int] = set()
+    for mid in ids:
+        tracked.add(7, mid)
+        kept = set(sorted(kept | {mid})[-cap:])
+    assert tracked.pop(7) == sorted(kept)  # P-TRK-5
+    assert tracked.pop(7) == []
+
+
+def test_budget_drops_least_recent_chat_first() -> None:
+    budget = 2 * CHAT_BYTES + 3 * RUN_BYTES
+    tracked = TrackedMessages(budget_bytes=budget)
+    tracked.add(1, 10)
+    tracked.add(1, 20)
+    tracked.add(2, 5)
+    assert tracked.nbytes <= budget
+    tracked.add(2, 50)  # over budget: chat 1 loses its oldest run
+    assert list(tracked[1]) == [20]
+    assert list(tracked[2]) == [5, 50]
+    tracked.add(2, 90)  # chat 1 is emptied and forgotten
+    assert 1 not in tracked
+    assert tracked.nbytes <= budget  # P-TRK-5
+    assert tracked.dropped == 2
+
+
+@given(
+    st.lists(
+        st.tuples(st.integers(1, 4), st.integers(min_value=1, max_value=60)),
+        max_size=60,
+    )
+)
+def test_add_many_matches_add(pairs: list[tuple[int, int]]) -> None:
+    one, many = TrackedMessages(per_chat=8), TrackedMessages(per_chat=8)
+    for chat_id, mid in pairs:
+        one.add(chat_id, mid)
+    many.add_many(pairs)
+    assert list(many) == list(one)
+    assert all(many.pop(chat_id) == one.pop(chat_id) for chat_id in range(1, 5))
+
+
+def test_add_many_enforces_the_budget_once() -> None:
+    budget = 2 * CHAT_BYTES + 3 * RUN_BYTES
+    tracked = TrackedMessages(budget_bytes=budget)
+    tracked.add_many([(1, 10), (1, 20), (2, 5), (2, 50), (2, 90)])
+    assert tracked.nbytes <= budget  # P-TRK-5
+    assert 1 not in tracked
+    assert list(tracked[2]) == [5, 50, 90]
+
+
+def test_rejects_negative_caps() -> None:
+    with pytest.raises(ValueError):
+        TrackedMessages(per_chat=-1)
+
+
+@given(st.lists(st.integers(min_value=1, max_value=200), max_size=80))
+def test_runs_round_trip_through_bytes(ids: list[int]) -> None:
+    store = MessageIds()
+    for mid in ids:
+        store.add(mid)
+    copy = MessageIds.from_bytes(store.to_bytes())
+    assert list(copy) == list(store)  # P-TRK-4
+    assert len(copy) == len(store)
+    assert copy.runs == store.runs
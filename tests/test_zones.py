@@ -0,0 +1,176 @@
+"""Tests for geofenced zones (tchaka.zones) and their use by AppState.
+
+Property coverage:
+- P-ZONE-1 :meth:`ZoneIndex.locate` equals a linear scan for the first zone
+  containing the point
+- P-ZONE-2 zone membership (``zone_of``/``zone_members``) stays the inverse of
+  each user's located zone (I8)
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from hypothesis import given, settings
+from hypothesis import strategies as st
+
+from tchaka.main import load_zone_index
+from tchaka.state import AppState, Coord, UserRecord
+from tchaka.zones import Zone, ZoneIndex, load_zones
+
+RANGE_KM = 1.0
+
+# A festival ground (~2.2 km tall) with a backstage hole, next to a campus.
+FESTIVAL = Zone(
+    "festival",
+    (
+        ((48.00, 2.00), (48.00, 2.03), (48.02, 2.03), (48.02, 2.00)),
+        ((48.009, 2.014), (48.009, 2.016), (48.011, 2.016), (48.011, 2.014)),
+    ),
+)
+CAMPUS = Zone("campus", (((48.03, 2.00), (48.03, 2.01), (48.04, 2.005)),))
+
+coords = st.tuples(
+    st.floats(min_value=47.9, max_value=48.1, allow_nan=False),
+    st.floats(min_value=1.9, max_value=2.1, allow_nan=False),
+)
+
+
+def _triangles() -> st.SearchStrategy[list[Zone]]:
+    triangle = st.tuples(coords, coords, coords)
+    return st.lists(triangle, max_size=40).map(
+        lambda ts: [Zone(f"z{i}", (t,)) for i, t in enumerate(ts)]
+    )
+
+
+def test_contains_polygon_with_hole() -> None:
+    assert FESTIVAL.contains(48.005, 2.005)
+    assert not FESTIVAL.contains(48.010, 2.015)  # backstage hole
+    assert not FESTIVAL.contains(48.025, 2.005)
+    assert CAMPUS.contains(48.033, 2.005)
+    assert FESTIVAL.bbox == (48.00, 2.00, 48.02, 2.03)
+
+
+def test_zone_validation() -> None:
+    with pytest.raises(ValueError, match="3"):
+        Zone("line", (((0.0, 0.0), (1.0, 1.0)),))
+    with pytest.raises(ValueError, match="unique"):
+        ZoneIndex([FESTIVAL, FESTIVAL])
+    assert ZoneIndex([]).locate(48.0, 2.0) is None
+
+
+@settings(max_examples=100)
+@given(_triangles(), st.lists(coords, min_size=1, max_size=20), st.sampled_from([2, 4]))
+def test_locate_matches_linear_scan(zones, points, fanout):
+    index = ZoneIndex(zones, fanout=fanout)
+    for lat, lon in points:
+        expected = next((z for z in zones if z.contains(lat, lon)), None)
+        assert index.locate(lat, lon) is expected  # P-ZONE-1
+
+
+def test_load_zones_geojson(tmp_path: Path) -> None:
+    def ring(*points: tuple[float, float]) -> list[list[float]]:
+        closed = [*points, points[0]]
+        return [[lon, lat] for lat, lon in closed]  # GeoJSON is [lon, lat]
+
+    path = tmp_path / "zones.geojson"
+    path.write_text(
+        json.dumps(
+            {
+                "type": "FeatureCollection",
+                "features": [
+                    {
+                        "type": "Feature",
+                        "properties": {"name": "festival"},
+                        "geometry": {
+                            "type": "Polygon",
+                            "coordinates": [ring(*FESTIVAL.rings[0])],
+                        },
+                    },
+                    {
+                        "type": "Feature",
+                        "properties": {},
+                        "geometry": {
+                            "type": "MultiPolygon",
+                            "coordinates": [[ring(*CAMPUS.rings[0])]],
+                        },
+                    },
+                ],
+            }
+        )
+    )
+    festival, campus = load_zones(path)
+    assert festival == Zone("festival", (FESTIVAL.rings[0],))
+    assert campus == Zone("zone1", CAMPUS.rings)
+    assert load_zone_index(str(path)) is not None
+
+
+def test_bad_zones_file(tmp_path: Path) -> None:
+    path = tmp_path / "zones.geojson"
+    path.write_text('{"type": "FeatureCollection", "features": [{"geometry": 1}]}')
+    with pytest.raises(ValueError, match="feature 0"):
+        load_zones(path)
+    assert load_zone_index(str(path)) is None
+    assert load_zone_index(str(tmp_path / "missing.geojson")) is None
+    assert load_zone_index(None) is None
+
+
+def _state(*, adjacency: bool = False) -> AppState:
+    state = AppState(
+        cell_km=RANGE_KM,
+        adjacency_km=RANGE_KM if adjacency else None,
+        zones=ZoneIndex([FESTIVAL, CAMPUS]),
+    )
+    # Two festival-goers ~2 km apart, one just outside the fence.
+    state.register(UserRecord("stage", 1, Coord(48.001, 2.001), 0.0))
+    state.register(UserRecord("gate", 2, Coord(48.019, 2.001), 0.0))
+    state.register(UserRecord("street", 3, Coord(48.0205, 2.001), 0.0))
+    state.register(UserRecord("cafe", 4, Coord(48.0212, 2.001), 0.0))
+    return state
+
+
+@pytest.mark.parametrize("adjacency", [False, True])
+def test_zone_members_relay_to_whole_zone(adjacency: bool) -> None:
+    state = _state(adjacency=adjacency)
+    assert state.zone_members == {"festival": {"stage", "gate"}}
+    assert sorted(state.recipients("stage", RANGE_KM)) == [2]
+    assert state.count_neighbors("gate", RANGE_KM) == 1
+    assert [r.user_id for _, r in state.nearest("gate", 3, RANGE_KM)] == ["stage"]
+    # The fence separates both ways, even within the radius.
+    assert [r.user_id for r in state.neighbors("street", RANGE_KM)] == ["cafe"]
+
+
+@pytest.mark.parametrize("adjacency", [False, True])
+def test_move_across_the_fence(adjacency: bool) -> None:
+    state = _state(adjacency=adjacency)
+    assert sorted(state.move("street", Coord(48.0195, 2.002), RANGE_KM)) == [1, 2]
+    assert state.move("street", Coord(48.0190, 2.003), RANGE_KM) == []
+    assert state.neighbors("cafe", RANGE_KM) == []
+    assert state.move("street", Coord(48.0205, 2.001), RANGE_KM) == [4]
+    assert state.zone_of == {"stage": "festival", "gate": "festival"}
+    if adjacency:
+        assert state.adjacency["street"] == {"cafe": 4}
+        assert state.adjacency["gate"] == {}
+
+
+@settings(max_examples=50)
+@given(st.lists(st.tuples(st.booleans(), coords), min_size=1, max_size=30))
+def test_membership_tracks_locations(steps):
+    state = AppState(cell_km=RANGE_KM, zones=ZoneIndex([FESTIVAL, CAMPUS]))
+    for i, (remove, (lat, lon)) in enumerate(steps):
+        uid = f"u{i % 5}"
+        if uid not in state.users:
+            state.register(UserRecord(uid, i % 5, Coord(lat, lon), 0.0))
+        elif remove:
+            state.remove_by_chat(i % 5)
+        else:
+            state.move(uid, Coord(lat, lon), RANGE_KM)
+        for user_id, rec in state.users.items():
+            zone = state.zones.locate(*rec.coord) if state.zones else None
+            assert state.zone_of.get(user_id) == (zone and zone.name)  # P-ZONE-2
+        assert {u for ms in state.zone_members.values() for u in ms} == set(
+            state.zone_of
+        )
+        assert all(state.zone_members.values())